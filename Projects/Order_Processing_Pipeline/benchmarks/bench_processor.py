@@ -0,0 +1,127 @@
+"""
+Throughput and end-to-end latency of the stream processor on synthetic events.
+
+    python -m benchmarks.bench_processor --events 200000 --products 1000
+    python -m benchmarks.bench_processor --store postgres --embedded-pg
+
+The events (with re-sent and broken messages mixed in) are generated once, then:
+  backlog     every event is queued before the processor starts: events/sec at full batches,
+              with one inventory UPSERT per product and batch, then per event (--no-coalesce);
+  paced       a producer thread emits --rate events/sec: p50/p99 latency from produce to commit.
+Each run starts from an empty store (a temp SQLite file, or the PostgreSQL tables dropped) and
+must end with the expected inventory, every broken message in the dead-letter sink and every
+re-sent one skipped. Exits non-zero if a check fails.
+"""
+import argparse
+import logging as std_logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from src.utils.dedupe import Deduplicator
+from src.utils.inventory_store import open_store
+from src.utils.processor import StreamProcessor
+from src.utils.producers import EventGenerator
+from src.utils.sinks import MemorySink
+from src.utils.sources import MemorySource
+
+
+def reset_pg(dsn):
+    import psycopg2
+
+    with psycopg2.connect(dsn) as conn, conn.cursor() as cur:
+        cur.execute("DROP TABLE IF EXISTS products, suppliers, inventory, orders, events_log")
+
+
+def pace(source, messages, rate):
+    """Put messages on source at `rate` per second, stamped with the time they are put."""
+    start = time.perf_counter()
+    for i, (topic, value) in enumerate(messages):
+        delay = start + i / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        source.put(topic, value)
+    source.close_input()
+
+
+def run(messages, generator, args, pg_dsn, coalesce=True, rate=None):
+    with tempfile.TemporaryDirectory() as tmp:
+        if pg_dsn:
+            reset_pg(pg_dsn)
+        store = open_store(args.store, os.path.join(tmp, "inventory.db"), pg_dsn)
+        dedupe = Deduplicator(store, bloom_capacity=max(len(messages), 1000))
+        dedupe.warm()
+        source, dlq, updates = MemorySource(), MemorySink(), MemorySink()
+        processor = StreamProcessor(source, store, dlq, dedupe, updates, max_batch=args.max_batch,
+                                    max_wait=args.max_wait, coalesce=coalesce)
+        if rate:
+            producer = threading.Thread(target=pace, args=(source, messages, rate), daemon=True)
+            start = time.perf_counter()
+            producer.start()
+        else:
+            for topic, value in messages:
+                source.put(topic, value)
+            source.close_input()
+            start = time.perf_counter()
+        processor.run()
+        elapsed = time.perf_counter() - start
+        summary = processor.summary()
+        levels = store.inventory()
+        store.close()
+    ok = (levels == generator.expected and len(dlq.messages) == generator.counts["invalid"]
+          and summary["applied"] == generator.counts["valid"])
+    return dict(summary, seconds=elapsed, rate=len(messages) / elapsed, ok=ok)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the stream processor.")
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--duplicate-rate", type=float, default=0.02)
+    parser.add_argument("--invalid-rate", type=float, default=0.01)
+    parser.add_argument("--max-batch", type=int, default=1000)
+    parser.add_argument("--max-wait", type=float, default=0.05)
+    parser.add_argument("--rate", type=float, default=5000.0, help="Events/sec of the paced run")
+    parser.add_argument("--paced-events", type=int, default=50_000, help="Events of the paced run")
+    parser.add_argument("--store", choices=["sqlite", "postgres"], default="sqlite")
+    parser.add_argument("--pg-dsn", default=os.getenv("ORDERS_PG_DSN"))
+    parser.add_argument("--embedded-pg", action="store_true", help="Start a throwaway PostgreSQL with pgserver")
+    args = parser.parse_args()
+    std_logging.disable(std_logging.CRITICAL)
+
+    pg_dsn, pg_server = args.pg_dsn, None
+    if args.store == "postgres" and args.embedded_pg:
+        import pgserver
+
+        pg_server = pgserver.get_server(tempfile.mkdtemp(), cleanup_mode="stop")
+        pg_dsn = pg_server.get_uri()
+
+    generator = EventGenerator(args.products, seed=1, duplicate_rate=args.duplicate_rate, invalid_rate=args.invalid_rate)
+    messages = generator.events(args.events)
+    paced_generator = EventGenerator(args.products, seed=2, duplicate_rate=args.duplicate_rate, invalid_rate=args.invalid_rate)
+    paced_messages = paced_generator.events(min(args.paced_events, args.events))
+    print(f"{args.store}: {len(messages)} events over {args.products} products {generator.counts}")
+    try:
+        rows = [
+            ("backlog", "per product", run(messages, generator, args, pg_dsn)),
+            ("backlog", "per event", run(messages, generator, args, pg_dsn, coalesce=False)),
+            (f"paced {args.rate:g}/s", "per product", run(paced_messages, paced_generator, args, pg_dsn, rate=args.rate)),
+        ]
+    finally:
+        if pg_server:
+            pg_server.cleanup()
+
+    print(f"{'run':<14} {'upserts':<12} {'events/s':>9} {'batches':>8} {'upsert rows':>12} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'db lookups':>10}  check")
+    for name, mode, r in rows:
+        print(f"{name:<14} {mode:<12} {r['rate']:>9.0f} {r['batches']:>8} {r['upserts']:>12} {r['p50_ms']:>8} "
+              f"{r['p99_ms']:>8} {r['lookups']:>10}  {'PASS' if r['ok'] else 'FAIL'}")
+    ok = all(r["ok"] for _, _, r in rows)
+    print("PASS inventory, dead letters and duplicates as expected" if ok else "FAIL some run does not match the expected state")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Cost of the daily report job, incremental against a full recompute, as the orders table grows.
+
+    python -m benchmarks.bench_reports --days 30 --events-per-day 20000
+    python -m benchmarks.bench_reports --store postgres --embedded-pg --days 10
+
+Synthetic events spread over --days days are processed in --stages chunks, with the report
+engine fed by the processor. After each chunk the daily job is timed both ways for the last
+complete day:
+  incremental  restore the engine's checkpoint, catch up on the batches committed since, snapshot;
+  recompute    GROUP BY queries over the day's orders and the low-stock index.
+The two reports are compared (totals and low-stock products equal, top sellers within the
+sketch's error bound). The engine's share of the processing time is reported as well.
+Exits non-zero if a comparison fails.
+"""
+import argparse
+import logging as std_logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from src.utils.dedupe import Deduplicator
+from src.utils.inventory_store import open_store
+from src.utils.processor import StreamProcessor
+from src.utils.producers import EventGenerator
+from src.utils.reports import ReportEngine, compare_reports, recompute_report
+from src.utils.sinks import MemorySink
+from src.utils.sources import MemorySource
+
+
+def reset_pg(dsn):
+    import psycopg2
+
+    with psycopg2.connect(dsn) as conn, conn.cursor() as cur:
+        cur.execute("DROP TABLE IF EXISTS products, suppliers, inventory, orders, events_log, reports, report_state")
+
+
+def timed(func):
+    """func, accumulating the seconds spent in it in its `seconds` attribute."""
+    def wrapper(*args):
+        start = time.perf_counter()
+        func(*args)
+        wrapper.seconds += time.perf_counter() - start
+    wrapper.seconds = 0.0
+    return wrapper
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the incremental daily reports.")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--events-per-day", type=int, default=20_000)
+    parser.add_argument("--stages", type=int, default=3, help="Chunks the days are processed in")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--threshold", type=int, default=10)
+    parser.add_argument("--store", choices=["sqlite", "postgres"], default="sqlite")
+    parser.add_argument("--pg-dsn", default=os.getenv("ORDERS_PG_DSN"))
+    parser.add_argument("--embedded-pg", action="store_true", help="Start a throwaway PostgreSQL with pgserver")
+    args = parser.parse_args()
+    std_logging.disable(std_logging.CRITICAL)
+
+    pg_dsn, pg_server = args.pg_dsn, None
+    if args.store == "postgres" and args.embedded_pg:
+        import pgserver
+
+        pg_server = pgserver.get_server(tempfile.mkdtemp(), cleanup_mode="stop")
+        pg_dsn = pg_server.get_uri()
+    if pg_dsn:
+        reset_pg(pg_dsn)
+
+    # the days end at midnight UTC today, so every day but the last stage's is complete
+    end = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+    generator = EventGenerator(args.products, seed=4, start_ts=end - args.days * 86400,
+                               interval=86400 / args.events_per_day)
+    total = args.days * args.events_per_day
+    rows, ok = [], True
+    with tempfile.TemporaryDirectory() as tmp:
+        store = open_store(args.store, os.path.join(tmp, "inventory.db"), pg_dsn)
+        dedupe = Deduplicator(store, bloom_capacity=total)
+        engine = ReportEngine(store, k=args.top_k, threshold=args.threshold, retain_days=args.days + 1)
+        listener = timed(engine.on_batch)
+        try:
+            for stage in range(1, args.stages + 1):
+                source = MemorySource()
+                for topic, value in generator.events(total * stage // args.stages - total * (stage - 1) // args.stages):
+                    source.put(topic, value)
+                source.close_input()
+                processor = StreamProcessor(source, store, MemorySink(), dedupe, max_batch=1000, listeners=[listener])
+                listener.seconds = 0.0
+                start = time.perf_counter()
+                processor.run()
+                processing = time.perf_counter() - start
+                engine.save()
+
+                # the last complete day, or the first one while it is still being filled
+                last_ts = generator.start_ts + (generator._n - 1) * generator.interval
+                day = datetime.fromtimestamp(max(generator.start_ts, last_ts - 86400), timezone.utc).strftime("%Y-%m-%d")
+                start = time.perf_counter()
+                job = ReportEngine.load(store, k=args.top_k, threshold=args.threshold, retain_days=args.days + 1)
+                incremental = job.snapshot(day)
+                incremental_ms = (time.perf_counter() - start) * 1000
+                start = time.perf_counter()
+                exact = recompute_report(store, day, args.top_k, args.threshold)
+                recompute_ms = (time.perf_counter() - start) * 1000
+                problems = compare_reports(incremental, exact)
+                ok &= not problems
+                orders = sum(1 for _ in store.iter_orders_since(""))
+                rows.append((stage, orders, day, listener.seconds / processing * 100, incremental_ms, recompute_ms, problems))
+        finally:
+            store.close()
+            if pg_server:
+                pg_server.cleanup()
+
+    print(f"{args.store}: {args.days} days x {args.events_per_day} events, {args.products} products")
+    print(f"{'stage':>5} {'orders':>9} {'report day':>11} {'engine %':>9} {'incremental ms':>15} {'recompute ms':>13}  check")
+    for stage, orders, day, share, incremental_ms, recompute_ms, problems in rows:
+        print(f"{stage:>5} {orders:>9} {day:>11} {share:>8.1f}% {incremental_ms:>15.1f} {recompute_ms:>13.1f}  "
+              + ("PASS" if not problems else "FAIL " + "; ".join(problems)))
+    print("PASS incremental reports match the recomputed ones" if ok else "FAIL some report differs")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from src.utils.dedupe import DEFAULT_BLOOM_CAPACITY, DEFAULT_LRU_SIZE, Deduplicator
+from src.utils.events import DLQ_TOPIC, SOURCE_TOPICS, UPDATES_TOPIC
+from src.utils.inventory_store import DEFAULT_DB, STORES, open_store
+from src.utils.logger import configure_logging, logging
+from src.utils.processor import DEFAULT_MAX_BATCH, DEFAULT_MAX_WAIT, StreamProcessor
+from src.utils.reports import (
+    DEFAULT_LOW_STOCK_THRESHOLD, DEFAULT_REPORT_DIR, DEFAULT_TOP_K, REPORT_FORMATS,
+    ReportEngine, compare_reports, export_report, recompute_report,
+)
+from src.utils.sinks import FileSink, KafkaSink
+from src.utils.sources import DEFAULT_BOOTSTRAP_SERVERS, DEFAULT_GROUP_ID, SOURCES, FileSource, KafkaSource
+
+DEFAULT_EVENTS_FILE = "data/events.jsonl"
+DEFAULT_DLQ_FILE = "data/dlq.jsonl"
+DEFAULT_UPDATES_FILE = "data/inventory_updates.jsonl"
+
+
+def _load_dotenv():
+    try:
+        from dotenv import load_dotenv  # deferred: optional, only reads .env
+    except ImportError:
+        return
+    load_dotenv()
+
+
+def open_source(args):
+    if args.source == "kafka":
+        return KafkaSource(args.topics, args.bootstrap_servers, args.group_id)
+    return FileSource(args.input, offset_path=f"{args.input}.offset", follow=args.follow)
+
+
+def open_sinks(args):
+    """The dead-letter sink and the inventory-updates sink (None without --updates)."""
+    if args.sinks == "kafka":
+        dlq = KafkaSink(DLQ_TOPIC, args.bootstrap_servers)
+        updates = KafkaSink(UPDATES_TOPIC, args.bootstrap_servers) if args.updates else None
+    else:
+        dlq = FileSink(args.dlq_file)
+        updates = FileSink(args.updates_file) if args.updates else None
+    return dlq, updates
+
+
+def produce_main(argv):
+    """
+    `python main.py produce ...`: simulate the producers, writing synthetic events to a JSON
+    Lines file (the input of --source file) or to the Kafka topics.
+    """
+    from src.utils.producers import EventGenerator
+
+    parser = argparse.ArgumentParser(prog="main.py produce", description="Generate synthetic order, sale and restock events.")
+    parser.add_argument("--count", type=int, default=10_000, help="Messages to produce")
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--duplicate-rate", type=float, default=0.02, help="Share of re-sent messages")
+    parser.add_argument("--invalid-rate", type=float, default=0.01, help="Share of broken messages")
+    parser.add_argument("--output", default=DEFAULT_EVENTS_FILE, help="JSON Lines file to append to")
+    parser.add_argument("--kafka", action="store_true", help="Produce to the Kafka topics instead of --output")
+    parser.add_argument("--bootstrap-servers", default=os.getenv("KAFKA_BOOTSTRAP_SERVERS", DEFAULT_BOOTSTRAP_SERVERS))
+    args = parser.parse_args(argv)
+
+    generator = EventGenerator(args.products, args.seed, args.duplicate_rate, args.invalid_rate)
+    if args.kafka:
+        sinks = {}
+        for topic, message in generator.events(args.count):
+            if topic not in sinks:
+                sinks[topic] = KafkaSink(topic, args.bootstrap_servers)
+            sinks[topic].send_raw(message)
+        for sink in sinks.values():
+            sink.close()
+    else:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "ab") as f:
+            for _, message in generator.events(args.count):
+                f.write(message + b"\n")
+    logging.info(f"[PRODUCE] {args.count} messages: {generator.counts}")
+    print(f"Produced {args.count} messages {generator.counts}")
+
+
+def report_main(argv):
+    """
+    `python main.py report ...`: the daily job. Restores the report engine's checkpoint, folds
+    in the orders committed since, and exports the day's report (total sales, top sellers,
+    low stock) to CSV/JSON and the reports table. --validate recomputes the report from the
+    orders table and exits non-zero when the two disagree.
+    """
+    yesterday = (datetime.now(timezone.utc) - timedelta(days=1)).strftime("%Y-%m-%d")
+    parser = argparse.ArgumentParser(prog="main.py report", description="Export the daily sales, top sellers and low-stock report.")
+    parser.add_argument("--date", default=yesterday, help="Report date YYYY-MM-DD (default yesterday, UTC)")
+    parser.add_argument("--out-dir", default=DEFAULT_REPORT_DIR, help="Where the report files are written")
+    parser.add_argument("--format", nargs="+", choices=REPORT_FORMATS, default=list(REPORT_FORMATS), help="Export formats")
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K, help="Top sellers listed")
+    parser.add_argument("--low-stock-threshold", type=int, default=DEFAULT_LOW_STOCK_THRESHOLD, help="Products with fewer units are low on stock")
+    parser.add_argument("--recompute", action="store_true", help="Compute the report from the orders table instead of the running aggregates")
+    parser.add_argument("--validate", action="store_true", help="Also recompute the report and compare it with the incremental one")
+    parser.add_argument("--store", choices=STORES, default=os.getenv("ORDERS_STORE", "sqlite"))
+    parser.add_argument("--db", default=DEFAULT_DB, help="SQLite database file")
+    parser.add_argument("--pg-dsn", default=os.getenv("ORDERS_PG_DSN"))
+    args = parser.parse_args(argv)
+
+    store = open_store(args.store, args.db, args.pg_dsn)
+    try:
+        report = None
+        if not args.recompute:
+            engine = ReportEngine.load(store, k=args.top_k, threshold=args.low_stock_threshold)
+            engine.save()
+            report = engine.snapshot(args.date)
+            if report is None:
+                logging.warning(f"[REPORTS] {args.date} is older than the days kept by the engine, recomputing")
+        if report is None:
+            report = recompute_report(store, args.date, args.top_k, args.low_stock_threshold)
+        store.save_report(args.date, report["total_sales"], json.dumps(report["top_sellers"]),
+                          json.dumps(report["low_stock"]), report["generated_at"])
+        paths = export_report(report, args.out_dir, args.format)
+        logging.info(f"[REPORTS] {args.date} ({report['mode']}) exported to {', '.join(map(str, paths))}")
+        print(f"{args.date}: total_sales={report['total_sales']} order_lines={report['order_lines']} "
+              f"low_stock={len(report['low_stock'])} ({report['mode']}) -> {args.out_dir}")
+
+        if args.validate and report["mode"] == "incremental":
+            problems = compare_reports(report, recompute_report(store, args.date, len(report["top_sellers"]) or args.top_k,
+                                                                args.low_stock_threshold))
+            for problem in problems:
+                print(f"MISMATCH {problem}")
+                logging.error(f"[REPORTS] validation of {args.date}: {problem}")
+            print("PASS incremental report matches the recomputed one" if not problems else "FAIL")
+            if problems:
+                sys.exit(1)
+    finally:
+        store.close()
+
+
+def main():
+    if sys.argv[1:2] == ["produce"]:
+        configure_logging()
+        produce_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["report"]:
+        _load_dotenv()
+        configure_logging()
+        report_main(sys.argv[2:])
+        return
+
+    _load_dotenv()
+    parser = argparse.ArgumentParser(description="Apply order, sale and restock events to the inventory database.")
+    parser.add_argument("--source", choices=SOURCES, default="kafka", help="Read the Kafka topics, or a JSON Lines file standing in for them")
+    parser.add_argument("--input", default=DEFAULT_EVENTS_FILE, help="With --source file: the events file (its read offset is kept in INPUT.offset)")
+    parser.add_argument("--follow", action="store_true", help="With --source file: tail the file instead of stopping at its end")
+    parser.add_argument("--topics", nargs="+", default=list(SOURCE_TOPICS), help="With --source kafka: topics to consume")
+    parser.add_argument("--bootstrap-servers", default=os.getenv("KAFKA_BOOTSTRAP_SERVERS", DEFAULT_BOOTSTRAP_SERVERS))
+    parser.add_argument("--group-id", default=DEFAULT_GROUP_ID, help="Kafka consumer group: processors of one group share the partitions")
+    parser.add_argument("--sinks", choices=["kafka", "file"], help="Send dead letters and updates to the dlq/inventory_updates topics or to files (default: like --source)")
+    parser.add_argument("--dlq-file", default=DEFAULT_DLQ_FILE, help="With file sinks: dead-letter file")
+    parser.add_argument("--updates", action=argparse.BooleanOptionalAction, default=True, help="Emit one inventory update per product and batch (default on)")
+    parser.add_argument("--updates-file", default=DEFAULT_UPDATES_FILE, help="With file sinks: inventory updates file")
+    parser.add_argument("--store", choices=STORES, default=os.getenv("ORDERS_STORE", "sqlite"), help="Where inventory, orders and events_log live")
+    parser.add_argument("--db", default=DEFAULT_DB, help="SQLite database file")
+    parser.add_argument("--pg-dsn", default=os.getenv("ORDERS_PG_DSN"), help="PostgreSQL connection string for --store postgres")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH, help="Records per micro-batch (one transaction)")
+    parser.add_argument("--max-wait", type=float, default=DEFAULT_MAX_WAIT, help="Seconds a poll waits for the first record of a batch")
+    parser.add_argument("--lru-size", type=int, default=DEFAULT_LRU_SIZE, help="Recent event ids remembered exactly")
+    parser.add_argument("--bloom-capacity", type=int, default=DEFAULT_BLOOM_CAPACITY, help="Event ids the Bloom filter is sized for (at 0.1%% false positives)")
+    parser.add_argument("--no-coalesce", dest="coalesce", action="store_false", help="One inventory UPSERT per event instead of per product and batch")
+    parser.add_argument("--reports", action="store_true", help="Maintain the daily reports as batches are committed (one processor per database)")
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K, help="With --reports: top sellers tracked per day")
+    parser.add_argument("--low-stock-threshold", type=int, default=DEFAULT_LOW_STOCK_THRESHOLD, help="With --reports: products with fewer units are low on stock")
+    args = parser.parse_args()
+    args.sinks = args.sinks or args.source
+
+    configure_logging()
+    store = open_store(args.store, args.db, args.pg_dsn)
+    dedupe = Deduplicator(store, args.lru_size, args.bloom_capacity)
+    dedupe.warm()
+    source = open_source(args)
+    dlq, updates = open_sinks(args)
+    engine = None
+    if args.reports:
+        engine = ReportEngine.load(store, k=args.top_k, threshold=args.low_stock_threshold)
+    processor = StreamProcessor(source, store, dlq, dedupe, updates, args.max_batch, args.max_wait, args.coalesce,
+                                listeners=[engine.on_batch] if engine else ())
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        processor.run(stop)
+    except KeyboardInterrupt:
+        logging.info("Shutting down gracefully. Bye!")
+    finally:
+        source.close()
+        dlq.close()
+        if updates is not None:
+            updates.close()
+        if engine is not None:
+            engine.save()
+        store.close()
+    summary = processor.summary()
+    print(f"Processed {summary['records']} records: {summary['applied']} applied, "
+          f"{summary['duplicates']} duplicates, {summary['invalid']} invalid")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import hashlib
+import math
+import time
+from collections import OrderedDict
+
+from src.utils.logger import logging
+
+DEFAULT_LRU_SIZE = 100_000
+DEFAULT_BLOOM_CAPACITY = 10_000_000
+DEFAULT_BLOOM_ERROR_RATE = 0.001
+
+
+class BloomFilter:
+    """
+    Set membership with false positives but no false negatives, in a fixed bit array sized for
+    `capacity` keys at `error_rate` (about 1.8 MB per million keys at 0.1%). Past its capacity
+    it keeps working, with a growing false-positive rate.
+    Positions come from one 128-bit BLAKE2b digest split into two hashes (double hashing).
+    """
+
+    def __init__(self, capacity: int = DEFAULT_BLOOM_CAPACITY, error_rate: float = DEFAULT_BLOOM_ERROR_RATE):
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def add(self, key: str):
+        bits = self.bits
+        for position in self._positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class LRUSet:
+    """The `capacity` most recently added or looked-up keys."""
+
+    def __init__(self, capacity: int = DEFAULT_LRU_SIZE):
+        self.capacity = capacity
+        self._keys = OrderedDict()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        if key in self._keys:
+            self._keys.move_to_end(key)
+            return True
+        return False
+
+    def add(self, key):
+        self._keys[key] = None
+        self._keys.move_to_end(key)
+        if len(self._keys) > self.capacity:
+            self._keys.popitem(last=False)
+
+
+class Deduplicator:
+    """
+    Tells which event ids were never processed, asking the events_log table of store as
+    rarely as possible:
+      - an id in the LRU of recent ids is a duplicate (replays and producer retries are recent);
+      - an id the Bloom filter has never seen is new, without a query;
+      - only the remaining "maybe" ids (real duplicates and false positives) are looked up in
+        events_log, with one query per batch.
+    The Bloom filter is loaded from events_log by warm(), so its "never seen" holds across
+    restarts; until then every id is looked up. Ids are recorded only once their batch is
+    committed. events_log stays the source of truth: the store refuses a batch holding an id
+    another processor committed in the meantime.
+    """
+
+    def __init__(self, store, lru_size: int = DEFAULT_LRU_SIZE, bloom_capacity: int = DEFAULT_BLOOM_CAPACITY,
+                 error_rate: float = DEFAULT_BLOOM_ERROR_RATE):
+        self.store = store
+        self.recent = LRUSet(lru_size)
+        self.bloom = BloomFilter(bloom_capacity, error_rate)
+        self.warmed = False
+        self.stats = {"lru_hits": 0, "bloom_negatives": 0, "lookups": 0, "false_positives": 0}
+
+    def warm(self):
+        """Add every event id of events_log to the Bloom filter."""
+        start = time.perf_counter()
+        for event_id in self.store.iter_event_ids():
+            self.bloom.add(event_id)
+        self.warmed = True
+        logging.info(f"[DEDUPE] loaded {self.bloom.count} event ids in {time.perf_counter() - start:.2f}s "
+                     f"(bloom {len(self.bloom.bits) / 1e6:.1f} MB, {self.bloom.hashes} hashes)")
+        if self.bloom.count > self.bloom.capacity:
+            logging.warning(f"[DEDUPE] {self.bloom.count} ids exceed the Bloom capacity {self.bloom.capacity}: "
+                            "more ids will be looked up, raise --bloom-capacity")
+
+    def new_ids(self, event_ids):
+        """The ids of event_ids (distinct) that were never processed."""
+        new, maybe = set(), []
+        for event_id in event_ids:
+            if event_id in self.recent:
+                self.stats["lru_hits"] += 1
+            elif self.warmed and event_id not in self.bloom:
+                self.stats["bloom_negatives"] += 1
+                new.add(event_id)
+            else:
+                maybe.append(event_id)
+        if maybe:
+            self.stats["lookups"] += len(maybe)
+            seen = self.store.seen(maybe)
+            unseen = [event_id for event_id in maybe if event_id not in seen]
+            if self.warmed:
+                self.stats["false_positives"] += len(unseen)
+            new.update(unseen)
+        return new
+
+    def record(self, event_ids):
+        """Remember ids whose batch was committed."""
+        for event_id in event_ids:
+            self.recent.add(event_id)
+            self.bloom.add(event_id)
@@ -0,0 +1,146 @@
+import json
+import math
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+# Kafka topics the processor reads, and the event type carried by each.
+TOPIC_TYPES = {
+    "online_orders": "online_order",
+    "store_sales": "store_sale",
+    "supplier_restocks": "supplier_restock",
+}
+SOURCE_TOPICS = tuple(TOPIC_TYPES)
+UPDATES_TOPIC = "inventory_updates"
+DLQ_TOPIC = "dlq"
+# Sign of the inventory change of each event type, and the orders.source it is recorded under.
+EVENT_SIGN = {"online_order": -1, "store_sale": -1, "supplier_restock": 1}
+ORDER_SOURCES = {"online_order": "online", "store_sale": "store"}
+MAX_ID_LENGTH = 128
+MAX_QUANTITY = 1_000_000
+
+
+class Record(NamedTuple):
+    """One message read from a source: its topic, raw bytes (or str) and the epoch seconds it was produced at."""
+    topic: str
+    value: object
+    produced_at: float
+
+
+class Event(NamedTuple):
+    """A validated event. delta is the signed change of the product's quantity on hand."""
+    event_id: str
+    event_type: str
+    product_id: str
+    quantity: int
+    delta: int
+    ts: float  # event time, UTC epoch seconds
+    timestamp: str  # the same as YYYY-MM-DDTHH:MM:SSZ
+    order_id: str = None
+    supplier_id: str = None
+    unit_price: float = None
+    raw: str = None
+
+
+class InvalidEvent(ValueError):
+    """A message that cannot be applied. event_id is set when the message carried a usable one."""
+
+    def __init__(self, message: str, event_id: str = None):
+        super().__init__(message)
+        self.event_id = event_id
+
+
+def _identifier(payload, field, event_id=None, required=True):
+    value = payload.get(field)
+    if value is None and not required:
+        return None
+    if isinstance(value, int) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str) or not value.strip() or len(value) > MAX_ID_LENGTH:
+        raise InvalidEvent(f"{field} must be a non-empty string of at most {MAX_ID_LENGTH} characters", event_id)
+    return value
+
+
+def format_ts(ts: float):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _parse_timestamp(value, event_id):
+    """
+    Event time from epoch seconds or an ISO 8601 string (a naive one is taken as UTC), as
+    (epoch seconds, format_ts text). A time outside the years 1 to 9999 UTC is invalid.
+    """
+    ts = None
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value):
+        ts = float(value)
+    elif isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            pass
+        else:
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            ts = parsed.timestamp()
+    if ts is None:
+        raise InvalidEvent(f"timestamp {value!r} is neither epoch seconds nor ISO 8601", event_id)
+    try:
+        return ts, format_ts(ts)
+    except (OverflowError, ValueError, OSError):
+        raise InvalidEvent(f"timestamp {value!r} is out of range", event_id)
+
+
+def decode(record: Record):
+    """
+    The JSON object of a record and its event_id. Raises InvalidEvent when the message is not
+    a JSON object or has no usable event_id: such a message cannot even be deduplicated.
+    """
+    value = record.value
+    try:
+        payload = json.loads(value)
+    except (TypeError, ValueError) as e:
+        raise InvalidEvent(f"not JSON: {e}")
+    if not isinstance(payload, dict):
+        raise InvalidEvent("not a JSON object")
+    return payload, _identifier(payload, "event_id")
+
+
+def validate(topic: str, payload: dict, event_id: str, raw: str = None):
+    """
+    Check the fields of a decoded event and return it as an Event, or raise InvalidEvent.
+    The event type is the payload's event_type, or the one of its topic. Orders and sales need
+    an order_id, restocks a supplier_id; quantity is a positive integer (restocks add it to the
+    stock, orders and sales take it out) and unit_price, when given, a non-negative number.
+    """
+    event_type = payload.get("event_type") or TOPIC_TYPES.get(topic)
+    if event_type not in EVENT_SIGN:
+        raise InvalidEvent(f"unknown event_type {event_type!r} (topic {topic!r})", event_id)
+    product_id = _identifier(payload, "product_id", event_id)
+    quantity = payload.get("quantity")
+    if isinstance(quantity, float) and quantity.is_integer():
+        quantity = int(quantity)
+    if not isinstance(quantity, int) or isinstance(quantity, bool) or not 0 < quantity <= MAX_QUANTITY:
+        raise InvalidEvent(f"quantity must be an integer between 1 and {MAX_QUANTITY}, got {quantity!r}", event_id)
+    ts, timestamp = _parse_timestamp(payload.get("timestamp"), event_id)
+    order_id = supplier_id = None
+    if event_type in ORDER_SOURCES:
+        order_id = _identifier(payload, "order_id", event_id)
+    else:
+        supplier_id = _identifier(payload, "supplier_id", event_id)
+    unit_price = payload.get("unit_price")
+    if unit_price is not None and (
+        not isinstance(unit_price, (int, float)) or isinstance(unit_price, bool)
+        or not math.isfinite(unit_price) or unit_price < 0
+    ):
+        raise InvalidEvent(f"unit_price must be a non-negative number, got {unit_price!r}", event_id)
+    return Event(
+        event_id, event_type, product_id, quantity, EVENT_SIGN[event_type] * quantity, ts, timestamp,
+        order_id=order_id, supplier_id=supplier_id,
+        unit_price=None if unit_price is None else float(unit_price), raw=raw,
+    )
+
+
+def raw_text(value):
+    """A message value as text, for events_log and the dead-letter queue."""
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", errors="replace")
+    return value if isinstance(value, str) else repr(value)
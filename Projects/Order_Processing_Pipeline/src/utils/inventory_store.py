@@ -0,0 +1,424 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from src.utils.events import ORDER_SOURCES
+from src.utils.logger import logging
+
+STORES = ("sqlite", "postgres")
+DEFAULT_DB = "data/inventory.db"
+# events_log.status of an applied event and of one rejected by validation (sent to the dlq).
+APPLIED = "applied"
+REJECTED = "rejected"
+# Rows per statement of an events_log lookup (SQLite allows 32766 parameters).
+LOOKUP_CHUNK = 1000
+
+# psycopg2 is optional (only needed with --store postgres), so it is loaded on first use.
+psycopg2 = None
+
+# The statements are shared by both databases: {p} is the parameter marker.
+SCHEMA_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS products (
+    product_id TEXT PRIMARY KEY,
+    name TEXT,
+    category TEXT,
+    price DOUBLE PRECISION
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS suppliers (
+    supplier_id TEXT PRIMARY KEY,
+    name TEXT,
+    contact TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS inventory (
+    product_id TEXT PRIMARY KEY,
+    quantity_on_hand BIGINT NOT NULL,
+    last_updated TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS orders (
+    event_id TEXT PRIMARY KEY,
+    order_id TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    quantity BIGINT NOT NULL,
+    unit_price DOUBLE PRECISION,
+    source TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_orders_timestamp ON orders (timestamp)",
+    """
+    CREATE TABLE IF NOT EXISTS events_log (
+    event_id TEXT PRIMARY KEY,
+    raw_event TEXT,
+    processed_at TEXT NOT NULL,
+    status TEXT NOT NULL
+    )
+    """,
+    # the report engine catches up on the batches committed after its checkpoint
+    "CREATE INDEX IF NOT EXISTS idx_events_log_processed_at ON events_log (processed_at)",
+    # the low-stock products are a range of this index, not a scan of the inventory
+    "CREATE INDEX IF NOT EXISTS idx_inventory_quantity ON inventory (quantity_on_hand)",
+    """
+    CREATE TABLE IF NOT EXISTS reports (
+    report_date TEXT PRIMARY KEY,
+    total_sales DOUBLE PRECISION NOT NULL,
+    top_sellers TEXT NOT NULL, -- JSON
+    low_stock TEXT NOT NULL, -- JSON
+    generated_at TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS report_state (
+    name TEXT PRIMARY KEY,
+    watermark TEXT NOT NULL, -- processed_at of the last batch folded in
+    state TEXT NOT NULL -- JSON
+    )
+    """,
+]
+INSERT_EVENTS_LOG_SQL = """
+    INSERT INTO events_log (event_id, raw_event, processed_at, status) VALUES ({p}, {p}, {p}, {p})
+    ON CONFLICT(event_id) DO NOTHING
+"""
+INSERT_ORDER_SQL = """
+    INSERT INTO orders (event_id, order_id, product_id, quantity, unit_price, source, timestamp)
+    VALUES ({p}, {p}, {p}, {p}, {p}, {p}, {p})
+"""
+# A delta is added to the stock of a known product; an unknown product starts from zero.
+UPSERT_INVENTORY_SQL = """
+    INSERT INTO inventory (product_id, quantity_on_hand, last_updated) VALUES ({p}, {p}, {p})
+    ON CONFLICT(product_id) DO UPDATE SET
+        quantity_on_hand = inventory.quantity_on_hand + excluded.quantity_on_hand,
+        last_updated = excluded.last_updated
+    RETURNING product_id, quantity_on_hand
+"""
+SELECT_EVENT_IDS_SQL = "SELECT event_id FROM events_log"
+SELECT_SEEN_SQL = "SELECT event_id FROM events_log WHERE event_id IN ({markers})"
+SELECT_INVENTORY_SQL = "SELECT product_id, quantity_on_hand FROM inventory"
+SELECT_LOW_STOCK_SQL = "SELECT product_id, quantity_on_hand FROM inventory WHERE quantity_on_hand < {p}"
+SELECT_ORDERS_SINCE_SQL = """
+    SELECT o.product_id, o.quantity, o.unit_price, o.source, o.timestamp, e.processed_at
+    FROM events_log e JOIN orders o ON o.event_id = e.event_id
+    WHERE e.processed_at > {p}
+    ORDER BY e.processed_at
+"""
+# Full recompute of a day's report, for validating the incremental one.
+SELECT_DAY_SALES_SQL = """
+    SELECT source, COUNT(*), SUM(quantity), SUM(quantity * COALESCE(unit_price, 0))
+    FROM orders WHERE timestamp >= {p} AND timestamp < {p}
+    GROUP BY source
+"""
+SELECT_DAY_TOP_SELLERS_SQL = """
+    SELECT product_id, SUM(quantity) AS units
+    FROM orders WHERE timestamp >= {p} AND timestamp < {p}
+    GROUP BY product_id ORDER BY units DESC, product_id LIMIT {p}
+"""
+SELECT_REPORT_STATE_SQL = "SELECT watermark, state FROM report_state WHERE name = {p}"
+# A state only replaces an older one: two writers cannot move the watermark back.
+UPSERT_REPORT_STATE_SQL = """
+    INSERT INTO report_state (name, watermark, state) VALUES ({p}, {p}, {p})
+    ON CONFLICT(name) DO UPDATE SET watermark = excluded.watermark, state = excluded.state
+    WHERE excluded.watermark >= report_state.watermark
+"""
+UPSERT_REPORT_SQL = """
+    INSERT INTO reports (report_date, total_sales, top_sellers, low_stock, generated_at) VALUES ({p}, {p}, {p}, {p}, {p})
+    ON CONFLICT(report_date) DO UPDATE SET
+        total_sales = excluded.total_sales, top_sellers = excluded.top_sellers,
+        low_stock = excluded.low_stock, generated_at = excluded.generated_at
+"""
+
+
+class DuplicateEvents(Exception):
+    """A batch held event ids already in events_log (committed by another processor): it was rolled back."""
+
+
+def _require_psycopg2():
+    global psycopg2
+    if psycopg2 is None:
+        try:
+            import psycopg2 as module  # deferred: optional dependency
+            import psycopg2.extras  # noqa: F401
+        except ImportError as e:
+            raise RuntimeError("--store postgres needs psycopg2: pip install psycopg2-binary") from e
+        psycopg2 = module
+    return psycopg2
+
+
+class InventoryStore:
+    """
+    The tables of the pipeline (products, suppliers, inventory, orders, events_log, reports) and
+    the one write path of the processor: apply_batch() stores a whole micro-batch in one
+    transaction.
+    Subclasses provide _connection() and the SQL dialect.
+    """
+
+    name = None
+    errors = ()
+    marker = "?"
+
+    def _sql(self, template, **extra):
+        return template.format(p=self.marker, **extra)
+
+    @contextmanager
+    def _connection(self):
+        """A connection for one transaction, committed on success and rolled back on error."""
+        raise NotImplementedError
+
+    def init_schema(self):
+        with self._connection() as conn:
+            cur = conn.cursor()
+            for statement in SCHEMA_SQL:
+                cur.execute(statement)
+            cur.close()
+
+    def iter_event_ids(self, chunk: int = 10_000):
+        """Every event id of events_log, streamed."""
+        with self._connection() as conn:
+            cur = self._stream_cursor(conn)
+            cur.execute(SELECT_EVENT_IDS_SQL)
+            while True:
+                rows = cur.fetchmany(chunk)
+                if not rows:
+                    break
+                for event_id, in rows:
+                    yield event_id
+            cur.close()
+
+    def _stream_cursor(self, conn):
+        return conn.cursor()
+
+    def seen(self, event_ids):
+        """The ids of event_ids already in events_log."""
+        event_ids = list(event_ids)
+        found = set()
+        with self._connection() as conn:
+            cur = conn.cursor()
+            for i in range(0, len(event_ids), LOOKUP_CHUNK):
+                chunk = event_ids[i:i + LOOKUP_CHUNK]
+                cur.execute(SELECT_SEEN_SQL.format(markers=", ".join([self.marker] * len(chunk))), chunk)
+                found.update(event_id for event_id, in cur.fetchall())
+            cur.close()
+        return found
+
+    def inventory(self):
+        """{product_id: quantity_on_hand}"""
+        with self._connection() as conn:
+            cur = conn.cursor()
+            cur.execute(SELECT_INVENTORY_SQL)
+            levels = dict(cur.fetchall())
+            cur.close()
+        return levels
+
+    def _query(self, sql, params=()):
+        with self._connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute(self._sql(sql), params)
+                return cur.fetchall()
+            finally:
+                cur.close()
+
+    def _write(self, sql, params):
+        with self._connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute(self._sql(sql), params)
+            finally:
+                cur.close()
+
+    def low_stock(self, threshold: int):
+        """{product_id: quantity_on_hand} of the products with fewer than threshold units."""
+        return dict(self._query(SELECT_LOW_STOCK_SQL, (threshold,)))
+
+    def iter_orders_since(self, watermark: str, chunk: int = 10_000):
+        """
+        (product_id, quantity, unit_price, source, timestamp, processed_at) of the orders of
+        the batches processed after watermark, oldest batch first, streamed.
+        """
+        with self._connection() as conn:
+            cur = self._stream_cursor(conn)
+            cur.execute(self._sql(SELECT_ORDERS_SINCE_SQL), (watermark,))
+            while True:
+                rows = cur.fetchmany(chunk)
+                if not rows:
+                    break
+                yield from rows
+            cur.close()
+
+    def day_sales(self, start: str, end: str):
+        """{source: (order lines, units, revenue)} of the orders with start <= timestamp < end."""
+        return {source: (lines, units, revenue) for source, lines, units, revenue
+                in self._query(SELECT_DAY_SALES_SQL, (start, end))}
+
+    def day_top_sellers(self, start: str, end: str, k: int):
+        """The k products with the most units sold with start <= timestamp < end, as (product_id, units)."""
+        return self._query(SELECT_DAY_TOP_SELLERS_SQL, (start, end, k))
+
+    def load_report_state(self, name: str):
+        """(watermark, state JSON) of the report engine `name`, or None."""
+        rows = self._query(SELECT_REPORT_STATE_SQL, (name,))
+        return rows[0] if rows else None
+
+    def save_report_state(self, name: str, watermark: str, state: str):
+        self._write(UPSERT_REPORT_STATE_SQL, (name, watermark, state))
+
+    def save_report(self, report_date: str, total_sales: float, top_sellers: str, low_stock: str, generated_at: str):
+        self._write(UPSERT_REPORT_SQL, (report_date, total_sales, top_sellers, low_stock, generated_at))
+
+    def apply_batch(self, events, rejected, deltas, processed_at: str):
+        """
+        Store one micro-batch in a single transaction: an events_log row per event (status
+        "applied") and per rejected (event_id, raw) pair ("rejected"), an orders row per order
+        or sale, and one inventory UPSERT per (product_id, delta) of deltas, in product order so
+        that concurrent processors lock rows in the same order.
+        Raises DuplicateEvents, with nothing written, when an event id is already logged.
+        Returns {product_id: quantity_on_hand after the batch}.
+        """
+        log_rows = [(e.event_id, e.raw, processed_at, APPLIED) for e in events]
+        log_rows += [(event_id, raw, processed_at, REJECTED) for event_id, raw in rejected]
+        order_rows = [
+            (e.event_id, e.order_id, e.product_id, e.quantity, e.unit_price, ORDER_SOURCES[e.event_type], e.timestamp)
+            for e in events if e.event_type in ORDER_SOURCES
+        ]
+        deltas = sorted(deltas)
+        with self._connection() as conn:
+            cur = conn.cursor()
+            try:
+                if log_rows and self._insert_log(cur, log_rows) != len(log_rows):
+                    raise DuplicateEvents(f"{len(log_rows)} events, some already in events_log")
+                if order_rows:
+                    self._insert_orders(cur, order_rows)
+                return self._upsert_inventory(cur, deltas, processed_at) if deltas else {}
+            finally:
+                cur.close()
+
+    def _insert_log(self, cur, rows):
+        """Insert events_log rows, skipping the ids already there. Returns the rows inserted."""
+        cur.executemany(self._sql(INSERT_EVENTS_LOG_SQL), rows)
+        return cur.rowcount
+
+    def _insert_orders(self, cur, rows):
+        cur.executemany(self._sql(INSERT_ORDER_SQL), rows)
+
+    def _upsert_inventory(self, cur, deltas, updated_at):
+        levels = {}
+        sql = self._sql(UPSERT_INVENTORY_SQL)
+        for product_id, delta in deltas:
+            cur.execute(sql, (product_id, delta, updated_at))
+            product_id, quantity = cur.fetchone()
+            levels[product_id] = quantity
+        return levels
+
+    def close(self):
+        """Release the connections."""
+
+
+class SQLiteInventoryStore(InventoryStore):
+    """
+    The pipeline tables in an SQLite file, for a single processor (and local runs and tests).
+    WAL mode lets reports read while batches are written.
+    """
+
+    name = "sqlite"
+    errors = (sqlite3.Error,)
+
+    def __init__(self, path: str = DEFAULT_DB, synchronous: str = "NORMAL"):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._local = threading.local()
+        self._conn(synchronous).execute("PRAGMA journal_mode=WAL;")
+        self.init_schema()
+
+    def _conn(self, synchronous="NORMAL"):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30.0)
+            conn.execute(f"PRAGMA synchronous={synchronous};")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        conn = self._conn()
+        with conn:
+            yield conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class PostgresInventoryStore(InventoryStore):
+    """
+    The pipeline tables in PostgreSQL, shared by several processors (one per group of Kafka
+    partitions). A batch goes out as three round trips: the events_log rows and the orders
+    as multi-row INSERTs, the coalesced deltas as one multi-row UPSERT.
+    """
+
+    name = "postgres"
+    marker = "%s"
+
+    def __init__(self, dsn: str, page_size: int = 1000):
+        _require_psycopg2()
+        if not dsn:
+            raise ValueError("The PostgreSQL store needs a connection string (--pg-dsn or ORDERS_PG_DSN)")
+        self.dsn = dsn
+        self.page_size = page_size
+        self.errors = (psycopg2.Error,)
+        self._local = threading.local()
+        self.init_schema()
+
+    @contextmanager
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or conn.closed:
+            conn = self._local.conn = psycopg2.connect(self.dsn)
+        with conn:  # commits, or rolls back on error
+            yield conn
+
+    def _stream_cursor(self, conn):
+        return conn.cursor(name="stream")  # server-side: the rows are not all loaded at once
+
+    def _insert_log(self, cur, rows):
+        sql = INSERT_EVENTS_LOG_SQL.replace("({p}, {p}, {p}, {p})", "%s") + " RETURNING event_id"
+        return len(psycopg2.extras.execute_values(cur, sql, rows, page_size=self.page_size, fetch=True))
+
+    def _insert_orders(self, cur, rows):
+        sql = INSERT_ORDER_SQL.replace("({p}, {p}, {p}, {p}, {p}, {p}, {p})", "%s")
+        psycopg2.extras.execute_values(cur, sql, rows, page_size=self.page_size)
+
+    def _upsert_inventory(self, cur, deltas, updated_at):
+        if len({product_id for product_id, _ in deltas}) < len(deltas):
+            # one row per event (not coalesced): a multi-row UPSERT cannot touch a row twice
+            return super()._upsert_inventory(cur, deltas, updated_at)
+        sql = UPSERT_INVENTORY_SQL.replace("({p}, {p}, {p})", "%s")
+        rows = psycopg2.extras.execute_values(
+            cur, sql, [(product_id, delta, updated_at) for product_id, delta in deltas],
+            page_size=self.page_size, fetch=True,
+        )
+        return dict(rows)
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def open_store(kind: str = "sqlite", path: str = DEFAULT_DB, dsn: str = None):
+    """Open the store `kind` ("sqlite" at path, or "postgres" at the libpq connection string dsn)."""
+    if kind == "sqlite":
+        store = SQLiteInventoryStore(path)
+    elif kind == "postgres":
+        store = PostgresInventoryStore(dsn)
+    else:
+        raise ValueError(f"unknown store {kind!r}, expected one of {STORES}")
+    logging.info(f"[STORE] opened {kind} store")
+    return store
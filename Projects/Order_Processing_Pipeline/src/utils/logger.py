@@ -0,0 +1,66 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+from pathlib import Path
+
+LOG_FORMAT = '%(asctime)s-%(name)s-%(levelname)s-%(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+LOG_FILE = 'logs/processor.log'
+MAX_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 5
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that enqueues the record untouched. The stock handler formats the message
+    in the calling thread; here formatting is left to the listener thread as well.
+    """
+    def prepare(self, record):
+        return record
+
+
+_listener = None
+
+
+def configure_logging(level=None, log_file=LOG_FILE):
+    """
+    Route every log record through a queue to a size-rotating file handler, so formatting and
+    disk I/O happen on a background QueueListener thread instead of the batch loop.
+    level defaults to the LOG_LEVEL environment variable (INFO if unset).
+    Importing this module configures nothing: entry points call this explicitly.
+    """
+    global _listener
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file, mode='a', maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT, encoding='utf-8'
+    )
+    file_handler.setFormatter(logging.Formatter(fmt=LOG_FORMAT, datefmt=DATE_FORMAT))
+
+    if _listener:
+        shutdown_logging()
+    else:
+        atexit.register(shutdown_logging)
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(DeferredQueueHandler(log_queue))
+    root.setLevel(level)
+
+
+def shutdown_logging():
+    """Drain the queue, stop the listener thread and close the log file (registered with atexit)."""
+    global _listener
+    if _listener:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
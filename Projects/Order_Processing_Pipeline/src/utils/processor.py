@@ -0,0 +1,178 @@
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from src.utils.events import InvalidEvent, decode, format_ts, raw_text, validate
+from src.utils.inventory_store import DuplicateEvents
+from src.utils.logger import logging
+
+DEFAULT_MAX_BATCH = 1000
+DEFAULT_MAX_WAIT = 0.2
+# Latencies kept for the percentiles: the most recent ones, so a long run reports its current state.
+LATENCY_WINDOW = 100_000
+# Seconds between two [STATS] log lines.
+STATS_INTERVAL = 60.0
+
+
+def coalesce(events):
+    """The net change per product of events, as sorted (product_id, delta) pairs: one UPSERT each."""
+    deltas = {}
+    for event in events:
+        deltas[event.product_id] = deltas.get(event.product_id, 0) + event.delta
+    return sorted(deltas.items())
+
+
+def percentile(values, q):
+    """The q-th percentile (0-100) of values by the nearest-rank method, None when empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+class StreamProcessor:
+    """
+    Applies the events of source to store, one micro-batch at a time:
+      1. poll up to max_batch records (waiting at most max_wait for the first one);
+      2. decode them and drop the ids repeated in the batch or already processed (dedupe);
+      3. validate the new events: the invalid ones go to dlq;
+      4. coalesce the quantity changes per product and store the batch in one transaction
+         (events_log, orders, one inventory UPSERT per product);
+      5. send one inventory update per product to updates, flush the sinks and commit the
+         source offsets.
+    Delivery is at least once up to the store, exactly once in it: a batch replayed after a
+    crash is recognised by its event ids. With coalesce=False every event is its own UPSERT
+    (the baseline of the benchmark).
+    Each of listeners is called after a commit with the batch's applied Events, the
+    {product_id: quantity_on_hand} it set and its processed_at (e.g. ReportEngine.on_batch).
+    """
+
+    def __init__(self, source, store, dlq, dedupe, updates=None, max_batch: int = DEFAULT_MAX_BATCH,
+                 max_wait: float = DEFAULT_MAX_WAIT, coalesce: bool = True, listeners=(), clock=time.time):
+        self.source = source
+        self.store = store
+        self.dlq = dlq
+        self.dedupe = dedupe
+        self.updates = updates
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.coalesce = coalesce
+        self.listeners = list(listeners)
+        self.clock = clock
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self._retry = None
+        self.stats = {"records": 0, "applied": 0, "duplicates": 0, "invalid": 0, "batches": 0, "upserts": 0}
+
+    def _dead_letter(self, record, error, now):
+        self.dlq.send({
+            "topic": record.topic, "value": raw_text(record.value), "error": str(error),
+            "event_id": getattr(error, "event_id", None), "failed_at": format_ts(now),
+        })
+
+    def process(self, records):
+        """Apply one batch of records. Returns {product_id: quantity_on_hand} of the products changed."""
+        now = self.clock()
+        batch = {}  # event_id -> (record, payload), first occurrence only
+        undecodable = []
+        for record in records:
+            try:
+                payload, event_id = decode(record)
+            except InvalidEvent as e:
+                undecodable.append((record, e))
+                continue
+            batch.setdefault(event_id, (record, payload))
+        new_ids = self.dedupe.new_ids(batch) if batch else set()
+
+        events, rejected = [], {}  # rejected: event_id -> (record, error)
+        for event_id in new_ids:
+            record, payload = batch[event_id]
+            try:
+                events.append(validate(record.topic, payload, event_id, raw_text(record.value)))
+            except InvalidEvent as e:
+                rejected[event_id] = (record, e)
+        processed_at = datetime.fromtimestamp(now, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        while True:
+            deltas = coalesce(events) if self.coalesce else [(e.product_id, e.delta) for e in events]
+            log_rejected = [(event_id, raw_text(record.value)) for event_id, (record, _) in rejected.items()]
+            try:
+                levels = self.store.apply_batch(events, log_rejected, deltas, processed_at) if new_ids else {}
+                break
+            except DuplicateEvents as e:
+                # another processor committed some of these ids since the lookup: drop them and retry
+                logging.warning(f"[PROCESSOR] {e}, looking the batch up again")
+                seen = self.store.seen(new_ids)
+                new_ids -= seen
+                events = [event for event in events if event.event_id not in seen]
+                rejected = {event_id: item for event_id, item in rejected.items() if event_id not in seen}
+
+        self.dedupe.record(new_ids)
+        for listener in self.listeners:
+            listener(events, levels, processed_at)
+        for record, error in undecodable + list(rejected.values()):
+            self._dead_letter(record, error, now)
+        if self.updates is not None:
+            for product_id, delta in (deltas if self.coalesce else coalesce(events)):
+                self.updates.send({
+                    "product_id": product_id, "delta": delta, "quantity_on_hand": levels[product_id],
+                    "updated_at": processed_at,
+                }, key=product_id)
+            self.updates.flush()
+        self.dlq.flush()
+        self.source.commit()
+
+        done = self.clock()
+        invalid = len(undecodable) + len(rejected)
+        self.latencies.extend(done - record.produced_at for record in records)
+        self.stats["records"] += len(records)
+        self.stats["applied"] += len(events)
+        self.stats["invalid"] += invalid
+        self.stats["duplicates"] += len(records) - len(undecodable) - len(new_ids)
+        self.stats["batches"] += 1
+        self.stats["upserts"] += len(deltas)
+        logging.debug("[BATCH] records=%d applied=%d invalid=%d upserts=%d seconds=%.4f",
+                      len(records), len(events), invalid, len(deltas), done - now)
+        return levels
+
+    def step(self):
+        """
+        Poll and process one batch. Returns the number of records read. A batch whose store
+        transaction failed is kept and processed again by the next step.
+        """
+        records = self._retry or self.source.poll(self.max_batch, self.max_wait)
+        self._retry = None
+        if records:
+            try:
+                self.process(records)
+            except self.store.errors:
+                self._retry = records
+                raise
+        return len(records)
+
+    def summary(self):
+        """The counters, with the p50 and p99 end-to-end latency (produce to commit) in milliseconds."""
+        latencies = list(self.latencies)
+        p50, p99 = percentile(latencies, 50), percentile(latencies, 99)
+        return dict(self.stats, **self.dedupe.stats,
+                    p50_ms=None if p50 is None else round(p50 * 1000, 2),
+                    p99_ms=None if p99 is None else round(p99 * 1000, 2))
+
+    def run(self, stop=None, max_records: int = None):
+        """
+        Process batches until the stop Event is set, a finite source is exhausted or
+        max_records were read, logging the counters every STATS_INTERVAL seconds.
+        """
+        logging.info(f"[PROCESSOR] started (max_batch={self.max_batch}, max_wait={self.max_wait}s, coalesce={self.coalesce})")
+        next_stats = time.monotonic() + STATS_INTERVAL
+        while not (stop is not None and stop.is_set()) and (self._retry or not self.source.exhausted):
+            try:
+                self.step()
+            except self.store.errors as e:
+                # nothing was committed: the batch is processed again after a pause
+                logging.error(f"[PROCESSOR] store error, batch not committed: {e}")
+                time.sleep(1.0)
+            if max_records is not None and self.stats["records"] >= max_records:
+                break
+            if time.monotonic() >= next_stats:
+                logging.info(f"[STATS] {self.summary()}")
+                next_stats += STATS_INTERVAL
+        logging.info(f"[PROCESSOR] stopped: {self.summary()}")
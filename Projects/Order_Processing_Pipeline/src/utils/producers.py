@@ -0,0 +1,103 @@
+import itertools
+import json
+import random
+import time
+import uuid
+from collections import deque
+
+from src.utils.events import EVENT_SIGN, format_ts
+
+# Share of each event type among the valid events.
+EVENT_MIX = {"online_order": 0.55, "store_sale": 0.35, "supplier_restock": 0.10}
+EVENT_TOPICS = {"online_order": "online_orders", "store_sale": "store_sales", "supplier_restock": "supplier_restocks"}
+# How a generated invalid message is broken.
+INVALID_KINDS = ("not_json", "no_event_id", "no_product", "bad_quantity", "bad_timestamp", "unknown_type")
+
+
+class EventGenerator:
+    """
+    Simulates the three producers of the pipeline: a reproducible (seeded) stream of online
+    orders, store sales and supplier restocks over `products` products, whose popularity follows
+    a Zipf-like law so a few products sell most. A share duplicate_rate of the messages are
+    re-sends of a recent message (a producer retry) and a share invalid_rate are broken.
+    Event times start at start_ts and advance by `interval` seconds per event.
+    expected holds the net quantity change per product of the distinct valid events, which the
+    inventory must equal once everything was processed.
+    """
+
+    def __init__(self, products: int = 1000, seed: int = 0, duplicate_rate: float = 0.02, invalid_rate: float = 0.01,
+                 start_ts: float = None, interval: float = 0.0, suppliers: int = 20):
+        self.rng = random.Random(seed)
+        self.products = [f"P{i:06d}" for i in range(products)]
+        self.suppliers = [f"S{i:03d}" for i in range(suppliers)]
+        self.weights = list(itertools.accumulate(1 / (i + 1) for i in range(products)))
+        self.prices = {product: round(self.rng.uniform(2, 200), 2) for product in self.products}
+        self.duplicate_rate = duplicate_rate
+        self.invalid_rate = invalid_rate
+        self.start_ts = time.time() if start_ts is None else start_ts
+        self.interval = interval
+        self.expected = {}
+        self.counts = {"valid": 0, "duplicate": 0, "invalid": 0}
+        self._recent = deque(maxlen=1000)
+        self._types = list(EVENT_MIX)
+        self._type_weights = list(itertools.accumulate(EVENT_MIX.values()))
+        self._n = 0
+
+    def _event_id(self):
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def _valid(self, ts):
+        rng = self.rng
+        event_type = rng.choices(self._types, cum_weights=self._type_weights)[0]
+        product = rng.choices(self.products, cum_weights=self.weights)[0]
+        event = {"event_id": self._event_id(), "event_type": event_type, "product_id": product, "timestamp": format_ts(ts)}
+        if event_type == "supplier_restock":
+            event.update(quantity=rng.randint(20, 200), supplier_id=rng.choice(self.suppliers))
+        else:
+            event.update(quantity=rng.randint(1, 5), order_id=f"O{rng.getrandbits(40):010x}",
+                         unit_price=self.prices[product])
+        self.expected[product] = self.expected.get(product, 0) + EVENT_SIGN[event_type] * event["quantity"]
+        return EVENT_TOPICS[event_type], json.dumps(event).encode()
+
+    def _invalid(self, ts):
+        rng = self.rng
+        kind = rng.choice(INVALID_KINDS)
+        event_type = rng.choice(self._types)
+        event = {"event_id": self._event_id(), "event_type": event_type, "product_id": rng.choice(self.products),
+                 "quantity": 1, "timestamp": format_ts(ts), "order_id": "O0", "supplier_id": "S000"}
+        if kind == "not_json":
+            return EVENT_TOPICS[event_type], b"{truncated"
+        if kind == "no_event_id":
+            del event["event_id"]
+        elif kind == "no_product":
+            del event["product_id"]
+        elif kind == "bad_quantity":
+            event["quantity"] = rng.choice([0, -3, "two", 2.5])
+        elif kind == "bad_timestamp":
+            event["timestamp"] = "yesterday"
+        else:
+            event["event_type"] = "refund"
+        return EVENT_TOPICS[event_type], json.dumps(event).encode()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        """The next (topic, message bytes)."""
+        ts = self.start_ts + self._n * self.interval
+        self._n += 1
+        roll = self.rng.random()
+        if roll < self.duplicate_rate and self._recent:
+            self.counts["duplicate"] += 1
+            return self.rng.choice(self._recent)
+        if roll < self.duplicate_rate + self.invalid_rate:
+            self.counts["invalid"] += 1
+            return self._invalid(ts)
+        self.counts["valid"] += 1
+        message = self._valid(ts)
+        self._recent.append(message)
+        return message
+
+    def events(self, count: int):
+        """The next count messages."""
+        return list(itertools.islice(self, count))
@@ -0,0 +1,396 @@
+import base64
+import csv
+import hashlib
+import json
+import math
+import time
+from array import array
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+from src.utils.events import ORDER_SOURCES, format_ts
+from src.utils.logger import logging
+
+DEFAULT_TOP_K = 10
+DEFAULT_LOW_STOCK_THRESHOLD = 10
+DEFAULT_SKETCH_WIDTH = 4096
+DEFAULT_SKETCH_DEPTH = 4
+# Days kept in memory (by event date): a late event for an older day is counted in `late` only.
+DEFAULT_RETAIN_DAYS = 7
+# Orders dated more than this many seconds past the wall clock (a producer with a wrong clock)
+# are counted in `future` only, so they cannot move the window forward and expire the real days.
+DEFAULT_MAX_SKEW = 3600.0
+DEFAULT_CHECKPOINT_INTERVAL = 60.0
+DEFAULT_REPORT_DIR = "data/reports"
+STATE_NAME = "daily_reports"
+REPORT_FORMATS = ("json", "csv")
+SOURCES = tuple(ORDER_SOURCES.values())
+
+
+class CountMinSketch:
+    """
+    Approximate counts in depth x width counters: an estimate is never below the true count
+    and, with probability 1 - e**-depth, exceeds it by at most e / width of the total counted.
+    The depth row indices come from one BLAKE2b digest of the key.
+    """
+
+    def __init__(self, width: int = DEFAULT_SKETCH_WIDTH, depth: int = DEFAULT_SKETCH_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.rows = [array("q", bytes(8 * width)) for _ in range(depth)]
+        self.total = 0
+
+    def _indices(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=4 * self.depth).digest()
+        return [int.from_bytes(digest[4 * i:4 * i + 4], "little") % self.width for i in range(self.depth)]
+
+    def add(self, key: str, count: int = 1):
+        """Count key `count` more times and return its new estimate."""
+        estimate = None
+        for row, index in zip(self.rows, self._indices(key)):
+            row[index] += count
+            estimate = row[index] if estimate is None else min(estimate, row[index])
+        self.total += count
+        return estimate
+
+    def estimate(self, key: str):
+        return min(row[index] for row, index in zip(self.rows, self._indices(key)))
+
+    @property
+    def error_bound(self):
+        """The overestimate not exceeded with probability 1 - e**-depth."""
+        return math.e / self.width * self.total
+
+    def to_state(self):
+        return {"width": self.width, "depth": self.depth, "total": self.total,
+                "rows": [base64.b64encode(row.tobytes()).decode() for row in self.rows]}
+
+    @classmethod
+    def from_state(cls, state):
+        sketch = cls(state["width"], state["depth"])
+        sketch.total = state["total"]
+        for row, data in zip(sketch.rows, state["rows"]):
+            row[:] = array("q", base64.b64decode(data))
+        return sketch
+
+
+class TopSellers:
+    """
+    The k products with the most units, from a count-min sketch of every product's units and
+    the k best candidates with their estimates. Counting a product costs one sketch update and
+    a comparison with the smallest candidate, whatever the number of products.
+    """
+
+    def __init__(self, k: int = DEFAULT_TOP_K, width: int = DEFAULT_SKETCH_WIDTH, depth: int = DEFAULT_SKETCH_DEPTH):
+        self.k = k
+        self.sketch = CountMinSketch(width, depth)
+        self.top = {}  # product_id -> estimated units
+        self._floor = None  # the candidate with the fewest units, None when to be recomputed
+
+    def _floor_key(self):
+        if self._floor is None:
+            self._floor = min(self.top, key=lambda product: (self.top[product], product))
+        return self._floor
+
+    def add(self, product_id: str, units: int):
+        estimate = self.sketch.add(product_id, units)
+        if product_id in self.top:
+            self.top[product_id] = estimate
+            if product_id == self._floor:
+                self._floor = None
+        elif len(self.top) < self.k:
+            self.top[product_id] = estimate
+            self._floor = None
+        else:
+            floor = self._floor_key()
+            if estimate > self.top[floor]:
+                del self.top[floor]
+                self.top[product_id] = estimate
+                self._floor = None
+
+    def items(self):
+        """(product_id, estimated units), best first."""
+        return sorted(self.top.items(), key=lambda item: (-item[1], item[0]))
+
+    def to_state(self):
+        return {"k": self.k, "sketch": self.sketch.to_state(), "top": self.top}
+
+    @classmethod
+    def from_state(cls, state):
+        top = cls(state["k"])
+        top.sketch = CountMinSketch.from_state(state["sketch"])
+        top.top = dict(state["top"])
+        return top
+
+
+class DaySales:
+    """The running totals of one day: order lines, units and revenue per source, and its top sellers."""
+
+    def __init__(self, k: int, width: int, depth: int):
+        self.by_source = {source: [0, 0, 0.0] for source in SOURCES}
+        self.top = TopSellers(k, width, depth)
+
+    def add(self, product_id, quantity, unit_price, source):
+        totals = self.by_source.setdefault(source, [0, 0, 0.0])
+        totals[0] += 1
+        totals[1] += quantity
+        totals[2] += quantity * (unit_price or 0.0)
+        self.top.add(product_id, quantity)
+
+    def to_state(self):
+        return {"by_source": self.by_source, "top": self.top.to_state()}
+
+    @classmethod
+    def from_state(cls, state):
+        day = cls.__new__(cls)
+        day.by_source = {source: list(totals) for source, totals in state["by_source"].items()}
+        day.top = TopSellers.from_state(state["top"])
+        return day
+
+
+def day_bounds(report_date: str):
+    """The timestamps [start, end) of the orders of report_date (YYYY-MM-DD)."""
+    start = date.fromisoformat(report_date)
+    return f"{start.isoformat()}T00:00:00Z", f"{(start + timedelta(days=1)).isoformat()}T00:00:00Z"
+
+
+class ReportEngine:
+    """
+    The daily reports (total sales, top sellers, low-stock products), kept up to date batch by
+    batch instead of scanning the orders table every day:
+      - running totals per event day and source;
+      - per day, a count-min sketch and top-k candidates of the units sold per product;
+      - the low-stock index: the products under threshold and their stock, updated from the
+        levels each batch returns (seeded from the inventory at load).
+    An order dated more than max_skew seconds past the clock is counted in `future` instead of
+    in a day. The processor calls on_batch() after each commit; the engine's state is saved in the
+    report_state table every checkpoint_interval seconds, with the processed_at of the last
+    batch folded in as its watermark. load() restores it and folds in the orders of the batches
+    committed since, so a snapshot never needs more than the tail of the orders table.
+    One engine owns the state: several processors sharing a database each see only their
+    partitions, so the report job catches up from the table instead.
+    """
+
+    def __init__(self, store=None, k: int = DEFAULT_TOP_K, threshold: int = DEFAULT_LOW_STOCK_THRESHOLD,
+                 width: int = DEFAULT_SKETCH_WIDTH, depth: int = DEFAULT_SKETCH_DEPTH,
+                 retain_days: int = DEFAULT_RETAIN_DAYS, checkpoint_interval: float = DEFAULT_CHECKPOINT_INTERVAL,
+                 name: str = STATE_NAME, max_skew: float = DEFAULT_MAX_SKEW, clock=time.time):
+        self.store = store
+        self.k = k
+        self.threshold = threshold
+        self.width = width
+        self.depth = depth
+        self.retain_days = retain_days
+        self.checkpoint_interval = checkpoint_interval
+        self.name = name
+        self.max_skew = max_skew
+        self.clock = clock
+        self.days = {}  # YYYY-MM-DD -> DaySales
+        self.low_stock = {}  # product_id -> quantity_on_hand, for the products under threshold
+        self.watermark = ""
+        self.late = 0
+        self.future = 0
+        self.expired_before = ""  # the days before this one were dropped
+        self._next_checkpoint = time.monotonic() + checkpoint_interval
+        self._advance_horizon()
+
+    def _advance_horizon(self):
+        # timestamps are format_ts text, so one string comparison per order tells a future one
+        self._horizon = format_ts(self.clock() + self.max_skew)
+
+    def _day(self, day):
+        sales = self.days.get(day)
+        if sales is None:
+            newest = max(self.days, default=day)
+            if day < newest and (date.fromisoformat(newest) - date.fromisoformat(day)).days >= self.retain_days:
+                return None
+            sales = self.days[day] = DaySales(self.k, self.width, self.depth)
+            self._expire(max(newest, day))
+        return sales
+
+    def _expire(self, newest):
+        oldest = (date.fromisoformat(newest) - timedelta(days=self.retain_days - 1)).isoformat()
+        for day in [day for day in self.days if day < oldest]:
+            del self.days[day]
+            self.expired_before = max(self.expired_before, oldest)
+
+    def add_order(self, product_id, quantity, unit_price, source, timestamp):
+        if timestamp > self._horizon:
+            self.future += 1
+            return
+        day = self._day(timestamp[:10])
+        if day is None:
+            self.late += 1
+            return
+        day.add(product_id, quantity, unit_price, source)
+
+    def update_levels(self, levels):
+        """Move the products of {product_id: quantity_on_hand} in or out of the low-stock index."""
+        for product_id, quantity in levels.items():
+            if quantity < self.threshold:
+                self.low_stock[product_id] = quantity
+            else:
+                self.low_stock.pop(product_id, None)
+
+    def on_batch(self, events, levels, processed_at):
+        """Fold in a committed batch: its Events, the stock levels it set and its processed_at."""
+        self._advance_horizon()
+        for event in events:
+            if event.event_type in ORDER_SOURCES:
+                self.add_order(event.product_id, event.quantity, event.unit_price,
+                               ORDER_SOURCES[event.event_type], event.timestamp)
+        self.update_levels(levels)
+        self.watermark = max(self.watermark, processed_at)
+        if self.store is not None and time.monotonic() >= self._next_checkpoint:
+            self.save()
+
+    def catch_up(self):
+        """Fold in the orders committed after the watermark and reseed the low-stock index. Returns the orders read."""
+        start, count = time.perf_counter(), 0
+        self._advance_horizon()
+        for product_id, quantity, unit_price, source, timestamp, processed_at in self.store.iter_orders_since(self.watermark):
+            self.add_order(product_id, quantity, unit_price, source, timestamp)
+            self.watermark = max(self.watermark, processed_at)
+            count += 1
+        self.low_stock = self.store.low_stock(self.threshold)
+        logging.info(f"[REPORTS] caught up on {count} orders in {time.perf_counter() - start:.2f}s "
+                     f"(watermark {self.watermark or 'none'}, {len(self.low_stock)} low-stock products)")
+        return count
+
+    def to_state(self):
+        return {
+            "k": self.k, "width": self.width, "depth": self.depth, "late": self.late, "future": self.future,
+            "expired_before": self.expired_before,
+            "days": {day: sales.to_state() for day, sales in self.days.items()},
+        }
+
+    def save(self):
+        """Write the state and its watermark to the report_state table."""
+        self.store.save_report_state(self.name, self.watermark, json.dumps(self.to_state()))
+        self._next_checkpoint = time.monotonic() + self.checkpoint_interval
+        logging.info(f"[REPORTS] checkpoint at {self.watermark} ({len(self.days)} days)")
+
+    @classmethod
+    def load(cls, store, **kwargs):
+        """The engine saved in store (a new one if none), caught up on the batches committed since."""
+        engine = cls(store, **kwargs)
+        saved = store.load_report_state(engine.name)
+        if saved:
+            engine.watermark, state = saved[0], json.loads(saved[1])
+            if (state["k"], state["width"], state["depth"]) != (engine.k, engine.width, engine.depth):
+                logging.warning("[REPORTS] saved state has another top-k or sketch size, kept: "
+                                f"k={state['k']} width={state['width']} depth={state['depth']}")
+                engine.k, engine.width, engine.depth = state["k"], state["width"], state["depth"]
+            engine.late, engine.expired_before = state["late"], state["expired_before"]
+            engine.future = state.get("future", 0)
+            engine.days = {day: DaySales.from_state(sales) for day, sales in state["days"].items()}
+        engine.catch_up()
+        return engine
+
+    def snapshot(self, report_date: str):
+        """The report of report_date from the running aggregates, or None when that day is no longer kept."""
+        sales = self.days.get(report_date)
+        if sales is None and report_date < self.expired_before:
+            return None
+        sales = sales or DaySales(self.k, self.width, self.depth)
+        return build_report(
+            report_date, {source: tuple(totals) for source, totals in sales.by_source.items()},
+            sales.top.items(), self.low_stock, self.threshold, "incremental",
+            error_bound=math.ceil(sales.top.sketch.error_bound),
+        )
+
+
+def build_report(report_date, by_source, top_sellers, low_stock, threshold, mode, error_bound=0):
+    """A report dict from {source: (order lines, units, revenue)}, (product_id, units) pairs and {product_id: stock}."""
+    lines = sum(totals[0] for totals in by_source.values())
+    units = sum(totals[1] for totals in by_source.values())
+    revenue = sum(totals[2] for totals in by_source.values())
+    return {
+        "report_date": report_date,
+        "mode": mode,
+        "generated_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "total_sales": round(revenue, 2),
+        "order_lines": lines,
+        "units_sold": units,
+        "by_source": {
+            source: {"order_lines": totals[0], "units_sold": totals[1], "total_sales": round(totals[2], 2)}
+            for source, totals in sorted(by_source.items())
+        },
+        "top_sellers": [{"product_id": product_id, "units_sold": units} for product_id, units in top_sellers],
+        "top_sellers_error_bound": error_bound,
+        "low_stock_threshold": threshold,
+        "low_stock": [{"product_id": product_id, "quantity_on_hand": quantity}
+                      for product_id, quantity in sorted(low_stock.items(), key=lambda item: (item[1], item[0]))],
+    }
+
+
+def recompute_report(store, report_date: str, k: int = DEFAULT_TOP_K, threshold: int = DEFAULT_LOW_STOCK_THRESHOLD):
+    """The report of report_date computed from scratch with GROUP BY queries over the day's orders."""
+    start, end = day_bounds(report_date)
+    return build_report(report_date, store.day_sales(start, end), store.day_top_sellers(start, end, k),
+                        store.low_stock(threshold), threshold, "recompute")
+
+
+def compare_reports(incremental, exact):
+    """
+    The differences between an incremental report and the recomputed one, as a list of
+    messages (empty when they agree). Totals and low-stock products must be equal; top-seller
+    estimates may exceed the exact counts by the sketch's error bound, and a product is only
+    required in the incremental top sellers when it beats the last one by more than that bound.
+    """
+    problems = []
+    for field in ("order_lines", "units_sold"):
+        if incremental[field] != exact[field]:
+            problems.append(f"{field}: incremental {incremental[field]} != recomputed {exact[field]}")
+    if not math.isclose(incremental["total_sales"], exact["total_sales"], rel_tol=1e-9, abs_tol=0.011):
+        problems.append(f"total_sales: incremental {incremental['total_sales']} != recomputed {exact['total_sales']}")
+    if incremental["low_stock"] != exact["low_stock"]:
+        problems.append(f"low_stock: {len(incremental['low_stock'])} products != recomputed {len(exact['low_stock'])}")
+    bound = incremental["top_sellers_error_bound"]
+    exact_units = {row["product_id"]: row["units_sold"] for row in exact["top_sellers"]}
+    estimated = {row["product_id"]: row["units_sold"] for row in incremental["top_sellers"]}
+    last = min(estimated.values(), default=0)
+    for product_id, units in exact_units.items():
+        if product_id not in estimated and units > last + bound:
+            problems.append(f"top_sellers: {product_id} ({units} units) is missing")
+        elif product_id in estimated and not units <= estimated[product_id] <= units + bound:
+            problems.append(f"top_sellers: {product_id} estimated {estimated[product_id]}, sold {units} (bound {bound})")
+    return problems
+
+
+def export_report(report, out_dir: str = DEFAULT_REPORT_DIR, formats=REPORT_FORMATS):
+    """
+    Write report as report_<date>.json and/or three CSV files (sales_<date>.csv per source,
+    top_sellers_<date>.csv, low_stock_<date>.csv) into out_dir. Returns the paths written.
+    """
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    day, paths = report["report_date"], []
+    if "json" in formats:
+        path = out / f"report_{day}.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        paths.append(path)
+    if "csv" in formats:
+        tables = {
+            f"sales_{day}.csv": (
+                ["source", "order_lines", "units_sold", "total_sales"],
+                [[source] + list(totals.values()) for source, totals in report["by_source"].items()]
+                + [["all", report["order_lines"], report["units_sold"], report["total_sales"]]],
+            ),
+            f"top_sellers_{day}.csv": (
+                ["rank", "product_id", "units_sold"],
+                [[rank, row["product_id"], row["units_sold"]] for rank, row in enumerate(report["top_sellers"], 1)],
+            ),
+            f"low_stock_{day}.csv": (
+                ["product_id", "quantity_on_hand"],
+                [[row["product_id"], row["quantity_on_hand"]] for row in report["low_stock"]],
+            ),
+        }
+        for name, (header, rows) in tables.items():
+            with open(out / name, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(header)
+                writer.writerows(rows)
+            paths.append(out / name)
+    return paths
@@ -0,0 +1,89 @@
+import json
+from pathlib import Path
+
+from src.utils.logger import logging
+from src.utils.sources import DEFAULT_BOOTSTRAP_SERVERS, _require_confluent_kafka
+
+
+class Sink:
+    """
+    Where the processor sends the messages it emits: dead letters (invalid events) and
+    inventory updates. send() may buffer; flush() returns once everything sent is durable,
+    and is called before the source offsets are committed.
+    """
+
+    def send(self, message: dict, key: str = None):
+        raise NotImplementedError
+
+    def flush(self):
+        """Wait until every message sent is written."""
+
+    def close(self):
+        self.flush()
+
+
+class MemorySink(Sink):
+    """Keeps the messages in a list, for tests and benchmarks."""
+
+    def __init__(self):
+        self.messages = []
+
+    def send(self, message, key=None):
+        self.messages.append(message)
+
+
+class FileSink(Sink):
+    """Appends the messages as JSON Lines to path, fsync-free: flush() hands them to the OS."""
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+
+    def send(self, message, key=None):
+        self._file.write(json.dumps(message, ensure_ascii=False) + "\n")
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class KafkaSink(Sink):
+    """
+    Produces the messages to a Kafka topic, keyed (e.g. by product_id, so the updates of a
+    product stay in order). Deliveries are batched by the producer; flush() waits for them.
+    """
+
+    def __init__(self, topic: str, bootstrap_servers: str = DEFAULT_BOOTSTRAP_SERVERS, extra: dict = None):
+        kafka = _require_confluent_kafka()
+        config = {"bootstrap.servers": bootstrap_servers, "linger.ms": 20, "enable.idempotence": True}
+        config.update(extra or {})
+        self.topic = topic
+        self._producer = kafka.Producer(config)
+        self.failed = 0
+
+    def _delivered(self, error, message):
+        if error is not None:
+            self.failed += 1
+            logging.error(f"[SINK] delivery to {self.topic} failed: {error}")
+
+    def send(self, message, key=None):
+        self.send_raw(json.dumps(message).encode(), key)
+
+    def send_raw(self, value: bytes, key: str = None):
+        """Produce an already serialized message."""
+        while True:
+            try:
+                self._producer.produce(self.topic, value, key=key, on_delivery=self._delivered)
+                break
+            except BufferError:
+                self._producer.poll(0.1)  # local queue full: serve deliveries, then send again
+        self._producer.poll(0)
+
+    def flush(self):
+        self._producer.flush()
+
+    def close(self):
+        self.flush()
@@ -0,0 +1,196 @@
+import json
+import os
+import queue
+import time
+from pathlib import Path
+
+from src.utils.events import SOURCE_TOPICS, Record
+from src.utils.logger import logging
+
+SOURCES = ("kafka", "file")
+DEFAULT_BOOTSTRAP_SERVERS = "localhost:9092"
+DEFAULT_GROUP_ID = "inventory-processor"
+
+# confluent_kafka is optional (only needed with --source kafka), so it is loaded on first use.
+confluent_kafka = None
+
+
+def _require_confluent_kafka():
+    global confluent_kafka
+    if confluent_kafka is None:
+        try:
+            import confluent_kafka as module  # deferred: optional dependency
+        except ImportError as e:
+            raise RuntimeError("--source kafka needs confluent-kafka: pip install confluent-kafka") from e
+        confluent_kafka = module
+    return confluent_kafka
+
+
+class EventSource:
+    """
+    Where the processor reads its micro-batches from.
+    poll() returns up to max_records Records, waiting at most max_wait seconds for the first one
+    and returning as soon as nothing more is immediately available, so a batch grows with the
+    backlog instead of delaying a light stream. commit() acknowledges everything returned so
+    far: the processor calls it only once the batch is stored, so a crash replays the batch
+    (and deduplication drops what had been applied).
+    """
+
+    exhausted = False  # True once a finite source has nothing left
+
+    def poll(self, max_records: int, max_wait: float):
+        raise NotImplementedError
+
+    def commit(self):
+        """Acknowledge every record returned so far."""
+
+    def close(self):
+        """Release the consumer."""
+
+
+class MemorySource(EventSource):
+    """An in-process queue fed by put(), for tests and benchmarks. close_input() ends it."""
+
+    _END = object()
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self.committed = 0
+        self._returned = 0
+
+    def put(self, topic: str, value, produced_at: float = None):
+        self._queue.put(Record(topic, value, time.time() if produced_at is None else produced_at))
+
+    def close_input(self):
+        self._queue.put(self._END)
+
+    def poll(self, max_records, max_wait):
+        if self.exhausted:
+            return []
+        records = []
+        try:
+            item = self._queue.get(timeout=max_wait)
+            while True:
+                if item is self._END:
+                    self.exhausted = True
+                    break
+                records.append(item)
+                if len(records) >= max_records:
+                    break
+                item = self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        self._returned += len(records)
+        return records
+
+    def commit(self):
+        self.committed = self._returned
+
+
+class FileSource(EventSource):
+    """
+    A JSON Lines file of events standing in for Kafka: each line is one event, read as if from
+    topic (None: every event must name its event_type). The byte offset of the next line
+    is saved in offset_path on commit(), so a restarted processor resumes after the last
+    stored batch. With follow, the file is tailed instead of ending at its last line.
+    """
+
+    def __init__(self, path: str, topic: str = None, offset_path: str = None, follow: bool = False):
+        self.path = path
+        self.topic = topic
+        self.offset_path = offset_path
+        self.follow = follow
+        self._file = open(path, "rb")
+        self._offset = self._load_offset()
+        self._file.seek(self._offset)
+        self._pending = b""
+
+    def _load_offset(self):
+        if self.offset_path and os.path.exists(self.offset_path):
+            with open(self.offset_path, encoding="utf-8") as f:
+                offset = json.load(f).get("offset", 0)
+            logging.info(f"[SOURCE] resuming {self.path} at byte {offset}")
+            return offset
+        return 0
+
+    def poll(self, max_records, max_wait):
+        records, deadline = [], time.monotonic() + max_wait
+        now = time.time()
+        while len(records) < max_records:
+            line = self._file.readline()
+            if line.endswith(b"\n") or (line and not self.follow):
+                line, self._pending = self._pending + line, b""
+                self._offset += len(line)
+                if line.strip():
+                    records.append(Record(self.topic, line, now))
+                continue
+            # end of the file; when tailed, a partial last line waits for the writer to finish it
+            self._pending += line
+            if records or not self.follow or time.monotonic() >= deadline:
+                break
+            time.sleep(min(0.05, max_wait))
+        self.exhausted = not self.follow and not records
+        return records
+
+    def commit(self):
+        if not self.offset_path:
+            return
+        Path(self.offset_path).parent.mkdir(parents=True, exist_ok=True)
+        tmp = f"{self.offset_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"path": self.path, "offset": self._offset}, f)
+        os.replace(tmp, self.offset_path)
+
+    def close(self):
+        self._file.close()
+
+
+class KafkaSource(EventSource):
+    """
+    A Kafka consumer of topics in consumer group group_id. Auto-commit is off: the offsets of a
+    batch are committed only by commit(), after the batch is stored. Several processors in one
+    group share the partitions of the topics.
+    extra is merged into the consumer configuration (e.g. security settings).
+    """
+
+    def __init__(self, topics=SOURCE_TOPICS, bootstrap_servers: str = DEFAULT_BOOTSTRAP_SERVERS,
+                 group_id: str = DEFAULT_GROUP_ID, extra: dict = None):
+        kafka = _require_confluent_kafka()
+        config = {
+            "bootstrap.servers": bootstrap_servers,
+            "group.id": group_id,
+            "enable.auto.commit": False,
+            "auto.offset.reset": "earliest",
+        }
+        config.update(extra or {})
+        self._consumer = kafka.Consumer(config)
+        self._consumer.subscribe(list(topics))
+        self._polled = False
+        logging.info(f"[SOURCE] consuming {', '.join(topics)} from {bootstrap_servers} as group {group_id}")
+
+    def poll(self, max_records, max_wait):
+        first = self._consumer.poll(max_wait)
+        if first is None:
+            return []
+        # whatever else is already fetched, without waiting for a full batch
+        messages = [first] + (self._consumer.consume(num_messages=max_records - 1, timeout=0) if max_records > 1 else [])
+        records = []
+        for message in messages:
+            error = message.error()
+            if error is not None:
+                if error.code() != confluent_kafka.KafkaError._PARTITION_EOF:
+                    logging.error(f"[SOURCE] consumer error: {error}")
+                continue
+            kind, ms = message.timestamp()
+            produced_at = ms / 1000 if kind != confluent_kafka.TIMESTAMP_NOT_AVAILABLE else time.time()
+            records.append(Record(message.topic(), message.value(), produced_at))
+        self._polled = self._polled or bool(records)
+        return records
+
+    def commit(self):
+        if self._polled:
+            self._consumer.commit(asynchronous=False)
+            self._polled = False
+
+    def close(self):
+        self._consumer.close()
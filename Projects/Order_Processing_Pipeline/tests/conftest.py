@@ -0,0 +1,35 @@
+import json
+
+import pytest
+
+from src.utils.dedupe import Deduplicator
+from src.utils.inventory_store import open_store
+from src.utils.processor import StreamProcessor
+from src.utils.sinks import MemorySink
+from src.utils.sources import MemorySource
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = open_store("sqlite", str(tmp_path / "inventory.db"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def pipeline(store):
+    """A processor on an in-memory source and sinks: run(messages) processes [(topic, payload), ...]."""
+    source, dlq, updates = MemorySource(), MemorySink(), MemorySink()
+    dedupe = Deduplicator(store, bloom_capacity=1000)
+    dedupe.warm()
+    processor = StreamProcessor(source, store, dlq, dedupe, updates, max_batch=100, max_wait=0.01)
+
+    def run(messages):
+        for topic, payload in messages:
+            source.put(topic, payload if isinstance(payload, (str, bytes)) else json.dumps(payload))
+        source.close_input()
+        processor.run()
+        return processor
+
+    run.source, run.dlq, run.updates, run.store = source, dlq, updates, store
+    return run
@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+from src.utils.events import InvalidEvent, validate
+
+OUT_OF_RANGE = [1e20, -1e12, 253402300800, "0001-01-01T00:00:00+01:00"]
+
+
+def restock(event_id, timestamp):
+    return {"event_id": event_id, "product_id": "P1", "quantity": 5, "supplier_id": "S1", "timestamp": timestamp}
+
+
+@pytest.mark.parametrize("timestamp", [1_754_000_000, 1_754_000_000.5, "2025-08-01T10:00:00Z", "2025-08-01T12:00:00+02:00"])
+def test_valid_timestamps(timestamp):
+    event = validate("supplier_restocks", restock("e1", timestamp), "e1")
+    assert event.delta == 5
+    assert event.timestamp.startswith("2025-08-01T") or event.timestamp.startswith("2025-07-31T")
+
+
+@pytest.mark.parametrize("timestamp", OUT_OF_RANGE + [float("nan"), "yesterday", True, None])
+def test_invalid_timestamps_raise_invalid_event(timestamp):
+    with pytest.raises(InvalidEvent) as info:
+        validate("supplier_restocks", restock("e1", timestamp), "e1")
+    assert info.value.event_id == "e1"
+
+
+def test_out_of_range_timestamps_go_to_the_dlq(pipeline):
+    messages = [("supplier_restocks", restock(f"bad{i}", ts)) for i, ts in enumerate(OUT_OF_RANGE)]
+    messages.append(("supplier_restocks", restock("good", "2025-08-01T10:00:00Z")))
+
+    processor = pipeline(messages)
+
+    assert sorted(message["event_id"] for message in pipeline.dlq.messages) == [f"bad{i}" for i in range(len(OUT_OF_RANGE))]
+    assert pipeline.store.inventory() == {"P1": 5}
+    assert processor.stats["applied"] == 1
+    assert pipeline.source.committed == len(messages)
+    assert all("out of range" in message["error"] for message in pipeline.dlq.messages)
+    assert all(json.loads(message["value"])["event_id"] == message["event_id"] for message in pipeline.dlq.messages)
@@ -0,0 +1,27 @@
+from datetime import datetime, timezone
+
+from src.utils.reports import ReportEngine
+
+NOW = datetime(2025, 8, 10, 12, tzinfo=timezone.utc).timestamp()
+DAYS = [f"2025-08-{day:02d}" for day in range(4, 11)]
+
+
+def test_far_future_order_does_not_expire_the_real_days(store):
+    engine = ReportEngine(store, clock=lambda: NOW)
+    for day in DAYS:
+        engine.add_order("P1", 2, 1.5, "web", f"{day}T09:00:00Z")
+    engine.on_batch([], {}, "2025-08-10T12:00:00Z")  # refreshes the horizon from the clock
+
+    engine.add_order("P1", 1, 1.5, "web", "2099-01-01T00:00:00Z")
+    engine.add_order("P1", 1, 1.5, "web", "2025-08-10T12:30:00Z")  # within the clock skew
+
+    assert sorted(engine.days) == DAYS
+    assert engine.future == 1
+    assert engine.snapshot(DAYS[0])["units_sold"] == 2
+    assert engine.snapshot(DAYS[-1])["units_sold"] == 3
+    assert engine.snapshot("2099-01-01")["units_sold"] == 0
+
+    engine.save()
+    restored = ReportEngine.load(store, clock=lambda: NOW)
+    assert restored.future == 1
+    assert sorted(restored.days) == DAYS
@@ -1,90 +1,77 @@
 import os
 import sys
 import time
-import sqlite3
-from datetime import datetime, timezone, timedelta
-import pandas as pd
+from datetime import datetime, timedelta, timezone
 import streamlit as st
 
 # Add project root to sys.path for imports
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from src.utils.logger import logging
+from src.utils.logger import configure_logging, logging
 
 DB_DEFAULT_PATH = "data/weather_database.db"
 
-def open_conn(db_path: str):
-    """Open a SQLite connection with row access by column name."""
-    logging.info(f"Opening database connection to: {db_path}")
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+@st.cache_resource
+def get_data_layer(db_path: str):
+    """
+    One DashboardData (read-only connection pool + per-city buffers) per database, shared by all sessions.
+    With WEATHER_BACKEND=postgres it reads from the PostgreSQL database at WEATHER_PG_DSN instead.
+    """
+    from src.utils.dashboard_data import DashboardData  # deferred: loads NumPy
+    from src.utils.storage import create_backend
+
+    backend = None
+    if os.getenv("WEATHER_BACKEND", "sqlite") == "postgres":
+        backend = create_backend("postgres", dsn=os.getenv("WEATHER_PG_DSN"))
+    logging.info(f"Creating dashboard read layer for: {backend.name if backend else db_path}")
+    return DashboardData(db_path, backend=backend)
 
 @st.cache_data(ttl=30)
 def get_cities(db_path: str):
-    """Fetch distinct city names from weather_raw."""
+    """Fetch city names from the cities dimension table (weather_raw on databases not migrated yet)."""
     try:
-        with open_conn(db_path) as conn:
-            rows = conn.execute(
-                "SELECT DISTINCT city_name FROM weather_raw ORDER BY 1;"
-            ).fetchall()
-        return [r["city_name"] for r in rows]
+        return get_data_layer(db_path).cities()
     except Exception as e:
         logging.error(f"Error fetching cities: {e}")
         return []
 
-@st.cache_data(ttl=30)
 def get_last_24h(db_path: str, city: str):
-    """Fetch last 24h weather data for a city."""
-    now_utc = int(datetime.now(timezone.utc).timestamp())
-    start = now_utc - 24 * 3600
+    """
+    Fetch last 24h weather data for a city as {"ts_utc", "temp_c", "humidity"} arrays.
+    Not wrapped in st.cache_data: the read layer already shares and delta-refreshes the series.
+    """
     try:
-        with open_conn(db_path) as conn:
-            rows = conn.execute(
-                """
-                SELECT ts_utc, temp_c, humidity
-                FROM weather_raw
-                WHERE city_name = ? AND ts_utc >= ?
-                ORDER BY ts_utc
-                """,
-                (city, start),
-            ).fetchall()
-        times = [datetime.fromtimestamp(r["ts_utc"], tz=timezone.utc) for r in rows]
-        temps = [r["temp_c"] for r in rows]
-        hums = [r["humidity"] for r in rows]
-        return times, temps, hums
+        return get_data_layer(db_path).recent(city)
     except Exception as e:
         logging.error(f"Error fetching last 24h data for {city}: {e}")
-        return [], [], []
+        return None
 
 @st.cache_data(ttl=60)
 def get_daily_metrics(db_path: str, city: str, days: int = 14):
-    """Fetch daily weather metrics for a city."""
+    """Fetch daily weather metrics for a city as columns (date_utc, avg_temp, ..., samples)."""
     try:
-        with open_conn(db_path) as conn:
-            rows = conn.execute(
-                """
-                SELECT date_utc, avg_temp, min_temp, max_temp, avg_humidity, samples
-                FROM weather_metrics
-                WHERE city_name = ?
-                ORDER BY date_utc DESC
-                LIMIT ?
-                """,
-                (city, days),
-            ).fetchall()
-        rows = list(rows)[::-1]
-        return (
-            [r["date_utc"] for r in rows],
-            [r["avg_temp"] for r in rows],
-            [r["min_temp"] for r in rows],
-            [r["max_temp"] for r in rows],
-            [r["avg_humidity"] for r in rows],
-            [r["samples"] for r in rows],
-        )
+        return get_data_layer(db_path).daily_metrics(city, days)
     except Exception as e:
         logging.error(f"Error fetching daily metrics for {city}: {e}")
-        return [], [], [], [], [], []
+        return None
+
+@st.cache_data(ttl=60)
+def get_history(db_path: str, city: str, start_ts: int, end_ts: int, points: int, method: str):
+    """Fetch a downsampled series for a city over any range, from the raw data or the rollups."""
+    try:
+        return get_data_layer(db_path).history(city, start_ts, end_ts, points, method)
+    except Exception as e:
+        logging.error(f"Error fetching history for {city}: {e}")
+        return None, None
+
+@st.cache_resource
+def init_logging():
+    """Configure logging once per server process (Streamlit re-runs this script on every interaction)."""
+    configure_logging()
 
 def main():
+    import pandas as pd  # deferred: only needed to build the charts
+
+    init_logging()
     logging.info("Starting Streamlit Weather Dashboard app")
     st.set_page_config(page_title="Weather Dashboard", page_icon="⛅", layout="wide")
 
@@ -95,7 +82,7 @@ def main():
     st.sidebar.header("Controls")
     db_path = st.sidebar.text_input("Database path", DB_DEFAULT_PATH)
 
-    if not db_path or not os.path.exists(db_path):
+    if os.getenv("WEATHER_BACKEND", "sqlite") == "sqlite" and (not db_path or not os.path.exists(db_path)):
         st.error("Database path is invalid or does not exist.")
         st.stop()
 
@@ -106,46 +93,78 @@ def main():
 
     st.sidebar.divider()
     city = st.sidebar.selectbox("City", options=cities)
-    view = st.sidebar.radio("View", options=["Last 24h (raw)", "Daily (metrics)"])
+    view = st.sidebar.radio("View", options=["Last 24h (raw)", "Daily (metrics)", "History (downsampled)"])
     st.sidebar.divider()
     st.sidebar.write(f"DB: {db_path}")
 
     if view == "Last 24h (raw)":
-        times, temps, hums = get_last_24h(db_path, city)
-        if not times:
+        recent = get_last_24h(db_path, city)
+        if recent is None or not len(recent["ts_utc"]):
             st.warning("No data in the last 24 hours for this city.")
             st.stop()
 
         st.subheader(f"Last 24 hours - {city}")
-        df = pd.DataFrame({"time": times, "Temperature (°C)": temps, "Humidity (%)": hums})
+        df = pd.DataFrame({
+            "time": pd.to_datetime(recent["ts_utc"], unit="s", utc=True),
+            "Temperature (°C)": recent["temp_c"],
+            "Humidity (%)": recent["humidity"],
+        })
         st.line_chart(df, x="time", y=["Temperature (°C)", "Humidity (%)"])
 
         with st.expander("Show data table"):
             st.dataframe(df, use_container_width=True)
 
+    elif view == "History (downsampled)":
+        today = datetime.now(timezone.utc).date()
+        picked = st.date_input("Date range", value=(today - timedelta(days=90), today))
+        if len(picked) != 2:
+            st.stop()
+        points = st.slider("Points", min_value=100, max_value=5000, value=1000, step=100)
+        method = st.radio("Downsampling", options=["lttb", "minmax"], horizontal=True)
+        start_ts = int(datetime(picked[0].year, picked[0].month, picked[0].day, tzinfo=timezone.utc).timestamp())
+        end_ts = int(datetime(picked[1].year, picked[1].month, picked[1].day, tzinfo=timezone.utc).timestamp()) + 86399
+        series, info = get_history(db_path, city, start_ts, end_ts, points, method)
+        if series is None or not len(series["ts_utc"]):
+            st.warning("No data in this range for this city.")
+            st.stop()
+
+        st.subheader(f"History - {city}")
+        st.caption(f"{len(series['ts_utc'])} points from the {info['tier']} tier, {info['bucket_seconds'] // 60} min buckets")
+        time_index = pd.to_datetime(series["ts_utc"], unit="s", utc=True)
+        temp_df = pd.DataFrame({
+            "time": time_index, "Min (°C)": series["temp_min"],
+            "Avg (°C)": series["temp_c"], "Max (°C)": series["temp_max"],
+        })
+        st.line_chart(temp_df, x="time", y=["Min (°C)", "Avg (°C)", "Max (°C)"])
+        hum_df = pd.DataFrame({"time": time_index, "Avg Humidity (%)": series["humidity"]})
+        st.line_chart(hum_df, x="time", y="Avg Humidity (%)")
+
     else:
         days = st.slider("Days", min_value=7, max_value=60, value=14, step=1)
-        dates, avg_t, min_t, max_t, avg_h, samples = get_daily_metrics(db_path, city, days)
-        if not dates:
+        metrics = get_daily_metrics(db_path, city, days)
+        if metrics is None or not len(metrics["date_utc"]):
             st.warning("No daily metrics yet. Run aggregation and try again.")
             st.stop()
 
         st.subheader(f"Daily metrics - {city}")
-        temp_df = pd.DataFrame({"Date": dates, "Min (°C)": min_t, "Avg (°C)": avg_t, "Max (°C)": max_t})
+        temp_df = pd.DataFrame({
+            "Date": metrics["date_utc"], "Min (°C)": metrics["min_temp"],
+            "Avg (°C)": metrics["avg_temp"], "Max (°C)": metrics["max_temp"],
+        })
         st.line_chart(temp_df, x="Date", y=["Min (°C)", "Avg (°C)", "Max (°C)"])
 
-        hum_df = pd.DataFrame({"Date": dates, "Avg Humidity (%)": avg_h})
+        hum_df = pd.DataFrame({"Date": metrics["date_utc"], "Avg Humidity (%)": metrics["avg_humidity"]})
         st.line_chart(hum_df, x="Date", y="Avg Humidity (%)")
 
         with st.expander("Show metrics table"):
             st.dataframe(
                 {
-                    "Date": dates,
-                    "Avg Temp": avg_t,
-                    "Min Temp": min_t,
-                    "Max Temp": max_t,
-                    "Avg Humidity": avg_h,
-                    "Samples": samples,
+                    "Date": metrics["date_utc"],
+                    "Avg Temp": metrics["avg_temp"],
+                    "Min Temp": metrics["min_temp"],
+                    "Max Temp": metrics["max_temp"],
+                    "Avg Humidity": metrics["avg_humidity"],
+                    "Samples": metrics["samples"],
                 },
                 use_container_width=True,
             )
@@ -0,0 +1,76 @@
+"""
+Load synthetic weather_raw data and check the dashboard queries against their indexes.
+
+    python -m benchmarks.bench_dashboard_queries --rows 1000000
+    python -m benchmarks.bench_dashboard_queries --rows 10000000 --cities 5000
+
+The rows are loaded before the schema migrations run, so the benchmark also exercises
+migrating an existing database (index builds and the cities backfill).
+For every dashboard query it asserts that EXPLAIN QUERY PLAN uses the expected index and that
+the median latency stays within its budget; the script exits non-zero otherwise.
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.datagen import NOW, load
+from src.utils.weather_db import SELECT_CITIES_SQL, SELECT_CITY_RANGE_SQL, SELECT_DAILY_METRICS_SQL
+
+
+def plan(conn, sql, params):
+    return " | ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+
+
+def median_ms(conn, sql, params, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard read paths.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--cities", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=20.0, help="Median latency budget per query")
+    parser.add_argument("--db", help="Reuse/keep this database file instead of a temp one")
+    args = parser.parse_args()
+
+    tmp = None
+    db_path = args.db
+    if not db_path:
+        tmp = tempfile.TemporaryDirectory()
+        db_path = os.path.join(tmp.name, "bench.db")
+    conn = sqlite3.connect(db_path)
+    if not conn.execute("SELECT name FROM sqlite_master WHERE name = 'weather_raw';").fetchone():
+        load(conn, args.rows, args.cities)
+    conn.execute("ANALYZE;")
+
+    city = f"City{args.cities // 2:05d}"
+    checks = [
+        ("cities", SELECT_CITIES_SQL, (), "idx_cities_name"),
+        ("last_24h", SELECT_CITY_RANGE_SQL, (city, NOW - 24 * 3600), "COVERING INDEX idx_weather_raw_city_ts"),
+        ("daily_metrics", SELECT_DAILY_METRICS_SQL, (city, 60), "sqlite_autoindex_weather_metrics_1"),
+    ]
+    failed = False
+    for name, sql, params, expected in checks:
+        query_plan = plan(conn, sql, params)
+        latency = median_ms(conn, sql, params, args.repeats)
+        ok = expected in query_plan and latency <= args.budget_ms
+        failed |= not ok
+        print(f"{'PASS' if ok else 'FAIL'} {name:<14} {latency:8.2f}ms  plan: {query_plan}")
+    conn.close()
+    if tmp:
+        tmp.cleanup()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Simulate many dashboard viewers against a growing database and compare the read paths.
+
+    python -m benchmarks.bench_dashboard_reads --rows 1000000 --viewers 50 --rounds 20
+
+"legacy" is what app.py did before the shared read layer: a new connection and a full 24h
+range query per viewer, with the result turned into Python lists row by row. "shared" is
+src.utils.dashboard_data.DashboardData with refresh_interval=0, i.e. every view asks for new
+rows, but only for those newer than the buffered ones. Between rounds every city gets one new
+sample, like a 10-minute ingestor tick.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks.datagen import NOW, load
+from src.utils.dashboard_data import DashboardData
+from src.utils.weather_db import INSERT_WEATHER_RAW_SQL, SELECT_CITY_RANGE_SQL
+
+
+def legacy_view(db_path, city, now):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    with conn:
+        rows = conn.execute(SELECT_CITY_RANGE_SQL, (city, now - 24 * 3600)).fetchall()
+    conn.close()
+    times = [datetime.fromtimestamp(r["ts_utc"], tz=timezone.utc) for r in rows]
+    return times, [r["temp_c"] for r in rows], [r["humidity"] for r in rows]
+
+
+def shared_view(data, city, now):
+    return data.recent(city)
+
+
+def add_tick(conn, cities, ts):
+    rows = [(f"City{c:05d}", str(c), "XX", ts, "", "bench", 20.0, 20.0, 50, 1013, 3.0, 180, "Clear", "clear sky")
+            for c in range(cities)]
+    with conn:
+        conn.executemany(INSERT_WEATHER_RAW_SQL, rows)
+
+
+def run(db_path, view, target, cities, viewers, rounds, seed=7):
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    clock = {"now": NOW}
+    if target == "shared":
+        target = DashboardData(db_path, refresh_interval=0, clock=lambda: clock["now"])
+    elapsed = 0.0
+    for r in range(rounds):
+        clock["now"] = NOW + (r + 1) * 600
+        add_tick(conn, cities, clock["now"])
+        start = time.perf_counter()
+        for _ in range(viewers):
+            view(target, f"City{rnd.randrange(cities):05d}", clock["now"])
+        elapsed += time.perf_counter() - start
+    conn.close()
+    return elapsed / (viewers * rounds) * 1000, target
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard read layer with many viewers.")
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--cities", type=int, default=100)
+    parser.add_argument("--viewers", type=int, default=50, help="Page views per round")
+    parser.add_argument("--rounds", type=int, default=20, help="Ingestor ticks simulated")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, view in (("legacy", legacy_view), ("shared", shared_view)):
+            db_path = os.path.join(tmp, f"{name}.db")
+            conn = sqlite3.connect(db_path)
+            load(conn, args.rows, args.cities)
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.close()
+            target = db_path if name == "legacy" else "shared"
+            ms, target = run(db_path, view, target, args.cities, args.viewers, args.rounds)
+            extra = ""
+            if name == "shared":
+                extra = f"  queries={target.queries} rows_read={target.rows_read:,}"
+                target.close()
+            print(f"{name:<7} {ms:8.3f} ms/view{extra}")
+
+
+if __name__ == "__main__":
+    main()
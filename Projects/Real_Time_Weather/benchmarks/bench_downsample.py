@@ -0,0 +1,82 @@
+"""
+Render payload size and query latency of the history view versus the length of the range.
+
+    python -m benchmarks.bench_downsample --rows 2000000 --cities 10 --points 1000
+
+For each range it compares shipping every raw sample ("raw") with DashboardData.history
+("downsampled", the dashboard's query through its read-only connection pool): rows read from
+SQLite, points sent to the chart, size of the JSON payload and median latency. The downsampled
+numbers should stay flat as the range grows.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from benchmarks.datagen import NOW, load
+from src.utils.dashboard_data import DashboardData
+
+RANGES_DAYS = (1, 7, 30, 90, 365, 1095)
+
+
+def raw_series(conn, city, start, end):
+    rows = conn.execute(
+        "SELECT ts_utc, temp_c, humidity FROM weather_raw WHERE city_name = ? AND ts_utc BETWEEN ? AND ? ORDER BY ts_utc",
+        (city, start, end),
+    ).fetchall()
+    return rows, len(rows)
+
+
+def downsampled_series(data, city, start, end, points, method):
+    columns, info = data.history(city, start, end, points, method)
+    payload = [[int(t), round(float(v), 2), round(float(h), 2)]
+               for t, v, h in zip(columns["ts_utc"], columns["temp_c"], columns["humidity"])]
+    return payload, info
+
+
+def measure(func, repeats):
+    samples, result = [], None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark downsampled history queries.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--cities", type=int, default=10)
+    parser.add_argument("--points", type=int, default=1000)
+    parser.add_argument("--method", choices=("lttb", "minmax"), default="lttb")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        conn = sqlite3.connect(db_path)
+        load(conn, args.rows, args.cities)
+        conn.execute("ANALYZE;")
+        conn.commit()
+        data = DashboardData(db_path)
+        city = "City00000"
+        print(f"{'range':>7} | {'raw rows':>9} {'raw KB':>9} {'raw ms':>8} | "
+              f"{'tier':>6} {'read':>6} {'points':>6} {'KB':>6} {'ms':>7}")
+        for days in RANGES_DAYS:
+            start, end = NOW - days * 86400, NOW
+            raw_ms, (rows, _) = measure(lambda: raw_series(conn, city, start, end), args.repeats)
+            raw_kb = len(json.dumps(rows)) / 1024
+            ds_ms, (payload, info) = measure(
+                lambda: downsampled_series(data, city, start, end, args.points, args.method), args.repeats)
+            ds_kb = len(json.dumps(payload)) / 1024
+            print(f"{days:>6}d | {len(rows):>9,} {raw_kb:>9.1f} {raw_ms:>8.2f} | "
+                  f"{info['tier']:>6} {info['rows_read']:>6} {len(payload):>6} {ds_kb:>6.1f} {ds_ms:>7.2f}")
+        data.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
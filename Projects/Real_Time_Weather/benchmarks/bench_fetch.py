@@ -0,0 +1,58 @@
+"""
+Compare sequential and concurrent run_once ticks against the local stub server.
+
+    python -m benchmarks.bench_fetch --cities 200 --latency-ms 150 --concurrency 16
+    python -m benchmarks.bench_fetch --cities 1000 --bulk
+
+With --bulk a third tick fetches the cities through the group endpoint. Its ids are resolved
+by a first by-name tick on the same database, which is not timed. Each tick writes into a throwaway temp directory, so the real data/ folder is never touched.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.mock_owm import start_mock_server
+from main import run_once
+from src.utils.http_client import HostRateLimiter, create_session
+
+
+def time_tick(cities, base_url, concurrency, rate_limit, bulk=False):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "weather.db")
+        limiter = HostRateLimiter(rate_limit) if rate_limit else None
+        opts = dict(concurrency=concurrency, session=create_session(concurrency), rate_limiter=limiter, base_url=base_url)
+        if bulk:
+            run_once(cities, "bench-key", db_path, tmp, bulk=True, **opts)  # resolves the city ids
+        start = time.perf_counter()
+        run_once(cities, "bench-key", db_path, tmp, bulk=bulk, **opts)
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the multi-city fetch engine.")
+    parser.add_argument("--cities", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rate-limit", type=float, default=0, help="Calls per minute (0 = unlimited)")
+    parser.add_argument("--bulk", action="store_true", help="Also time a tick through the group endpoint")
+    args = parser.parse_args()
+
+    server, base_url = start_mock_server(latency_ms=args.latency_ms, rate_429=args.rate_429)
+    cities = [f"City{i:05d}" for i in range(args.cities)]
+    try:
+        runs = [(1, False), (args.concurrency, False)] + ([(args.concurrency, True)] if args.bulk else [])
+        for concurrency, bulk in runs:
+            state = server.RequestHandlerClass.state
+            before = state.requests
+            elapsed = time_tick(cities, base_url, concurrency, args.rate_limit, bulk)
+            requests = state.requests - before - (len(cities) if bulk else 0)
+            print(f"concurrency={concurrency:<4} bulk={bulk!s:<5} cities={len(cities):<6} tick={elapsed:8.2f}s "
+                  f"({len(cities) / elapsed:8.1f} cities/s, {requests} requests)")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
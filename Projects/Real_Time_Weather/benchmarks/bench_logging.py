@@ -0,0 +1,119 @@
+"""
+Per-record logging overhead of the fetch hot path, before and after the queue-based pipeline.
+
+    python -m benchmarks.bench_logging --requests 20000
+
+"legacy" reproduces the previous setup: a synchronous FileHandler at DEBUG, the string-scanning
+ApiKeyFilter and the split/join mask_api_key applied to the URL and the payload of every request.
+"queued" is src.utils.logger.configure_logging at INFO: the caller only enqueues records and the
+single-pass redaction and file I/O run on the listener thread. The time reported is what the
+fetching thread spends logging, which is what slows a tick down.
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks.mock_owm import fake_weather
+from src.utils.logger import configure_logging, shutdown_logging
+
+API_KEY = "0123456789abcdef0123456789abcdef"
+URL = f"https://api.openweathermap.org/data/2.5/weather?appid={API_KEY}&q=London&units=metric"
+
+
+class LegacyApiKeyFilter(logging.Filter):
+    def __init__(self, api_key):
+        super().__init__()
+        self.api_key = api_key
+
+    def filter(self, record):
+        if self.api_key and self.api_key in str(record.msg):
+            record.msg = str(record.msg).replace(self.api_key, "***REDACTED***")
+        if hasattr(record, 'args') and isinstance(record.args, tuple):
+            record.args = tuple(
+                a.replace(self.api_key, "***REDACTED***") if isinstance(a, str) and self.api_key in a else a
+                for a in record.args
+            )
+        return True
+
+
+def legacy_mask(content, api_key):
+    if isinstance(content, str):
+        content = content.replace(api_key, "***REDACTED***")
+        parts = content.split("appid=")
+        if len(parts) > 1:
+            for i in range(1, len(parts)):
+                end_idx = parts[i].find("&")
+                parts[i] = "***REDACTED***" + parts[i][end_idx:] if end_idx != -1 else "***REDACTED***"
+            content = "appid=".join(parts)
+        return content
+    if isinstance(content, dict):
+        return {k: legacy_mask(v, api_key) for k, v in content.items()}
+    if isinstance(content, list):
+        return [legacy_mask(v, api_key) for v in content]
+    return content
+
+
+def configure_legacy(log_file):
+    root = logging.getLogger()
+    shutdown_logging()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    handler = logging.FileHandler(log_file, mode="a")
+    handler.setFormatter(logging.Formatter('%(asctime)s-%(name)s-%(levelname)s-%(message)s'))
+    root.addHandler(handler)
+    root.filters.clear()
+    root.addFilter(LegacyApiKeyFilter(API_KEY))
+    root.setLevel(logging.DEBUG)
+
+
+def legacy_request(data):
+    logging.info(f"Request sent to URL: {legacy_mask(URL, API_KEY)}")
+    logging.info("Weather data (truncated): %s", {k: data.get(k) for k in ["name", "dt", "main", "weather"]})
+    logging.error(f"HTTP 429: {legacy_mask({'cod': 429, 'message': URL}, API_KEY)}")
+    logging.info(f"[QUEUED] city={data['name']} event={data['dt']} captured=20250101T000000Z")
+
+
+def queued_request(data):
+    logging.info("Request sent to URL: %s", URL)
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("Weather data (truncated): %s", {k: data.get(k) for k in ["name", "dt", "main", "weather"]})
+    logging.error("HTTP %s: %s", 429, {"cod": 429, "message": URL})
+    logging.info("[QUEUED] city=%s event=%s captured=%s", data["name"], data["dt"], "20250101T000000Z")
+
+
+def run(name, request, requests):
+    data = fake_weather("London")
+    start = time.perf_counter()
+    for _ in range(requests):
+        request(data)
+    elapsed = time.perf_counter() - start
+    return elapsed / (requests * 4) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark of per-record logging overhead.")
+    parser.add_argument("--requests", type=int, default=20_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_log = os.path.join(tmp, "legacy.log")
+        configure_legacy(legacy_log)
+        legacy_us = run("legacy", legacy_request, args.requests)
+        logging.getLogger().filters.clear()
+
+        queued_log = os.path.join(tmp, "queued.log")
+        configure_logging(level="INFO", log_file=queued_log, api_key=API_KEY)
+        queued_us = run("queued", queued_request, args.requests)
+        shutdown_logging()
+
+        with open(queued_log, encoding="utf-8") as f:
+            leaked = sum(API_KEY in line for line in f)
+    print(f"legacy: {legacy_us:7.2f} us/record (sync FileHandler, DEBUG, filter + mask_api_key)")
+    print(f"queued: {queued_us:7.2f} us/record (QueueHandler, INFO, redaction on listener thread)")
+    print(f"speedup: {legacy_us / queued_us:.1f}x, api key leaked into queued log: {leaked} lines")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Generate synthetic raw_*.json files and time the replay engine on them.
+
+    python -m benchmarks.bench_replay --files 50000 --cities 500 --workers 1 8
+
+Every run loads into a fresh database, so the numbers are for a full rebuild.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.datagen import write_raw_files
+from src.utils.replay import replay
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark rebuilding weather_raw from raw JSON files.")
+    parser.add_argument("--files", type=int, default=20_000)
+    parser.add_argument("--cities", type=int, default=500)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        write_raw_files(tmp, args.files, args.cities)
+        print(f"generated {args.files:,} files in {time.perf_counter() - start:.1f}s")
+        for workers in args.workers:
+            db_path = os.path.join(tmp, f"replay_{workers}.db")
+            result = replay(db_path, tmp, workers=workers)
+            print(
+                f"workers={workers:<3} {result['seconds']:7.2f}s  {result['files_per_sec']:10,.0f} files/s  "
+                f"{result['rows_per_sec']:10,.0f} rows/s  inserted={result['rows_inserted']:,}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Run run_once ticks against the fault-injecting stub server and check the retry layer.
+
+    python -m benchmarks.bench_resilience --cities 40 --concurrency 8
+
+Three scenarios, each with and without the resilience settings:
+  flaky       a share of 500s, 429s and dropped connections: retries recover the cities
+              a single attempt loses, and every city still failing is in the retry queue.
+  stragglers  a few cities hang, fetched sequentially: the tick deadline ends the tick on
+              time and the abandoned cities are queued instead of stalling it.
+  outage      every call answers 503: the circuit breaker stops sending requests after a few
+              failures, and once the provider is back the retry queue is drained.
+Each tick writes into a throwaway temp directory. Exits non-zero if a check fails.
+"""
+import argparse
+import logging as std_logging
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from benchmarks.mock_owm import start_mock_server
+from main import run_once
+from src.utils.http_client import create_session
+from src.utils.resilience import CircuitBreaker, FetchPolicy, RetryQueue
+from src.utils.storage import SQLiteBackend
+
+
+def tick(base_url, cities, db_path, out_dir, concurrency, policy=None, queue=None, deadline=None):
+    start = time.perf_counter()
+    run_once(cities, "bench-key", db_path, out_dir, concurrency=concurrency, session=create_session(concurrency),
+             base_url=base_url, policy=policy, retry_queue=queue, tick_deadline=deadline)
+    elapsed = time.perf_counter() - start
+    with sqlite3.connect(db_path) as conn:
+        stored = conn.execute("SELECT COUNT(DISTINCT city_name) FROM weather_raw").fetchone()[0]
+    return elapsed, stored
+
+
+def run(name, label, state_kwargs, cities, concurrency, policy=None, deadline=None, down=False, after=None):
+    """
+    One tick on a fresh stub (answering 503 to everything with down) and database, as a result
+    row. after(state, base_url, db_path, out_dir, queue) can run more ticks and add columns.
+    """
+    server, base_url = start_mock_server(**state_kwargs)
+    state = server.RequestHandlerClass.state
+    state.down = down
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "weather.db")
+            backend = SQLiteBackend(db_path)
+            backend.init_schema()
+            queue = RetryQueue(backend, base_delay=0)
+            try:
+                elapsed, stored = tick(base_url, cities, db_path, tmp, concurrency, policy, queue, deadline)
+                row = dict(scenario=name, run=label, tick=elapsed, stored=stored, queued=queue.size, requests=state.requests)
+                if after:
+                    row.update(after(state, base_url, db_path, tmp, queue))
+                return row
+            finally:
+                backend.close()
+    finally:
+        server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check retries, circuit breaker and tick deadline against a faulty stub.")
+    parser.add_argument("--cities", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--deadline", type=float, default=2.0, help="Tick deadline of the stragglers scenario")
+    parser.add_argument("--verbose", action="store_true", help="Keep the ingestor logs")
+    args = parser.parse_args()
+    if not args.verbose:
+        std_logging.disable(std_logging.CRITICAL)
+
+    cities = [f"City{i:05d}" for i in range(args.cities)]
+    resilient = lambda threshold=0: FetchPolicy(  # noqa: E731
+        retries=args.retries, backoff=0.05, max_backoff=2.0, rng=random.Random(0),
+        breaker=CircuitBreaker(threshold, reset_timeout=0.5) if threshold else None,
+    )
+    results, checks = [], []
+
+    flaky = dict(latency_ms=args.latency_ms, rate_500=0.2, rate_429=0.05, rate_drop=0.05, retry_after=0, seed=1)
+    single = run("flaky", "1 attempt", flaky, cities, args.concurrency)
+    retried = run("flaky", f"{args.retries} retries", flaky, cities, args.concurrency, policy=resilient())
+    results += [single, retried]
+    checks.append(("retries recover the cities lost on the first attempt", retried["stored"] > single["stored"]))
+    checks.append(("every city is stored or queued",
+                   all(r["stored"] + r["queued"] == len(cities) for r in (single, retried))))
+
+    hang = cities[1::max(len(cities) // 4, 1)][:3]
+    stragglers = dict(latency_ms=args.latency_ms, hang_cities=hang, hang_ms=3000)
+    short = cities[:12]
+    waited = run("stragglers", "no deadline", stragglers, short, 1)
+    bounded = run("stragglers", f"deadline {args.deadline:g}s", stragglers, short, 1, deadline=args.deadline)
+    results += [waited, bounded]
+    checks.append(("the deadline ends the tick on time", bounded["tick"] < args.deadline + 1.0 < waited["tick"]))
+    checks.append(("abandoned cities are queued", bounded["stored"] + bounded["queued"] == len(short) and bounded["queued"] >= 1))
+
+    breaker_policy = resilient(threshold=5)
+
+    def recover(state, base_url, db_path, out_dir, queue):
+        state.down = False
+        time.sleep(0.6)  # past the breaker reset timeout
+        # sequential like the retry sweep: concurrent calls fail fast while the half-open trial is out
+        _, stored = tick(base_url, [], db_path, out_dir, 1, policy=breaker_policy, queue=queue)
+        return dict(recovered=stored, left=queue.size)
+
+    outage = dict(latency_ms=args.latency_ms)
+    no_breaker = run("outage", "no breaker", outage, cities, 1, policy=resilient(), down=True)
+    with_breaker = run("outage", "breaker", outage, cities, 1, policy=breaker_policy, down=True, after=recover)
+    results += [no_breaker, with_breaker]
+    checks.append(("the open breaker stops sending requests", with_breaker["requests"] < no_breaker["requests"] / 5))
+    checks.append(("the retry queue is drained once the provider is back",
+                   with_breaker["recovered"] == len(cities) and with_breaker["left"] == 0))
+
+    print(f"{'scenario':<11} {'run':<14} {'tick s':>7} {'stored':>7} {'queued':>7} {'requests':>9}")
+    for r in results:
+        print(f"{r['scenario']:<11} {r['run']:<14} {r['tick']:>7.2f} {r['stored']:>7} {r['queued']:>7} {r['requests']:>9}")
+    for description, ok in checks:
+        print(f"{'PASS' if ok else 'FAIL'} {description}")
+    sys.exit(0 if all(ok for _, ok in checks) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Simulate years of ingestion and check that retention keeps the database size and the query
+latency flat.
+
+    python -m benchmarks.bench_retention --days 730 --cities 20
+    python -m benchmarks.bench_retention --days 1095 --cities 100 --every 1
+
+Two databases are fed the same hourly samples of --cities cities, one simulated day at a time,
+through WeatherWriter as the ingestor does. Every --every days, one gets a retention pass at the
+simulated time (raw rows and files 90 days, hourly rollups 180 days, daily rollups and
+weather_metrics forever), the other is only aggregated. Each simulated day also
+writes --files-per-day raw JSON responses, which the retention pass moves into the Parquet
+archive.
+At the end of every quarter the script prints the size, the weather_raw rows and the median
+latency of the dashboard queries and of a full scan of weather_raw, for both databases.
+It exits non-zero if, with retention, the size or the scan latency of the last quarter grew past
+--tolerance over the first quarter after steady state (only the tables kept forever still grow,
+by one row per city and day), if weather_metrics lost a pruned day, or if
+a delete batch held the write lock longer than --max-batch-ms.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.datagen import NOW, city_name, write_raw_files
+from src.utils.replay import iter_raw_json_files
+from src.utils.retention import database_size, run_retention
+from src.utils.weather_aggregator import aggregate_incremental
+from src.utils.weather_db import SELECT_CITY_RANGE_SQL, SELECT_DAILY_METRICS_SQL
+from src.utils.weather_writer import WeatherWriter
+
+DAY = 86400
+QUARTER = 91
+RETENTION = {"raw": 90, "files": 90, "hourly": 180, "daily": None, "metrics": None, "archive": None}
+RAW_SCAN_SQL = "SELECT COUNT(*), AVG(temp_c) FROM weather_raw;"
+
+
+def day_rows(rnd, start_ts, cities, interval):
+    """One row per city every `interval` seconds of the day starting at start_ts."""
+    rows = []
+    for ts in range(start_ts, start_ts + DAY, interval):
+        for city in range(cities):
+            rows.append((
+                city_name(city), str(city), "XX", ts, "", "bench",
+                round(rnd.uniform(-10, 35), 2), 0.0, rnd.randint(10, 100), 1013, 3.0, 180, "Clear", "clear sky",
+            ))
+    return rows
+
+
+def median_ms(db_path, sql, params, repeats):
+    conn = sqlite3.connect(db_path)
+    try:
+        samples = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            samples.append((time.perf_counter() - start) * 1000)
+    finally:
+        conn.close()
+    return statistics.median(samples)
+
+
+def measure(db_path, now, city, repeats):
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("SELECT COUNT(*) FROM weather_raw;").fetchone()[0]
+    finally:
+        conn.close()
+    return {
+        "mb": database_size(db_path) / 1e6,
+        "rows": rows,
+        "last_24h": median_ms(db_path, SELECT_CITY_RANGE_SQL, (city, now - DAY), repeats),
+        "daily_metrics": median_ms(db_path, SELECT_DAILY_METRICS_SQL, (city, 60), repeats),
+        "raw_scan": median_ms(db_path, RAW_SCAN_SQL, (), repeats),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that retention keeps DB size and query latency flat over time.")
+    parser.add_argument("--days", type=int, default=730, help="Simulated days of ingestion")
+    parser.add_argument("--cities", type=int, default=20)
+    parser.add_argument("--interval", type=int, default=600, help="Seconds between two samples of a city")
+    parser.add_argument("--every", type=int, default=7, help="Days between two retention passes")
+    parser.add_argument("--files-per-day", type=int, default=24, help="Raw JSON responses written per simulated day")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows per delete transaction")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed growth of size and scan latency after steady state")
+    parser.add_argument("--max-batch-ms", type=float, default=500.0, help="Longest allowed delete transaction")
+    args = parser.parse_args()
+    # the first quarter past the longest finite retention and one pass interval is the steady state
+    keep_days = RETENTION["raw"]
+    steady_day = max(days for days in RETENTION.values() if days is not None) + args.every
+    if args.days < steady_day + 2 * QUARTER:
+        parser.error(f"--days must cover at least {steady_day + 2 * QUARTER} days to reach steady state")
+    samples = DAY // args.interval
+
+    tmp = tempfile.TemporaryDirectory()
+    pruned_db = os.path.join(tmp.name, "retention.db")
+    kept_db = os.path.join(tmp.name, "no_retention.db")
+    data_dir = os.path.join(tmp.name, "data")
+    archive_dir = os.path.join(tmp.name, "archive")
+    Path(data_dir).mkdir()
+    city = city_name(args.cities // 2)
+    rnd = random.Random(args.seed)
+    first_day = NOW // DAY * DAY - args.days * DAY
+
+    writers = [WeatherWriter(db, batch_size=5000, flush_interval=0, wal=True) for db in (pruned_db, kept_db)]
+    quarters = []
+    max_batch_ms = 0.0
+    passes = 0
+    retention_seconds = 0.0
+    start = time.perf_counter()
+    print(f"{'day':>5} | {'with retention':^44} | {'without retention':^44}")
+    print(f"{'':>5} | {'MB':>7} {'rows':>10} {'24h ms':>7} {'daily ms':>8} {'scan ms':>7} "
+          f"| {'MB':>7} {'rows':>10} {'24h ms':>7} {'daily ms':>8} {'scan ms':>7}")
+    for day in range(args.days):
+        day_start = first_day + day * DAY
+        rows = day_rows(rnd, day_start, args.cities, args.interval)
+        for writer in writers:
+            writer.add_many(rows)
+            writer.flush()
+        write_raw_files(data_dir, args.files_per_day, 1, end_ts=day_start + DAY - 3600, interval=DAY // max(1, args.files_per_day))
+        now = day_start + DAY
+        if (day + 1) % args.every == 0:
+            summary = run_retention(pruned_db, data_dir, archive_dir, RETENTION, now=now,
+                                    batch_size=args.batch_size, pause=0)
+            max_batch_ms = max(max_batch_ms, summary["max_batch_ms"])
+            retention_seconds += summary["seconds"]
+            passes += 1
+            conn = sqlite3.connect(kept_db, isolation_level=None)
+            aggregate_incremental(conn)
+            conn.close()
+        if (day + 1) % QUARTER == 0:
+            pruned, kept = measure(pruned_db, now, city, args.repeats), measure(kept_db, now, city, args.repeats)
+            quarters.append((day + 1, pruned, kept))
+            print(f"{day + 1:>5} | " + " | ".join(
+                f"{m['mb']:>7.1f} {m['rows']:>10,} {m['last_24h']:>7.2f} {m['daily_metrics']:>8.2f} {m['raw_scan']:>7.2f}"
+                for m in (pruned, kept)))
+    for writer in writers:
+        writer.close()
+
+    print(f"\n{args.days} days x {args.cities} cities in {time.perf_counter() - start:.1f}s; "
+          f"{passes} retention passes, {retention_seconds:.1f}s in total, longest delete transaction {max_batch_ms:.1f}ms")
+
+    failures = []
+    steady = next(m for day, m, _ in quarters if day >= steady_day)
+    last = quarters[-1][1]
+    if last["mb"] > steady["mb"] * (1 + args.tolerance):
+        failures.append(f"database grew from {steady['mb']:.1f}MB to {last['mb']:.1f}MB")
+    if last["raw_scan"] > steady["raw_scan"] * (1 + args.tolerance) + 1.0:
+        failures.append(f"raw scan slowed from {steady['raw_scan']:.2f}ms to {last['raw_scan']:.2f}ms")
+    if max_batch_ms > args.max_batch_ms:
+        failures.append(f"a delete transaction took {max_batch_ms:.1f}ms")
+
+    conn = sqlite3.connect(pruned_db)
+    days, short = conn.execute(
+        "SELECT COUNT(DISTINCT date_utc), SUM(samples != ?) FROM weather_metrics WHERE city_name = ?;", (samples, city)
+    ).fetchone()
+    oldest = conn.execute("SELECT MIN(ts_utc) FROM weather_raw;").fetchone()[0]
+    conn.close()
+    complete_days = args.days - args.days % args.every
+    if days < complete_days or short:
+        failures.append(f"weather_metrics holds {days} days of {city} ({short} incomplete), expected {complete_days}")
+    if oldest is None or oldest < now - (keep_days + args.every) * DAY:
+        failures.append("weather_raw still holds rows past the retention window")
+    files = sum(1 for _ in iter_raw_json_files(data_dir))
+    partitions = sum(1 for p in Path(archive_dir).glob("date=*")) if os.path.isdir(archive_dir) else 0
+    print(f"weather_metrics: {days} days of {city}; data/: {files} raw files; archive: {partitions} daily partitions")
+    if files > (keep_days + args.every) * args.files_per_day or (args.files_per_day and not partitions):
+        failures.append(f"{files} raw files left in the data directory")
+    tmp.cleanup()
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if not failures:
+        print("PASS size and scan latency flat after steady state, rollups complete")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Load test of the sharded ingestion (run_sharded) against the local stub server.
+
+    python -m benchmarks.bench_sharded --cities 10000 --workers 1 2 4 --latency-ms 100
+    python -m benchmarks.bench_sharded --cities 5000 --workers 4 --kill-after 2
+
+Every city is made due at once and the time until all of them reach the writer is measured,
+for each number of worker processes. The stub runs in its own process so it does not share
+the coordinator's interpreter. --kill-after SIGKILLs one worker that many seconds into the
+last run: its cities must be taken over and every city still stored exactly once.
+--work-queue postgres (with --pg-dsn, or --embedded-pg to start a throwaway server with
+pgserver) runs the queue in PostgreSQL. Exits non-zero if a run misses cities.
+"""
+import argparse
+import logging as std_logging
+import multiprocessing
+import os
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+from benchmarks.mock_owm import fake_weather
+from main import run_sharded
+from src.utils.weather_writer import WeatherWriter
+from src.utils.work_queue import DEFAULT_LEASE_SECONDS
+
+
+def start_stub(latency_ms):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.mock_owm", "--port", str(port), "--latency-ms", str(latency_ms)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f"{base_url}/data/2.5/weather?q=probe", timeout=1).read()
+            return process, base_url
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("the stub server did not start")
+
+
+def kill_one_worker(after, killed):
+    def kill():
+        time.sleep(after)
+        workers = [p for p in multiprocessing.active_children() if p.name.startswith("shard-")]
+        if workers:
+            os.kill(workers[0].pid, signal.SIGKILL)
+            killed.append(workers[0].pid)
+    threading.Thread(target=kill, daemon=True).start()
+
+
+def run(cities, workers, base_url, args, kill_after=None, pg_dsn=None):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "weather.db")
+        writer = WeatherWriter(db_path, batch_size=5000, flush_interval=1.0, wal=True, synchronous="NORMAL")
+        config = {
+            "api_key": "bench-key", "base_url": base_url,
+            "queue": args.work_queue, "queue_db": os.path.join(tmp, "queue.db"), "pg_dsn": pg_dsn,
+            "concurrency": args.concurrency, "calls_per_minute": 0, "retries": 2,
+            "breaker_threshold": 0, "breaker_reset": 60.0, "claim_size": args.claim_size, "lease": args.lease,
+        }
+        if pg_dsn:
+            reset_pg_queue(pg_dsn)
+        killed = []
+        if kill_after:
+            kill_one_worker(kill_after, killed)
+        give_up_at = time.monotonic() + args.timeout
+        start = time.perf_counter()
+        run_sharded(
+            {city: 3600.0 for city in cities}, db_path, tmp, workers, config, writer, spread=False,
+            stop_when=lambda: writer.rows_received >= len(cities) or time.monotonic() > give_up_at,
+        )
+        elapsed = time.perf_counter() - start
+        writer.close()
+        with sqlite3.connect(db_path) as conn:
+            stored, rows = conn.execute("SELECT COUNT(DISTINCT city_id), COUNT(*) FROM weather_raw").fetchone()
+        return elapsed, stored, rows, killed
+
+
+def reset_pg_queue(dsn):
+    import psycopg2
+
+    with psycopg2.connect(dsn) as conn, conn.cursor() as cur:
+        cur.execute("DROP TABLE IF EXISTS work_items, work_workers")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the coordinator/worker mode.")
+    parser.add_argument("--cities", type=int, default=5000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--concurrency", type=int, default=16, help="Fetch threads per worker")
+    parser.add_argument("--claim-size", type=int, default=100)
+    parser.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS)
+    parser.add_argument("--kill-after", type=float, help="SIGKILL one worker this many seconds into the last run")
+    parser.add_argument("--work-queue", choices=["sqlite", "postgres"], default="sqlite")
+    parser.add_argument("--pg-dsn", default=os.getenv("WEATHER_PG_DSN"))
+    parser.add_argument("--embedded-pg", action="store_true", help="Start a throwaway PostgreSQL with pgserver")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Seconds before a run is given up")
+    args = parser.parse_args()
+    std_logging.disable(std_logging.WARNING)  # the coordinator's logs; workers log to logs/worker-N.log
+
+    pg_dsn, pg_server = args.pg_dsn, None
+    if args.work_queue == "postgres" and args.embedded_pg:
+        import pgserver
+
+        pg_server = pgserver.get_server(tempfile.mkdtemp(), cleanup_mode="stop")
+        pg_dsn = pg_server.get_uri()
+
+    stub, base_url = start_stub(args.latency_ms)
+    cities = [f"City{i:06d}" for i in range(args.cities)]
+    # the stub derives ids from a hash of the name: a collision stores two cities as one
+    expected = len({fake_weather(city, 0)["id"] for city in cities})
+    ok = True
+    try:
+        print(f"{'workers':>7} {'seconds':>8} {'cities/s':>9} {'stored':>7} {'rows':>7}  note")
+        for i, workers in enumerate(args.workers):
+            kill_after = args.kill_after if i == len(args.workers) - 1 else None
+            elapsed, stored, rows, killed = run(cities, workers, base_url, args, kill_after, pg_dsn)
+            note = f"killed worker pid {killed[0]}" if killed else ""
+            complete = stored == expected
+            ok &= complete
+            print(f"{workers:>7} {elapsed:>8.2f} {stored / elapsed:>9.0f} {stored:>7} {rows:>7}  {note}"
+                  + ("" if complete else "  MISSING CITIES"))
+    finally:
+        stub.terminate()
+        if pg_server:
+            pg_server.cleanup()
+    print("PASS every city stored" if ok else "FAIL some cities were not stored")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Cold-start time of each CLI mode, based on `python -X importtime`.
+
+    python -m benchmarks.bench_startup --repeats 5
+    python -m benchmarks.bench_startup --modes aggregate replay --json startup.json
+
+Each mode runs in a fresh interpreter inside an empty temp directory (so it works on an empty
+database and never touches data/). For every mode it reports the median wall time, the total
+import time and the heaviest top-level imports, which is what to look at when a mode regresses.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+MODES = {
+    "help": ["main.py", "--help"],
+    "aggregate": ["main.py", "--aggregate", "new"],
+    "replay": ["main.py", "replay", "--data-dir", "empty", "--workers", "1"],
+    "fetch-setup": ["-c", "import main; from src.utils.http_client import create_session; create_session()"],
+    "dashboard-import": ["-c", "import app"],
+}
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def parse_importtime(stderr):
+    """Return {top-level module: cumulative microseconds} from -X importtime output."""
+    top = {}
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match and len(match.group(3)) == 1:
+            top[match.group(4)] = int(match.group(2))
+    return top
+
+
+def run_mode(args, cwd):
+    script = args[0]
+    if script.endswith(".py"):
+        args = [str(PROJECT_ROOT / script)] + args[1:]
+    env = dict(os.environ, PYTHONPATH=str(PROJECT_ROOT))
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime"] + args, cwd=cwd, env=env,
+                          capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    return proc.returncode, wall_ms, parse_importtime(proc.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start time per CLI mode.")
+    parser.add_argument("--modes", nargs="+", choices=sorted(MODES), default=list(MODES))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="Heaviest imports to show per mode")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, "empty"))
+        for mode in args.modes:
+            walls, imports, returncode = [], [], 0
+            for _ in range(args.repeats):
+                returncode, wall_ms, top = run_mode(MODES[mode], tmp)
+                walls.append(wall_ms)
+                imports.append(top)
+            if returncode != 0:
+                print(f"{mode:<17} skipped (exit code {returncode}, missing dependency?)")
+                continue
+            import_ms = statistics.median(sum(top.values()) for top in imports) / 1000
+            heaviest = sorted(imports[-1].items(), key=lambda kv: kv[1], reverse=True)[:args.top]
+            results[mode] = {
+                "wall_ms": round(statistics.median(walls), 1),
+                "import_ms": round(import_ms, 1),
+                "heaviest_imports_ms": {name: round(us / 1000, 1) for name, us in heaviest},
+            }
+            print(f"{mode:<17} wall={results[mode]['wall_ms']:8.1f}ms  imports={import_ms:8.1f}ms  "
+                  + ", ".join(f"{name}={ms}ms" for name, ms in results[mode]["heaviest_imports_ms"].items()))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Per-record parsing of API responses versus the columnar batch transform.
+
+    python -m benchmarks.bench_transform --responses 100000 --bad 0.01
+
+"per-dict" is the previous path, kept here as the baseline: is_complete_response +
+build_weather_row for every response.
+"batch" is src.utils.weather_transform.transform_batch, timed to its columns and to the row
+tuples fed to the writer. --archive also compares RawArchiveWriter.append per response with
+append_batch per --archive-batch responses. Rows of the valid responses must be
+identical on both paths; the script exits non-zero otherwise.
+"""
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks.mock_owm import fake_weather
+from src.utils.weather_transform import transform_batch
+
+CAPTURED = "20240101T000000Z"
+
+
+def is_complete_response(data):
+    """Return True if an OpenWeatherMap response carries the fields needed for a weather_raw row."""
+    return bool(data) and "main" in data and "weather" in data
+
+
+def build_weather_row(data, captured_at_utc):
+    """Turn one response into a weather_raw row, in the column order of INSERT_WEATHER_RAW_SQL."""
+    dt = data.get("dt", 0)
+    weather = data.get("weather", [{}])[0]
+    return (
+        data.get("name", "Unknown"),
+        str(data.get("id", "Unknown")),
+        data.get("sys", {}).get("country", "Unknown"),
+        dt,
+        datetime.fromtimestamp(dt, tz=timezone.utc).strftime("%Y-%m-%d") if dt else "",
+        captured_at_utc,
+        data.get("main", {}).get("temp", -273.15),
+        data.get("main", {}).get("feels_like", -273.15),
+        data.get("main", {}).get("humidity", 0),
+        data.get("main", {}).get("pressure", 0),
+        data.get("wind", {}).get("speed", 0),
+        data.get("wind", {}).get("deg", 0),
+        weather.get("main", "Unknown"),
+        weather.get("description", "Unknown"),
+    )
+
+
+def make_responses(count, cities, bad_ratio, seed=0):
+    """Synthetic responses, a bad_ratio share of them broken in the ways seen in practice."""
+    rnd = random.Random(seed)
+    responses = [fake_weather(f"City{i % cities:05d}", 1_700_000_000 + (i // cities) * 600) for i in range(count)]
+    breakages = (
+        lambda d: d.pop("main"),
+        lambda d: d["main"].pop("temp"),
+        lambda d: d["main"].update(humidity=140),
+        lambda d: d["main"].update(temp="n/a"),
+        lambda d: d.pop("dt"),
+    )
+    for d in rnd.sample(responses, int(count * bad_ratio)):
+        rnd.choice(breakages)(d)
+    return responses
+
+
+def per_dict(responses):
+    return [build_weather_row(d, CAPTURED) for d in responses if is_complete_response(d)]
+
+
+def measure(func, repeats):
+    samples, result = [], None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), result
+
+
+def archive_run(responses, batch_size):
+    from src.utils.raw_archive import RawArchiveWriter
+
+    captured_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = RawArchiveWriter(tmp, max_rows=len(responses) + 1)
+        if batch_size:
+            for i in range(0, len(responses), batch_size):
+                group = responses[i:i + batch_size]
+                cities = [d.get("name", "") for d in group]
+                archive.append_batch(cities, group, transform_batch(group, CAPTURED), captured_at)
+        else:
+            for d in responses:
+                archive.append(d.get("name", ""), d, captured_at)
+        archive.close()
+        return archive.rows_written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the batch response transform.")
+    parser.add_argument("--responses", type=int, default=100_000)
+    parser.add_argument("--cities", type=int, default=500)
+    parser.add_argument("--bad", type=float, default=0.01, help="Share of malformed responses")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--archive", action="store_true", help="Also time the Parquet archive paths")
+    parser.add_argument("--archive-batch", type=int, default=1000, help="Responses per append_batch call")
+    args = parser.parse_args()
+
+    responses = make_responses(args.responses, args.cities, args.bad)
+    legacy_s, legacy_rows = measure(lambda: per_dict(responses), args.repeats)
+    columns_s, batch = measure(lambda: transform_batch(responses, CAPTURED), args.repeats)
+    rows_s, rows = measure(lambda: transform_batch(responses, CAPTURED).rows(), args.repeats)
+
+    n = args.responses
+    print(f"{'path':<18} {'seconds':>8} {'responses/s':>12} {'rows':>8}")
+    print(f"{'per-dict':<18} {legacy_s:>8.3f} {n / legacy_s:>12,.0f} {len(legacy_rows):>8,}")
+    print(f"{'batch (columns)':<18} {columns_s:>8.3f} {n / columns_s:>12,.0f} {batch.valid_count:>8,}")
+    print(f"{'batch (rows)':<18} {rows_s:>8.3f} {n / rows_s:>12,.0f} {len(rows):>8,}")
+    print(f"speedup to rows: {legacy_s / rows_s:.1f}x   {batch.summary()}")
+
+    if args.archive:
+        for name, batch_size in (("archive per-dict", 0), ("archive batch", args.archive_batch)):
+            seconds, written = measure(lambda: archive_run(responses, batch_size), 1)
+            print(f"{name:<18} {seconds:>8.3f} {n / seconds:>12,.0f} {written:>8,}")
+
+    # the per-dict path keeps some responses the batch checks reject: compare the ones both accept
+    accepted = [build_weather_row(d, CAPTURED) for d, ok in zip(responses, batch.valid) if ok]
+    same = accepted == rows
+    print(f"{'PASS' if same else 'FAIL'} valid rows identical on both paths")
+    sys.exit(0 if same else 1)
+
+
+if __name__ == "__main__":
+    main()
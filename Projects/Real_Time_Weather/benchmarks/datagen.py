@@ -0,0 +1,130 @@
+"""
+Seeded synthetic datasets for the benchmarks: weather_raw rows and raw API responses.
+
+    python -m benchmarks.datagen --rows 10000000 --cities 5000 --db data/bench/weather.db
+    python -m benchmarks.datagen --raw-files 50000 --cities 500 --raw-dir data/bench/raw
+
+Rows are spread evenly over `cities` cities, one sample every --interval seconds up to NOW, so
+the same arguments always produce the same database. They are loaded into a bare weather_raw
+table with journaling off and the schema migrations run afterwards, like an old database being
+upgraded: indexes, the cities table and the rollups are built once instead of row by row, which
+keeps 100M rows practical. Raw responses are the payloads of the stub server (mock_owm), written
+as raw_<city>_<ts>.json files the way the ingestor does.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks.mock_owm import fake_weather
+from src.utils.weather_db import INSERT_WEATHER_RAW_SQL, create_metrics_table, create_weather_table, migrate_schema
+
+NOW = 1_750_000_000
+CHUNK = 100_000
+INTERVAL = 600
+
+
+def city_name(city: int):
+    return f"City{city:05d}"
+
+
+def synthetic_rows(rows, cities, seed=42, end_ts=NOW, interval=INTERVAL):
+    """Yield weather_raw rows spread evenly over `cities` cities, one sample every `interval` seconds before end_ts."""
+    rnd = random.Random(seed)
+    names = [city_name(city) for city in range(cities)]
+    ids = [str(city) for city in range(cities)]
+    per_city = max(1, rows // cities)
+    for i in range(rows):
+        city = i % cities
+        ts = end_ts - (per_city - i // cities) * interval
+        yield (
+            names[city], ids[city], "XX", ts, "", "bench",
+            round(rnd.uniform(-10, 35), 2), 0.0, rnd.randint(10, 100), 1013, 3.0, 180, "Clear", "clear sky",
+        )
+
+
+def synthetic_ticks(ticks, cities, end_ts=NOW, interval=INTERVAL):
+    """
+    Yield (captured_at_utc, responses) for `ticks` ingestor ticks ending at end_ts, each with the
+    current weather payload of every city as the stub server answers it.
+    """
+    names = [city_name(city) for city in range(cities)]
+    for tick in range(ticks):
+        fetched = end_ts - (ticks - 1 - tick) * interval
+        captured_at = datetime.fromtimestamp(fetched, tz=timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        yield captured_at, [fake_weather(name, fetched) for name in names]
+
+
+def write_raw_files(data_dir, files, cities, end_ts=NOW, interval=INTERVAL):
+    """Write `files` raw responses spread over `cities` cities, `interval` seconds apart, like the ingestor does."""
+    for i in range(files):
+        city = city_name(i % cities)
+        fetched = end_ts - (i // cities) * interval
+        data = fake_weather(city, fetched)
+        ts = datetime.fromtimestamp(fetched, tz=timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        with open(os.path.join(data_dir, f"raw_{city}_{ts}.json"), "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def load(conn, rows, cities, seed=42, end_ts=NOW, interval=INTERVAL):
+    """Load `rows` synthetic rows into an empty database, then migrate it to the current schema."""
+    conn.execute("PRAGMA journal_mode=OFF;")
+    conn.execute("PRAGMA synchronous=OFF;")
+    # Create the bare table first and migrate after loading, like an old database would
+    conn.execute("PRAGMA user_version = 0;")
+    conn.execute("""
+        CREATE TABLE weather_raw (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, city_name TEXT NOT NULL, city_id TEXT NOT NULL,
+        country TEXT NOT NULL, ts_utc INTEGER NOT NULL, date_str TEXT NOT NULL,
+        captured_at_utc TEXT NOT NULL, temp_c REAL NOT NULL, feels_like_c REAL NOT NULL,
+        humidity REAL NOT NULL, pressure REAL NOT NULL, wind_speed REAL NOT NULL,
+        wind_deg REAL NOT NULL, weather_main TEXT, weather_desc TEXT, UNIQUE(city_id, ts_utc))
+    """)
+    gen = synthetic_rows(rows, cities, seed, end_ts, interval)
+    start = time.perf_counter()
+    while True:
+        chunk = [row for _, row in zip(range(CHUNK), gen)]
+        if not chunk:
+            break
+        with conn:
+            conn.executemany(INSERT_WEATHER_RAW_SQL, chunk)
+    print(f"loaded {rows:,} rows in {time.perf_counter() - start:.1f}s")
+    start = time.perf_counter()
+    create_weather_table(conn)  # runs the pending migrations
+    create_metrics_table(conn)
+    print(f"migrated to schema version {migrate_schema(conn)} in {time.perf_counter() - start:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic weather_raw database and/or raw JSON files.")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="weather_raw rows to load into --db")
+    parser.add_argument("--cities", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--interval", type=int, default=INTERVAL, help="Seconds between two samples of a city")
+    parser.add_argument("--db", help="SQLite database to create (must not exist)")
+    parser.add_argument("--raw-dir", help="Directory to write raw_<city>_<ts>.json files to")
+    parser.add_argument("--raw-files", type=int, default=10_000)
+    args = parser.parse_args()
+    if not args.db and not args.raw_dir:
+        parser.error("give --db and/or --raw-dir")
+
+    if args.db:
+        if os.path.exists(args.db):
+            parser.error(f"{args.db} already exists")
+        Path(args.db).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(args.db)
+        load(conn, args.rows, args.cities, args.seed, interval=args.interval)
+        conn.close()
+    if args.raw_dir:
+        Path(args.raw_dir).mkdir(parents=True, exist_ok=True)
+        start = time.perf_counter()
+        write_raw_files(args.raw_dir, args.raw_files, args.cities, interval=args.interval)
+        print(f"wrote {args.raw_files:,} raw files in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Local stub of the OpenWeatherMap current weather endpoints.
+
+It answers GET /data/2.5/weather?q=<city> with a deterministic payload and
+GET /data/2.5/group?id=<id>,<id>,... with {"cnt": n, "list": [payload, ...]} for the city ids
+it has handed out (a restarted stub has forgotten them), after an artificial latency, and can reply 429 Too Many Requests for a fraction of the calls so the fetch engine
+can be exercised without touching the real API or burning quota.
+It also injects the faults the retry layer has to survive: a share of 5xx answers, calls that
+hang past the client timeout, dropped connections, cities that always fail or always hang, and
+an outage window during which every call is answered 503.
+
+Run standalone:
+    python -m benchmarks.mock_owm --port 8765 --latency-ms 200 --rate-429 0.05
+    python -m benchmarks.mock_owm --rate-500 0.1 --rate-hang 0.02 --hang-city Oslo --outage 60:30
+then point the ingestor at it:
+    python main.py London Paris --base-url http://127.0.0.1:8765
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def fake_weather(city: str, now: float = None):
+    """Build a deterministic OpenWeatherMap-like payload for city."""
+    now = time.time() if now is None else now
+    city_id = zlib.crc32(city.lower().encode("utf-8")) % 10_000_000
+    dt = int(now // 600 * 600)
+    rnd = random.Random(city_id ^ dt)
+    return {
+        "coord": {"lon": 0.0, "lat": 0.0},
+        "weather": [{"id": 800, "main": "Clear", "description": "clear sky", "icon": "01d"}],
+        "main": {
+            "temp": round(rnd.uniform(-10, 35), 2),
+            "feels_like": round(rnd.uniform(-12, 37), 2),
+            "pressure": rnd.randint(980, 1040),
+            "humidity": rnd.randint(10, 100),
+        },
+        "wind": {"speed": round(rnd.uniform(0, 15), 2), "deg": rnd.randint(0, 359)},
+        "dt": dt,
+        "sys": {"country": "XX"},
+        "id": city_id,
+        "name": city,
+        "cod": 200,
+    }
+
+
+class MockState:
+    """
+    Settings and counters shared by all request handler threads.
+    rate_500, rate_hang and rate_drop are the shares of calls answered 500, held for hang_ms
+    before answering, or closed without an answer. fail_cities and hang_cities always fail or
+    hang. outage is a (start, duration) window in seconds from now during which every call is
+    answered 503; down can also be flipped while the server runs.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, rate_429: float = 0.0, retry_after: int = 1, seed: int = 0,
+                 rate_500: float = 0.0, rate_hang: float = 0.0, rate_drop: float = 0.0, hang_ms: float = 30_000.0,
+                 fail_cities=(), hang_cities=(), outage=None):
+        self.latency_ms = latency_ms
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.rate_500 = rate_500
+        self.rate_hang = rate_hang
+        self.rate_drop = rate_drop
+        self.hang_ms = hang_ms
+        self.fail_cities = {city.lower() for city in fail_cities}
+        self.hang_cities = {city.lower() for city in hang_cities}
+        self.outage = None if outage is None else (time.monotonic() + outage[0], time.monotonic() + sum(outage))
+        self.down = False
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.faults = {}  # fault -> calls it was injected in
+        self.names = {}  # city id -> city name, for the group endpoint
+
+    def fault(self, city: str = None):
+        """Count the call and pick what goes wrong with it: None, "429", "500", "503", "hang" or "drop"."""
+        city = (city or "").lower()
+        with self.lock:
+            self.requests += 1
+            now = time.monotonic()
+            if self.down or (self.outage and self.outage[0] <= now < self.outage[1]):
+                fault = "503"
+            elif city in self.fail_cities:
+                fault = "500"
+            elif city in self.hang_cities:
+                fault = "hang"
+            else:
+                fault = None
+                draw = self.random.random()
+                for name, rate in (("429", self.rate_429), ("500", self.rate_500),
+                                   ("hang", self.rate_hang), ("drop", self.rate_drop)):
+                    if draw < rate:
+                        fault = name
+                        break
+                    draw -= rate
+            if fault:
+                self.faults[fault] = self.faults.get(fault, 0) + 1
+                if fault == "429":
+                    self.throttled += 1
+            return fault
+
+    def weather(self, city):
+        data = fake_weather(city)
+        with self.lock:
+            self.names[data["id"]] = city
+        return data
+
+    def group(self, ids):
+        with self.lock:
+            names = [self.names.get(int(city_id)) for city_id in ids if city_id.isdigit()]
+        items = [fake_weather(name) for name in names if name]
+        return {"cnt": len(items), "list": items}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    state: MockState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, body: dict, headers: dict = None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up waiting, e.g. on a hanging call
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if self.state.latency_ms:
+            time.sleep(self.state.latency_ms / 1000.0)
+        fault = self.state.fault(query.get("q"))
+        if fault == "429":
+            self.send_json(429, {"cod": 429, "message": "rate limited"}, {"Retry-After": str(self.state.retry_after)})
+            return
+        if fault in ("500", "503"):
+            self.send_json(int(fault), {"cod": fault, "message": "internal error" if fault == "500" else "service unavailable"})
+            return
+        if fault == "drop":
+            self.close_connection = True
+            return
+        if fault == "hang":
+            time.sleep(self.state.hang_ms / 1000.0)
+        if url.path == "/data/2.5/weather" and query.get("q"):
+            self.send_json(200, self.state.weather(query["q"]))
+            return
+        if url.path == "/data/2.5/group" and query.get("id"):
+            ids = query["id"].split(",")
+            if len(ids) > 20:
+                self.send_json(400, {"cod": "400", "message": "too many cities, 20 at most"})
+                return
+            self.send_json(200, self.state.group(ids))
+            return
+        self.send_json(404, {"cod": "404", "message": "city not found"})
+
+
+def start_mock_server(host: str = "127.0.0.1", port: int = 0, **state_kwargs):
+    """
+    Start the stub server in a background thread.
+    Returns (server, base_url); call server.shutdown() when done.
+    Port 0 picks a free port.
+    """
+    handler = type("BoundMockHandler", (MockHandler,), {"state": MockState(**state_kwargs)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="mock-owm", daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local OpenWeatherMap stub server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="Artificial latency per request")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429")
+    parser.add_argument("--rate-500", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--rate-hang", type=float, default=0.0, help="Fraction of requests held for --hang-ms")
+    parser.add_argument("--rate-drop", type=float, default=0.0, help="Fraction of requests closed without an answer")
+    parser.add_argument("--hang-ms", type=float, default=30_000.0, help="How long a hanging request is held")
+    parser.add_argument("--fail-city", action="append", default=[], help="City always answered with 500 (repeatable)")
+    parser.add_argument("--hang-city", action="append", default=[], help="City whose requests always hang (repeatable)")
+    parser.add_argument("--outage", metavar="START:SECONDS", help="Answer every request with 503 from START seconds after startup, for SECONDS")
+    args = parser.parse_args()
+
+    outage = tuple(float(v) for v in args.outage.split(":", 1)) if args.outage else None
+    server, base_url = start_mock_server(
+        args.host, args.port,
+        latency_ms=args.latency_ms, rate_429=args.rate_429, retry_after=args.retry_after,
+        rate_500=args.rate_500, rate_hang=args.rate_hang, rate_drop=args.rate_drop, hang_ms=args.hang_ms,
+        fail_cities=args.fail_city, hang_cities=args.hang_city, outage=outage,
+    )
+    print(f"Mock OpenWeatherMap listening on {base_url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
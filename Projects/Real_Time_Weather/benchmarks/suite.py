@@ -0,0 +1,435 @@
+"""
+End-to-end benchmark suite of the weather pipeline, with machine-readable results and regression checks.
+
+    python -m benchmarks.suite
+    python -m benchmarks.suite --rows 100000000 --cities 5000 --dataset-dir data/bench
+    python -m benchmarks.suite --scenarios tick ingest --baseline data/benchmarks/3f2c1ab.json
+    python -m benchmarks.suite compare data/benchmarks/3f2c1ab.json data/benchmarks/9e8d7c6.json
+
+Scenarios, each run in a fresh interpreter so that its peak RSS is its own:
+  tick       run_once over --tick-cities cities against the stub server (started in another
+             process), after one untimed tick: tick latency and cities/sec.
+  ingest     --ingest-ticks ticks of stub payloads through transform_batch and a WeatherWriter
+             into an empty database: rows/sec.
+  aggregate  on the dataset: the first aggregate_new_metrics (every day recomputed), appending
+             one tick of rows, merging it incrementally, and recomputing the last day.
+  dashboard  the DashboardData calls of app.py on the dataset for --queries random cities,
+             every one read from the database: p50/p95 latency.
+The dataset is --rows synthetic weather_raw rows over --cities cities (benchmarks.datagen). With
+--dataset-dir it is kept there, named after its parameters, and reused by later runs.
+
+The results (with the commit, the machine and the configuration) are written to --output,
+data/benchmarks/<commit>.json by default. Every metric listed in benchmarks/thresholds.json is
+checked against its absolute budget ("max"/"min") and, when a baseline is given, against the
+baseline value: it regresses when it is worse by more than "tolerance" (relative) and "slack"
+(absolute, in the metric's unit). Runs of different configurations are compared with a warning.
+Exits non-zero when a scenario fails its own checks or a metric regresses.
+"""
+import argparse
+import json
+import logging as std_logging
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+THRESHOLDS_FILE = Path(__file__).resolve().parent / "thresholds.json"
+DEFAULT_OUTPUT_DIR = "data/benchmarks"
+SCENARIOS = ("tick", "ingest", "aggregate", "dashboard")
+
+
+def percentiles(samples):
+    """p50 and p95 of samples, in milliseconds, rounded."""
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return round(statistics.median(ordered) * 1000, 3), round(p95 * 1000, 3)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB."""
+    try:
+        # VmHWM starts over at exec; ru_maxrss on Linux keeps the high-water mark of the forked parent
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)  # bytes on macOS, KiB elsewhere
+
+
+# --------- Scenarios (run in the child interpreter) ---------
+
+def scenario_tick(config, dataset, tmp):
+    from benchmarks.bench_sharded import start_stub
+    from benchmarks.mock_owm import fake_weather
+    from benchmarks.datagen import city_name
+    from main import run_once
+    from src.utils.http_client import create_session
+    from src.utils.weather_writer import WeatherWriter
+
+    cities = [city_name(city) for city in range(config["tick_cities"])]
+    db_path = os.path.join(tmp, "tick.db")
+    stub, base_url = start_stub(config["latency_ms"])
+    try:
+        writer = WeatherWriter(db_path)
+        opts = dict(concurrency=config["concurrency"], session=create_session(config["concurrency"]),
+                    base_url=base_url, writer=writer)
+        run_once(cities, "bench-key", db_path, tmp, **opts)  # connections, schema, first rows
+        samples = []
+        for _ in range(config["ticks"]):
+            start = time.perf_counter()
+            run_once(cities, "bench-key", db_path, tmp, **opts)
+            samples.append(time.perf_counter() - start)
+        writer.close()
+    finally:
+        stub.terminate()
+    with sqlite3.connect(db_path) as conn:
+        stored = conn.execute("SELECT COUNT(DISTINCT city_id) FROM weather_raw;").fetchone()[0]
+    # the stub derives ids from a hash of the name: a collision stores two cities as one
+    expected = len({fake_weather(city, 0)["id"] for city in cities})
+    return {
+        "p50_s": round(statistics.median(samples), 4),
+        "max_s": round(max(samples), 4),
+        "cities_per_s": round(len(cities) / statistics.median(samples), 1),
+        "ok": stored == expected,
+    }
+
+
+def scenario_ingest(config, dataset, tmp):
+    from benchmarks.datagen import synthetic_ticks
+    from src.utils.weather_transform import transform_batch
+    from src.utils.weather_writer import WeatherWriter
+
+    writer = WeatherWriter(os.path.join(tmp, "ingest.db"), flush_interval=0)
+    transform_s = write_s = 0.0
+    responses = 0
+    for captured_at, payloads in synthetic_ticks(config["ingest_ticks"], config["cities"]):
+        start = time.perf_counter()
+        rows = transform_batch(payloads, captured_at).rows()
+        transform_s += time.perf_counter() - start
+        start = time.perf_counter()
+        writer.add_many(rows)
+        write_s += time.perf_counter() - start
+        responses += len(payloads)
+    start = time.perf_counter()
+    writer.close()
+    write_s += time.perf_counter() - start
+    inserted = writer.stats()["rows_inserted"]
+    return {
+        "rows_per_s": round(inserted / (transform_s + write_s), 1),
+        "transform_s": round(transform_s, 3),
+        "write_s": round(write_s, 3),
+        "ok": inserted == writer.stats()["rows_received"] == responses,
+    }
+
+
+def scenario_aggregate(config, dataset, tmp):
+    from benchmarks.datagen import INTERVAL, synthetic_rows
+    from main import aggregate_new_metrics, aggregate_weather_metrics, get_date_window_ts
+    from src.utils.weather_writer import WeatherWriter
+
+    with sqlite3.connect(dataset) as conn:
+        # forget the previous runs: the next aggregation recomputes every day
+        conn.execute("DELETE FROM aggregation_state;")
+        conn.execute("DELETE FROM weather_metrics;")
+        rows = conn.execute("SELECT MAX(id) FROM weather_raw;").fetchone()[0]
+        last_ts = conn.execute("SELECT MAX(ts_utc) FROM weather_raw;").fetchone()[0]
+
+    start = time.perf_counter()
+    aggregate_new_metrics(dataset)
+    full_s = time.perf_counter() - start
+
+    # one more tick of every city, after the newest row (a reused dataset grows by one tick per run)
+    start = time.perf_counter()
+    with WeatherWriter(dataset, flush_interval=0) as writer:
+        writer.add_many(list(synthetic_rows(config["cities"], config["cities"], seed=rows, end_ts=last_ts + 2 * INTERVAL)))
+    append_s = time.perf_counter() - start
+    start = time.perf_counter()
+    merged = aggregate_new_metrics(dataset)
+    incremental_s = time.perf_counter() - start
+
+    day = datetime.fromtimestamp(last_ts, tz=timezone.utc).strftime("%Y-%m-%d")
+    start = time.perf_counter()
+    written = aggregate_weather_metrics(dataset, *get_date_window_ts(day))
+    day_s = time.perf_counter() - start
+    return {
+        "full_s": round(full_s, 3),
+        "full_rows_per_s": round(rows / full_s, 1),
+        "append_tick_ms": round(append_s * 1000, 3),
+        "incremental_ms": round(incremental_s * 1000, 3),
+        "day_ms": round(day_s * 1000, 3),
+        "ok": merged == config["cities"] and written > 0,
+    }
+
+
+def scenario_dashboard(config, dataset, tmp):
+    from benchmarks.datagen import NOW, city_name
+    from src.utils.dashboard_data import DashboardData
+
+    # every call reads from the database, as for a viewer of a city nobody looked at lately
+    data = DashboardData(dataset, refresh_interval=0, full_refresh_interval=0, clock=lambda: NOW)
+    rnd = random.Random(config["seed"])
+    calls = {
+        "recent": lambda city: data.recent(city),
+        "daily": lambda city: data.daily_metrics(city, 14),
+        "history_30d": lambda city: data.history(city, NOW - 30 * 86400, NOW),
+        "history_365d": lambda city: data.history(city, NOW - 365 * 86400, NOW),
+    }
+    samples = {name: [] for name in ["cities"] + list(calls)}
+    empty = 0
+    for _ in range(config["queries"]):
+        start = time.perf_counter()
+        data.cities()
+        samples["cities"].append(time.perf_counter() - start)
+        city = city_name(rnd.randrange(config["cities"]))
+        for name, call in calls.items():
+            start = time.perf_counter()
+            result = call(city)
+            samples[name].append(time.perf_counter() - start)
+            empty += name == "recent" and not len(result["ts_utc"])
+    data.close()
+    metrics = {}
+    for name, values in samples.items():
+        metrics[f"{name}_p50_ms"], metrics[f"{name}_p95_ms"] = percentiles(values)
+    metrics["ok"] = empty == 0
+    return metrics
+
+
+def run_scenario_main(argv):
+    """`python -m benchmarks.suite run-scenario NAME CONFIG`: run one scenario and print its metrics as JSON."""
+    name, config = argv[0], json.loads(argv[1])
+    std_logging.disable(std_logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        metrics = globals()[f"scenario_{name}"](config, config.get("dataset"), tmp)
+        metrics["seconds"] = round(time.perf_counter() - start, 3)
+    metrics["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(metrics))
+
+
+# --------- Results and regression checks ---------
+
+def git_revision():
+    """(short commit, whether the project has uncommitted changes), or ("unknown", False) outside git."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--", "."], cwd=PROJECT_ROOT,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, bool(status.strip())
+
+
+def flatten(results):
+    """{"scenario.metric": value} of the numeric metrics of a results document."""
+    return {
+        f"{scenario}.{metric}": value
+        for scenario, metrics in results["scenarios"].items()
+        for metric, value in metrics.items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    }
+
+
+def check(results, thresholds, baseline=None):
+    """
+    Check the metrics of results against thresholds, and against baseline (another results
+    document) if given. Returns [(metric, baseline value, value, relative change, status)] for
+    every metric with a threshold, status being PASS, FAIL (with the reason) or MISSING.
+    """
+    current = flatten(results)
+    previous = flatten(baseline) if baseline else {}
+    report = []
+    for metric, rule in thresholds.items():
+        value, base = current.get(metric), previous.get(metric)
+        if value is None:
+            if metric.split(".")[0] in results["scenarios"]:
+                report.append((metric, base, None, None, "MISSING"))
+            continue
+        lower = rule.get("better", "lower") == "lower"
+        change = (value - base) / base if base else None
+        status = "PASS"
+        if "max" in rule and value > rule["max"]:
+            status = f"FAIL above {rule['max']}"
+        elif "min" in rule and value < rule["min"]:
+            status = f"FAIL below {rule['min']}"
+        elif change is not None:
+            worse = change if lower else -change
+            if worse > rule.get("tolerance", 0.1) and abs(value - base) > rule.get("slack", 0):
+                status = f"FAIL {worse:+.0%} worse (tolerance {rule.get('tolerance', 0.1):.0%})"
+        report.append((metric, base, value, change, status))
+    return report
+
+
+def _number(value):
+    return "-" if value is None else f"{value:,.0f}" if abs(value) >= 10_000 else f"{value:g}"
+
+
+def print_report(report):
+    print(f"{'metric':<34} {'baseline':>12} {'value':>12} {'change':>8}  status")
+    for metric, base, value, change, status in report:
+        print(f"{metric:<34} {_number(base):>12} {_number(value):>12} "
+              f"{'-' if change is None else f'{change:+.1%}':>8}  {status}")
+    return all(not status.startswith("FAIL") for *_, status in report)
+
+
+def load_results(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_thresholds(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def warn_if_incomparable(baseline, results):
+    if baseline["config"] != results["config"]:
+        changed = sorted(k for k in set(baseline["config"]) | set(results["config"])
+                         if baseline["config"].get(k) != results["config"].get(k))
+        print(f"WARNING the runs were configured differently ({', '.join(changed)}): the comparison is indicative only")
+    if baseline["machine"] != results["machine"]:
+        print("WARNING the runs were made on different machines or Python/SQLite versions")
+
+
+def compare_main(argv):
+    """`python -m benchmarks.suite compare BASELINE RESULTS`: check RESULTS against BASELINE."""
+    parser = argparse.ArgumentParser(prog="benchmarks.suite compare", description="Compare two benchmark results files.")
+    parser.add_argument("baseline")
+    parser.add_argument("results")
+    parser.add_argument("--thresholds", default=str(THRESHOLDS_FILE))
+    args = parser.parse_args(argv)
+
+    baseline, results = load_results(args.baseline), load_results(args.results)
+    print(f"baseline {baseline['commit']} ({baseline['created_at']}) -> {results['commit']} ({results['created_at']})")
+    warn_if_incomparable(baseline, results)
+    ok = print_report(check(results, load_thresholds(args.thresholds), baseline))
+    print("PASS no regression" if ok else "FAIL some metric regressed")
+    sys.exit(0 if ok else 1)
+
+
+# --------- Suite runner ---------
+
+def prepare_dataset(args, directory):
+    """Path of the synthetic dataset of these arguments, generated (and aggregated once) if missing."""
+    from benchmarks.datagen import load
+    from src.utils.weather_aggregator import aggregate_incremental
+
+    path = Path(directory) / f"weather_{args.rows}r_{args.cities}c_s{args.seed}.db"
+    if path.exists():
+        print(f"dataset: reusing {path}")
+        return str(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix(".partial")
+    partial.unlink(missing_ok=True)
+    print(f"dataset: generating {args.rows:,} rows over {args.cities:,} cities")
+    conn = sqlite3.connect(partial)
+    load(conn, args.rows, args.cities, args.seed)
+    aggregate_incremental(conn)  # the dashboard scenario reads weather_metrics
+    conn.execute("ANALYZE;")
+    conn.close()
+    partial.rename(path)
+    return str(path)
+
+
+def run_child(name, config):
+    proc = subprocess.run([sys.executable, "-m", "benchmarks.suite", "run-scenario", name, json.dumps(config)],
+                          cwd=PROJECT_ROOT, capture_output=True, text=True)
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        print(proc.stderr[-2000:], file=sys.stderr)
+        return {"ok": False, "error": f"exit code {proc.returncode}"}
+    return json.loads(lines[-1])
+
+
+def main():
+    if sys.argv[1:2] == ["run-scenario"]:
+        run_scenario_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["compare"]:
+        compare_main(sys.argv[2:])
+        return
+
+    from src.utils.http_client import DEFAULT_CONCURRENCY
+
+    parser = argparse.ArgumentParser(description="Run the end-to-end benchmark suite of the weather pipeline.")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--rows", type=int, default=1_000_000, help="weather_raw rows of the dataset")
+    parser.add_argument("--cities", type=int, default=2000, help="Cities of the dataset and of the ingest scenario")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dataset-dir", help="Keep the dataset here and reuse it (default: a temp directory)")
+    parser.add_argument("--tick-cities", type=int, default=500)
+    parser.add_argument("--ticks", type=int, default=5, help="Timed ticks of the tick scenario")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Latency of the stub server")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--ingest-ticks", type=int, default=50, help="Ticks of --cities payloads in the ingest scenario")
+    parser.add_argument("--queries", type=int, default=200, help="Cities viewed in the dashboard scenario")
+    parser.add_argument("--output", help="Results file (default data/benchmarks/<commit>.json)")
+    parser.add_argument("--baseline", help="Results file to check this run against")
+    parser.add_argument("--thresholds", default=str(THRESHOLDS_FILE))
+    args = parser.parse_args()
+
+    commit, dirty = git_revision()
+    config = {key: getattr(args, key) for key in (
+        "rows", "cities", "seed", "tick_cities", "ticks", "latency_ms", "concurrency", "ingest_ticks", "queries")}
+    results = {
+        "commit": commit,
+        "dirty": dirty,
+        "created_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "machine": {
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+        },
+        "config": config,
+        "scenarios": {},
+    }
+
+    tmp = tempfile.TemporaryDirectory()
+    try:
+        if {"aggregate", "dashboard"} & set(args.scenarios):
+            start = time.perf_counter()
+            config_with_data = dict(config, dataset=prepare_dataset(args, args.dataset_dir or tmp.name))
+            results["dataset_seconds"] = round(time.perf_counter() - start, 1)
+        else:
+            config_with_data = config
+        for name in SCENARIOS:
+            if name in args.scenarios:
+                metrics = run_child(name, config_with_data)
+                results["scenarios"][name] = metrics
+                print(f"{name:<10} " + "  ".join(f"{key}={value}" for key, value in metrics.items()))
+    finally:
+        tmp.cleanup()
+
+    output = Path(args.output or Path(DEFAULT_OUTPUT_DIR) / f"{commit}{'-dirty' if dirty else ''}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {output}")
+
+    baseline = load_results(args.baseline) if args.baseline else None
+    if baseline:
+        warn_if_incomparable(baseline, results)
+    ok = print_report(check(results, load_thresholds(args.thresholds), baseline))
+    failed = [name for name, metrics in results["scenarios"].items() if not metrics.get("ok")]
+    if failed:
+        print(f"FAIL scenario checks: {', '.join(failed)}")
+    print("PASS" if ok and not failed else "FAIL")
+    sys.exit(0 if ok and not failed else 1)
+
+
+if __name__ == "__main__":
+    main()
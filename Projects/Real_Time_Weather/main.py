@@ -1,49 +1,57 @@
 import os
-import requests
-from dotenv import load_dotenv
 from datetime import datetime, timezone
 import json
 from pathlib import Path
-from src.utils.logger import logging
+from src.utils.logger import Redactor, configure_logging, logging
 import sys
 from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
-from src.utils.weather_db import get_db_connection, create_weather_table,create_metrics_table
+from src.utils.weather_db import get_db_connection, create_weather_table,create_metrics_table, INSERT_WEATHER_RAW_SQL
+from src.utils.raw_archive import ROLL_FORMATS, RawArchiveWriter
+from src.utils.weather_aggregator import aggregate_incremental, aggregate_range
+from src.utils.weather_transform import transform_batch
+from src.utils.bulk_fetch import CityIdResolver, chunked, group_url
+from src.utils.response_cache import ResponseCache
+from src.utils.metrics import (
+    AGGREGATION, DB_COMMIT, DB_INSERT, DEFAULT_METRICS_HOST, FILE_WRITE, REGISTRY, ROWS, TICK, TRANSFORM,
+    start_metrics_server,
+)
+from src.utils.profiling import DEFAULT_PROFILE_DIR, TickProfiler
+from src.utils.storage import BACKENDS, create_backend
+from src.utils.scheduler import TimerHeapScheduler, parse_interval_overrides, spread_offsets
+from src.utils.weather_writer import DEFAULT_BATCH_SIZE, DEFAULT_FLUSH_INTERVAL, WeatherWriter
+from src.utils.http_client import (
+    DEFAULT_BASE_URL, DEFAULT_CALLS_PER_MINUTE, DEFAULT_CONCURRENCY,
+    HostRateLimiter, create_session, fetch_many, get_json, weather_url,
+)
+from src.utils.work_queue import DEFAULT_CLAIM_SIZE, DEFAULT_LEASE_SECONDS, DEFAULT_QUEUE_DB, WORK_QUEUES
+from src.utils.resilience import (
+    DEFAULT_BREAKER_RESET, DEFAULT_BREAKER_THRESHOLD, DEFAULT_RETRIES, RETRY_QUEUE_DELAY,
+    CircuitBreaker, FetchFailed, FetchPolicy, RetryQueue,
+)
 import sqlite3
+import threading
 import time
 import argparse
 from datetime import datetime, timezone, timedelta
+from contextlib import nullcontext
+from functools import partial
 
 # --------- Helper to mask API key from URLs and text content ---------
 def mask_api_key(content, api_key):
     """
     Mask the API key in the content.
-    If the content is a string, it replaces the API key with "***REDACTED***".
+    If the content is a string, it replaces the API key (and any appid= value) with "***REDACTED***".
     If the content is a dictionary or list, it recursively masks the API key in all string values.
     Returns the modified content.
     If the API key is not provided, it returns the content unchanged.
-    This is useful for logging and debugging purposes to avoid exposing sensitive information.
+    Log records do not need this: the logging pipeline redacts every line it writes.
     """
     if not api_key:
         return content
-    if isinstance(content, str):
-        content = content.replace(api_key, "***REDACTED***")
-        parts = content.split("appid=")
-        if len(parts) > 1:
-            for i in range(1, len(parts)):
-                end_idx = parts[i].find("&")
-                if end_idx != -1:
-                    parts[i] = "***REDACTED***" + parts[i][end_idx:]
-                else:
-                    parts[i] = "***REDACTED***"
-            content = "appid=".join(parts)
-        return content
-    elif isinstance(content, dict):
-        return {k: mask_api_key(v, api_key) for k, v in content.items()}
-    elif isinstance(content, list):
-        return [mask_api_key(v, api_key) for v in content]
-    return content
+    return Redactor(api_key).redact_value(content)
 
-def fetch_and_store_weather(city, api_key, db_path, out_dir):
+def fetch_and_store_weather(city, api_key, db_path, out_dir, session=None, rate_limiter=None, base_url=DEFAULT_BASE_URL, writer=None, archive=None, cache=None,
+                            policy=None, retry_queue=None):
     """
     Fetch weather data for a given city using OpenWeatherMap API and store it in the database and a JSON file.
     The city parameter can be a single city name or a comma-separated list of cities.
@@ -58,177 +66,537 @@ def fetch_and_store_weather(city, api_key, db_path, out_dir):
     and return without storing any data.
     If the data is successfully fetched, it will log the relevant information and store it in the
     database and the JSON file.
+    session is an optional shared requests.Session so connections are kept alive between calls,
+    rate_limiter an optional HostRateLimiter consulted before the request is sent, and base_url
+    the API root (it can point to a local stub server).
+    When a WeatherWriter is given the row is queued on it and written in its next batch,
+    otherwise a connection is opened for this single insert.
+    When a RawArchiveWriter is given the response goes to the Parquet archive instead of
+    its own JSON file.
+    With a ResponseCache, the call is skipped while the city's last observation is still the
+    current one, and a payload whose (city_id, dt) was already seen is not written again.
+    policy (a FetchPolicy) retries transient failures and bounds the call by its tick deadline;
+    a city still failing is pushed to retry_queue (a RetryQueue), and leaves it once fetched.
+    Returns the response payload, or None when nothing was fetched.
     """
+    import requests  # deferred: only the fetch path needs it
+
     params = {"appid": api_key, "q": city, "units": "metric"}
-    url = "https://api.openweathermap.org/data/2.5/weather"
+    url = weather_url(base_url)
+
+    if cache and not cache.should_fetch(city):
+        logging.debug("[CACHE] city=%s reason=no-new-observation-yet", city)
+        return None
 
     try:
-        resp = requests.get(url, params=params, timeout=15)
-        safe_url = mask_api_key(resp.url, api_key)
-        logging.info(f"Request sent to URL: {safe_url}")
-    except requests.exceptions.RequestException as e:
-        safe_msg = mask_api_key(str(e), api_key)
-        logging.error(f"Network error: {safe_msg}")
-        return
+        data = get_json(session or requests, url, params, rate_limiter=rate_limiter, policy=policy)
+    except FetchFailed as e:
+        logging.error(f"Fetch failed for '{city}': {e}")
+        if retry_queue:
+            retry_queue.push(city, str(e))
+        return None
+    if retry_queue:
+        retry_queue.remove(city)  # answered, even if with a permanent error: nothing to retry
+    if data is None:
+        return None
+    store_weather(city, data, db_path, out_dir, writer=writer, archive=archive, cache=cache)
+    return data
 
-    if resp.status_code != 200:
-        try:
-            err_json = resp.json()
-            safe_err = mask_api_key(err_json, api_key)
-            logging.error(f"HTTP {resp.status_code}: {safe_err}")
-        except Exception:
-            safe_text = mask_api_key(resp.text, api_key)
-            logging.error(f"HTTP {resp.status_code}: {safe_text}")
-        return
+def store_weather(city, data, db_path, out_dir, writer=None, archive=None, cache=None):
+    """
+    Store one current weather payload for the city query `city`: in its own JSON file (or in
+    archive), then as a weather_raw row through writer, or a one-off connection without one.
+    Payloads already stored are skipped when a cache is given, and the payload is recorded in it
+    once its row is committed, so a failed write is retried on the next fetch.
+    """
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug(
+            "Weather data (truncated): %s",
+            {k: data.get(k) for k in ["name", "dt", "main", "weather"]}
+        )
 
-    data = resp.json()
-    logging.info(
-        "Weather data (truncated): %s",
-        {k: data.get(k) for k in ["name", "dt", "main", "weather"]}
-    )
+    if cache and not cache.is_new(city, data):
+        logging.info("[SKIP] city=%s event=%s reason=unchanged", city, data.get("dt"))
+        return
 
-    out_dir = Path(out_dir)
-    out_dir.mkdir(parents=True, exist_ok=True)
+    captured_at = datetime.now(timezone.utc)
+    ts = captured_at.strftime("%Y%m%dT%H%M%SZ")
 
-    ts = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
-    safe_city = city.replace(" ", "_")
-    path = out_dir / f"raw_{safe_city}_{ts}.json"
+    if archive:
+        archive.append(city, data, captured_at)
+    else:
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        safe_city = city.replace(" ", "_")
+        path = out_dir / f"raw_{safe_city}_{ts}.json"
 
-    try:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        logging.info(f"Wrote data to file: {path}")
-    except OSError as e:
-        safe_msg = mask_api_key(str(e), api_key)
-        logging.error(f"File write error: {safe_msg}")
+        try:
+            with FILE_WRITE.time(), open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            logging.info("Wrote data to file: %s", path)
+        except OSError as e:
+            logging.error("File write error: %s", e)
 
     # Prepare data for database insertion
-    if not data or "main" not in data or "weather" not in data:
-        logging.error("Incomplete weather data received.")
+    with TRANSFORM.time():
+        batch = transform_batch([data], ts)
+    if not batch.valid_count:
+        logging.error("Incomplete weather data received: %s", batch.summary())
         return
 
-    city_name = data.get("name", "Unknown")
-    city_id = str(data.get("id", "Unknown"))
-    country = data.get("sys", {}).get("country", "Unknown")
-    ts_utc = data.get("dt", 0)
-    dt = data.get("dt", 0)
-    date_str = datetime.fromtimestamp(dt, tz=timezone.utc).strftime("%Y-%m-%d") if dt else ""
-    captured_at_utc = ts
-    temp_c = data.get("main", {}).get("temp", -273.15)
-    feels_like_c = data.get("main",{}).get("feels_like", -273.15)
-    humidity = data.get("main", {}).get("humidity", 0)
-    pressure = data.get("main", {}).get("pressure", 0)
-    wind_speed = data.get("wind", {}).get("speed", 0)
-    wind_deg = data.get("wind", {}).get("deg", 0)
-    weather_main = data.get("weather", [{}])[0].get("main", "Unknown")
-    weather_desc = data.get("weather", [{}])[0].get("description", "Unknown")
+    row = batch.rows()[0]
+    city_name, ts_utc, temp_c, humidity, wind_speed = row[0], row[3], row[6], row[8], row[10]
+
+    if writer:
+        writer.add(row, on_written=partial(cache.record, city, data) if cache else None)
+        logging.info("[QUEUED] city=%s event=%s captured=%s", city_name, ts_utc, ts)
+        return
 
     conn = get_db_connection(db_path)
     if conn:
         create_weather_table(conn)
         try:
             cursor = conn.cursor()
-            cursor.execute(
-                """
-                INSERT OR IGNORE INTO weather_raw (
-                    city_name, city_id, country, ts_utc,date_str, captured_at_utc,
-                    temp_c, feels_like_c, humidity, pressure,
-                    wind_speed, wind_deg, weather_main, weather_desc
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,?)
-                """,
-                (
-                    city_name,
-                    city_id,
-                    country,
-                    ts_utc,
-                    date_str,
-                    captured_at_utc,
-                    temp_c,
-                    feels_like_c,
-                    humidity,
-                    pressure,
-                    wind_speed,
-                    wind_deg,
-                    weather_main,
-                    weather_desc,
-                ),
-            )
-            conn.commit()
+            with DB_INSERT.labels("sqlite").time():
+                cursor.execute(INSERT_WEATHER_RAW_SQL, row)
+            with DB_COMMIT.labels("sqlite").time():
+                conn.commit()
+            if cache:
+                cache.record(city, data)
+            ROWS.labels("inserted" if cursor.rowcount else "duplicate").inc()
             if cursor.rowcount == 0:
                 logging.info(f"[SKIP] city={city_name} event={ts_utc} reason=duplicate")
             else:
                 logging.info(
-                    f"[OK] city={city_name} event={ts_utc} captured={captured_at_utc} "
+                    f"[OK] city={city_name} event={ts_utc} captured={ts} "
                     f"temp={temp_c}C hum={humidity}% wind={wind_speed}mps inserted"
                 )
             logging.info("Weather data inserted into database.")
         except sqlite3.Error as e:
+            ROWS.labels("error").inc()
             logging.error(f"Database insert error: {e}")
         finally:
             cursor.close()
             conn.close()
-def aggregate_weather_metrics(db_path, start_ts, end_ts):
+
+def fetch_and_store_group(cities, api_key, db_path, out_dir, resolver, session=None, rate_limiter=None,
+                          base_url=DEFAULT_BASE_URL, writer=None, archive=None, cache=None, policy=None, retry_queue=None):
+    """
+    Fetch weather data for up to GROUP_SIZE cities with one call to the group endpoint and store
+    every city like fetch_and_store_weather does.
+    resolver (a CityIdResolver) gives the city ids. Cities without a known id are fetched by
+    name one by one and their id is remembered, so they join the group call from the next tick.
+    A city missing from the group response has its id dropped and is resolved again next time.
+    When a group call fails after the retries of policy, all its cities go to retry_queue.
+    """
+    import requests  # deferred: only the fetch path needs it
+
+    ids, unresolved = resolver.resolve(cities)
+    for city in unresolved:
+        data = fetch_and_store_weather(
+            city, api_key, db_path, out_dir, session=session, rate_limiter=rate_limiter,
+            base_url=base_url, writer=writer, archive=archive, cache=cache, policy=policy, retry_queue=retry_queue,
+        )
+        resolver.remember(city, data)
+
+    if cache:
+        ids = {city: city_id for city, city_id in ids.items() if cache.should_fetch(city)}
+    http = session or requests
+    for chunk in chunked(ids.items()):
+        params = {"appid": api_key, "id": ",".join(city_id for _, city_id in chunk), "units": "metric"}
+        try:
+            data = get_json(http, group_url(base_url), params, rate_limiter=rate_limiter, policy=policy)
+        except FetchFailed as e:
+            logging.error(f"Group fetch failed for {len(chunk)} cities: {e}")
+            if retry_queue:
+                for city, _ in chunk:
+                    retry_queue.push(city, str(e))
+            continue
+        if retry_queue:
+            for city, _ in chunk:
+                retry_queue.remove(city)
+        if data is None:
+            continue
+        by_id = {str(item.get("id")): item for item in data.get("list", [])}
+        found, items = [], []
+        for city, city_id in chunk:
+            item = by_id.get(city_id)
+            if item is None:
+                logging.warning(f"City '{city}' (id {city_id}) missing from the group response, resolving it again next time")
+                resolver.forget(city)
+                continue
+            found.append(city)
+            items.append(item)
+        store_weather_batch(found, items, db_path, out_dir, writer=writer, archive=archive, cache=cache)
+
+def store_weather_batch(cities, items, db_path, out_dir, writer=None, archive=None, cache=None):
+    """
+    Store the payloads of several cities fetched together, like store_weather does for one.
+    The payloads are turned into columns by transform_batch in one pass: rows failing its
+    checks are counted in a single log line, the valid ones go to writer (or one transaction)
+    as a bulk insert, and the Parquet archive receives the batch columns directly.
+    """
+    if cache:
+        kept = [(city, item) for city, item in zip(cities, items) if cache.is_new(city, item)]
+        if len(kept) < len(items):
+            logging.info("[SKIP] cities=%d reason=unchanged", len(items) - len(kept))
+        cities, items = [city for city, _ in kept], [item for _, item in kept]
+    if not items:
+        return
+
+    captured_at = datetime.now(timezone.utc)
+    ts = captured_at.strftime("%Y%m%dT%H%M%SZ")
+    with TRANSFORM.time():
+        batch = transform_batch(items, ts)
+    if archive:
+        archive.append_batch(cities, items, batch, captured_at)
+    else:
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        for city, item in zip(cities, items):
+            path = out_dir / f"raw_{city.replace(' ', '_')}_{ts}.json"
+            try:
+                with FILE_WRITE.time(), open(path, "w", encoding="utf-8") as f:
+                    json.dump(item, f, ensure_ascii=False, indent=2)
+            except OSError as e:
+                logging.error("File write error: %s", e)
+        logging.info("Wrote %d data files to: %s", len(items), out_dir)
+
+    if batch.rejected:
+        logging.error("[TRANSFORM] %s", batch.summary())
+    rows = batch.rows()
+    stored = [(city, item) for city, item, valid in zip(cities, items, batch.valid) if valid]
+
+    def record():
+        for city, item in stored:
+            cache.record(city, item)
+
+    if writer:
+        writer.add_many(rows, on_written=record if cache else None)
+        logging.info("[QUEUED] cities=%d captured=%s", len(rows), ts)
+        return
+
+    conn = get_db_connection(db_path)
+    if conn:
+        create_weather_table(conn)
+        try:
+            with DB_INSERT.labels("sqlite").time():
+                inserted = conn.executemany(INSERT_WEATHER_RAW_SQL, rows).rowcount
+            with DB_COMMIT.labels("sqlite").time():
+                conn.commit()
+            if cache:
+                record()
+            ROWS.labels("inserted").inc(inserted)
+            ROWS.labels("duplicate").inc(len(rows) - inserted)
+            logging.info(f"[OK] cities={len(rows)} captured={ts} inserted={inserted} duplicates={len(rows) - inserted}")
+        except sqlite3.Error as e:
+            ROWS.labels("error").inc(len(rows))
+            logging.error(f"Database insert error: {e}")
+        finally:
+            conn.close()
+
+def flush_archive(archive):
+    """Write the responses buffered by archive; after a write error they stay buffered for the next flush."""
+    try:
+        archive.flush()
+    except archive.errors as e:
+        logging.error(f"Archive write error, responses kept for the next flush: {e}")
+
+
+def aggregate_weather_metrics(db_path, start_ts, end_ts, backend=None):
     """
     Aggregate weather metrics for a given date range and store them in the database.
     The date range is defined by start_ts and end_ts, which are Unix timestamps.
-    date_str is the date in 'YYYY-MM-DD' format.
     example: start_ts = 1700000000, end_ts = 1700086399
     1700000000 is the start of the day in UTC, and 1700086399 is the end of the day in UTC.
+    A range spanning several days (a backfill) is recomputed in one set-based pass.
     This function aggregates metrics like average, min, and max temperature,
-    average humidity, and the number of samples for each city on that date.
-    It then inserts these metrics into the weather_metrics table.
+    average humidity, and the number of samples for each city on each date, and
+    overwrites the rows already stored for those days in the weather_metrics table.
+    With a StorageBackend (e.g. PostgreSQL) the metrics are computed there instead of in db_path.
+    Returns the number of (city, day) rows written.
     """
+    with AGGREGATION.labels("range").time():
+        return _aggregate(db_path, backend, lambda b: b.aggregate_range(start_ts, end_ts),
+                          lambda conn: aggregate_range(conn, start_ts, end_ts))
+
+def _aggregate(db_path, backend, on_backend, on_sqlite):
+    """Run an aggregation on backend, or on a connection to db_path, logging database errors."""
+    if backend:
+        try:
+            backend.init_schema()
+            return on_backend(backend)
+        except backend.errors as e:
+            logging.error(f"Database aggregation error: {e}")
+            return 0
     conn = get_db_connection(db_path)
     if conn:
-            try:
-                create_metrics_table(conn)
-
-                cursor = conn.cursor()
-                cursor.execute(
-                    """
-                    SELECT
-                        CITY_NAME, 
-                        DATE(DATETIME(TS_UTC, 'UNIXEPOCH')) AS DATE_UTC,
-                        AVG(TEMP_C) AS AVG_TEMP,
-                        MIN(TEMP_C) AS MIN_TEMP,
-                        MAX(TEMP_C) AS MAC_TEMP,
-                        AVG(HUMIDITY) AS AVG_HUMIDITY,
-                        COUNT(*) AS SAMPLES
-                    FROM WEATHER_RAW
-                    WHERE TS_UTC BETWEEN ? AND ?
-                    GROUP BY CITY_NAME, DATE_UTC;
-                    """,(start_ts, end_ts))
-                rows = cursor.fetchall()
-                for row in rows:
-                    city_name, date_utc, avg_temp, min_temp, max_temp, avg_humidity, samples = row
-                    cursor.execute(
-                        """
-                        INSERT OR IGNORE INTO weather_metrics (
-                            city_name, date_utc, avg_temp, min_temp, max_temp,
-                            avg_humidity, samples
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?)
-                        """,
-                        (city_name, date_utc, avg_temp, min_temp, max_temp, avg_humidity, samples)
-                    )
-                    conn.commit()
-                    logging.info(f"Aggregated {len(rows)} rows into weather_metrics.")
-            except sqlite3.Error as e:
-                logging.error(f"Database aggregation error: {e}")
-                return 0
-            finally:
-                    cursor.close()
-                    conn.close()
-                    logging.info("Database connection closed.")
-
-def run_once(cities, api_key, db_path, out_dir):
+        try:
+            create_weather_table(conn)
+            create_metrics_table(conn)
+            return on_sqlite(conn)
+        except sqlite3.Error as e:
+            logging.error(f"Database aggregation error: {e}")
+            return 0
+        finally:
+            conn.close()
+            logging.info("Database connection closed.")
+
+def aggregate_new_metrics(db_path, backend=None):
+    """
+    Merge the weather_raw rows inserted since the previous aggregation into weather_metrics.
+    Only the new rows are read, so this is cheap enough to run every few minutes.
+    With a StorageBackend (e.g. PostgreSQL) the metrics are merged there instead of in db_path.
+    Returns the number of raw rows merged.
+    """
+    with AGGREGATION.labels("incremental").time():
+        return _aggregate(db_path, backend, lambda b: b.aggregate_incremental(), aggregate_incremental)
+
+def run_once(cities, api_key, db_path, out_dir, concurrency=1, session=None, rate_limiter=None, base_url=DEFAULT_BASE_URL, writer=None, archive=None, cache=None, bulk=False,
+             profiler=None, policy=None, retry_queue=None, tick_deadline=None):
     """
     fetch weather data for multiple cities and store it in the database and files.
+    With concurrency > 1 the cities are fetched by a bounded thread pool sharing one
+    keep-alive session, so the tick takes about as long as its slowest requests instead of
+    the sum of all of them. rate_limiter (optional) caps the calls sent to the API host.
+    Rows go through writer (a long-lived WeatherWriter); without one a writer is opened
+    for this tick only. Either way the tick's rows are flushed before returning, and so are
+    the responses buffered by archive (an optional RawArchiveWriter), and the optional
+    ResponseCache is saved.
+    With bulk, cities are fetched GROUP_SIZE at a time through the group endpoint, and the pool
+    runs one group per worker.
+    The tick is timed in the weather_tick_seconds histogram; an armed TickProfiler (profiler)
+    captures it, fetch workers included.
+    Calls follow policy (a FetchPolicy: retries and circuit breaker) and stop tick_deadline
+    seconds after the tick started: the cities not fetched by then are abandoned to retry_queue
+    (a RetryQueue), whose due cities are fetched along with `cities`.
     """
-    for city in cities:
-        try:
-            fetch_and_store_weather(city, api_key, db_path, out_dir)
-        except Exception as e:
-            logging.error(f"Failed to process city '{city}': {e}")
+    policy = (policy or FetchPolicy(retries=0)).for_tick(tick_deadline)
+    if retry_queue:
+        due = [city for city in retry_queue.due() if city not in cities]
+        if due:
+            logging.info(f"Retrying {len(due)} cities from the retry queue")
+            cities = list(cities) + due
+    if session is None:
+        session = create_session(max(concurrency, 1))
+    own_writer = writer is None
+    if own_writer:
+        writer = WeatherWriter(db_path, flush_interval=0)
+    capture = profiler.capture("run_once") if profiler else nullcontext()
+    in_worker = profiler.thread if profiler else (lambda func: func)
+    start = time.perf_counter()
+    try:
+        with TICK.labels("run_once").time(), capture:
+            if bulk:
+                resolver = CityIdResolver(writer.backend)
+                fetch_many(
+                    chunked(cities),
+                    in_worker(lambda group: fetch_and_store_group(
+                        group, api_key, db_path, out_dir, resolver,
+                        session=session, rate_limiter=rate_limiter, base_url=base_url,
+                        writer=writer, archive=archive, cache=cache, policy=policy, retry_queue=retry_queue,
+                    )),
+                    concurrency=concurrency,
+                )
+            else:
+                fetch_many(
+                    cities,
+                    in_worker(lambda city: fetch_and_store_weather(
+                        city, api_key, db_path, out_dir,
+                        session=session, rate_limiter=rate_limiter, base_url=base_url,
+                        writer=writer, archive=archive, cache=cache, policy=policy, retry_queue=retry_queue,
+                    )),
+                    concurrency=concurrency,
+                )
+            writer.flush()
+            if archive:
+                flush_archive(archive)
+            if cache:
+                cache.save()
+    finally:
+        if own_writer:
+            writer.close()
+    logging.info(f"Fetched {len(cities)} cities in {time.perf_counter() - start:.2f}s (concurrency={concurrency})")
+    logging.info(f"Writer stats: {writer.stats()}")
+    logging.info(f"Timings (count, seconds): {REGISTRY.timings()}")
+    if cache:
+        logging.info(f"Response cache stats: {cache.stats()}")
+    if retry_queue:
+        logging.info(f"Cities waiting in the retry queue: {retry_queue.size}")
+
+def run_scheduled(cities, api_key, db_path, out_dir, interval, overrides=None, jitter=0.0, spread=True,
+                  concurrency=1, session=None, rate_limiter=None, base_url=DEFAULT_BASE_URL, writer=None, archive=None, cache=None,
+                  bulk=False, profiler=None, policy=None, retry_queue=None, tick_deadline=None):
+    """
+    fetch weather data for every city on its own fixed-rate schedule until interrupted.
+    interval is the default period in seconds and overrides maps city -> period for cities
+    (or groups of cities) that need another one. Each city is a job on a timer heap: runs stay
+    on the interval grid however long a fetch takes, and a city still being fetched when its
+    next tick comes is skipped instead of piling up. With spread, the start offsets of the
+    cities sharing an interval are spread evenly over it, and jitter adds up to that many random
+    seconds to every run, so requests are smoothed over the window instead of sent in a burst.
+    With bulk, the cities sharing an interval are split into groups of GROUP_SIZE and each
+    group is one job fetched through the group endpoint.
+    Buffered rows and archive files are flushed once per default interval.
+    Every job run is timed in the weather_tick_seconds histogram; an armed TickProfiler
+    (profiler) captures the next fetch job that starts.
+    Calls follow policy (a FetchPolicy), and a job stops sending requests after tick_deadline
+    seconds, or its period without one, so a hanging city cannot run into its next tick.
+    Cities that still fail are pushed to retry_queue (a RetryQueue), swept every
+    RETRY_QUEUE_DELAY seconds.
+    """
+    overrides = overrides or {}
+    scheduler = TimerHeapScheduler(max_workers=max(concurrency, 1))
+    groups = {}
+    for city in dict.fromkeys(list(cities) + list(overrides)):
+        groups.setdefault(overrides.get(city, interval), []).append(city)
+
+    def instrumented(kind, name, func, profile=True):
+        def run():
+            capture = profiler.capture(name) if profiler and profile else nullcontext()
+            with TICK.labels(kind).time(), capture:
+                func()
+        return run
+
+    resolver = None
+    if bulk:
+        backend = writer.backend if writer else create_backend("sqlite", db_path=db_path)
+        if not writer:
+            backend.init_schema()  # the writer's backend has its schema already
+        resolver = CityIdResolver(backend)
+    policy = policy or FetchPolicy(retries=0)
+    opts = dict(session=session, rate_limiter=rate_limiter, base_url=base_url, writer=writer, archive=archive, cache=cache,
+                retry_queue=retry_queue)
+
+    def bounded(func, period):
+        # the deadline starts when the job runs, not when it is scheduled
+        seconds = min(tick_deadline or period, period)
+        return lambda: func(policy=policy.for_tick(seconds))
+
+    for period, group in groups.items():
+        jobs = [
+            (",".join(chunk), bounded(partial(fetch_and_store_group, chunk, api_key, db_path, out_dir, resolver, **opts), period))
+            for chunk in chunked(group)
+        ] if bulk else [
+            (city, bounded(partial(fetch_and_store_weather, city, api_key, db_path, out_dir, **opts), period))
+            for city in group
+        ]
+        offsets = spread_offsets(len(jobs), period) if spread else [0.0] * len(jobs)
+        for (name, func), offset in zip(jobs, offsets):
+            scheduler.add_job(name, instrumented("group" if bulk else "city", name, func), period, offset=offset, jitter=jitter)
+        logging.info(f"Scheduled {len(group)} cities every {period / 60:g} minutes (spread={spread}, jitter={jitter}s)")
+
+    def flush():
+        if writer:
+            writer.flush()
+            logging.info(f"Writer stats: {writer.stats()}")
+        if archive:
+            flush_archive(archive)
+        if cache:
+            cache.save()
+            logging.info(f"Response cache stats: {cache.stats()}")
+
+    scheduler.add_job("flush", instrumented("flush", "flush", flush, profile=False), interval, offset=interval)
+
+    if retry_queue:
+        def sweep():
+            due = retry_queue.due()
+            if not due:
+                return
+            logging.info(f"Retrying {len(due)} cities from the retry queue")
+            sweep_policy = policy.for_tick(RETRY_QUEUE_DELAY)
+            for city in due:
+                fetch_and_store_weather(city, api_key, db_path, out_dir, **opts, policy=sweep_policy)
+
+        scheduler.add_job("retry", instrumented("retry", "retry", sweep), RETRY_QUEUE_DELAY, offset=RETRY_QUEUE_DELAY)
+    try:
+        scheduler.run_forever()
+    finally:
+        scheduler.stop(wait=False)
+
+def run_sharded(periods, db_path, out_dir, workers, config, writer, archive=None, cache=None, spread=True, stop_when=None):
+    """
+    Coordinate a sharded ingestion: `workers` local processes fetch the cities of periods
+    ({city: seconds between two fetches}) from a shared work queue, and this process writes
+    their results through the single batched writer.
+    The queue (config["queue"]: SQLite file config["queue_db"] or PostgreSQL at config["pg_dsn"])
+    is synced with periods, then every worker claims due cities under a lease (see
+    sharding.worker_process for the rest of config). Workers started with `main.py worker`
+    on other hosts can share a PostgreSQL queue. A local worker that dies has its leases
+    released at once and is restarted; remote workers that stop claiming are released after
+    DEFAULT_STALE_AFTER seconds. Either way their cities are taken over by the others.
+    spread is passed to WorkQueue.sync. Runs until interrupted, or until stop_when() returns True.
+    """
+    import multiprocessing  # deferred: only the sharded mode needs it
+    from multiprocessing.connection import wait
+
+    from src.utils.sharding import worker_process
+    from src.utils.work_queue import DEFAULT_STALE_AFTER, open_work_queue, worker_id
+
+    work_queue = open_work_queue(config["queue"], config["queue_db"], config["pg_dsn"])
+    work_queue.sync(periods, spread=spread)
+    # spawn, not fork: a forked child would inherit the logging listener thread's locks
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    processes, pipes = {}, {}  # slot -> Process, results connection -> slot
+
+    def start(slot):
+        # one pipe per worker: a worker killed in the middle of a send only breaks its own pipe
+        # (the partial message ends in EOFError), and a full pipe makes the worker wait
+        reader, sender = context.Pipe(duplex=False)
+        worker_config = dict(config, log_file=str(Path("logs") / f"worker-{slot}.log"))
+        process = context.Process(target=worker_process, args=(worker_config, sender, stop), name=f"shard-{slot}", daemon=True)
+        process.start()
+        sender.close()  # the worker holds the only write end, so its exit is seen as EOF
+        processes[slot], pipes[reader] = process, slot
+
+    def drain(timeout):
+        for reader in wait(list(pipes), timeout):
+            try:
+                batch = reader.recv()
+            except (EOFError, OSError):
+                pipes.pop(reader)
+                reader.close()
+                continue
+            store_weather_batch([city for city, _ in batch], [item for _, item in batch], db_path, out_dir,
+                                writer=writer, archive=archive, cache=cache)
+
+    for slot in range(workers):
+        start(slot)
+    logging.info(f"Sharding {len(periods)} cities over {workers} worker processes ({config['queue']} work queue)")
+    check_at = report_at = time.monotonic()
+    try:
+        while not (stop_when and stop_when()):
+            drain(0.5)
+            now = time.monotonic()
+            if now >= check_at:
+                check_at = now + 1.0
+                for slot, process in list(processes.items()):
+                    if not process.is_alive():
+                        logging.error(f"[SHARD] worker {slot} (pid {process.pid}) exited with code {process.exitcode}, restarting it")
+                        work_queue.release(worker_id(process.pid))
+                        start(slot)
+                work_queue.reap(DEFAULT_STALE_AFTER)
+            if now >= report_at:
+                report_at = now + 60.0
+                logging.info(f"[SHARD] queue={work_queue.stats()} writer={writer.stats()}")
+    finally:
+        stop.set()
+        # keep reading until every worker closed its pipe: a worker blocked on a full pipe could not exit
+        give_up_at = time.monotonic() + 30.0
+        while pipes and time.monotonic() < give_up_at:
+            drain(0.2)
+        for process in processes.values():
+            process.join(timeout=1.0)
+            if process.is_alive():
+                process.terminate()
+        writer.flush()
+        if archive:
+            flush_archive(archive)
+        if cache:
+            cache.save()
+        logging.info(f"[SHARD] stopped: queue={work_queue.stats()} writer={writer.stats()}")
+        work_queue.close()
 
 def get_date_window_ts(date_str):
     """
@@ -241,47 +609,307 @@ def get_date_window_ts(date_str):
     end = int((datetime(dt.year, dt.month, dt.day, tzinfo=timezone.utc) + timedelta(days=1)).timestamp()) - 1
     return start, end
 
-def main():
-    parser = argparse.ArgumentParser(description="Fetch weather data for multiple cities.")
-    parser.add_argument("cities", nargs="+", help="City names to fetch weather for (e.g. London Paris 'New York')")
-    parser.add_argument("--schedule", "-s", type=int, help="Run every N minutes(optional)")
-    parser.add_argument("--aggregate", type=str, choices=["today", "yesterday"], help="Aggregate metrics for a date window (today, yesterday, or YYYY-MM-DD)")
-    parser.add_argument("--aggregate-date", type=str, help="Aggregate metrics for a specific date (YYYY-MM-DD)")
-    args = parser.parse_args()
+def open_backend(args, db_path):
+    """Open the StorageBackend chosen with --backend, exiting with a message if it is unusable."""
+    try:
+        return create_backend(
+            args.backend, db_path=db_path, dsn=args.pg_dsn, wal=args.wal, synchronous=args.synchronous,
+            cache_size=args.cache_size, mmap_size=args.mmap_size,
+        )
+    except Exception as e:
+        logging.error(f"Could not open the {args.backend} backend: {e}")
+        sys.exit(1)
+
+def replay_main(argv):
+    """
+    `python main.py replay ...`: rebuild weather_raw from the raw responses stored on disk
+    (raw_*.json files and, if present, the Parquet archive) without calling the API.
+    """
+    from src.utils.replay import DEFAULT_CHUNK_SIZE, replay  # pulls in multiprocessing
+
+    parser = argparse.ArgumentParser(prog="main.py replay", description="Rebuild weather_raw from the raw JSON files and archive.")
+    parser.add_argument("--data-dir", default="data", help="Directory holding the raw_*.json files")
+    parser.add_argument("--archive-dir", default="data/archive", help="Parquet archive directory (skipped if missing)")
+    parser.add_argument("--db", default="data/weather_database.db", help="SQLite database to load into")
+    parser.add_argument("--workers", "-w", type=int, help="Parser processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Files parsed per worker task")
+    args = parser.parse_args(argv)
+
+    Path(args.db).parent.mkdir(parents=True, exist_ok=True)
+    result = replay(args.db, args.data_dir, args.archive_dir, workers=args.workers, chunk_size=args.chunk_size)
+    print(
+        f"Replayed {result['sources']} sources ({result['rejected']} rejected) in {result['seconds']}s: "
+        f"{result['rows_inserted']} rows inserted, {result['rows_duplicate']} duplicates, "
+        f"{result['files_per_sec']} files/s, {result['rows_per_sec']} rows/s"
+    )
+
+def retention_main(argv):
+    """
+    `python main.py retention ...`: one retention pass over the SQLite database and the raw files.
+    Expired raw rows are merged into weather_metrics, then deleted in small batches next to the
+    running ingestor; freed pages are handed back, and expired raw JSON files are moved into the
+    Parquet archive. Meant to run daily, e.g. from cron.
+    """
+    from src.utils.raw_archive import DEFAULT_ARCHIVE_DIR
+    from src.utils.retention import (
+        BUSY_TIMEOUT, DEFAULT_BATCH_SIZE, DEFAULT_PAUSE, DEFAULT_VACUUM_PAGES, RETENTION_TARGETS,
+        enable_incremental_vacuum, parse_retention, run_retention,
+    )
+
+    parser = argparse.ArgumentParser(prog="main.py retention", description="Prune expired data and reclaim the space.",
+                                     epilog="Targets: " + "; ".join(f"{k} = {v}" for k, v in RETENTION_TARGETS.items()))
+    parser.add_argument("--keep", action="append", metavar="TARGET=DAYS", help="Days to keep a target, or 'forever' (repeatable; default raw=90 files=90, the rest forever)")
+    parser.add_argument("--db", default="data/weather_database.db", help="SQLite database")
+    parser.add_argument("--data-dir", default="data", help="Directory holding the raw_*.json files")
+    parser.add_argument("--archive-dir", default=DEFAULT_ARCHIVE_DIR, help="Parquet archive the expired raw files are moved to")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows deleted per write transaction")
+    parser.add_argument("--pause", type=float, default=DEFAULT_PAUSE, help="Seconds between two batches, left to the ingestor")
+    parser.add_argument("--vacuum-pages", type=int, default=DEFAULT_VACUUM_PAGES, help="Free pages handed back per incremental vacuum step (0 = no vacuum)")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true", help="Rewrite an existing database once (VACUUM, blocks writers) so its free pages can be handed back")
+    parser.add_argument("--dry-run", action="store_true", help="Only count what would be pruned")
+    args = parser.parse_args(argv)
+    try:
+        retention = parse_retention(args.keep)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.enable_incremental_vacuum and os.path.exists(args.db):
+        conn = sqlite3.connect(args.db, timeout=BUSY_TIMEOUT, isolation_level=None)
+        try:
+            enable_incremental_vacuum(conn)
+        finally:
+            conn.close()
+    summary = run_retention(args.db, args.data_dir, args.archive_dir, retention, batch_size=args.batch_size,
+                            pause=args.pause, vacuum_pages=args.vacuum_pages, dry_run=args.dry_run)
+    kept = ", ".join(f"{target}={days if days is not None else 'forever'}" for target, days in retention.items())
+    print(f"Retention ({kept}){' dry run' if args.dry_run else ''}: " + ", ".join(f"{k}={v}" for k, v in summary.items()))
+
+def worker_main(argv):
+    """
+    `python main.py worker ...`: join a sharded ingestion from another host. The worker claims
+    cities from the coordinator's work queue (PostgreSQL, or an SQLite file every host can
+    lock) and, having no link to the coordinator's writer, stores them through its own
+    batched writer, normally into the shared PostgreSQL backend.
+    """
+    from dotenv import load_dotenv
+
+    from src.utils.sharding import DEFAULT_WORKER_CONCURRENCY, ShardWorker, fetch_city
+    from src.utils.work_queue import DEFAULT_CLAIM_SIZE, DEFAULT_LEASE_SECONDS, DEFAULT_QUEUE_DB, WORK_QUEUES, open_work_queue
+
+    parser = argparse.ArgumentParser(prog="main.py worker", description="Fetch cities claimed from a shared work queue.")
+    parser.add_argument("--work-queue", choices=WORK_QUEUES, default="postgres", help="Where the work queue lives")
+    parser.add_argument("--queue-db", default=DEFAULT_QUEUE_DB, help="SQLite work queue file")
+    parser.add_argument("--pg-dsn", default=os.getenv("WEATHER_PG_DSN"), help="PostgreSQL connection string (work queue and --backend postgres)")
+    parser.add_argument("--backend", choices=BACKENDS, default=os.getenv("WEATHER_BACKEND", "postgres"), help="Where observations are stored")
+    parser.add_argument("--concurrency", "-c", type=int, default=DEFAULT_WORKER_CONCURRENCY, help="Cities fetched in parallel")
+    parser.add_argument("--rate-limit", type=float, default=DEFAULT_CALLS_PER_MINUTE, help="Maximum API calls per minute of this worker (0 = unlimited)")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES)
+    parser.add_argument("--breaker-threshold", type=int, default=DEFAULT_BREAKER_THRESHOLD)
+    parser.add_argument("--breaker-reset", type=float, default=DEFAULT_BREAKER_RESET)
+    parser.add_argument("--claim-size", type=int, default=DEFAULT_CLAIM_SIZE, help="Cities claimed at a time")
+    parser.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS, help="Seconds a claim is held before other workers may take it over")
+    parser.add_argument("--base-url", default=os.getenv("OPENWEATHER_BASE_URL", DEFAULT_BASE_URL))
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    # SQLite settings of open_backend, for a worker writing to a local database
+    parser.set_defaults(wal=True, synchronous=None, cache_size=None, mmap_size=None)
+    args = parser.parse_args(argv)
 
     load_dotenv()
+    configure_logging()
     api_key = os.getenv("OPENWEATHER_API_KEY")
     if not api_key:
         logging.error("Missing OPENWEATHER_API_KEY in .env")
         sys.exit(1)
+    db_path, out_dir = "data/weather_database.db", "data"
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    work_queue = open_work_queue(args.work_queue, args.queue_db, args.pg_dsn)
+    writer = WeatherWriter(db_path, batch_size=args.batch_size, backend=open_backend(args, db_path))
+    session = create_session(args.concurrency)
+    limiter = HostRateLimiter(args.rate_limit) if args.rate_limit > 0 else None
+    policy = FetchPolicy(
+        retries=args.retries,
+        breaker=CircuitBreaker(args.breaker_threshold, args.breaker_reset) if args.breaker_threshold > 0 else None,
+    )
+    worker = ShardWorker(
+        work_queue,
+        lambda city, tick_policy: fetch_city(city, api_key, session, limiter, args.base_url, tick_policy),
+        lambda batch: store_weather_batch([city for city, _ in batch], [item for _, item in batch], db_path, out_dir, writer=writer),
+        policy, claim_size=args.claim_size, lease=args.lease, concurrency=args.concurrency,
+    )
+    stop = threading.Event()
+    try:
+        worker.run(stop)
+    except KeyboardInterrupt:
+        logging.info("Shutting down gracefully. Bye!")
+    finally:
+        work_queue.release(worker.name)
+        work_queue.close()
+        writer.close()
+
+def main():
+    if sys.argv[1:2] == ["replay"]:
+        configure_logging()
+        replay_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["worker"]:
+        worker_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["retention"]:
+        configure_logging()
+        retention_main(sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(description="Fetch weather data for multiple cities.")
+    parser.add_argument("cities", nargs="*", help="City names to fetch weather for (e.g. London Paris 'New York')")
+    parser.add_argument("--schedule", "-s", type=int, help="Run every N minutes(optional)")
+    parser.add_argument("--city-interval", action="append", metavar="CITY[,CITY...]=MINUTES", help="With --schedule: fetch these cities every MINUTES instead (repeatable)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="With --schedule: random delay of up to this many seconds added to each fetch")
+    parser.add_argument("--spread", action=argparse.BooleanOptionalAction, default=True, help="With --schedule: spread city start times over the interval (default) instead of fetching all at once")
+    parser.add_argument("--aggregate", type=str, choices=["today", "yesterday", "new"], help="Aggregate metrics for today/yesterday, or merge only rows added since the last run (new)")
+    parser.add_argument("--aggregate-date", type=str, help="Aggregate metrics for a specific date (YYYY-MM-DD)")
+    parser.add_argument("--aggregate-range", nargs=2, metavar=("START", "END"), help="Backfill metrics for every date from START to END (YYYY-MM-DD) in one pass")
+    parser.add_argument("--concurrency", "-c", type=int, default=DEFAULT_CONCURRENCY, help="Number of cities fetched in parallel (1 = sequential)")
+    parser.add_argument("--workers", type=int, default=0, help="With --schedule: shard the cities over N worker processes fed by a work queue (0 = one process)")
+    parser.add_argument("--work-queue", choices=WORK_QUEUES, default="sqlite", help="With --workers: keep the work queue in an SQLite file or in PostgreSQL (--pg-dsn), which workers on other hosts can join")
+    parser.add_argument("--queue-db", default=DEFAULT_QUEUE_DB, help="SQLite work queue file")
+    parser.add_argument("--claim-size", type=int, default=DEFAULT_CLAIM_SIZE, help="With --workers: cities a worker claims at a time")
+    parser.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS, help="With --workers: seconds a claim is held before other workers may take it over")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES, help="Extra attempts for a call failing with a network error, 429 or 5xx")
+    parser.add_argument("--tick-deadline", type=float, help="Seconds after which a tick abandons the cities not fetched yet to the retry queue (with --schedule: at most the interval)")
+    parser.add_argument("--breaker-threshold", type=int, default=DEFAULT_BREAKER_THRESHOLD, help="Consecutive failures that open the circuit breaker of the API host (0 = no breaker)")
+    parser.add_argument("--breaker-reset", type=float, default=DEFAULT_BREAKER_RESET, help="Seconds an open circuit fails fast before a trial call")
+    parser.add_argument("--rate-limit", type=float, default=DEFAULT_CALLS_PER_MINUTE, help="Maximum API calls per minute per host (0 = unlimited)")
+    parser.add_argument("--bulk", action="store_true", help="Fetch up to 20 cities per request through the group endpoint")
+    parser.add_argument("--cache", action=argparse.BooleanOptionalAction, default=True, help="Skip API calls and writes when a city's observation cannot have changed (default on)")
+    parser.add_argument("--base-url", type=str, default=os.getenv("OPENWEATHER_BASE_URL", DEFAULT_BASE_URL), help="OpenWeatherMap API root, e.g. a local stub server")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per database transaction")
+    parser.add_argument("--flush-interval", type=float, default=DEFAULT_FLUSH_INTERVAL, help="Seconds before a partial batch is flushed")
+    parser.add_argument("--backend", choices=BACKENDS, default=os.getenv("WEATHER_BACKEND", "sqlite"), help="Where observations and metrics are stored")
+    parser.add_argument("--pg-dsn", default=os.getenv("WEATHER_PG_DSN"), help="PostgreSQL connection string for --backend postgres")
+    parser.add_argument("--wal", action="store_true", help="Enable SQLite write-ahead logging")
+    parser.add_argument("--synchronous", type=str.upper, choices=["OFF", "NORMAL", "FULL"], help="SQLite synchronous pragma")
+    parser.add_argument("--cache-size", type=int, help="SQLite cache_size pragma (negative = KiB)")
+    parser.add_argument("--mmap-size", type=int, help="SQLite mmap_size pragma in bytes")
+    parser.add_argument("--archive", choices=["json", "parquet"], default="json", help="Raw response storage: one JSON file per fetch, or a partitioned Parquet archive")
+    parser.add_argument("--archive-roll", choices=sorted(ROLL_FORMATS), default="hourly", help="Time bucket of the Parquet archive files")
+    parser.add_argument("--metrics-port", type=int, default=os.getenv("WEATHER_METRICS_PORT"), help="With --schedule: serve Prometheus metrics on http://HOST:PORT/metrics")
+    parser.add_argument("--metrics-host", default=DEFAULT_METRICS_HOST, help="Address the metrics endpoint listens on")
+    parser.add_argument("--profile-tick", action="store_true", help="Write a cProfile of the first tick (with --schedule, SIGUSR1 profiles the next one)")
+    parser.add_argument("--profile-dir", default=DEFAULT_PROFILE_DIR, help="Where tick profiles are written")
+    args = parser.parse_args()
 
     # Set default paths
     db_path = "data/weather_database.db"
     out_dir = "data"
 
- 
+    # Aggregation never touches the network: skip dotenv/requests and configure logging right away
+    if args.aggregate or args.aggregate_date or args.aggregate_range:
+        configure_logging()
+        # SQLite aggregation keeps its own connection handling; other backends are opened here
+        backend = open_backend(args, db_path) if args.backend != "sqlite" else None
+
     if args.aggregate:
-        if args.aggregate == "today":
-            today = datetime.now(timezone.utc).date()
-            start_ts, end_ts = get_date_window_ts(today.strftime("%Y-%m-%d"))
-        elif args.aggregate == "yesterday":
-            yesterday = (datetime.now(timezone.utc) - timedelta(days=1)).date()
-            start_ts, end_ts = get_date_window_ts(yesterday.strftime("%Y-%m-%d"))
-        aggregate_weather_metrics(db_path, start_ts, end_ts)
+        if args.aggregate in ("today", "new"):
+            # Today's metrics only change when new rows arrive, so merging those is enough
+            aggregate_new_metrics(db_path, backend)
+            sys.exit(0)
+        yesterday = (datetime.now(timezone.utc) - timedelta(days=1)).date()
+        start_ts, end_ts = get_date_window_ts(yesterday.strftime("%Y-%m-%d"))
+        aggregate_weather_metrics(db_path, start_ts, end_ts, backend)
         sys.exit(0)
     elif args.aggregate_date:
         start_ts, end_ts = get_date_window_ts(args.aggregate_date)
-        aggregate_weather_metrics(db_path, start_ts, end_ts)
+        aggregate_weather_metrics(db_path, start_ts, end_ts, backend)
+        sys.exit(0)
+    elif args.aggregate_range:
+        start_ts, _ = get_date_window_ts(args.aggregate_range[0])
+        _, end_ts = get_date_window_ts(args.aggregate_range[1])
+        aggregate_weather_metrics(db_path, start_ts, end_ts, backend)
         sys.exit(0)
 
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    # Configured after .env is loaded so the log redactor knows the API key
+    configure_logging()
+    api_key = os.getenv("OPENWEATHER_API_KEY")
+    if not api_key:
+        logging.error("Missing OPENWEATHER_API_KEY in .env")
+        sys.exit(1)
+
+    concurrency = max(args.concurrency, 1)
+    fetch_opts = {
+        "concurrency": concurrency,
+        "session": create_session(concurrency),
+        "rate_limiter": HostRateLimiter(args.rate_limit) if args.rate_limit > 0 else None,
+        "base_url": args.base_url,
+        "bulk": args.bulk,
+        "policy": FetchPolicy(
+            retries=args.retries,
+            breaker=CircuitBreaker(args.breaker_threshold, args.breaker_reset) if args.breaker_threshold > 0 else None,
+        ),
+        "tick_deadline": args.tick_deadline,
+    }
+
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    writer = WeatherWriter(
+        db_path, batch_size=args.batch_size, flush_interval=args.flush_interval,
+        wal=args.wal, synchronous=args.synchronous, cache_size=args.cache_size, mmap_size=args.mmap_size,
+        backend=open_backend(args, db_path) if args.backend != "sqlite" else None,
+    )
+    fetch_opts["writer"] = writer
+    fetch_opts["retry_queue"] = RetryQueue(writer.backend)
+    if args.archive == "parquet":
+        fetch_opts["archive"] = RawArchiveWriter(str(Path(out_dir) / "archive"), roll=args.archive_roll)
+    if args.cache:
+        fetch_opts["cache"] = ResponseCache(str(Path(out_dir) / "response_cache.json"))
+
+    if args.schedule or args.profile_tick:
+        fetch_opts["profiler"] = TickProfiler(args.profile_dir)
+        if args.profile_tick:
+            fetch_opts["profiler"].arm()
+
     if args.schedule:
         try:
-            while True:
-                run_once(args.cities, api_key, db_path, out_dir)
-                logging.info(f"Waiting for {args.schedule} minutes before next run...")
-                time.sleep(args.schedule * 60)
+            overrides = parse_interval_overrides(args.city_interval)
+        except ValueError as e:
+            parser.error(str(e))
+        if args.metrics_port is not None:
+            start_metrics_server(args.metrics_port, args.metrics_host)
+        if args.workers > 0:
+            periods = {city: args.schedule * 60 for city in args.cities}
+            periods.update(overrides)
+            config = {
+                "api_key": api_key, "base_url": args.base_url,
+                "queue": args.work_queue, "queue_db": args.queue_db, "pg_dsn": args.pg_dsn,
+                # each process fetches with its own pool, the API rate limit is shared between them
+                "concurrency": concurrency, "calls_per_minute": args.rate_limit / args.workers,
+                "retries": args.retries, "breaker_threshold": args.breaker_threshold, "breaker_reset": args.breaker_reset,
+                "claim_size": args.claim_size, "lease": args.lease,
+            }
+            try:
+                run_sharded(periods, db_path, out_dir, args.workers, config, writer,
+                            archive=fetch_opts.get("archive"), cache=fetch_opts.get("cache"), spread=args.spread)
+            except KeyboardInterrupt:
+                logging.info("Shutting down gracefully. Bye!")
+            writer.close()
+            if args.archive == "parquet":
+                fetch_opts["archive"].close()
+            sys.exit(0)
+        if fetch_opts["profiler"].install_signal():
+            logging.info(f"Send SIGUSR1 (kill -USR1 {os.getpid()}) to profile the next tick")
+        try:
+            run_scheduled(
+                args.cities, api_key, db_path, out_dir, args.schedule * 60,
+                overrides=overrides, jitter=args.jitter, spread=args.spread, **fetch_opts,
+            )
         except KeyboardInterrupt:
             logging.info("Shutting down gracefully. Bye!")
+            writer.close()
+            if args.archive == "parquet":
+                fetch_opts["archive"].close()
+            if args.cache:
+                fetch_opts["cache"].save()
             sys.exit(0)
     else:
         if not args.cities:
@@ -290,7 +918,10 @@ def main():
         else:
             # Run once without scheduling
             logging.info("Running once without scheduling...")
-            run_once(args.cities, api_key, db_path, out_dir)
+            run_once(args.cities, api_key, db_path, out_dir, **fetch_opts)
+            writer.close()
+            if args.archive == "parquet":
+                fetch_opts["archive"].close()
 
 if __name__ == "__main__":
     main()
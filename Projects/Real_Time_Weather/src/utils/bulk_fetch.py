@@ -0,0 +1,86 @@
+import threading
+from datetime import datetime, timezone
+
+from src.utils.logger import logging
+
+# The group endpoint accepts at most 20 city ids per call.
+GROUP_SIZE = 20
+
+
+def chunked(items, size: int = GROUP_SIZE):
+    """Split items into tuples of at most size elements, keeping their order."""
+    items = list(items)
+    return [tuple(items[i:i + size]) for i in range(0, len(items), size)]
+
+
+def group_url(base_url: str):
+    """URL of the OpenWeatherMap multi-city endpoint (/data/2.5/group?id=ID,ID,...)."""
+    return f"{base_url.rstrip('/')}/data/2.5/group"
+
+
+class CityIdResolver:
+    """
+    Map city queries (the names given on the command line) to OpenWeatherMap city ids.
+    Known ids are loaded once from the city_lookup table of backend (a StorageBackend, whose
+    schema is already created); the SQLite schema seeds it from the cities already stored in
+    weather_raw. A query that is not known yet is fetched by name once and its id is remembered
+    from the response, so the following ticks can use the group endpoint.
+    Queries are matched case-insensitively.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._ids = {}
+        self._load()
+
+    @staticmethod
+    def _key(query: str):
+        return query.strip().lower()
+
+    def _load(self):
+        try:
+            self._ids = self.backend.city_lookup()
+            logging.info(f"Loaded {len(self._ids)} city ids for bulk fetching.")
+        except self.backend.errors as e:
+            logging.error(f"City id lookup error: {e}")
+
+    def _write(self, method, *args):
+        try:
+            method(*args)
+        except self.backend.errors as e:
+            logging.error(f"City id lookup write error: {e}")
+
+    def resolve(self, cities):
+        """Return ({city: city_id} for the known cities, [cities without a known id])."""
+        ids, unresolved = {}, []
+        with self._lock:
+            for city in cities:
+                city_id = self._ids.get(self._key(city))
+                if city_id:
+                    ids[city] = city_id
+                else:
+                    unresolved.append(city)
+        return ids, unresolved
+
+    def remember(self, city: str, data: dict):
+        """Store the id found in a response fetched by name for city."""
+        city_id = (data or {}).get("id")
+        if city_id is None:
+            return
+        key, city_id = self._key(city), str(city_id)
+        with self._lock:
+            if self._ids.get(key) == city_id:
+                return
+            self._ids[key] = city_id
+        resolved_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        self._write(self.backend.save_city_lookup, key, city_id, resolved_at)
+        logging.info(f"Resolved city '{city}' to id {city_id}")
+
+    def forget(self, city: str):
+        """Drop the id of city, e.g. when the group endpoint no longer returns it."""
+        key = self._key(city)
+        with self._lock:
+            if self._ids.pop(key, None) is None:
+                return
+        self._write(self.backend.delete_city_lookup, key)
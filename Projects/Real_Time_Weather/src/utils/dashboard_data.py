@@ -0,0 +1,160 @@
+import threading
+import time
+
+import numpy as np
+
+from src.utils.downsample import DEFAULT_POINTS, METHODS, plan_buckets, reduce_series
+from src.utils.metrics import DASHBOARD_QUERY
+from src.utils.storage import DEFAULT_POOL_SIZE, SQLiteBackend
+
+DEFAULT_WINDOW = 24 * 3600
+# Readers reuse buffered data for this long before asking the database for new rows.
+DEFAULT_REFRESH_INTERVAL = 30.0
+# Buffers are rebuilt from scratch this often, to pick up rows backfilled behind the last ts_utc.
+DEFAULT_FULL_REFRESH_INTERVAL = 600.0
+DEFAULT_CAPACITY = 4096
+
+RANGE_COLUMNS = ("ts_utc", "temp_c", "humidity")
+DAILY_COLUMNS = ("date_utc", "avg_temp", "min_temp", "max_temp", "avg_humidity", "samples")
+
+
+class CityBuffer:
+    """
+    Ring buffer holding the recent (ts_utc, temp_c, humidity) samples of one city as NumPy arrays.
+    Samples are appended in ts_utc order; once `capacity` is reached the oldest ones are overwritten.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.ts = np.zeros(capacity, dtype=np.int64)
+        self.temp = np.zeros(capacity, dtype=np.float64)
+        self.humidity = np.zeros(capacity, dtype=np.float64)
+        self.start = 0
+        self.count = 0
+        self.lock = threading.Lock()
+        self.refreshed_at = 0.0
+        self.rebuilt_at = 0.0
+
+    @property
+    def last_ts(self):
+        """ts_utc of the newest buffered sample, or None when empty."""
+        return int(self.ts[(self.start + self.count - 1) % self.capacity]) if self.count else None
+
+    def clear(self):
+        self.start = self.count = 0
+
+    def extend(self, ts, temp, humidity):
+        """Append sample arrays (sorted by ts_utc and newer than last_ts)."""
+        n = len(ts)
+        if n >= self.capacity:
+            ts, temp, humidity = ts[-self.capacity:], temp[-self.capacity:], humidity[-self.capacity:]
+            n = self.capacity
+        end = self.start + self.count
+        idx = np.arange(end, end + n) % self.capacity
+        self.ts[idx], self.temp[idx], self.humidity[idx] = ts, temp, humidity
+        overflow = max(0, self.count + n - self.capacity)
+        self.start = (self.start + overflow) % self.capacity
+        self.count = min(self.capacity, self.count + n)
+
+    def since(self, start_ts: int):
+        """Return copies of the buffered samples with ts_utc >= start_ts, oldest first."""
+        idx = (self.start + np.arange(self.count)) % self.capacity
+        ts = self.ts[idx]
+        first = int(np.searchsorted(ts, start_ts, side="left"))
+        idx = idx[first:]
+        return {"ts_utc": self.ts[idx], "temp_c": self.temp[idx], "humidity": self.humidity[idx]}
+
+
+def _columns(rows, names):
+    """Turn fetched rows into {column name: NumPy array}."""
+    if not rows:
+        return {name: np.array([]) for name in names}
+    return {name: np.array(values) for name, values in zip(names, zip(*rows))}
+
+
+class DashboardData:
+    """
+    Process-wide read layer of the dashboard, shared by every browser session.
+    Queries go through a StorageBackend: by default a read-only SQLiteBackend on db_path, whose
+    ReadOnlyPool keeps pool_size connections open. The last-24h series of every city viewed is
+    kept in a CityBuffer that is topped up with only the rows newer than its last ts_utc, at most once
+    per refresh_interval, and rebuilt from the database every full_refresh_interval.
+    Results are returned as columns of NumPy arrays.
+    """
+
+    def __init__(self, db_path: str, pool_size: int = DEFAULT_POOL_SIZE, window: int = DEFAULT_WINDOW,
+                 refresh_interval: float = DEFAULT_REFRESH_INTERVAL,
+                 full_refresh_interval: float = DEFAULT_FULL_REFRESH_INTERVAL,
+                 capacity: int = DEFAULT_CAPACITY, clock=time.time, backend=None):
+        self.backend = backend or SQLiteBackend(db_path, read_only=True, pool_size=pool_size)
+        self.window = window
+        self.refresh_interval = refresh_interval
+        self.full_refresh_interval = full_refresh_interval
+        self.capacity = capacity
+        self.clock = clock
+        self._buffers = {}
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.rows_read = 0
+
+    def _fetch(self, query, *args):
+        with DASHBOARD_QUERY.labels(query.__name__).time():
+            rows = query(*args)
+        self.queries += 1
+        self.rows_read += len(rows)
+        return rows
+
+    def cities(self):
+        """City names from the cities dimension table (weather_raw on databases not migrated yet)."""
+        return self._fetch(self.backend.cities)
+
+    def _buffer(self, city):
+        with self._lock:
+            buf = self._buffers.get(city)
+            if buf is None:
+                buf = self._buffers[city] = CityBuffer(self.capacity)
+            return buf
+
+    def recent(self, city: str):
+        """Samples of city over the last `window` seconds as {"ts_utc", "temp_c", "humidity"} arrays."""
+        now = self.clock()
+        start = int(now) - self.window
+        buf = self._buffer(city)
+        with buf.lock:
+            if now - buf.rebuilt_at >= self.full_refresh_interval:
+                buf.clear()
+                buf.rebuilt_at = now
+                buf.refreshed_at = 0.0
+            if now - buf.refreshed_at >= self.refresh_interval:
+                last_ts = buf.last_ts
+                since = start if last_ts is None else max(start, last_ts + 1)
+                rows = self._fetch(self.backend.city_range, city, since)
+                if rows:
+                    data = np.array(rows, dtype=np.float64)
+                    buf.extend(data[:, 0].astype(np.int64), data[:, 1], data[:, 2])
+                buf.refreshed_at = now
+            return buf.since(start)
+
+    def daily_metrics(self, city: str, days: int = 14):
+        """The last `days` rows of weather_metrics for city, oldest first, as columns."""
+        rows = self._fetch(self.backend.daily_metrics, city, days)
+        return _columns(rows[::-1], DAILY_COLUMNS)
+
+    def history(self, city: str, start_ts: int, end_ts: int, points: int = DEFAULT_POINTS, method: str = "lttb"):
+        """
+        Temperature and humidity of city between start_ts and end_ts reduced to about `points` points.
+        The backend reads the finest tier that fits the range, grouped into at most OVERSAMPLE * points
+        time buckets (plan_buckets), so the rows read depend on `points` and not on the length of the
+        range; method ("lttb" or "minmax", see reduce_series) then picks the final points.
+        Returns (columns, info): SERIES_COLUMNS as NumPy arrays, and the tier, bucket size and
+        number of rows read from the database.
+        """
+        if method not in METHODS:
+            raise ValueError(f"method must be one of {METHODS}, got {method!r}")
+        name, table, bucket = plan_buckets(start_ts, end_ts, points)
+        rows = self._fetch(self.backend.series_buckets, city, start_ts, end_ts, table, bucket)
+        info = {"tier": name, "bucket_seconds": bucket, "rows_read": len(rows)}
+        return reduce_series(rows, points, method), info
+
+    def close(self):
+        self.backend.close()
@@ -0,0 +1,113 @@
+import math
+
+import numpy as np
+
+from src.utils.weather_db import SELECT_RAW_BUCKETS_SQL, SELECT_ROLLUP_BUCKETS_SQL
+
+# (name, table, seconds per row) from the finest to the coarsest tier. weather_raw holds one
+# observation about every 10 minutes; the rollups are maintained by trg_weather_raw_rollup.
+TIERS = (
+    ("raw", "weather_raw", 600),
+    ("hourly", "weather_rollup_hourly", 3600),
+    ("daily", "weather_rollup_daily", 86400),
+)
+SERIES_COLUMNS = ("ts_utc", "temp_c", "temp_min", "temp_max", "humidity", "samples")
+DEFAULT_POINTS = 1000
+# SQL returns up to this many buckets per point drawn, the rest of the reduction is done by
+# LTTB / min-max, which keeps the shape of the series better than plain averaging.
+OVERSAMPLE = 4
+METHODS = ("lttb", "minmax")
+
+
+def lttb(x, y, points: int):
+    """
+    Largest-Triangle-Three-Buckets: indices of `points` samples of (x, y) that keep its visual shape.
+    The first and last samples are always kept; every bucket in between contributes the sample
+    forming the largest triangle with the previously kept one and the average of the next bucket.
+    """
+    size = len(x)
+    if points >= size or points < 3:
+        return np.arange(size)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = (np.arange(points - 1) * ((size - 2) / (points - 2))).astype(np.int64) + 1
+    edges = np.append(edges, size)
+    # Averages of every bucket at once; the per-bucket loop below then only touches the few
+    # samples of its bucket, as plain floats (faster than NumPy calls on such short slices).
+    counts = np.diff(edges)
+    avg_x = (np.add.reduceat(x, edges[:-1]) / counts).tolist()
+    avg_y = (np.add.reduceat(y, edges[:-1]) / counts).tolist()
+    xs, ys, bounds = x.tolist(), y.tolist(), edges.tolist()
+    kept = [0]
+    a = 0
+    for i in range(points - 2):
+        ax, ay = xs[a], ys[a]
+        nx, ny = avg_x[i + 1], avg_y[i + 1]
+        best, best_area = bounds[i], -1.0
+        for j in range(bounds[i], bounds[i + 1]):
+            area = abs((ax - nx) * (ys[j] - ay) - (ax - xs[j]) * (ny - ay))
+            if area > best_area:
+                best, best_area = j, area
+        a = best
+        kept.append(a)
+    kept.append(size - 1)
+    return np.array(kept, dtype=np.int64)
+
+
+def minmax(x, y, points: int):
+    """Indices of the smallest and largest y of each of points/2 equal buckets, in order."""
+    size = len(x)
+    if points >= size or points < 2:
+        return np.arange(size)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(0, size, points // 2 + 1).astype(np.int64)
+    kept = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            window = y[start:end]
+            kept += [start + int(window.argmin()), start + int(window.argmax())]
+    return np.unique(kept)
+
+
+def choose_tier(start_ts: int, end_ts: int, max_rows: int):
+    """Finest tier whose native resolution fits the range in max_rows rows (the daily tier otherwise)."""
+    span = max(end_ts - start_ts, 1)
+    for tier in TIERS:
+        if span / tier[2] <= max_rows:
+            return tier
+    return TIERS[-1]
+
+
+def bucket_sql(table: str):
+    """SQLite query grouping `table` (weather_raw or a rollup table) into :bucket-second rows."""
+    return SELECT_RAW_BUCKETS_SQL if table == "weather_raw" else SELECT_ROLLUP_BUCKETS_SQL.format(table=table)
+
+
+def plan_buckets(start_ts: int, end_ts: int, points: int = DEFAULT_POINTS):
+    """
+    Pick the source of a series between start_ts and end_ts: the finest tier that fits the range,
+    grouped into at most OVERSAMPLE * points buckets. Returns (tier name, table, bucket seconds).
+    """
+    max_rows = max(points, 1) * OVERSAMPLE
+    name, table, resolution = choose_tier(start_ts, end_ts, max_rows)
+    bucket = resolution * max(1, math.ceil((end_ts - start_ts) / (max_rows * resolution)))
+    return name, table, bucket
+
+
+def reduce_series(rows, points: int = DEFAULT_POINTS, method: str = "lttb"):
+    """
+    Reduce bucket rows (in SERIES_COLUMNS order) to about `points` points with method ("lttb" or
+    "minmax", applied to the average temperature). Returns SERIES_COLUMNS as NumPy arrays.
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}, got {method!r}")
+    if not rows:
+        return {column: np.array([]) for column in SERIES_COLUMNS}
+    data = np.array(rows, dtype=np.float64)
+    reduce = lttb if method == "lttb" else minmax
+    data = data[reduce(data[:, 0], data[:, 1], points)]
+    columns = {column: data[:, i] for i, column in enumerate(SERIES_COLUMNS)}
+    columns["ts_utc"] = columns["ts_utc"].astype(np.int64)
+    columns["samples"] = columns["samples"].astype(np.int64)
+    return columns
+
@@ -0,0 +1,199 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+from src.utils.logger import logging
+from src.utils.metrics import FETCH_FAILURES, HTTP_LATENCY, HTTP_RESPONSES, HTTP_RETRIES, JSON_PARSE
+from src.utils.resilience import RETRYABLE_STATUS, FetchFailed, FetchPolicy
+
+DEFAULT_BASE_URL = "https://api.openweathermap.org"
+DEFAULT_CONCURRENCY = 8
+# OpenWeatherMap free tier allows 60 calls per minute per API key.
+DEFAULT_CALLS_PER_MINUTE = 60
+
+
+def create_session(pool_size: int = DEFAULT_CONCURRENCY):
+    """
+    Create a requests.Session with a keep-alive connection pool sized for pool_size workers.
+    The same session should be reused for every request of the process so TCP/TLS
+    connections to the API host are opened once and then recycled.
+    """
+    # Imported here so CLI modes that never fetch do not pay for loading requests
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class HostRateLimiter:
+    """
+    Thread-safe token bucket rate limiter, one bucket per host.
+    calls_per_minute is the sustained rate allowed for each host and burst is the number of
+    calls that may be sent back to back before throttling kicks in (defaults to calls_per_minute).
+    penalize() blocks a host for a while, e.g. after the provider answered 429 Too Many Requests.
+    """
+
+    def __init__(self, calls_per_minute: float = DEFAULT_CALLS_PER_MINUTE, burst: int = None):
+        self.rate = calls_per_minute / 60.0
+        self.capacity = float(burst or calls_per_minute)
+        self._buckets = {}
+        self._blocked_until = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, host: str):
+        """Block until a call to host is allowed, then consume one token."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                blocked_until = self._blocked_until.get(host, 0.0)
+                if now < blocked_until:
+                    wait = blocked_until - now
+                else:
+                    tokens, last = self._buckets.get(host, (self.capacity, now))
+                    tokens = min(self.capacity, tokens + (now - last) * self.rate)
+                    if tokens >= 1.0:
+                        self._buckets[host] = (tokens - 1.0, now)
+                        return
+                    self._buckets[host] = (tokens, now)
+                    wait = (1.0 - tokens) / self.rate
+            time.sleep(wait)
+
+    def penalize(self, host: str, delay: float):
+        """Stop handing out tokens for host during the next delay seconds."""
+        with self._lock:
+            until = time.monotonic() + delay
+            if until > self._blocked_until.get(host, 0.0):
+                self._blocked_until[host] = until
+        logging.warning(f"Rate limited by {host}, pausing requests for {delay:.1f}s")
+
+
+def weather_url(base_url: str = DEFAULT_BASE_URL):
+    """URL of the OpenWeatherMap current weather endpoint (/data/2.5/weather?q=CITY)."""
+    return f"{base_url.rstrip('/')}/data/2.5/weather"
+
+
+def host_of(url: str):
+    """Return the network location (host[:port]) of url, used as the rate limiter key."""
+    return urlparse(url).netloc
+
+
+def retry_after_seconds(resp, default: float = 60.0):
+    """Read the Retry-After header of a response in seconds, falling back to default."""
+    value = resp.headers.get("Retry-After")
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_json(http, url: str, params: dict, rate_limiter=None, timeout: float = 15, policy=None):
+    """
+    Send one GET request through http (a requests.Session or the requests module) and return
+    the decoded JSON body, or None when the API answered an error that retrying cannot fix
+    (e.g. 404 city not found).
+    rate_limiter (optional) is consulted before sending and paused for Retry-After on a 429.
+    policy (a FetchPolicy) retries network errors, timeouts, 429 and 5xx responses with backoff,
+    skips hosts whose circuit breaker is open and shortens the timeout to the tick deadline.
+    Raises FetchFailed when such a transient failure is still there after the retries.
+    """
+    import requests  # deferred: only the fetch path needs it
+
+    policy = policy or FetchPolicy(retries=0)
+    host = host_of(url)
+    endpoint = url.rstrip("/").rsplit("/", 1)[-1]
+    breaker = policy.breaker
+    for attempt in range(policy.retries + 1):
+        if policy.deadline.expired:
+            FETCH_FAILURES.labels("deadline").inc()
+            raise FetchFailed(f"tick deadline reached before {endpoint} answered", "deadline")
+        if breaker and not breaker.allow(host):
+            FETCH_FAILURES.labels("circuit_open").inc()
+            raise FetchFailed(f"circuit open for {host}", "circuit_open")
+        if rate_limiter:
+            rate_limiter.acquire(host)
+        retry_after = None
+        try:
+            with HTTP_LATENCY.labels(endpoint).time():
+                resp = http.get(url, params=params, timeout=policy.deadline.clamp(timeout))
+            # Arguments are formatted (and the key redacted) on the logging thread
+            logging.info("Request sent to URL: %s", resp.url)
+        except requests.exceptions.RequestException as e:
+            status, error = "network_error", f"network error: {e}"
+            HTTP_RESPONSES.labels(status).inc()
+            logging.error("Network error: %s", e)
+        else:
+            status, error = resp.status_code, f"HTTP {resp.status_code}"
+            HTTP_RESPONSES.labels(status).inc()
+            if status == 200:
+                if breaker:
+                    breaker.success(host)
+                with JSON_PARSE.time():
+                    return resp.json()
+            try:
+                logging.error("HTTP %s: %s", status, resp.json())
+            except Exception:
+                logging.error("HTTP %s: %s", status, resp.text)
+            if status == 429:
+                retry_after = retry_after_seconds(resp)
+                if rate_limiter:
+                    rate_limiter.penalize(host, retry_after)
+            elif status == 503 and "Retry-After" in resp.headers:
+                retry_after = retry_after_seconds(resp)
+            if status not in RETRYABLE_STATUS:
+                if breaker:
+                    breaker.success(host)  # the host answered: it is up
+                return None
+        # throttling says nothing about the health of the host, the breaker only counts failures
+        if breaker and status == 429:
+            breaker.release(host)
+        elif breaker:
+            breaker.failure(host)
+        if attempt == policy.retries:
+            break
+        if retry_after is not None and retry_after > policy.max_backoff:
+            # the provider asked for a longer pause than a fetch should block for: queue it instead
+            break
+        delay = policy.delay(attempt, retry_after)
+        remaining = policy.deadline.remaining()
+        if remaining is not None and delay >= remaining:
+            FETCH_FAILURES.labels("deadline").inc()
+            raise FetchFailed(f"{error}, no time left in the tick for a retry", "deadline")
+        HTTP_RETRIES.labels(status).inc()
+        logging.warning("Retrying %s in %.2fs (attempt %d of %d) after %s", endpoint, delay, attempt + 2, policy.retries + 1, error)
+        time.sleep(delay)
+    FETCH_FAILURES.labels("exhausted").inc()
+    raise FetchFailed(f"{error} after {policy.retries + 1} attempts")
+
+
+def fetch_many(items, func, concurrency: int = DEFAULT_CONCURRENCY):
+    """
+    Call func(item) for every item using a bounded thread pool of `concurrency` workers.
+    Exceptions raised by func are logged per item and do not stop the other items.
+    Returns a dict mapping each item to the value returned by func (None on failure).
+    With concurrency <= 1 the items are processed sequentially in the calling thread.
+    """
+    results = {}
+    if concurrency <= 1:
+        for item in items:
+            try:
+                results[item] = func(item)
+            except Exception as e:
+                logging.error(f"Failed to process '{item}': {e}")
+                results[item] = None
+        return results
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="fetch") as pool:
+        futures = {pool.submit(func, item): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                results[item] = future.result()
+            except Exception as e:
+                logging.error(f"Failed to process '{item}': {e}")
+                results[item] = None
+    return results
@@ -1,40 +1,120 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import re
+from pathlib import Path
+from urllib.parse import quote, quote_plus
 
-print("=== INSIDE Logger.py ===")
-
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s-%(name)s-%(levelname)s-%(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S',
-    filename='logs/app.log',
-    filemode='a',  # Overwrite on each run. Use 'a' for append.
-    force=True
-)
-
-# --------- Lower urllib3 and requests log level to WARNING ---------
-logging.getLogger("urllib3").setLevel(logging.WARNING)
-logging.getLogger("requests").setLevel(logging.WARNING)
-
-# --------- Global API key redaction filter ---------
-class ApiKeyFilter(logging.Filter):
-    def __init__(self, api_key):
-        super().__init__()
-        self.api_key = api_key
-    def filter(self, record):
-        # Redact API key in main log message
-        if self.api_key and self.api_key in str(record.msg):
-            record.msg = str(record.msg).replace(self.api_key, "***REDACTED***")
-        # Redact API key in arguments (if used in formatting)
-        if hasattr(record, 'args') and isinstance(record.args, tuple):
-            record.args = tuple(
-                a.replace(self.api_key, "***REDACTED***") if isinstance(a, str) and self.api_key in a else a
-                for a in record.args
-            )
-        return True
-
-api_key = os.getenv("OPENWEATHER_API_KEY")
-if api_key:
-    logging.getLogger().addFilter(ApiKeyFilter(api_key))
-
-print("Logging is configured. You can now use the logging module in your scripts.")
+LOG_FORMAT = '%(asctime)s-%(name)s-%(levelname)s-%(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+LOG_FILE = 'logs/app.log'
+MAX_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 5
+REDACTED = "***REDACTED***"
+
+
+# --------- Single-pass API key redaction ---------
+class Redactor:
+    """
+    Mask secrets in text with one precompiled regular expression.
+    Any `appid=<value>` query parameter is masked, plus the literal secrets given
+    (e.g. the API key itself) wherever they appear, as is or percent-encoded as in a URL.
+    """
+    def __init__(self, *secrets):
+        variants = {v for s in secrets if s for v in (s, quote(s, safe=""), quote_plus(s))}
+        # longest first, so an encoded key is not cut at a raw prefix of it, and before the
+        # appid pattern, which stops at the first space of a raw key
+        patterns = [re.escape(v) for v in sorted(variants, key=len, reverse=True)]
+        patterns.append(r"(?<=appid=)[^&\s'\"]+")
+        self.pattern = re.compile("|".join(patterns))
+
+    def __call__(self, text):
+        return self.pattern.sub(REDACTED, text)
+
+    def redact_value(self, content):
+        """Redact a string, or every string inside a (nested) dict or list."""
+        if isinstance(content, str):
+            return self(content)
+        if isinstance(content, dict):
+            return {k: self.redact_value(v) for k, v in content.items()}
+        if isinstance(content, list):
+            return [self.redact_value(v) for v in content]
+        return content
+
+
+class RedactingFormatter(logging.Formatter):
+    """Formatter that runs the final log line through a Redactor."""
+    def __init__(self, redactor, fmt=LOG_FORMAT, datefmt=DATE_FORMAT):
+        super().__init__(fmt=fmt, datefmt=datefmt)
+        self.redactor = redactor
+
+    def format(self, record):
+        return self.redactor(super().format(record))
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that enqueues the record untouched. The stock handler formats the message
+    in the calling thread; here formatting is left to the listener thread as well.
+    Records never leave the process, so they do not need to be made picklable.
+    """
+    def prepare(self, record):
+        return record
+
+
+_listener = None
+
+
+def configure_logging(level=None, log_file=LOG_FILE, api_key=None, stream=None):
+    """
+    Route every log record through a queue to a size-rotating file handler, and to stream
+    (e.g. sys.stderr) when one is given.
+    The calling thread only enqueues the record; formatting, API key redaction and disk I/O
+    happen on a background QueueListener thread, so logging never blocks the fetch hot path.
+    level defaults to the LOG_LEVEL environment variable (INFO if unset) and api_key to
+    OPENWEATHER_API_KEY. Calling it again replaces the previous configuration.
+    Importing this module configures nothing: entry points call this explicitly.
+    """
+    global _listener
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    api_key = api_key or os.getenv("OPENWEATHER_API_KEY")
+    Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file, mode='a', maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT, encoding='utf-8'
+    )
+    handlers = [file_handler] + ([logging.StreamHandler(stream)] if stream is not None else [])
+    formatter = RedactingFormatter(Redactor(api_key))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    if _listener:
+        shutdown_logging()
+    else:
+        atexit.register(shutdown_logging)
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(DeferredQueueHandler(log_queue))
+    root.setLevel(level)
+
+    # --------- Lower urllib3 and requests log level to WARNING ---------
+    logging.getLogger("urllib3").setLevel(logging.WARNING)
+    logging.getLogger("requests").setLevel(logging.WARNING)
+
+
+def shutdown_logging():
+    """Drain the queue, stop the listener thread and close the log file (registered with atexit)."""
+    global _listener
+    if _listener:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
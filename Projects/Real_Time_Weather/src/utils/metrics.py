@@ -0,0 +1,241 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from src.utils.logger import logging
+
+# Upper bounds in seconds, from a fast SQLite insert to a slow API call.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_METRICS_HOST = "127.0.0.1"
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        """Observe the seconds spent in the with block, even when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """The series of this metric for the given label values (in labelnames order)."""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def series(self):
+        return sorted(self._children.items())
+
+
+class Counter(_Metric):
+    """A monotonically increasing count, e.g. rows inserted or responses per status code."""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        """Increment the series without labels."""
+        self.labels().inc(amount)
+
+    def render(self):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+                for key, child in self.series()]
+
+
+class Histogram(_Metric):
+    """Observed durations counted in cumulative `buckets` (seconds), with their sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        """Observe value on the series without labels."""
+        self.labels().observe(value)
+
+    def time(self):
+        """Time a with block on the series without labels."""
+        return self.labels().time()
+
+    def render(self):
+        lines = []
+        for key, child in self.series():
+            with child._lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else _format_value(float(bound))
+                labels = _format_labels(self.labelnames, key, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    The metrics of the process, rendered in the Prometheus text exposition format.
+    Recording a value only takes a short lock, so instruments can stay on the hot paths.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def render(self):
+        """Every metric as Prometheus text (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def timings(self):
+        """{histogram{labels}: (count, total seconds)} of the histograms observed so far, for the logs."""
+        result = {}
+        for metric in self._metrics.values():
+            if isinstance(metric, Histogram):
+                for key, child in metric.series():
+                    if child.count:
+                        name = f"{metric.name}{_format_labels(metric.labelnames, key)}"
+                        result[name] = (child.count, round(child.sum, 4))
+        return result
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_LATENCY = REGISTRY.histogram(
+    "weather_http_request_seconds", "Time to get the response of an OpenWeather API call.", ["endpoint"])
+HTTP_RESPONSES = REGISTRY.counter(
+    "weather_http_responses_total", "OpenWeather API responses by status code (network_error when none came back).", ["status"])
+HTTP_RETRIES = REGISTRY.counter(
+    "weather_http_retries_total", "OpenWeather API calls sent again, by the status (or network_error) that failed.", ["status"])
+FETCH_FAILURES = REGISTRY.counter(
+    "weather_fetch_failures_total", "API calls given up (exhausted, circuit_open, deadline).", ["reason"])
+JSON_PARSE = REGISTRY.histogram(
+    "weather_json_parse_seconds", "Time to decode the JSON body of an API response.")
+TRANSFORM = REGISTRY.histogram(
+    "weather_transform_seconds", "Time to turn responses into weather_raw rows.")
+FILE_WRITE = REGISTRY.histogram(
+    "weather_file_write_seconds", "Time to write a raw response JSON file.")
+DB_INSERT = REGISTRY.histogram(
+    "weather_db_insert_seconds", "Time to send a batch of weather_raw rows to the database, before commit.", ["backend"])
+DB_COMMIT = REGISTRY.histogram(
+    "weather_db_commit_seconds", "Time to commit a batch of weather_raw rows.", ["backend"])
+ROWS = REGISTRY.counter(
+    "weather_rows_total", "weather_raw rows handed to the database by outcome (inserted, duplicate, error).", ["result"])
+AGGREGATION = REGISTRY.histogram(
+    "weather_aggregation_seconds", "Time to aggregate weather_metrics (range recompute or incremental merge).", ["mode"],
+    buckets=DEFAULT_BUCKETS + (30.0, 60.0, 300.0))
+TICK = REGISTRY.histogram(
+    "weather_tick_seconds", "Time of a fetch tick: a whole run_once, or one scheduled job.", ["job"],
+    buckets=DEFAULT_BUCKETS + (30.0, 60.0, 300.0))
+DASHBOARD_QUERY = REGISTRY.histogram(
+    "weather_dashboard_query_seconds", "Time of a dashboard loader query.", ["query"])
+
+
+def start_metrics_server(port: int, host: str = DEFAULT_METRICS_HOST, registry: MetricsRegistry = REGISTRY):
+    """
+    Serve registry on http://host:port/metrics from a daemon thread. Returns the server
+    (server.shutdown() stops it); port 0 picks a free port, see server.server_address.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # deferred: only --metrics-port needs it
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logging.debug("metrics endpoint: " + format, *args)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logging.info(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
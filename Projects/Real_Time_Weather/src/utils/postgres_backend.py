@@ -0,0 +1,407 @@
+import io
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from src.utils.logger import logging
+from src.utils.metrics import DB_COMMIT, DB_INSERT
+from src.utils.storage import StorageBackend
+from src.utils.weather_aggregator import SECONDS_PER_DAY, STATE_NAME
+
+# psycopg2 is optional (only needed with --backend postgres), so it is loaded on first use.
+psycopg2 = None
+
+RAW_COLUMNS = (
+    "city_name", "city_id", "country", "ts_utc", "date_str", "captured_at_utc",
+    "temp_c", "feels_like_c", "humidity", "pressure",
+    "wind_speed", "wind_deg", "weather_main", "weather_desc",
+)
+_ROLLUP_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS weather_rollup_{name} (
+    city_name TEXT NOT NULL,
+    bucket_ts BIGINT NOT NULL,
+    samples BIGINT NOT NULL,
+    sum_temp DOUBLE PRECISION NOT NULL,
+    min_temp DOUBLE PRECISION NOT NULL,
+    max_temp DOUBLE PRECISION NOT NULL,
+    sum_humidity DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (city_name, bucket_ts)
+    )
+"""
+SCHEMA_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS weather_raw (
+    id BIGSERIAL PRIMARY KEY,
+    city_name TEXT NOT NULL,
+    city_id TEXT NOT NULL,
+    country TEXT NOT NULL,
+    ts_utc BIGINT NOT NULL,
+    date_str TEXT NOT NULL,
+    captured_at_utc TEXT NOT NULL,
+    temp_c DOUBLE PRECISION NOT NULL,
+    feels_like_c DOUBLE PRECISION NOT NULL,
+    humidity DOUBLE PRECISION NOT NULL,
+    pressure DOUBLE PRECISION NOT NULL,
+    wind_speed DOUBLE PRECISION NOT NULL,
+    wind_deg DOUBLE PRECISION NOT NULL,
+    weather_main TEXT,
+    weather_desc TEXT,
+    UNIQUE (city_id, ts_utc)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_weather_raw_city_ts ON weather_raw (city_name, ts_utc) INCLUDE (temp_c, humidity)",
+    "CREATE INDEX IF NOT EXISTS idx_weather_raw_ts ON weather_raw (ts_utc)",
+    """
+    CREATE TABLE IF NOT EXISTS cities (
+    city_id TEXT PRIMARY KEY,
+    city_name TEXT NOT NULL,
+    country TEXT NOT NULL,
+    first_seen_ts BIGINT NOT NULL,
+    last_seen_ts BIGINT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_cities_name ON cities (city_name)",
+    """
+    CREATE TABLE IF NOT EXISTS weather_metrics (
+    city_name TEXT NOT NULL,
+    date_utc TEXT NOT NULL,
+    avg_temp DOUBLE PRECISION,
+    min_temp DOUBLE PRECISION,
+    max_temp DOUBLE PRECISION,
+    avg_humidity DOUBLE PRECISION,
+    samples BIGINT,
+    sum_temp DOUBLE PRECISION,
+    sum_humidity DOUBLE PRECISION,
+    PRIMARY KEY (city_name, date_utc)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS aggregation_state (
+    name TEXT PRIMARY KEY,
+    last_id BIGINT NOT NULL,
+    last_ts_utc BIGINT,
+    updated_at TEXT NOT NULL
+    )
+    """,
+    _ROLLUP_TABLE_SQL.format(name="hourly"),
+    _ROLLUP_TABLE_SQL.format(name="daily"),
+    """
+    CREATE TABLE IF NOT EXISTS fetch_retry_queue (
+    city TEXT PRIMARY KEY,
+    attempts INTEGER NOT NULL,
+    last_error TEXT,
+    first_failed_at TEXT NOT NULL,
+    next_attempt_at DOUBLE PRECISION NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS city_lookup (
+    query TEXT PRIMARY KEY,
+    city_id TEXT NOT NULL,
+    resolved_at TEXT NOT NULL
+    )
+    """,
+]
+
+# COPY cannot skip duplicates, so batches are copied into a per-session staging table first.
+STAGE_TABLE_SQL = """
+    CREATE TEMP TABLE IF NOT EXISTS weather_raw_stage (
+    city_name TEXT, city_id TEXT, country TEXT, ts_utc BIGINT, date_str TEXT, captured_at_utc TEXT,
+    temp_c DOUBLE PRECISION, feels_like_c DOUBLE PRECISION, humidity DOUBLE PRECISION, pressure DOUBLE PRECISION,
+    wind_speed DOUBLE PRECISION, wind_deg DOUBLE PRECISION, weather_main TEXT, weather_desc TEXT
+    ) ON COMMIT DELETE ROWS
+"""
+COPY_STAGE_SQL = f"COPY weather_raw_stage ({', '.join(RAW_COLUMNS)}) FROM STDIN"
+
+_ROLLUP_UPSERT_SQL = """
+    {name} AS (
+        INSERT INTO weather_rollup_{name} (city_name, bucket_ts, samples, sum_temp, min_temp, max_temp, sum_humidity)
+        SELECT city_name, ts_utc - ts_utc % {seconds}, COUNT(*), SUM(temp_c), MIN(temp_c), MAX(temp_c), SUM(humidity)
+        FROM inserted
+        GROUP BY 1, 2
+        ON CONFLICT (city_name, bucket_ts) DO UPDATE SET
+            samples = weather_rollup_{name}.samples + EXCLUDED.samples,
+            sum_temp = weather_rollup_{name}.sum_temp + EXCLUDED.sum_temp,
+            min_temp = LEAST(weather_rollup_{name}.min_temp, EXCLUDED.min_temp),
+            max_temp = GREATEST(weather_rollup_{name}.max_temp, EXCLUDED.max_temp),
+            sum_humidity = weather_rollup_{name}.sum_humidity + EXCLUDED.sum_humidity
+    )
+"""
+# Move the staged rows into weather_raw and update, from the rows actually inserted, what the
+# SQLite triggers maintain there: the cities table and the hourly/daily rollups.
+MERGE_STAGE_SQL = f"""
+    WITH inserted AS (
+        INSERT INTO weather_raw ({", ".join(RAW_COLUMNS)})
+        SELECT {", ".join(RAW_COLUMNS)} FROM weather_raw_stage
+        ON CONFLICT (city_id, ts_utc) DO NOTHING
+        RETURNING city_id, city_name, country, ts_utc, temp_c, humidity
+    ),
+    city_rows AS (
+        INSERT INTO cities (city_id, city_name, country, first_seen_ts, last_seen_ts)
+        SELECT city_id, MAX(city_name), MAX(country), MIN(ts_utc), MAX(ts_utc)
+        FROM inserted
+        GROUP BY city_id
+        ON CONFLICT (city_id) DO UPDATE SET
+            city_name = EXCLUDED.city_name,
+            country = EXCLUDED.country,
+            first_seen_ts = LEAST(cities.first_seen_ts, EXCLUDED.first_seen_ts),
+            last_seen_ts = GREATEST(cities.last_seen_ts, EXCLUDED.last_seen_ts)
+    ),
+    {_ROLLUP_UPSERT_SQL.format(name="hourly", seconds=3600)},
+    {_ROLLUP_UPSERT_SQL.format(name="daily", seconds=86400)}
+    SELECT COUNT(*) FROM inserted
+"""
+
+_GROUPED_RAW_SQL = """
+    SELECT
+        city_name,
+        to_char(to_timestamp(ts_utc) AT TIME ZONE 'UTC', 'YYYY-MM-DD') AS day_utc,
+        AVG(temp_c), MIN(temp_c), MAX(temp_c), AVG(humidity),
+        COUNT(*), SUM(temp_c), SUM(humidity)
+    FROM weather_raw
+    WHERE id > %(last_id)s AND id <= %(max_id)s {window}
+    GROUP BY city_name, day_utc
+"""
+_INSERT_METRICS_SQL = """
+    INSERT INTO weather_metrics (
+        city_name, date_utc, avg_temp, min_temp, max_temp,
+        avg_humidity, samples, sum_temp, sum_humidity
+    )
+"""
+MERGE_METRICS_SQL = _INSERT_METRICS_SQL + _GROUPED_RAW_SQL.format(window="") + """
+    ON CONFLICT (city_name, date_utc) DO UPDATE SET
+        samples = weather_metrics.samples + EXCLUDED.samples,
+        sum_temp = weather_metrics.sum_temp + EXCLUDED.sum_temp,
+        sum_humidity = weather_metrics.sum_humidity + EXCLUDED.sum_humidity,
+        avg_temp = (weather_metrics.sum_temp + EXCLUDED.sum_temp) / (weather_metrics.samples + EXCLUDED.samples),
+        avg_humidity = (weather_metrics.sum_humidity + EXCLUDED.sum_humidity) / (weather_metrics.samples + EXCLUDED.samples),
+        min_temp = LEAST(weather_metrics.min_temp, EXCLUDED.min_temp),
+        max_temp = GREATEST(weather_metrics.max_temp, EXCLUDED.max_temp)
+"""
+REPLACE_METRICS_SQL = _INSERT_METRICS_SQL + _GROUPED_RAW_SQL.format(window="AND ts_utc BETWEEN %(start)s AND %(end)s") + """
+    ON CONFLICT (city_name, date_utc) DO UPDATE SET
+        samples = EXCLUDED.samples,
+        sum_temp = EXCLUDED.sum_temp,
+        sum_humidity = EXCLUDED.sum_humidity,
+        avg_temp = EXCLUDED.avg_temp,
+        avg_humidity = EXCLUDED.avg_humidity,
+        min_temp = EXCLUDED.min_temp,
+        max_temp = EXCLUDED.max_temp
+"""
+SET_HIGH_WATER_MARK_SQL = """
+    INSERT INTO aggregation_state (name, last_id, last_ts_utc, updated_at) VALUES (%s, %s, %s, %s)
+    ON CONFLICT (name) DO UPDATE SET
+        last_id = EXCLUDED.last_id,
+        last_ts_utc = COALESCE(EXCLUDED.last_ts_utc, aggregation_state.last_ts_utc),
+        updated_at = EXCLUDED.updated_at
+"""
+
+SELECT_CITIES_SQL = "SELECT DISTINCT city_name FROM cities ORDER BY 1"
+SELECT_CITY_RANGE_SQL = """
+    SELECT ts_utc, temp_c, humidity
+    FROM weather_raw
+    WHERE city_name = %s AND ts_utc >= %s
+    ORDER BY ts_utc
+"""
+SELECT_DAILY_METRICS_SQL = """
+    SELECT date_utc, avg_temp, min_temp, max_temp, avg_humidity, samples
+    FROM weather_metrics
+    WHERE city_name = %s
+    ORDER BY date_utc DESC
+    LIMIT %s
+"""
+SELECT_RAW_BUCKETS_SQL = """
+    SELECT (ts_utc / %(bucket)s) * %(bucket)s AS bucket_ts,
+           AVG(temp_c), MIN(temp_c), MAX(temp_c), AVG(humidity), COUNT(*)
+    FROM weather_raw
+    WHERE city_name = %(city)s AND ts_utc BETWEEN %(start)s AND %(end)s
+    GROUP BY 1
+    ORDER BY 1
+"""
+SELECT_ROLLUP_BUCKETS_SQL = """
+    SELECT (bucket_ts / %(bucket)s) * %(bucket)s AS bucket_ts,
+           SUM(sum_temp) / SUM(samples), MIN(min_temp), MAX(max_temp),
+           SUM(sum_humidity) / SUM(samples), SUM(samples)
+    FROM {table}
+    WHERE city_name = %(city)s AND bucket_ts BETWEEN %(start)s AND %(end)s
+    GROUP BY 1
+    ORDER BY 1
+"""
+
+SELECT_RETRY_QUEUE_SQL = "SELECT city, attempts, next_attempt_at FROM fetch_retry_queue"
+UPSERT_RETRY_QUEUE_SQL = """
+    INSERT INTO fetch_retry_queue (city, attempts, last_error, first_failed_at, next_attempt_at)
+    VALUES (%s, %s, %s, %s, %s)
+    ON CONFLICT (city) DO UPDATE SET
+        attempts = EXCLUDED.attempts,
+        last_error = EXCLUDED.last_error,
+        next_attempt_at = EXCLUDED.next_attempt_at
+"""
+DELETE_RETRY_QUEUE_SQL = "DELETE FROM fetch_retry_queue WHERE city = %s"
+
+SELECT_CITY_LOOKUP_SQL = "SELECT query, city_id FROM city_lookup"
+UPSERT_CITY_LOOKUP_SQL = """
+    INSERT INTO city_lookup (query, city_id, resolved_at) VALUES (%s, %s, %s)
+    ON CONFLICT (query) DO UPDATE SET city_id = EXCLUDED.city_id, resolved_at = EXCLUDED.resolved_at
+"""
+DELETE_CITY_LOOKUP_SQL = "DELETE FROM city_lookup WHERE query = %s"
+
+
+def _require_psycopg2():
+    global psycopg2
+    if psycopg2 is None:
+        try:
+            import psycopg2 as module
+            import psycopg2.pool
+        except ImportError as e:
+            raise ImportError("The PostgreSQL backend needs psycopg2: pip install psycopg2-binary") from e
+        psycopg2 = module
+
+
+def _copy_value(value):
+    """Encode one value in the COPY text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, str):
+        return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+    return str(value)
+
+
+def copy_buffer(rows):
+    """Serialize rows (RAW_COLUMNS order) into a file-like object for COPY ... FROM STDIN."""
+    return io.StringIO("".join("\t".join(map(_copy_value, row)) + "\n" for row in rows))
+
+
+class PostgresBackend(StorageBackend):
+    """
+    A PostgreSQL database, the central store named in the shop's architecture, which unlike
+    SQLite accepts writes from several ingest workers at once.
+    Connections come from a thread-safe pool of min_connections..max_connections. Batches are
+    loaded with COPY into a temporary staging table and merged into weather_raw with a single
+    INSERT ... ON CONFLICT DO NOTHING, which also maintains cities and the hourly/daily rollups
+    (the job of triggers in the SQLite schema).
+    """
+
+    name = "postgres"
+
+    def __init__(self, dsn: str, min_connections: int = 1, max_connections: int = 8):
+        _require_psycopg2()
+        if not dsn:
+            raise ValueError("The PostgreSQL backend needs a connection string (--pg-dsn or WEATHER_PG_DSN)")
+        self.errors = (psycopg2.Error,)
+        self._pool = psycopg2.pool.ThreadedConnectionPool(min_connections, max_connections, dsn)
+        # getconn raises instead of waiting when the pool is exhausted, so callers queue here
+        self._slots = threading.BoundedSemaphore(max_connections)
+        logging.info(f"Opened PostgreSQL connection pool ({min_connections}..{max_connections} connections)")
+
+    @contextmanager
+    def _connection(self):
+        """Borrow a pooled connection for one transaction, committed on success."""
+        with self._slots:
+            conn = self._pool.getconn()
+            try:
+                with conn:  # commits, or rolls back on error
+                    yield conn
+            finally:
+                self._pool.putconn(conn)
+
+    def _read(self, sql, params=()):
+        with self._connection() as conn, conn.cursor() as cur:
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+    def init_schema(self):
+        with self._connection() as conn, conn.cursor() as cur:
+            for statement in SCHEMA_SQL:
+                cur.execute(statement)
+        logging.info("PostgreSQL schema is up to date.")
+
+    def insert_rows(self, rows):
+        if not rows:
+            return 0
+        with self._connection() as conn, conn.cursor() as cur:
+            with DB_INSERT.labels(self.name).time():
+                cur.execute(STAGE_TABLE_SQL)
+                cur.copy_expert(COPY_STAGE_SQL, copy_buffer(rows))
+                cur.execute(MERGE_STAGE_SQL)
+                inserted = cur.fetchone()[0]
+            with DB_COMMIT.labels(self.name).time():
+                conn.commit()
+            return inserted
+
+    def _merge_new_rows(self, cur):
+        """Same high-water mark logic as weather_aggregator._merge_new_rows, in PostgreSQL."""
+        # Wait for in-flight inserts and hold new ones back, so no row below MAX(id) commits later
+        cur.execute("LOCK TABLE weather_raw IN SHARE MODE")
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM weather_raw")
+        max_id = cur.fetchone()[0]
+        cur.execute("SELECT last_id FROM aggregation_state WHERE name = %s", (STATE_NAME,))
+        mark = cur.fetchone()
+        last_id = mark[0] if mark else 0
+        if mark and max_id <= last_id:
+            return last_id, 0
+        cur.execute("SELECT COUNT(*), MAX(ts_utc) FROM weather_raw WHERE id > %s AND id <= %s", (last_id, max_id))
+        new_rows, last_ts = cur.fetchone()
+        if mark:
+            cur.execute(MERGE_METRICS_SQL, {"last_id": last_id, "max_id": max_id})
+        else:
+            cur.execute(REPLACE_METRICS_SQL, {"last_id": 0, "max_id": max_id, "start": 0, "end": 2**63 - 1})
+        cur.execute(SET_HIGH_WATER_MARK_SQL, (
+            STATE_NAME, max_id, last_ts, datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ"),
+        ))
+        logging.info(f"Merged {new_rows} new raw rows (id {last_id + 1}..{max_id}) into weather_metrics.")
+        return max_id, new_rows
+
+    def aggregate_incremental(self):
+        with self._connection() as conn, conn.cursor() as cur:
+            cur.execute("LOCK TABLE aggregation_state IN EXCLUSIVE MODE")
+            return self._merge_new_rows(cur)[1]
+
+    def aggregate_range(self, start_ts, end_ts):
+        start_ts = start_ts // SECONDS_PER_DAY * SECONDS_PER_DAY
+        end_ts = end_ts // SECONDS_PER_DAY * SECONDS_PER_DAY + SECONDS_PER_DAY - 1
+        with self._connection() as conn, conn.cursor() as cur:
+            cur.execute("LOCK TABLE aggregation_state IN EXCLUSIVE MODE")
+            last_id, _ = self._merge_new_rows(cur)
+            cur.execute(REPLACE_METRICS_SQL, {"last_id": 0, "max_id": last_id, "start": start_ts, "end": end_ts})
+            written = cur.rowcount
+        logging.info(f"Recomputed {written} city-day rows in weather_metrics for ts {start_ts}..{end_ts}.")
+        return written
+
+    def cities(self):
+        return [row[0] for row in self._read(SELECT_CITIES_SQL)]
+
+    def city_range(self, city, start_ts):
+        return self._read(SELECT_CITY_RANGE_SQL, (city, start_ts))
+
+    def daily_metrics(self, city, days):
+        return self._read(SELECT_DAILY_METRICS_SQL, (city, days))
+
+    def series_buckets(self, city, start_ts, end_ts, table, bucket):
+        sql = SELECT_RAW_BUCKETS_SQL if table == "weather_raw" else SELECT_ROLLUP_BUCKETS_SQL.format(table=table)
+        return self._read(sql, {"bucket": bucket, "city": city, "start": start_ts, "end": end_ts})
+
+    def _write(self, sql, params=()):
+        with self._connection() as conn, conn.cursor() as cur:
+            cur.execute(sql, params)
+
+    def retry_queue(self):
+        return self._read(SELECT_RETRY_QUEUE_SQL)
+
+    def save_retry(self, city, attempts, error, first_failed_at, next_attempt_at):
+        self._write(UPSERT_RETRY_QUEUE_SQL, (city, attempts, error, first_failed_at, next_attempt_at))
+
+    def delete_retry(self, city):
+        self._write(DELETE_RETRY_QUEUE_SQL, (city,))
+
+    def city_lookup(self):
+        return dict(self._read(SELECT_CITY_LOOKUP_SQL))
+
+    def save_city_lookup(self, query, city_id, resolved_at):
+        self._write(UPSERT_CITY_LOOKUP_SQL, (query, city_id, resolved_at))
+
+    def delete_city_lookup(self, query):
+        self._write(DELETE_CITY_LOOKUP_SQL, (query,))
+
+    def close(self):
+        self._pool.closeall()
@@ -0,0 +1,116 @@
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from src.utils.logger import logging
+
+DEFAULT_PROFILE_DIR = "logs/profiles"
+DEFAULT_TOP = 40
+# Before 3.12 a cProfile.Profile only sees the thread that enabled it; from 3.12 on it is built
+# on sys.monitoring, sees every thread, and a second one cannot be enabled while it runs.
+PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+
+class TickProfiler:
+    """
+    Capture a cProfile of a single fetch tick on request.
+    arm() (called by --profile-tick, or by SIGUSR1 through install_signal) makes the next tick
+    run under the profiler: the next capture() block claims the request and profiles its own
+    thread, plus every function wrapped with thread() that runs while it is open, so the fetch
+    workers of a concurrent tick are included. On Python 3.12+ the capture profiler already sees
+    every thread and thread() leaves the function alone. The merged statistics are written to
+    <out_dir>/tick-<name>-<UTC time>.prof (for pstats / snakeviz) with a text summary of the
+    `top` functions by cumulative time next to it.
+    """
+
+    def __init__(self, out_dir: str = DEFAULT_PROFILE_DIR, top: int = DEFAULT_TOP):
+        self.out_dir = Path(out_dir)
+        self.top = top
+        self._armed = threading.Event()
+        self._session = None
+        self._lock = threading.Lock()
+        self.captures = 0
+
+    def arm(self):
+        """Profile the next tick."""
+        self._armed.set()
+        logging.info("[PROFILE] the next tick will be profiled")
+
+    def install_signal(self):
+        """Arm the profiler on SIGUSR1. Returns False where the signal does not exist (Windows)."""
+        import signal
+
+        if not hasattr(signal, "SIGUSR1"):
+            return False
+        # only set the flag in the handler: logging from it could deadlock on the logging lock
+        signal.signal(signal.SIGUSR1, lambda signum, frame: self._armed.set())
+        return True
+
+    @contextmanager
+    def capture(self, name: str):
+        """Profile the with block if the profiler is armed and no other tick is being profiled."""
+        with self._lock:
+            claimed = self._armed.is_set() and self._session is None
+            if claimed:
+                self._armed.clear()
+                self._session = []
+        if not claimed:
+            yield
+            return
+        import cProfile  # deferred: only profiled ticks need it
+
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self._lock:
+                profiles, self._session = [profile, *self._session], None
+            self._write(name, profiles, time.perf_counter() - start)
+
+    def thread(self, func):
+        """Wrap func so that calls made in other threads during a capture are profiled too."""
+        if not PER_THREAD_PROFILES:
+            return func
+
+        def run(*args, **kwargs):
+            session = self._session
+            if session is None:
+                return func(*args, **kwargs)
+            import cProfile
+
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+                session.append(profile)
+        return run
+
+    def _write(self, name, profiles, elapsed):
+        import io
+        import pstats
+        from datetime import datetime, timezone
+
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        safe_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in name)[:60]
+        path = self.out_dir / f"tick-{safe_name}-{stamp}.prof"
+        try:
+            stats.dump_stats(path)
+            summary = io.StringIO()
+            pstats.Stats(str(path), stream=summary).sort_stats("cumulative").print_stats(self.top)
+            path.with_suffix(".txt").write_text(summary.getvalue(), encoding="utf-8")
+        except OSError as e:
+            logging.error(f"[PROFILE] could not write {path}: {e}")
+            return
+        self.captures += 1
+        logging.info(f"[PROFILE] tick={name} took={elapsed:.3f}s threads={len(profiles)} profile={path}")
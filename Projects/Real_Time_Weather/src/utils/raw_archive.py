@@ -0,0 +1,247 @@
+import json
+import threading
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from src.utils.logger import logging
+
+# pyarrow is optional (only needed with --archive parquet) and slow to import,
+# so it is loaded on first use by _require_pyarrow.
+pa = ds = pq = None
+
+DEFAULT_ARCHIVE_DIR = "data/archive"
+DEFAULT_MAX_ROWS = 50_000
+ROLL_FORMATS = {"hourly": "%Y%m%dT%H", "daily": "%Y%m%d"}
+ARCHIVE_COLUMNS = ["city", "city_id", "country", "dt", "captured_at_utc", "payload"]
+
+
+def _require_pyarrow():
+    global pa, ds, pq
+    if pa is None:
+        try:
+            import pyarrow
+            import pyarrow.dataset
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError("The Parquet raw archive needs pyarrow: pip install pyarrow") from e
+        pa, ds, pq = pyarrow, pyarrow.dataset, pyarrow.parquet
+
+
+def archive_schema():
+    """
+    Arrow schema of the archive files. city and country are dictionary encoded since a file
+    holds many responses for few distinct cities; payload is the compact JSON response.
+    """
+    _require_pyarrow()
+    return pa.schema([
+        ("city", pa.dictionary(pa.int32(), pa.string())),
+        ("city_id", pa.int64()),
+        ("country", pa.dictionary(pa.int32(), pa.string())),
+        ("dt", pa.int64()),
+        ("captured_at_utc", pa.string()),
+        ("payload", pa.string()),
+    ])
+
+
+def _buffer_schema():
+    # archive_schema with plain strings: buffered rows and batches are sorted by city before
+    # the dictionary encoding is applied
+    schema = archive_schema()
+    for name in ("city", "country"):
+        schema = schema.set(schema.get_field_index(name), pa.field(name, pa.string()))
+    return schema
+
+
+def _as_int(value):
+    # a malformed id or dt is archived as null (the payload keeps it) rather than failing the write
+    try:
+        value = int(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    return value if -2**63 <= value < 2**63 else None
+
+
+def _partitioning():
+    return ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+
+
+class RawArchiveWriter:
+    """
+    Append API responses into time-partitioned, compressed Parquet files under root:
+        <root>/date=YYYY-MM-DD/part-<bucket>-<id>.parquet
+    Responses are buffered per roll bucket (an hour or a day of capture time, see ROLL_FORMATS)
+    and written when the bucket changes, when it holds max_rows responses, or on flush()/close().
+    Rows are sorted by city inside each file so row-group statistics let readers skip cities.
+    A bucket whose write fails stays buffered and is written again with the next roll or flush;
+    flush() and close() raise the error (one of `errors`) so callers know it is not on disk yet.
+    """
+
+    def __init__(self, root: str = DEFAULT_ARCHIVE_DIR, roll: str = "hourly", max_rows: int = DEFAULT_MAX_ROWS,
+                 compression: str = "zstd"):
+        _require_pyarrow()
+        if roll not in ROLL_FORMATS:
+            raise ValueError(f"roll must be one of {sorted(ROLL_FORMATS)}, got {roll!r}")
+        self.root = Path(root)
+        self.roll = roll
+        self.max_rows = max_rows
+        self.compression = compression
+        self.schema = archive_schema()
+        self.errors = (OSError, pa.ArrowException)
+        self._buffer_schema = _buffer_schema()
+        self._buffers = {}
+        self._tables = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.files_written = 0
+        self.rows_written = 0
+
+    def append(self, city: str, data: dict, captured_at: datetime = None):
+        """Queue one API response captured at captured_at (UTC, defaults to now)."""
+        captured_at = captured_at or datetime.now(timezone.utc)
+        bucket = captured_at.strftime(ROLL_FORMATS[self.roll])
+        row = {
+            "city": data.get("name") or city,
+            "city_id": _as_int(data.get("id")),
+            "country": data.get("sys", {}).get("country"),
+            "dt": _as_int(data.get("dt")),
+            "captured_at_utc": captured_at.strftime("%Y%m%dT%H%M%SZ"),
+            "payload": json.dumps(data, ensure_ascii=False, separators=(",", ":")),
+        }
+        with self._lock:
+            self._roll_locked(bucket)
+            self._buffers.setdefault(bucket, []).append(row)
+            if self._count_locked(bucket, 1) >= self.max_rows:
+                self._try_write_locked(bucket)
+
+    def append_batch(self, cities, responses, batch, captured_at: datetime = None):
+        """
+        Queue the responses of one fetch at once, given the WeatherBatch transformed from them
+        (see weather_transform.transform_batch). The archive columns come from the batch arrays;
+        cities are the queries, used as the city of the responses without a name.
+        """
+        captured_at = captured_at or datetime.now(timezone.utc)
+        bucket = captured_at.strftime(ROLL_FORMATS[self.roll])
+        columns, missing = batch.columns, batch.missing
+        try:
+            table = pa.table({
+                "city": pa.array(np.where(missing["city_name"], np.asarray(cities, dtype=str), columns["city_name"])),
+                "city_id": pa.array(columns["city_id"], mask=missing["city_id"]).cast(pa.int64()),
+                "country": pa.array(columns["country"], mask=missing["country"]),
+                "dt": pa.array(columns["ts_utc"], mask=missing["ts_utc"]),
+                "captured_at_utc": pa.array(np.full(len(batch), captured_at.strftime("%Y%m%dT%H%M%SZ"))),
+                "payload": pa.array([json.dumps(data, ensure_ascii=False, separators=(",", ":")) for data in responses]),
+            }, schema=self._buffer_schema)
+        except pa.ArrowInvalid:
+            # a city id that is not a number: keep the responses through the row path
+            for city, data in zip(cities, responses):
+                self.append(city, data, captured_at)
+            return
+        with self._lock:
+            self._roll_locked(bucket)
+            self._tables.setdefault(bucket, []).append(table)
+            if self._count_locked(bucket, table.num_rows) >= self.max_rows:
+                self._try_write_locked(bucket)
+
+    def _roll_locked(self, bucket):
+        # A new bucket means the previous ones are complete: roll them to disk
+        for old in [b for b in self._pending if b != bucket]:
+            self._try_write_locked(old)
+
+    def _count_locked(self, bucket, added):
+        self._pending[bucket] = self._pending.get(bucket, 0) + added
+        return self._pending[bucket]
+
+    def flush(self):
+        """Write every buffered response to disk. Raises the first write error, once every bucket was tried."""
+        error = None
+        with self._lock:
+            for bucket in list(self._pending):
+                try:
+                    self._write_locked(bucket)
+                except self.errors as e:
+                    error = error or e
+        if error is not None:
+            raise error
+
+    def close(self):
+        self.flush()
+
+    def _try_write_locked(self, bucket):
+        try:
+            self._write_locked(bucket)
+        except self.errors as e:
+            logging.error(f"Archive write error ({self._pending[bucket]} responses kept for the next flush): {e}")
+
+    def _write_locked(self, bucket):
+        count = self._pending.pop(bucket, 0)
+        if not count:
+            return
+        rows = self._buffers.pop(bucket, [])
+        tables = self._tables.pop(bucket, [])
+        path = None
+        try:
+            if rows:
+                tables.append(pa.Table.from_pylist(rows, schema=self._buffer_schema))
+                rows = []
+            day = datetime.strptime(bucket[:8], "%Y%m%d").strftime("%Y-%m-%d")
+            part_dir = self.root / f"date={day}"
+            part_dir.mkdir(parents=True, exist_ok=True)
+            path = part_dir / f"part-{bucket}-{uuid.uuid4().hex[:8]}.parquet"
+            table = pa.concat_tables(tables).sort_by("city").cast(self.schema)
+            pq.write_table(table, path, compression=self.compression, use_dictionary=["city", "country"])
+        except self.errors:
+            # keep the responses for the next attempt, without the part file a failed write may leave
+            if path is not None:
+                path.unlink(missing_ok=True)
+            self._buffers[bucket] = rows + self._buffers.get(bucket, [])
+            self._tables[bucket] = tables + self._tables.get(bucket, [])
+            self._pending[bucket] = count + self._pending.get(bucket, 0)
+            raise
+        self.files_written += 1
+        self.rows_written += table.num_rows
+        logging.info(f"Archived {table.num_rows} responses to {path}")
+
+
+def _archive_filter(start_date=None, end_date=None, cities=None):
+    expr = None
+    for part in (
+        ds.field("date") >= start_date if start_date else None,
+        ds.field("date") <= end_date if end_date else None,
+        ds.field("city").isin(list(cities)) if cities else None,
+    ):
+        if part is not None:
+            expr = part if expr is None else expr & part
+    return expr
+
+
+def iter_archive_batches(root: str = DEFAULT_ARCHIVE_DIR, start_date: str = None, end_date: str = None,
+                         columns=None, cities=None, batch_size: int = 65_536):
+    """
+    Stream the archive as pyarrow RecordBatches.
+    start_date / end_date ('YYYY-MM-DD', inclusive) prune whole date partitions, columns limits
+    what is decoded (column pruning) and cities is pushed down as a predicate so row groups
+    without those cities are skipped.
+    """
+    _require_pyarrow()
+    if not Path(root).exists():
+        return
+    dataset = ds.dataset(root, format="parquet", partitioning=_partitioning())
+    yield from dataset.to_batches(
+        columns=columns,
+        filter=_archive_filter(start_date, end_date, cities),
+        batch_size=batch_size,
+    )
+
+
+def scan_archive(root: str = DEFAULT_ARCHIVE_DIR, start_date: str = None, end_date: str = None,
+                 columns=None, cities=None):
+    """Same as iter_archive_batches but returns one pyarrow Table."""
+    _require_pyarrow()
+    batches = list(iter_archive_batches(root, start_date, end_date, columns, cities))
+    if not batches:
+        fields = columns or ARCHIVE_COLUMNS
+        return pa.schema([f for f in archive_schema() if f.name in fields]).empty_table()
+    return pa.Table.from_batches(batches)
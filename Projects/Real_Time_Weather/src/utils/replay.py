@@ -0,0 +1,160 @@
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+from src.utils.logger import logging
+from src.utils.weather_transform import transform_batch
+from src.utils.weather_writer import WeatherWriter
+
+DEFAULT_CHUNK_SIZE = 500
+REPLAY_BATCH_SIZE = 20_000
+
+
+def iter_raw_json_files(data_dir: str):
+    """Yield the paths of the raw_<city>_<YYYYMMDDTHHMMSSZ>.json files of data_dir without listing it all up front."""
+    if not os.path.isdir(data_dir):
+        return
+    with os.scandir(data_dir) as entries:
+        for entry in entries:
+            if entry.name.startswith("raw_") and entry.name.endswith(".json") and entry.is_file():
+                yield entry.path
+
+
+def captured_at_from_filename(path: str):
+    """Return the capture timestamp encoded in a raw_<city>_<ts>.json file name."""
+    return Path(path).stem.rsplit("_", 1)[-1]
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _transform(responses, captured, failed, read):
+    # the summary is logged by the parent: records logged in a worker would not reach the log file
+    batch = transform_batch(responses, captured)
+    return batch.rows(), read, failed + len(batch) - batch.valid_count, batch.summary() if batch.rejected else None
+
+
+def parse_json_files(paths):
+    """
+    Worker: load a chunk of raw JSON files and transform them as one batch.
+    Returns (rows, sources_read, sources_rejected, transform summary if rows were rejected).
+    """
+    responses, captured, failed = [], [], 0
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                responses.append(json.load(f))
+        except (OSError, ValueError):
+            failed += 1
+            continue
+        captured.append(captured_at_from_filename(path))
+    return _transform(responses, captured, failed, len(paths))
+
+
+def parse_archive_records(records):
+    """
+    Worker: decode a chunk of (payload, captured_at_utc) pairs read from the Parquet archive and
+    transform them as one batch.
+    Returns (rows, sources_read, sources_rejected, transform summary if rows were rejected).
+    """
+    responses, captured, failed = [], [], 0
+    for payload, captured_at_utc in records:
+        try:
+            responses.append(json.loads(payload))
+        except (TypeError, ValueError):
+            failed += 1
+            continue
+        captured.append(captured_at_utc)
+    return _transform(responses, captured, failed, len(records))
+
+
+def iter_archive_records(archive_dir: str, chunk_size: int):
+    """Yield chunks of (payload, captured_at_utc) pairs from the Parquet archive, if there is one."""
+    if not os.path.isdir(archive_dir):
+        return
+    from src.utils.raw_archive import iter_archive_batches
+
+    for batch in iter_archive_batches(archive_dir, columns=["payload", "captured_at_utc"], batch_size=chunk_size):
+        columns = batch.to_pydict()
+        yield list(zip(columns["payload"], columns["captured_at_utc"]))
+
+
+def _iter_tasks(data_dir, archive_dir, chunk_size):
+    for chunk in _chunks(iter_raw_json_files(data_dir), chunk_size):
+        yield parse_json_files, chunk
+    if archive_dir:
+        for chunk in iter_archive_records(archive_dir, chunk_size):
+            yield parse_archive_records, chunk
+
+
+def _run_pool(tasks, writer, workers, totals):
+    """Run (func, chunk) tasks on a process pool with a bounded number in flight, feeding writer."""
+    import multiprocessing  # deferred: only a replay with work to do starts processes
+
+    def collect(future):
+        rows, read, rejected, summary = future.result()
+        if summary:
+            logging.warning("[TRANSFORM] %s", summary)
+        writer.add_many(rows)
+        totals["sources"] += read
+        totals["rejected"] += rejected
+        totals["rows_parsed"] += len(rows)
+
+    # spawn, not fork: a forked child would inherit the logging listener thread's locks
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending = set()
+        for func, chunk in tasks:
+            pending.add(pool.submit(func, chunk))
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future)
+        for future in pending:
+            collect(future)
+
+
+def replay(db_path: str, data_dir: str = "data", archive_dir: str = None, workers: int = None,
+           chunk_size: int = DEFAULT_CHUNK_SIZE, batch_size: int = REPLAY_BATCH_SIZE, wal: bool = True):
+    """
+    Rebuild weather_raw from the raw responses kept on disk.
+    The raw_*.json files of data_dir and, when archive_dir is given, the Parquet archive are
+    streamed in chunks of chunk_size, parsed across a pool of `workers` processes (CPU count by
+    default) and bulk loaded through one WeatherWriter. Rows already in the table are skipped by
+    the UNIQUE(city_id, ts_utc) constraint, so a replay can be re-run safely.
+    Returns a dict with counts and files/sec and rows/sec throughput.
+    """
+    workers = workers or os.cpu_count() or 1
+    totals = {"sources": 0, "rejected": 0, "rows_parsed": 0}
+    tasks = _iter_tasks(data_dir, archive_dir, chunk_size)
+
+    start = time.perf_counter()
+    writer = WeatherWriter(db_path, batch_size=batch_size, flush_interval=0, wal=wal, synchronous="NORMAL")
+    try:
+        _run_pool(tasks, writer, workers, totals)
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - start
+
+    writer_stats = writer.stats()
+    result = {
+        **totals,
+        "rows_inserted": writer_stats["rows_inserted"],
+        "rows_duplicate": writer_stats["rows_duplicate"],
+        "workers": workers,
+        "seconds": round(elapsed, 3),
+        "files_per_sec": round(totals["sources"] / elapsed, 1) if elapsed else 0.0,
+        "rows_per_sec": round(writer_stats["rows_inserted"] / elapsed, 1) if elapsed else 0.0,
+    }
+    logging.info(f"Replay finished: {result}")
+    return result
+
@@ -0,0 +1,231 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+from src.utils.logger import logging
+
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 30.0
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_RESET = 60.0
+# Responses worth sending the request again for: throttling and server-side failures.
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+# The retry queue waits RETRY_QUEUE_DELAY seconds after a city's first failure, doubling up to
+# RETRY_QUEUE_MAX_DELAY, and gives the city up after RETRY_QUEUE_MAX_ATTEMPTS failures.
+RETRY_QUEUE_DELAY = 60.0
+RETRY_QUEUE_MAX_DELAY = 3600.0
+RETRY_QUEUE_MAX_ATTEMPTS = 24
+
+
+class FetchFailed(Exception):
+    """
+    A request that could not get an answer: network errors, timeouts, 429 or 5xx responses
+    still failing after the retries, an open circuit breaker or an exhausted tick deadline.
+    reason is a short label for the metrics ("exhausted", "circuit_open" or "deadline").
+    """
+
+    def __init__(self, message: str, reason: str = "exhausted"):
+        super().__init__(message)
+        self.reason = reason
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker, one circuit per host.
+    A host whose calls failed `threshold` times in a row is opened: calls to it fail fast for
+    reset_timeout seconds instead of each waiting for its timeout. Then a single trial call is
+    let through (half-open); its success closes the circuit, its failure opens it again and
+    release() (a trial that said nothing about the host, e.g. a 429) keeps it open for another
+    reset_timeout.
+    """
+
+    def __init__(self, threshold: int = DEFAULT_BREAKER_THRESHOLD, reset_timeout: float = DEFAULT_BREAKER_RESET,
+                 clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._failures = {}
+        self._opened_at = {}
+        self._probing = set()
+        self._lock = threading.Lock()
+
+    def state(self, host: str):
+        """"closed", "open" or "half-open"."""
+        with self._lock:
+            return self._state(host)
+
+    def _state(self, host):
+        opened_at = self._opened_at.get(host)
+        if opened_at is None:
+            return "closed"
+        return "open" if self.clock() - opened_at < self.reset_timeout else "half-open"
+
+    def allow(self, host: str):
+        """Whether a call to host may be sent now."""
+        with self._lock:
+            state = self._state(host)
+            if state == "closed":
+                return True
+            if state == "half-open" and host not in self._probing:
+                self._probing.add(host)
+                return True
+            return False
+
+    def success(self, host: str):
+        with self._lock:
+            self._failures.pop(host, None)
+            self._probing.discard(host)
+            closed = self._opened_at.pop(host, None) is not None
+        if closed:
+            logging.info(f"[BREAKER] host={host} state=closed")
+
+    def failure(self, host: str):
+        with self._lock:
+            failures = self._failures[host] = self._failures.get(host, 0) + 1
+            reopened = host in self._probing
+            self._probing.discard(host)
+            if not reopened and (failures < self.threshold or host in self._opened_at):
+                return
+            self._opened_at[host] = self.clock()
+        logging.warning(f"[BREAKER] host={host} state=open failures={failures} retry_in={self.reset_timeout:g}s")
+
+    def release(self, host: str):
+        """End a call that was neither a success nor a failure; a trial call restarts the open timer."""
+        with self._lock:
+            if host not in self._probing:
+                return
+            self._probing.discard(host)
+            self._opened_at[host] = self.clock()
+        logging.info(f"[BREAKER] host={host} state=open trial=inconclusive retry_in={self.reset_timeout:g}s")
+
+
+class Deadline:
+    """A point in time after which a tick stops sending requests. seconds=None never expires."""
+
+    def __init__(self, seconds: float = None, clock=time.monotonic):
+        self.clock = clock
+        self.at = None if seconds is None else clock() + seconds
+
+    def remaining(self):
+        """Seconds left (never negative), or None without a deadline."""
+        return None if self.at is None else max(0.0, self.at - self.clock())
+
+    @property
+    def expired(self):
+        return self.at is not None and self.clock() >= self.at
+
+    def clamp(self, timeout: float):
+        """timeout, shortened so it cannot run past the deadline."""
+        remaining = self.remaining()
+        return timeout if remaining is None else min(timeout, remaining)
+
+
+class FetchPolicy:
+    """
+    How get_json handles transient failures.
+    A failed call is sent again up to `retries` times, after a full-jitter exponential backoff
+    (a random delay up to backoff * 2**attempt, capped at max_backoff) or, on a 429 or 503, after
+    the Retry-After the provider asked for. breaker (a CircuitBreaker) is shared by all the calls
+    of the process and deadline bounds a single tick: for_tick() makes the policy of one tick.
+    """
+
+    def __init__(self, retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF,
+                 max_backoff: float = DEFAULT_MAX_BACKOFF, breaker: CircuitBreaker = None,
+                 deadline: Deadline = None, rng: random.Random = None):
+        self.retries = max(retries, 0)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker
+        self.deadline = deadline or Deadline()
+        self.rng = rng or random.Random()
+
+    def for_tick(self, seconds: float = None):
+        """The same policy (and breaker), with a deadline `seconds` from now."""
+        return FetchPolicy(self.retries, self.backoff, self.max_backoff, self.breaker, Deadline(seconds), self.rng)
+
+    def delay(self, attempt: int, retry_after: float = None):
+        """Seconds to wait before retry number attempt + 1 (attempt counts from 0)."""
+        if retry_after is not None:
+            # a little jitter so the clients told the same Retry-After do not come back together
+            return retry_after + self.rng.uniform(0, self.backoff)
+        return self.rng.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+
+class RetryQueue:
+    """
+    Cities whose fetch failed, kept in the fetch_retry_queue table of a storage backend so they
+    are fetched again (by a retry sweep, or with the next run_once) instead of being dropped.
+    backend is the StorageBackend of the writer, whose schema is already created, so the queue
+    goes through the same connections and database as the observations.
+    Each new failure of a city doubles its wait, from base_delay up to max_delay; after
+    max_attempts failures it is given up with an error. The queue is mirrored in memory, so
+    remove() only touches the database for cities that are actually queued.
+    """
+
+    def __init__(self, backend, base_delay: float = RETRY_QUEUE_DELAY, max_delay: float = RETRY_QUEUE_MAX_DELAY,
+                 max_attempts: int = RETRY_QUEUE_MAX_ATTEMPTS, clock=time.time):
+        self.backend = backend
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._queue = {}  # city -> (attempts, next_attempt_at)
+        self._load()
+
+    @property
+    def size(self):
+        return len(self._queue)
+
+    def __contains__(self, city):
+        return city in self._queue
+
+    def _load(self):
+        try:
+            self._queue = {city: (attempts, at) for city, attempts, at in self.backend.retry_queue()}
+        except self.backend.errors as e:
+            logging.error(f"Retry queue load error: {e}")
+            return
+        if self._queue:
+            logging.info(f"Loaded {len(self._queue)} cities waiting in the fetch retry queue.")
+
+    def _write(self, method, *params):
+        try:
+            method(*params)
+        except self.backend.errors as e:
+            logging.error(f"Retry queue write error: {e}")
+
+    def push(self, city: str, error: str):
+        """Record a failed fetch of city and schedule its next attempt."""
+        with self._lock:
+            attempts = self._queue.get(city, (0, 0.0))[0] + 1
+            if attempts > self.max_attempts:
+                self._queue.pop(city, None)
+            else:
+                next_at = self.clock() + min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+                self._queue[city] = (attempts, next_at)
+        if attempts > self.max_attempts:
+            logging.error(f"[RETRY] city={city} giving up after {attempts - 1} failed retries: {error}")
+            self._write(self.backend.delete_retry, city)
+            return
+        first_failed_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        self._write(self.backend.save_retry, city, attempts, error, first_failed_at, next_at)
+        logging.warning(f"[RETRY] city={city} attempts={attempts} next_in={next_at - self.clock():.0f}s error={error}")
+
+    def remove(self, city: str):
+        """Forget city after a successful fetch."""
+        if city not in self._queue:
+            return
+        with self._lock:
+            if self._queue.pop(city, None) is None:
+                return
+        self._write(self.backend.delete_retry, city)
+        logging.info(f"[RETRY] city={city} recovered")
+
+    def due(self):
+        """The queued cities whose next attempt time has come, oldest first."""
+        now = self.clock()
+        with self._lock:
+            return [city for city, (_, at) in sorted(self._queue.items(), key=lambda item: item[1][1]) if at <= now]
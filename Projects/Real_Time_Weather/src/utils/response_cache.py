@@ -0,0 +1,126 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from src.utils.logger import logging
+
+DEFAULT_CACHE_PATH = "data/response_cache.json"
+# OpenWeatherMap refreshes a station's observation (dt) about every 10 minutes.
+DEFAULT_UPDATE_INTERVAL = 600
+# How long to wait before asking again when the expected update has not shown up yet.
+DEFAULT_RECHECK_INTERVAL = 60
+
+
+class ResponseCache:
+    """
+    Remember the last observation seen for each city to avoid useless API calls and writes.
+    For every city query it keeps the city_id, the observation time `dt` and the time the next
+    update is expected (dt + update_interval). Until then should_fetch() answers False, since the
+    API cannot return anything new. is_new() tells whether a fetched payload is new, i.e. whether
+    its (city_id, dt) has not been stored yet, so unchanged payloads skip the file and DB writes;
+    record() marks it stored once its write succeeded.
+    State lives in memory and is persisted to a small JSON file by save(), so restarts keep it.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, update_interval: float = DEFAULT_UPDATE_INTERVAL,
+                 recheck_interval: float = DEFAULT_RECHECK_INTERVAL, clock=time.time):
+        self.path = Path(path) if path else None
+        self.update_interval = update_interval
+        self.recheck_interval = recheck_interval
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._cities = {}    # city query -> {"city_id", "dt", "next_check"}
+        self._last_dt = {}   # city_id -> newest dt seen
+        self.hits = 0
+        self.misses = 0
+        self.unchanged = 0
+        self._load()
+
+    def _load(self):
+        if not self.path or not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self._cities = state.get("cities", {})
+            self._last_dt = state.get("last_dt", {})
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable response cache {self.path}: {e}")
+
+    def save(self):
+        """Write the cache state to disk atomically."""
+        if not self.path:
+            return
+        with self._lock:
+            state = {"cities": dict(self._cities), "last_dt": dict(self._last_dt)}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logging.error(f"Response cache write error: {e}")
+
+    def should_fetch(self, city: str):
+        """Return False (a hit, one API call saved) if no new observation can exist yet for city."""
+        with self._lock:
+            entry = self._cities.get(city)
+            if entry and self.clock() < entry["next_check"]:
+                self.hits += 1
+                return False
+            self.misses += 1
+            return True
+
+    def is_new(self, city: str, data: dict):
+        """
+        Return True if a fetched payload for city holds an observation not stored yet.
+        Payloads without id or dt are always treated as new. Nothing is remembered until record().
+        """
+        city_id, dt = data.get("id"), data.get("dt")
+        if city_id is None or not dt:
+            return True
+        with self._lock:
+            if dt > self._last_dt.get(str(city_id), 0):
+                return True
+            self.unchanged += 1
+        self._schedule(city, str(city_id), dt)
+        return False
+
+    def record(self, city: str, data: dict):
+        """
+        Remember the observation of a payload once it is stored, so that it is not written again
+        and city is not requested before its next update is due. Call it only after the write
+        succeeded: a payload whose write failed must still count as new when it is fetched again.
+        """
+        city_id, dt = data.get("id"), data.get("dt")
+        if city_id is None or not dt:
+            return
+        city_id = str(city_id)
+        with self._lock:
+            if dt > self._last_dt.get(city_id, 0):
+                self._last_dt[city_id] = dt
+        self._schedule(city, city_id, dt)
+
+    def _schedule(self, city, city_id, dt):
+        now = self.clock()
+        next_check = dt + self.update_interval
+        if next_check <= now:
+            # The update is overdue: poll again soon rather than right away
+            next_check = now + self.recheck_interval
+        with self._lock:
+            self._cities[city] = {"city_id": city_id, "dt": dt, "next_check": next_check}
+
+    def stats(self):
+        """Counters: hits (= API calls saved), misses (calls made), unchanged payloads (writes saved)."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "saved_calls": self.hits,
+                "unchanged_payloads": self.unchanged,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
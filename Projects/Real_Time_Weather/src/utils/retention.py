@@ -0,0 +1,291 @@
+import json
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from src.utils.logger import logging
+from src.utils.raw_archive import DEFAULT_ARCHIVE_DIR, RawArchiveWriter
+from src.utils.replay import captured_at_from_filename, iter_raw_json_files
+from src.utils.weather_aggregator import SECONDS_PER_DAY, aggregate_incremental, get_high_water_mark
+from src.utils.weather_db import (
+    AUTO_VACUUM_SQL, COUNT_EXPIRED_SQL, PRUNE_METRICS_SQL, PRUNE_RAW_SQL, PRUNE_ROLLUP_SQL,
+)
+
+# What each retention target holds. Days of None keep it forever.
+RETENTION_TARGETS = {
+    "raw": "weather_raw rows",
+    "hourly": "weather_rollup_hourly rows",
+    "daily": "weather_rollup_daily rows",
+    "metrics": "weather_metrics rows",
+    "files": "raw_*.json files (moved to the Parquet archive)",
+    "archive": "Parquet archive partitions",
+}
+DEFAULT_RETENTION = {"raw": 90, "files": 90, "hourly": None, "daily": None, "metrics": None, "archive": None}
+ROLLUP_TABLES = {"hourly": "weather_rollup_hourly", "daily": "weather_rollup_daily"}
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_PAUSE = 0.05
+DEFAULT_VACUUM_PAGES = 1000
+DEFAULT_FILES_PER_CHUNK = 5000
+BUSY_TIMEOUT = 30.0
+
+
+def parse_retention(specs, base=None):
+    """
+    Parse --keep values of the form "TARGET=DAYS" (or "TARGET=forever") on top of base
+    (DEFAULT_RETENTION by default) into {target: days or None}.
+    """
+    retention = dict(DEFAULT_RETENTION if base is None else base)
+    for spec in specs or []:
+        target, sep, days = spec.partition("=")
+        target = target.strip()
+        if not sep or target not in RETENTION_TARGETS:
+            raise ValueError(f"expected TARGET=DAYS with TARGET one of {', '.join(RETENTION_TARGETS)}, got {spec!r}")
+        if days.strip().lower() == "forever":
+            retention[target] = None
+            continue
+        if not days.strip().isdigit() or int(days) < 1:
+            raise ValueError(f"days must be a positive integer or 'forever' in {spec!r}")
+        retention[target] = int(days)
+    if retention["files"] is not None and retention["archive"] is not None and retention["archive"] < retention["files"]:
+        raise ValueError("the archive must be kept at least as long as the raw files moved into it")
+    return retention
+
+
+def cutoff_ts(days, now=None):
+    """Start of the oldest UTC day kept by a `days`-day policy: everything before it is expired."""
+    now = time.time() if now is None else now
+    return int(now - days * SECONDS_PER_DAY) // SECONDS_PER_DAY * SECONDS_PER_DAY
+
+
+def _day(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def _delete_in_batches(conn, sql, params, batch_size, pause, stats):
+    """
+    Run a DELETE ... LIMIT ? statement in its own short write transaction until it deletes less
+    than batch_size rows, sleeping `pause` seconds in between so the ingestor can take the lock.
+    Returns the rows deleted.
+    """
+    deleted = 0
+    while True:
+        start = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            count = conn.execute(sql, params + (batch_size,)).rowcount
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        stats["batches"] += 1
+        stats["max_batch_ms"] = max(stats["max_batch_ms"], round((time.perf_counter() - start) * 1000, 2))
+        deleted += count
+        if count < batch_size:
+            return deleted
+        time.sleep(pause)
+
+
+def prune_database(conn, retention, now=None, batch_size=DEFAULT_BATCH_SIZE, pause=DEFAULT_PAUSE, dry_run=False):
+    """
+    Delete the rows expired under retention ({target: days or None}) from an SQLite database.
+    Cutoffs fall on UTC day boundaries, so a day is kept or pruned as a whole and recomputing the
+    metrics of a pruned day (aggregate_range) finds no raw rows instead of part of them.
+    Raw rows are only deleted once merged into weather_metrics: the incremental aggregation runs
+    first, and rows above its high-water mark are kept whatever their age. The hourly and daily
+    rollups are kept up to date by trigger at insert time, so they already hold them.
+    Rows go in batches of batch_size, each in its own transaction. With dry_run nothing is
+    deleted and the expired rows are counted instead.
+    Returns {target: rows, "batches": n, "max_batch_ms": longest write transaction}.
+    """
+    stats = {"batches": 0, "max_batch_ms": 0.0}
+    if retention.get("raw") is not None:
+        if dry_run:
+            # the real pass aggregates first, so everything present counts as merged
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM weather_raw;").fetchone()[0]
+        else:
+            aggregate_incremental(conn)
+            mark = get_high_water_mark(conn)
+            last_id = mark[0] if mark else 0
+        params = (cutoff_ts(retention["raw"], now), last_id)
+        stats["raw"] = (conn.execute(COUNT_EXPIRED_SQL["raw"], params).fetchone()[0] if dry_run
+                        else _delete_in_batches(conn, PRUNE_RAW_SQL, params, batch_size, pause, stats))
+    for target, table in ROLLUP_TABLES.items():
+        if retention.get(target) is not None:
+            params = (cutoff_ts(retention[target], now),)
+            stats[target] = (conn.execute(COUNT_EXPIRED_SQL["rollup"].format(table=table), params).fetchone()[0] if dry_run
+                             else _delete_in_batches(conn, PRUNE_ROLLUP_SQL.format(table=table), params, batch_size, pause, stats))
+    if retention.get("metrics") is not None:
+        params = (_day(cutoff_ts(retention["metrics"], now)),)
+        stats["metrics"] = (conn.execute(COUNT_EXPIRED_SQL["metrics"], params).fetchone()[0] if dry_run
+                            else _delete_in_batches(conn, PRUNE_METRICS_SQL, params, batch_size, pause, stats))
+    return stats
+
+
+def enable_incremental_vacuum(conn):
+    """
+    Switch an existing database to auto_vacuum=INCREMENTAL. This rewrites the whole file with a
+    VACUUM, which holds the write lock for its duration: run it once, with the ingestor stopped.
+    """
+    mode = conn.execute("PRAGMA auto_vacuum;").fetchone()[0]
+    if mode == 2:
+        return False
+    conn.execute(AUTO_VACUUM_SQL)
+    conn.execute("VACUUM;")
+    logging.info("Database rewritten with auto_vacuum=INCREMENTAL.")
+    return True
+
+
+def reclaim_space(conn, pages=DEFAULT_VACUUM_PAGES, pause=DEFAULT_PAUSE):
+    """
+    Give the free pages left by the deletes back to the file system, `pages` at a time with a
+    pause in between, then checkpoint and truncate the WAL if the database uses one.
+    The database must be in auto_vacuum=INCREMENTAL mode (new databases are, see AUTO_VACUUM_SQL);
+    otherwise the free pages are left for new rows to reuse.
+    Returns {"freed_pages", "free_pages" (left), "wal_checkpoint": (busy, log frames, checkpointed) or None}.
+    """
+    free = conn.execute("PRAGMA freelist_count;").fetchone()[0]
+    freed = 0
+    if conn.execute("PRAGMA auto_vacuum;").fetchone()[0] != 2:
+        if free:
+            logging.info(f"{free} free pages kept for reuse: run `main.py retention --enable-incremental-vacuum` "
+                         "once to shrink the file as well")
+    else:
+        while free and pages > 0:
+            # executescript steps the pragma to the end; execute() would free a single page
+            conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+            left = conn.execute("PRAGMA freelist_count;").fetchone()[0]
+            freed += free - left
+            if left >= free:
+                break
+            free = left
+            time.sleep(pause)
+    checkpoint = None
+    if conn.execute("PRAGMA journal_mode;").fetchone()[0] == "wal":
+        checkpoint = conn.execute("PRAGMA wal_checkpoint(TRUNCATE);").fetchone()
+    return {"freed_pages": freed, "free_pages": free, "wal_checkpoint": checkpoint}
+
+
+def archive_expired_files(data_dir, archive_dir=DEFAULT_ARCHIVE_DIR, days=None, now=None,
+                          chunk_size=DEFAULT_FILES_PER_CHUNK, dry_run=False):
+    """
+    Move the raw_*.json files of data_dir captured before the `days`-day cutoff into the Parquet
+    archive (zstd-compressed, daily partitions), where replay still finds them.
+    The directory is streamed: expired files are read chunk_size at a time and appended in
+    capture order, one day at a time. A day's files are deleted only once the archive file
+    holding them is written; if the write fails they are left in place and the pass stops, since
+    the next days would most likely fail the same way. A crash in between also leaves them in
+    place, and the next run archives them again (replay skips the duplicate rows).
+    Returns {"files": archived (or expired, with dry_run), "rejected": unreadable files left in
+    place, "failed": files left in place because their archive write failed}.
+    """
+    cutoff = cutoff_ts(days, now)
+    totals = {"files": 0, "rejected": 0, "failed": 0}
+    archive = None if dry_run else RawArchiveWriter(archive_dir, roll="daily", max_rows=chunk_size)
+
+    def archive_day(files):
+        done = []
+        for captured, path in files:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                totals["rejected"] += 1
+                continue
+            city = Path(path).stem[len("raw_"):].rsplit("_", 1)[0].replace("_", " ")
+            archive.append(city, data, captured)
+            done.append(path)
+        try:
+            archive.flush()
+        except archive.errors as e:
+            totals["failed"] += len(done)
+            logging.error(f"Archive write error, {len(done)} raw files of {_day(files[0][0].timestamp())} left in place: {e}")
+            return False
+        for path in done:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logging.error(f"Could not remove archived file {path}: {e}")
+        totals["files"] += len(done)
+        return True
+
+    def archive_chunk(chunk):
+        chunk.sort()
+        start = 0
+        for i in range(1, len(chunk) + 1):
+            if i == len(chunk) or chunk[i][0].date() != chunk[start][0].date():
+                if not archive_day(chunk[start:i]):
+                    return False
+                start = i
+        return True
+
+    chunk = []
+    for path in iter_raw_json_files(data_dir):
+        try:
+            captured = datetime.strptime(captured_at_from_filename(path), "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue  # not named by the ingestor
+        if captured.timestamp() >= cutoff:
+            continue
+        if dry_run:
+            totals["files"] += 1
+            continue
+        chunk.append((captured, path))
+        if len(chunk) >= chunk_size:
+            if not archive_chunk(chunk):
+                return totals
+            chunk = []
+    if chunk:
+        archive_chunk(chunk)
+    return totals
+
+
+def prune_archive(archive_dir=DEFAULT_ARCHIVE_DIR, days=None, now=None, dry_run=False):
+    """Delete the date=YYYY-MM-DD partitions of the Parquet archive older than the `days`-day cutoff. Returns the partitions."""
+    cutoff = _day(cutoff_ts(days, now))
+    root = Path(archive_dir)
+    expired = sorted(p for p in root.glob("date=*") if p.is_dir() and p.name[len("date="):] < cutoff) if root.is_dir() else []
+    if not dry_run:
+        for partition in expired:
+            shutil.rmtree(partition)
+    return len(expired)
+
+
+def database_size(db_path):
+    """Bytes used by the database file and its WAL."""
+    return sum(os.path.getsize(path) for path in (db_path, f"{db_path}-wal") if os.path.exists(path))
+
+
+def run_retention(db_path, data_dir="data", archive_dir=DEFAULT_ARCHIVE_DIR, retention=None, now=None,
+                  batch_size=DEFAULT_BATCH_SIZE, pause=DEFAULT_PAUSE, vacuum_pages=DEFAULT_VACUUM_PAGES, dry_run=False):
+    """
+    One retention pass over the SQLite database at db_path and the raw files of data_dir, under
+    retention ({target: days or None}, DEFAULT_RETENTION by default): prune_database, then
+    reclaim_space (skipped with vacuum_pages=0), then archive_expired_files and prune_archive.
+    Safe to run next to the ingestor: every write transaction is one batch, and the connection
+    waits up to BUSY_TIMEOUT seconds for the lock instead of failing.
+    Returns a summary dict, also logged.
+    """
+    retention = DEFAULT_RETENTION if retention is None else retention
+    start = time.perf_counter()
+    summary = {"dry_run": dry_run, "db_bytes_before": database_size(db_path)}
+    if os.path.exists(db_path):
+        conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        try:
+            summary.update(prune_database(conn, retention, now, batch_size, pause, dry_run))
+            if not dry_run and vacuum_pages > 0:
+                summary.update(reclaim_space(conn, vacuum_pages, pause))
+        finally:
+            conn.close()
+    if retention.get("files") is not None:
+        files = archive_expired_files(data_dir, archive_dir, retention["files"], now, dry_run=dry_run)
+        summary["files"], summary["files_rejected"] = files["files"], files["rejected"]
+        summary["files_failed"] = files["failed"]
+    if retention.get("archive") is not None:
+        summary["archive_partitions"] = prune_archive(archive_dir, retention["archive"], now, dry_run)
+    summary["db_bytes_after"] = database_size(db_path)
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+    logging.info(f"Retention pass{' (dry run)' if dry_run else ''}: {summary}")
+    return summary
@@ -0,0 +1,139 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.utils.logger import logging
+
+
+class ScheduledJob:
+    """
+    A function run every `interval` seconds on a fixed-rate grid.
+    The n-th run is due at start + offset + n * interval (+ up to `jitter` random seconds),
+    so the time a run takes never shifts the following ones. Runs that would start while the
+    previous one is still going are skipped, and so are ticks missed while the process was busy.
+    """
+
+    def __init__(self, name, func, interval, offset=0.0, jitter=0.0):
+        if interval <= 0:
+            raise ValueError(f"interval must be positive, got {interval}")
+        self.name = name
+        self.func = func
+        self.interval = float(interval)
+        self.offset = float(offset)
+        self.jitter = float(jitter)
+        self.base = None  # grid time of the next run, without jitter
+        self.running = False
+        self.runs = 0
+        self.skipped = 0
+        self.last_duration = None
+
+
+class TimerHeapScheduler:
+    """
+    Run many ScheduledJobs from one thread using a heap of due times.
+    Due jobs are handed to a pool of `max_workers` threads, so a slow job delays neither the
+    clock nor the other jobs. stop() (or Ctrl+C in run_forever) ends the loop.
+    """
+
+    def __init__(self, max_workers=4, clock=time.monotonic, rng=None):
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self._heap = []
+        self._seq = itertools.count()
+        self._jobs = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scheduler")
+
+    @property
+    def jobs(self):
+        return list(self._jobs)
+
+    def add_job(self, name, func, interval, offset=0.0, jitter=0.0):
+        """Register func to run every `interval` seconds, the first time `offset` seconds from now."""
+        job = ScheduledJob(name, func, interval, offset, jitter)
+        job.base = self.clock() + job.offset
+        self._jobs.append(job)
+        self._push(job)
+        return job
+
+    def _push(self, job):
+        due = job.base + (self.rng.uniform(0, job.jitter) if job.jitter else 0.0)
+        heapq.heappush(self._heap, (due, next(self._seq), job))
+
+    def _advance(self, job, now):
+        """Move the job to its next grid slot after now, counting the slots that were missed."""
+        job.base += job.interval
+        if job.base <= now:
+            missed = int((now - job.base) // job.interval) + 1
+            job.base += missed * job.interval
+            job.skipped += missed
+            logging.warning(f"[SCHEDULE] job={job.name} missed {missed} tick(s), resuming on the grid")
+
+    def _run(self, job):
+        start = time.perf_counter()
+        try:
+            job.func()
+        except Exception as e:
+            logging.error(f"[SCHEDULE] job={job.name} failed: {e}")
+        finally:
+            job.last_duration = time.perf_counter() - start
+            with self._lock:
+                job.running = False
+                job.runs += 1
+
+    def run_pending(self):
+        """Start every job that is due now. Returns the number of seconds until the next one."""
+        now = self.clock()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, job = heapq.heappop(self._heap)
+            with self._lock:
+                overlapping = job.running
+                if not overlapping:
+                    job.running = True
+            if overlapping:
+                job.skipped += 1
+                logging.warning(f"[SCHEDULE] job={job.name} still running, skipping this tick")
+            else:
+                self._pool.submit(self._run, job)
+            self._advance(job, now)
+            self._push(job)
+        return max(0.0, self._heap[0][0] - self.clock()) if self._heap else None
+
+    def run_forever(self):
+        """Dispatch jobs until stop() is called. Waits on an Event, so stop() takes effect at once."""
+        while not self._stop.is_set():
+            delay = self.run_pending()
+            self._stop.wait(delay if delay is not None else 1.0)
+
+    def stop(self, wait=True):
+        """Stop dispatching and, if wait, let the running jobs finish."""
+        self._stop.set()
+        self._pool.shutdown(wait=wait)
+
+
+def spread_offsets(count, interval):
+    """Start offsets that spread `count` jobs evenly over one `interval` instead of firing them together."""
+    return [i * interval / count for i in range(count)] if count else []
+
+
+def parse_interval_overrides(specs):
+    """
+    Parse --city-interval values of the form "CITY[,CITY...]=MINUTES" into {city: seconds}.
+    Listing several cities before the '=' puts them in a group sharing that interval.
+    """
+    overrides = {}
+    for spec in specs or []:
+        cities, sep, minutes = spec.rpartition("=")
+        if not sep or not cities:
+            raise ValueError(f"expected CITY[,CITY...]=MINUTES, got {spec!r}")
+        seconds = float(minutes) * 60
+        if seconds <= 0:
+            raise ValueError(f"interval must be positive in {spec!r}")
+        for city in cities.split(","):
+            if city.strip():
+                overrides[city.strip()] = seconds
+    return overrides
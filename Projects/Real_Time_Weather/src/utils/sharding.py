@@ -0,0 +1,117 @@
+import signal
+
+from src.utils.http_client import DEFAULT_BASE_URL, HostRateLimiter, create_session, fetch_many, get_json, weather_url
+from src.utils.logger import configure_logging, logging
+from src.utils.resilience import RETRY_QUEUE_DELAY, CircuitBreaker, FetchFailed, FetchPolicy
+from src.utils.work_queue import DEFAULT_CLAIM_SIZE, DEFAULT_LEASE_SECONDS, open_work_queue, worker_id
+
+DEFAULT_WORKER_CONCURRENCY = 16
+# How long an idle worker waits before asking the queue for due cities again.
+DEFAULT_IDLE_WAIT = 1.0
+
+
+def fetch_city(city, api_key, session, rate_limiter=None, base_url=DEFAULT_BASE_URL, policy=None):
+    """Fetch the current weather of city: (payload or None, the FetchFailed if the call failed)."""
+    params = {"appid": api_key, "q": city, "units": "metric"}
+    try:
+        return get_json(session, weather_url(base_url), params, rate_limiter=rate_limiter, policy=policy), None
+    except FetchFailed as e:
+        return None, e
+
+
+class ShardWorker:
+    """
+    One worker of a sharded ingestion: claims due cities from work_queue, fetches them with a
+    pool of `concurrency` threads and hands the payloads to sink as one list of (city, payload)
+    per claim. The cities are completed only after sink returned, so a worker dying in between
+    costs a second fetch (its duplicate rows are ignored), never a lost one.
+    fetch(city, policy) returns (payload, error) like fetch_city. A claim is bounded by a
+    deadline shorter than its lease, so a slow batch is abandoned before another worker takes it
+    over; the cities that failed are due again after retry_delay seconds.
+    """
+
+    def __init__(self, work_queue, fetch, sink, policy, name: str = None, claim_size: int = DEFAULT_CLAIM_SIZE,
+                 lease: float = DEFAULT_LEASE_SECONDS, concurrency: int = DEFAULT_WORKER_CONCURRENCY,
+                 retry_delay: float = RETRY_QUEUE_DELAY, idle_wait: float = DEFAULT_IDLE_WAIT):
+        self.queue = work_queue
+        self.fetch = fetch
+        self.sink = sink
+        self.policy = policy
+        self.name = name or worker_id()
+        self.claim_size = claim_size
+        self.lease = lease
+        self.concurrency = concurrency
+        self.retry_delay = retry_delay
+        self.idle_wait = idle_wait
+        self.fetched = 0
+        self.failed = 0
+
+    def step(self):
+        """Claim, fetch, sink and complete one batch. Returns the number of cities claimed."""
+        cities = self.queue.claim(self.name, self.claim_size, self.lease)
+        if not cities:
+            return 0
+        policy = self.policy.for_tick(self.lease * 0.8)
+        results = fetch_many(cities, lambda city: self.fetch(city, policy), concurrency=self.concurrency)
+        found, done, failed = [], [], []
+        for city in cities:
+            data, error = results.get(city) or (None, FetchFailed("fetch raised"))
+            if error is not None:
+                failed.append(city)
+                continue
+            done.append(city)
+            if data is not None:
+                found.append((city, data))
+        if found:
+            self.sink(found)
+        self.queue.complete(self.name, done)
+        if failed:
+            self.queue.retry(self.name, failed, min(self.retry_delay, self.lease))
+        self.fetched += len(found)
+        self.failed += len(failed)
+        logging.info("[SHARD] worker=%s claimed=%d fetched=%d failed=%d", self.name, len(cities), len(found), len(failed))
+        return len(cities)
+
+    def run(self, stop):
+        """Work until the stop Event is set, waiting idle_wait seconds whenever nothing is due."""
+        logging.info(f"[SHARD] worker {self.name} started (claim={self.claim_size}, concurrency={self.concurrency})")
+        while not stop.is_set():
+            try:
+                claimed = self.step()
+            except self.queue.errors as e:
+                logging.error(f"[SHARD] work queue error: {e}")
+                claimed = 0
+            if not claimed:
+                stop.wait(self.idle_wait)
+        logging.info(f"[SHARD] worker {self.name} stopped: fetched={self.fetched} failed={self.failed}")
+
+
+def worker_process(config: dict, results, stop):
+    """
+    Entry point of a local worker process started by run_sharded. config holds plain values
+    (the process is spawned): api_key, base_url, queue, queue_db, pg_dsn, concurrency,
+    calls_per_minute, retries, breaker_threshold, breaker_reset, claim_size, lease and log_file.
+    Payloads are sent through results (the write end of a Pipe) to the coordinator's writer.
+    """
+    # Ctrl+C reaches the whole process group: the coordinator stops the workers through `stop`
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    configure_logging(log_file=config["log_file"], api_key=config["api_key"])
+    work_queue = open_work_queue(config["queue"], config["queue_db"], config["pg_dsn"])
+    session = create_session(config["concurrency"])
+    limiter = HostRateLimiter(config["calls_per_minute"]) if config["calls_per_minute"] else None
+    policy = FetchPolicy(
+        retries=config["retries"],
+        breaker=CircuitBreaker(config["breaker_threshold"], config["breaker_reset"]) if config["breaker_threshold"] else None,
+    )
+    worker = ShardWorker(
+        work_queue,
+        lambda city, tick_policy: fetch_city(city, config["api_key"], session, limiter, config["base_url"], tick_policy),
+        results.send, policy,
+        claim_size=config["claim_size"], lease=config["lease"], concurrency=config["concurrency"],
+    )
+    try:
+        worker.run(stop)
+    finally:
+        work_queue.release(worker.name)
+        work_queue.close()
+        results.close()
@@ -0,0 +1,262 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from src.utils.downsample import bucket_sql
+from src.utils.logger import logging
+from src.utils.metrics import DB_COMMIT, DB_INSERT
+from src.utils.weather_aggregator import aggregate_incremental, aggregate_range
+from src.utils.weather_db import (
+    DELETE_CITY_LOOKUP_SQL, DELETE_RETRY_QUEUE_SQL, INSERT_WEATHER_RAW_SQL, SELECT_CITIES_SQL, SELECT_CITY_LOOKUP_SQL,
+    SELECT_CITY_RANGE_SQL, SELECT_DAILY_METRICS_SQL, SELECT_RETRY_QUEUE_SQL, UPSERT_CITY_LOOKUP_SQL, UPSERT_RETRY_QUEUE_SQL,
+    apply_pragmas, create_metrics_table, create_weather_table,
+)
+
+BACKENDS = ("sqlite", "postgres")
+DEFAULT_POOL_SIZE = 4
+
+
+class StorageBackend:
+    """
+    Where the weather pipeline keeps its tables. A backend covers schema creation, bulk insert of
+    weather_raw rows (tuples in INSERT_WEATHER_RAW_SQL column order), the weather_metrics upserts,
+    the fetch_retry_queue and city_lookup tables and the queries of the dashboard, so the writer,
+    the aggregation, the retry queue, the bulk fetch and the dashboard do not depend on a given database. Methods are safe to call from several threads.
+    `errors` holds the exception types the backend raises for database failures.
+    """
+
+    name = None
+    errors = ()
+
+    def init_schema(self):
+        """Create the tables, indexes and rollups if they do not exist yet."""
+        raise NotImplementedError
+
+    def insert_rows(self, rows):
+        """Insert observation rows in one transaction, ignoring duplicates. Returns the rows inserted."""
+        raise NotImplementedError
+
+    def aggregate_incremental(self):
+        """Merge the rows added since the last run into weather_metrics. Returns the rows merged."""
+        raise NotImplementedError
+
+    def aggregate_range(self, start_ts, end_ts):
+        """Recompute weather_metrics for the days touched by [start_ts, end_ts]. Returns the rows written."""
+        raise NotImplementedError
+
+    def cities(self):
+        """Names of the known cities, sorted."""
+        raise NotImplementedError
+
+    def city_range(self, city, start_ts):
+        """(ts_utc, temp_c, humidity) rows of city from start_ts on, oldest first."""
+        raise NotImplementedError
+
+    def daily_metrics(self, city, days):
+        """The last `days` weather_metrics rows of city, newest first (SELECT_DAILY_METRICS_SQL columns)."""
+        raise NotImplementedError
+
+    def series_buckets(self, city, start_ts, end_ts, table, bucket):
+        """Rows of `table` (weather_raw or a rollup) grouped into `bucket`-second rows (downsample.SERIES_COLUMNS)."""
+        raise NotImplementedError
+
+    def retry_queue(self):
+        """(city, attempts, next_attempt_at) rows of the fetch retry queue."""
+        raise NotImplementedError
+
+    def save_retry(self, city, attempts, error, first_failed_at, next_attempt_at):
+        """Queue city for a retry, or update its attempts and next attempt time if already queued."""
+        raise NotImplementedError
+
+    def delete_retry(self, city):
+        """Remove city from the fetch retry queue."""
+        raise NotImplementedError
+
+    def city_lookup(self):
+        """{query: city_id} of the city_lookup table used by the bulk fetch."""
+        raise NotImplementedError
+
+    def save_city_lookup(self, query, city_id, resolved_at):
+        """Remember the city id of query, replacing the one stored before."""
+        raise NotImplementedError
+
+    def delete_city_lookup(self, query):
+        """Forget the city id of query."""
+        raise NotImplementedError
+
+    def close(self):
+        """Release the connections."""
+
+
+class ReadOnlyPool:
+    """
+    A fixed set of read-only SQLite connections (URI mode=ro) shared by all dashboard sessions.
+    Connections are opened lazily, handed out one per query through connection() and returned
+    afterwards, so a page view no longer opens and closes its own connection. With the ingestor
+    writing in WAL mode, these readers never block it nor each other.
+    """
+
+    def __init__(self, db_path: str, size: int = DEFAULT_POOL_SIZE):
+        self.uri = f"{Path(db_path).resolve().as_uri()}?mode=ro"
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        logging.info(f"Opened read-only database connection to: {self.uri}")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection, waiting for one to be returned if all `size` are in use."""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.size
+                if can_open:
+                    self._opened += 1
+            conn = self._open() if can_open else self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        """Close the idle connections."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    The local SQLite database at db_path.
+    Writes go through one long-lived connection (SQLite allows a single writer at a time) tuned
+    with apply_pragmas. With read_only, the backend never writes and reads go through a
+    ReadOnlyPool of `pool_size` connections instead, which is what the dashboard uses.
+    """
+
+    name = "sqlite"
+    errors = (sqlite3.Error,)
+
+    def __init__(self, db_path: str, read_only: bool = False, pool_size: int = DEFAULT_POOL_SIZE,
+                 wal: bool = False, synchronous: str = None, cache_size: int = None, mmap_size: int = None):
+        self.db_path = db_path
+        self.read_only = read_only
+        self._pragmas = dict(wal=wal, synchronous=synchronous, cache_size=cache_size, mmap_size=mmap_size)
+        self._pool = ReadOnlyPool(db_path, pool_size) if read_only else None
+        self._conn = None
+        self._lock = threading.RLock()
+
+    @contextmanager
+    def _connection(self):
+        if self._pool:
+            with self._pool.connection() as conn:
+                yield conn
+            return
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+                apply_pragmas(self._conn, **self._pragmas)
+            yield self._conn
+
+    def _read(self, sql, params=()):
+        with self._connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def _write(self, sql, params=()):
+        with self._connection() as conn, conn:  # commits, or rolls back on error
+            conn.execute(sql, params)
+
+    def init_schema(self):
+        with self._connection() as conn:
+            create_weather_table(conn)
+            create_metrics_table(conn)
+
+    def insert_rows(self, rows):
+        with self._connection() as conn:
+            try:
+                with DB_INSERT.labels(self.name).time():
+                    # rowcount sums the rows inserted by each statement, ignoring trigger writes
+                    inserted = conn.executemany(INSERT_WEATHER_RAW_SQL, rows).rowcount
+                with DB_COMMIT.labels(self.name).time():
+                    conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+            return inserted
+
+    def aggregate_incremental(self):
+        with self._connection() as conn:
+            return aggregate_incremental(conn)
+
+    def aggregate_range(self, start_ts, end_ts):
+        with self._connection() as conn:
+            return aggregate_range(conn, start_ts, end_ts)
+
+    def cities(self):
+        try:
+            rows = self._read(SELECT_CITIES_SQL)
+        except sqlite3.OperationalError:
+            # databases not migrated yet have no cities table
+            rows = self._read("SELECT DISTINCT city_name FROM weather_raw ORDER BY 1;")
+        return [row[0] for row in rows]
+
+    def city_range(self, city, start_ts):
+        return self._read(SELECT_CITY_RANGE_SQL, (city, start_ts))
+
+    def daily_metrics(self, city, days):
+        return self._read(SELECT_DAILY_METRICS_SQL, (city, days))
+
+    def series_buckets(self, city, start_ts, end_ts, table, bucket):
+        return self._read(bucket_sql(table), {"bucket": bucket, "city": city, "start": start_ts, "end": end_ts})
+
+    def retry_queue(self):
+        return self._read(SELECT_RETRY_QUEUE_SQL)
+
+    def save_retry(self, city, attempts, error, first_failed_at, next_attempt_at):
+        self._write(UPSERT_RETRY_QUEUE_SQL, (city, attempts, error, first_failed_at, next_attempt_at))
+
+    def delete_retry(self, city):
+        self._write(DELETE_RETRY_QUEUE_SQL, (city,))
+
+    def city_lookup(self):
+        return dict(self._read(SELECT_CITY_LOOKUP_SQL))
+
+    def save_city_lookup(self, query, city_id, resolved_at):
+        self._write(UPSERT_CITY_LOOKUP_SQL, (query, city_id, resolved_at))
+
+    def delete_city_lookup(self, query):
+        self._write(DELETE_CITY_LOOKUP_SQL, (query,))
+
+    def close(self):
+        if self._pool:
+            self._pool.close()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def create_backend(kind: str = "sqlite", db_path: str = None, dsn: str = None, **options):
+    """
+    Open the storage backend `kind` ("sqlite" or "postgres").
+    SQLite uses db_path and the options of SQLiteBackend; PostgreSQL uses the libpq connection
+    string dsn and the options of PostgresBackend. Options that do not apply are ignored.
+    """
+    if kind == "sqlite":
+        keys = ("read_only", "pool_size", "wal", "synchronous", "cache_size", "mmap_size")
+        return SQLiteBackend(db_path, **{k: v for k, v in options.items() if k in keys})
+    if kind == "postgres":
+        from src.utils.postgres_backend import PostgresBackend  # deferred: needs psycopg2
+
+        keys = ("min_connections", "max_connections")
+        return PostgresBackend(dsn, **{k: v for k, v in options.items() if k in keys})
+    raise ValueError(f"unknown storage backend {kind!r}, expected one of {BACKENDS}")
@@ -0,0 +1,137 @@
+from datetime import datetime, timezone
+
+from src.utils.logger import logging
+
+STATE_NAME = "weather_metrics"
+SECONDS_PER_DAY = 86400
+
+_GROUPED_RAW_SQL = """
+    SELECT
+        city_name,
+        DATE(ts_utc, 'unixepoch') AS day_utc,
+        AVG(temp_c), MIN(temp_c), MAX(temp_c), AVG(humidity),
+        COUNT(*), SUM(temp_c), SUM(humidity)
+    FROM weather_raw
+    WHERE id > ? AND id <= ? {window}
+    GROUP BY city_name, day_utc
+"""
+
+_INSERT_METRICS_SQL = """
+    INSERT INTO weather_metrics (
+        city_name, date_utc, avg_temp, min_temp, max_temp,
+        avg_humidity, samples, sum_temp, sum_humidity
+    )
+"""
+
+# Merge new raw rows into the running per-(city, day) sums. SQLite evaluates every
+# expression of the SET list against the row as it was before the update.
+MERGE_METRICS_SQL = _INSERT_METRICS_SQL + _GROUPED_RAW_SQL.format(window="") + """
+    ON CONFLICT(city_name, date_utc) DO UPDATE SET
+        samples = samples + excluded.samples,
+        sum_temp = sum_temp + excluded.sum_temp,
+        sum_humidity = sum_humidity + excluded.sum_humidity,
+        avg_temp = (sum_temp + excluded.sum_temp) / (samples + excluded.samples),
+        avg_humidity = (sum_humidity + excluded.sum_humidity) / (samples + excluded.samples),
+        min_temp = MIN(min_temp, excluded.min_temp),
+        max_temp = MAX(max_temp, excluded.max_temp)
+"""
+
+# Recompute days from scratch, overwriting whatever was stored for them.
+REPLACE_METRICS_SQL = _INSERT_METRICS_SQL + _GROUPED_RAW_SQL.format(window="AND ts_utc BETWEEN ? AND ?") + """
+    ON CONFLICT(city_name, date_utc) DO UPDATE SET
+        samples = excluded.samples,
+        sum_temp = excluded.sum_temp,
+        sum_humidity = excluded.sum_humidity,
+        avg_temp = excluded.avg_temp,
+        avg_humidity = excluded.avg_humidity,
+        min_temp = excluded.min_temp,
+        max_temp = excluded.max_temp
+"""
+
+
+def get_high_water_mark(conn):
+    """
+    Return (last_id, last_ts_utc) of the newest weather_raw row merged into weather_metrics,
+    or None if the incremental aggregation never ran on this database.
+    """
+    row = conn.execute(
+        "SELECT last_id, last_ts_utc FROM aggregation_state WHERE name = ?;", (STATE_NAME,)
+    ).fetchone()
+    return (row[0], row[1]) if row else None
+
+
+def _set_high_water_mark(conn, last_id, last_ts_utc):
+    conn.execute(
+        """
+        INSERT INTO aggregation_state (name, last_id, last_ts_utc, updated_at) VALUES (?, ?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET
+            last_id = excluded.last_id,
+            last_ts_utc = COALESCE(excluded.last_ts_utc, last_ts_utc),
+            updated_at = excluded.updated_at
+        """,
+        (STATE_NAME, last_id, last_ts_utc, datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")),
+    )
+
+
+def _merge_new_rows(conn):
+    """
+    Merge the weather_raw rows above the high-water mark into weather_metrics and move the mark.
+    Must run inside a write transaction. Returns (new mark, number of raw rows merged).
+    On the first run (no mark yet) every day found in weather_raw is recomputed instead,
+    so metrics written by earlier non-incremental runs are not counted twice.
+    """
+    max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM weather_raw;").fetchone()[0]
+    mark = get_high_water_mark(conn)
+    last_id = mark[0] if mark else 0
+    if mark and max_id <= last_id:
+        return last_id, 0
+
+    new_rows, last_ts = conn.execute(
+        "SELECT COUNT(*), MAX(ts_utc) FROM weather_raw WHERE id > ? AND id <= ?;", (last_id, max_id)
+    ).fetchone()
+    if mark:
+        conn.execute(MERGE_METRICS_SQL, (last_id, max_id))
+    else:
+        conn.execute(REPLACE_METRICS_SQL, (0, max_id, 0, 2**63 - 1))
+    _set_high_water_mark(conn, max_id, last_ts)
+    logging.info(f"Merged {new_rows} new raw rows (id {last_id + 1}..{max_id}) into weather_metrics.")
+    return max_id, new_rows
+
+
+def aggregate_incremental(conn):
+    """
+    Fold the raw rows inserted since the last run into the per-(city, day) metrics with one
+    set-based UPSERT. The cost is proportional to the number of new rows, not to the table size,
+    so it can run every few minutes. Returns the number of raw rows merged.
+    """
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        _, merged = _merge_new_rows(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return merged
+
+
+def aggregate_range(conn, start_ts, end_ts):
+    """
+    Recompute the metrics of every UTC day touched by [start_ts, end_ts] in a single pass,
+    overwriting the stored values (useful to backfill a date range or repair it).
+    The window is widened to whole days since metrics are per day. Pending incremental rows
+    are merged first in the same transaction so the high-water mark stays consistent.
+    Returns the number of (city, day) rows written.
+    """
+    start_ts = start_ts // SECONDS_PER_DAY * SECONDS_PER_DAY
+    end_ts = end_ts // SECONDS_PER_DAY * SECONDS_PER_DAY + SECONDS_PER_DAY - 1
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        last_id, _ = _merge_new_rows(conn)
+        cursor = conn.execute(REPLACE_METRICS_SQL, (0, last_id, start_ts, end_ts))
+        written = cursor.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    logging.info(f"Recomputed {written} city-day rows in weather_metrics for ts {start_ts}..{end_ts}.")
+    return written
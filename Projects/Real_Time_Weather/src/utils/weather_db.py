@@ -1,6 +1,234 @@
 import sqlite3
 from src.utils.logger import logging
 
+INSERT_WEATHER_RAW_SQL = """
+    INSERT OR IGNORE INTO weather_raw (
+        city_name, city_id, country, ts_utc, date_str, captured_at_utc,
+        temp_c, feels_like_c, humidity, pressure,
+        wind_speed, wind_deg, weather_main, weather_desc
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Dashboard read paths. They are served by the indexes created in SCHEMA_MIGRATIONS.
+SELECT_CITIES_SQL = "SELECT DISTINCT city_name FROM cities ORDER BY 1;"
+SELECT_CITY_RANGE_SQL = """
+    SELECT ts_utc, temp_c, humidity
+    FROM weather_raw
+    WHERE city_name = ? AND ts_utc >= ?
+    ORDER BY ts_utc
+"""
+SELECT_DAILY_METRICS_SQL = """
+    SELECT date_utc, avg_temp, min_temp, max_temp, avg_humidity, samples
+    FROM weather_metrics
+    WHERE city_name = ?
+    ORDER BY date_utc DESC
+    LIMIT ?
+"""
+# Time-bucketed series for the downsampled history view: {bucket} seconds per row, from
+# weather_raw or from one of the rollup tables maintained by trg_weather_raw_rollup.
+SELECT_RAW_BUCKETS_SQL = """
+    SELECT (ts_utc / :bucket) * :bucket AS bucket_ts,
+           AVG(temp_c), MIN(temp_c), MAX(temp_c), AVG(humidity), COUNT(*)
+    FROM weather_raw
+    WHERE city_name = :city AND ts_utc BETWEEN :start AND :end
+    GROUP BY 1
+    ORDER BY 1
+"""
+SELECT_ROLLUP_BUCKETS_SQL = """
+    SELECT (bucket_ts / :bucket) * :bucket AS bucket_ts,
+           SUM(sum_temp) / SUM(samples), MIN(min_temp), MAX(max_temp),
+           SUM(sum_humidity) / SUM(samples), SUM(samples)
+    FROM {table}
+    WHERE city_name = :city AND bucket_ts BETWEEN :start AND :end
+    GROUP BY 1
+    ORDER BY 1
+"""
+
+# City query -> OpenWeatherMap city id, used by the bulk (group endpoint) fetch mode.
+SELECT_CITY_LOOKUP_SQL = "SELECT query, city_id FROM city_lookup;"
+UPSERT_CITY_LOOKUP_SQL = """
+    INSERT INTO city_lookup (query, city_id, resolved_at) VALUES (?, ?, ?)
+    ON CONFLICT(query) DO UPDATE SET city_id = excluded.city_id, resolved_at = excluded.resolved_at
+"""
+DELETE_CITY_LOOKUP_SQL = "DELETE FROM city_lookup WHERE query = ?;"
+
+# Cities whose fetch failed after its retries, fetched again by the retry sweep.
+SELECT_RETRY_QUEUE_SQL = "SELECT city, attempts, next_attempt_at FROM fetch_retry_queue;"
+UPSERT_RETRY_QUEUE_SQL = """
+    INSERT INTO fetch_retry_queue (city, attempts, last_error, first_failed_at, next_attempt_at)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(city) DO UPDATE SET
+        attempts = excluded.attempts,
+        last_error = excluded.last_error,
+        next_attempt_at = excluded.next_attempt_at
+"""
+DELETE_RETRY_QUEUE_SQL = "DELETE FROM fetch_retry_queue WHERE city = ?;"
+
+# Retention: expired rows deleted a batch at a time (the LIMIT), oldest first, through the
+# ts_utc / primary key indexes. Raw rows above the aggregation high-water mark are never deleted.
+PRUNE_RAW_SQL = """
+    DELETE FROM weather_raw WHERE id IN (
+        SELECT id FROM weather_raw WHERE ts_utc < ? AND id <= ? ORDER BY ts_utc LIMIT ?
+    )
+"""
+PRUNE_ROLLUP_SQL = """
+    DELETE FROM {table} WHERE (city_name, bucket_ts) IN (
+        SELECT city_name, bucket_ts FROM {table} WHERE bucket_ts < ? LIMIT ?
+    )
+"""
+PRUNE_METRICS_SQL = """
+    DELETE FROM weather_metrics WHERE rowid IN (
+        SELECT rowid FROM weather_metrics WHERE date_utc < ? LIMIT ?
+    )
+"""
+COUNT_EXPIRED_SQL = {
+    "raw": "SELECT COUNT(*) FROM weather_raw WHERE ts_utc < ? AND id <= ?;",
+    "rollup": "SELECT COUNT(*) FROM {table} WHERE bucket_ts < ?;",
+    "metrics": "SELECT COUNT(*) FROM weather_metrics WHERE date_utc < ?;",
+}
+# Lets the retention job hand freed pages back with PRAGMA incremental_vacuum. It only takes
+# effect on a new database, before its first table and before journal_mode=WAL is set; an
+# existing one needs a one-off VACUUM (main.py retention --enable-incremental-vacuum).
+AUTO_VACUUM_SQL = "PRAGMA auto_vacuum = INCREMENTAL;"
+
+# Schema migrations applied in order on top of the weather_raw table. The index of the last
+# applied entry is stored in PRAGMA user_version, so each one runs exactly once per database.
+SCHEMA_MIGRATIONS = [
+    # 1: covering index for the per-city time range query of the dashboard, a plain ts_utc
+    #    index for date-window aggregation, and a small city dimension table kept up to date
+    #    by a trigger so the city list no longer needs a DISTINCT scan of weather_raw.
+    [
+        "CREATE INDEX IF NOT EXISTS idx_weather_raw_city_ts ON weather_raw (city_name, ts_utc, temp_c, humidity);",
+        "CREATE INDEX IF NOT EXISTS idx_weather_raw_ts ON weather_raw (ts_utc);",
+        """
+        CREATE TABLE IF NOT EXISTS cities (
+        city_id TEXT PRIMARY KEY,
+        city_name TEXT NOT NULL,
+        country TEXT NOT NULL,
+        first_seen_ts INTEGER NOT NULL,
+        last_seen_ts INTEGER NOT NULL
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_cities_name ON cities (city_name);",
+        """
+        INSERT OR IGNORE INTO cities (city_id, city_name, country, first_seen_ts, last_seen_ts)
+        SELECT city_id, city_name, country, MIN(ts_utc), MAX(ts_utc)
+        FROM weather_raw
+        GROUP BY city_id;
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_weather_raw_cities AFTER INSERT ON weather_raw
+        BEGIN
+            INSERT INTO cities (city_id, city_name, country, first_seen_ts, last_seen_ts)
+            VALUES (NEW.city_id, NEW.city_name, NEW.country, NEW.ts_utc, NEW.ts_utc)
+            ON CONFLICT(city_id) DO UPDATE SET
+                city_name = excluded.city_name,
+                country = excluded.country,
+                first_seen_ts = MIN(first_seen_ts, excluded.first_seen_ts),
+                last_seen_ts = MAX(last_seen_ts, excluded.last_seen_ts);
+        END;
+        """,
+    ],
+    # 2: city query -> city id lookup for the group endpoint. Queries are stored lowercased and
+    #    seeded from the city names already known, leaving out names shared by several ids.
+    [
+        """
+        CREATE TABLE IF NOT EXISTS city_lookup (
+        query TEXT PRIMARY KEY,
+        city_id TEXT NOT NULL,
+        resolved_at TEXT NOT NULL
+        );
+        """,
+        """
+        INSERT OR IGNORE INTO city_lookup (query, city_id, resolved_at)
+        SELECT lower(city_name), MIN(city_id), strftime('%Y-%m-%dT%H:%M:%SZ', 'now')
+        FROM cities
+        GROUP BY lower(city_name)
+        HAVING COUNT(*) = 1;
+        """,
+    ],
+    # 3: hourly and daily rollups of weather_raw for the downsampled history view, backfilled
+    #    once and then kept up to date by a trigger, so long ranges never scan raw rows.
+    [
+        """
+        CREATE TABLE IF NOT EXISTS weather_rollup_hourly (
+        city_name TEXT NOT NULL,
+        bucket_ts INTEGER NOT NULL, -- start of the hourly bucket, UTC epoch seconds
+        samples INTEGER NOT NULL,
+        sum_temp REAL NOT NULL,
+        min_temp REAL NOT NULL,
+        max_temp REAL NOT NULL,
+        sum_humidity REAL NOT NULL,
+        PRIMARY KEY (city_name, bucket_ts)
+        ) WITHOUT ROWID;
+        """,
+        """
+        INSERT INTO weather_rollup_hourly (city_name, bucket_ts, samples, sum_temp, min_temp, max_temp, sum_humidity)
+        SELECT city_name, ts_utc - ts_utc % 3600, COUNT(*), SUM(temp_c), MIN(temp_c), MAX(temp_c), SUM(humidity)
+        FROM weather_raw
+        GROUP BY 1, 2;
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS weather_rollup_daily (
+        city_name TEXT NOT NULL,
+        bucket_ts INTEGER NOT NULL, -- start of the daily bucket, UTC epoch seconds
+        samples INTEGER NOT NULL,
+        sum_temp REAL NOT NULL,
+        min_temp REAL NOT NULL,
+        max_temp REAL NOT NULL,
+        sum_humidity REAL NOT NULL,
+        PRIMARY KEY (city_name, bucket_ts)
+        ) WITHOUT ROWID;
+        """,
+        """
+        INSERT INTO weather_rollup_daily (city_name, bucket_ts, samples, sum_temp, min_temp, max_temp, sum_humidity)
+        SELECT city_name, ts_utc - ts_utc % 86400, COUNT(*), SUM(temp_c), MIN(temp_c), MAX(temp_c), SUM(humidity)
+        FROM weather_raw
+        GROUP BY 1, 2;
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_weather_raw_rollup AFTER INSERT ON weather_raw
+        BEGIN
+            INSERT INTO weather_rollup_hourly (city_name, bucket_ts, samples, sum_temp, min_temp, max_temp, sum_humidity)
+            VALUES (NEW.city_name, NEW.ts_utc - NEW.ts_utc % 3600, 1, NEW.temp_c, NEW.temp_c, NEW.temp_c, NEW.humidity)
+            ON CONFLICT(city_name, bucket_ts) DO UPDATE SET
+                samples = samples + 1,
+                sum_temp = sum_temp + excluded.sum_temp,
+                min_temp = MIN(min_temp, excluded.min_temp),
+                max_temp = MAX(max_temp, excluded.max_temp),
+                sum_humidity = sum_humidity + excluded.sum_humidity;
+            INSERT INTO weather_rollup_daily (city_name, bucket_ts, samples, sum_temp, min_temp, max_temp, sum_humidity)
+            VALUES (NEW.city_name, NEW.ts_utc - NEW.ts_utc % 86400, 1, NEW.temp_c, NEW.temp_c, NEW.temp_c, NEW.humidity)
+            ON CONFLICT(city_name, bucket_ts) DO UPDATE SET
+                samples = samples + 1,
+                sum_temp = sum_temp + excluded.sum_temp,
+                min_temp = MIN(min_temp, excluded.min_temp),
+                max_temp = MAX(max_temp, excluded.max_temp),
+                sum_humidity = sum_humidity + excluded.sum_humidity;
+        END;
+        """,
+    ],
+    # 4: persistent queue of the cities whose fetch failed, so they are retried with backoff
+    #    (across restarts too) instead of being dropped until their next scheduled tick.
+    [
+        """
+        CREATE TABLE IF NOT EXISTS fetch_retry_queue (
+        city TEXT PRIMARY KEY,
+        attempts INTEGER NOT NULL,
+        last_error TEXT,
+        first_failed_at TEXT NOT NULL,
+        next_attempt_at REAL NOT NULL -- UTC epoch seconds
+        );
+        """,
+    ],
+    # 5: bucket_ts indexes on the rollups (clustered by city) so the retention job finds their
+    #    expired rows without scanning every city. Only new buckets touch them, not the upserts.
+    [
+        "CREATE INDEX IF NOT EXISTS idx_weather_rollup_hourly_bucket ON weather_rollup_hourly (bucket_ts);",
+        "CREATE INDEX IF NOT EXISTS idx_weather_rollup_daily_bucket ON weather_rollup_daily (bucket_ts);",
+    ],
+]
+
 def get_db_connection(db_path:str):
     """
     Open (and return) a connection to the sqlite database at db_path.
@@ -12,12 +240,36 @@ def get_db_connection(db_path:str):
         logging.error(f"An error occurred while connecting to the Database :- {e}")
 
 
+def apply_pragmas(conn, wal: bool = False, synchronous: str = None, cache_size: int = None, mmap_size: int = None):
+    """
+    Tune an open connection for write throughput.
+    wal switches the database to write-ahead logging (readers no longer block the writer),
+    synchronous is one of OFF / NORMAL / FULL, cache_size follows SQLite semantics
+    (negative = KiB, positive = pages) and mmap_size is in bytes.
+    Options left to None keep the SQLite defaults. A new database is also set up for
+    incremental vacuum (see AUTO_VACUUM_SQL).
+    """
+    try:
+        conn.execute(AUTO_VACUUM_SQL)
+        if wal:
+            conn.execute("PRAGMA journal_mode=WAL;")
+        if synchronous:
+            conn.execute(f"PRAGMA synchronous={synchronous.upper()};")
+        if cache_size is not None:
+            conn.execute(f"PRAGMA cache_size={int(cache_size)};")
+        if mmap_size is not None:
+            conn.execute(f"PRAGMA mmap_size={int(mmap_size)};")
+    except sqlite3.Error as e:
+        logging.error(f"An error occurred while applying pragmas: {e}")
+
+
 def create_weather_table(conn):
     """
     Use the open connection to create the weather_raw table using your schema, if it doesn't already exist.
     """
     try:
         cursor = conn.cursor()
+        cursor.execute(AUTO_VACUUM_SQL)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS weather_raw (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -44,6 +296,29 @@ def create_weather_table(conn):
         logging.error(f"An error occurred while creating the table: {e}")
     finally:
         cursor.close()
+    migrate_schema(conn)
+
+
+def migrate_schema(conn):
+    """
+    Apply the SCHEMA_MIGRATIONS the database has not seen yet, each one in its own transaction.
+    The weather_raw table must already exist. Returns the resulting schema version.
+    """
+    version = conn.execute("PRAGMA user_version;").fetchone()[0]
+    for target, statements in enumerate(SCHEMA_MIGRATIONS[version:], start=version + 1):
+        try:
+            conn.execute("BEGIN;")
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {target};")
+            conn.commit()
+            logging.info(f"Migrated database schema to version {target}.")
+            version = target
+        except sqlite3.Error as e:
+            conn.rollback()
+            logging.error(f"An error occurred while migrating the schema to version {target}: {e}")
+            break
+    return version
 
 
 def create_metrics_table(conn):
@@ -61,9 +336,26 @@ def create_metrics_table(conn):
             max_temp REAL,
             avg_humidity REAL,
             samples INTEGER,
+            sum_temp REAL,     -- running sums so new samples can be merged in
+            sum_humidity REAL,
             PRIMARY KEY (city_name, date_utc)
             );  
         ''')
+        # Tables created before the running sums existed get the columns added and backfilled
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(weather_metrics);")}
+        if "sum_temp" not in columns:
+            cursor.execute("ALTER TABLE weather_metrics ADD COLUMN sum_temp REAL;")
+            cursor.execute("ALTER TABLE weather_metrics ADD COLUMN sum_humidity REAL;")
+            cursor.execute("UPDATE weather_metrics SET sum_temp = avg_temp * samples, sum_humidity = avg_humidity * samples;")
+        # High-water mark of the weather_raw rows already merged into weather_metrics
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS aggregation_state (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL,
+            last_ts_utc INTEGER,
+            updated_at TEXT NOT NULL
+            );
+        ''')
         # Commit the changes to the database
         conn.commit()
         logging.info("Metrics table created successfully.")
@@ -71,4 +363,3 @@ def create_metrics_table(conn):
         logging.error(f"An error occurred while creating the metrics table: {e}")
     finally:
         cursor.close()
-
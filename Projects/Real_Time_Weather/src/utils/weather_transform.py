@@ -0,0 +1,200 @@
+import numpy as np
+
+# Temperatures above this cannot be Celsius: the response was requested without units=metric
+# and is in Kelvin.
+KELVIN_THRESHOLD = 150.0
+KELVIN_OFFSET = 273.15
+# 9999-12-31T23:59:59Z: later Unix timestamps are garbage and would not fit in int64 as floats.
+MAX_TIMESTAMP = 253_402_300_799
+
+
+class Field:
+    """
+    One weather_raw column and where it comes from in an OpenWeatherMap response.
+    path is the sequence of keys (str) and list indexes (int) leading to the value, kind is
+    "str", "int" or "float". A missing or malformed value makes the row invalid when required,
+    and is replaced by default otherwise. valid is an optional inclusive (min, max) range, and
+    temperature marks the values to convert from Kelvin when they cannot be Celsius.
+    """
+
+    def __init__(self, name, path, kind, required=False, default=None, valid=None, temperature=False):
+        self.name = name
+        self.path = tuple(path)
+        self.kind = kind
+        self.required = required
+        self.default = default
+        self.valid = valid
+        self.temperature = temperature
+
+
+# The declarative mapping of a current weather response onto weather_raw.
+WEATHER_FIELDS = (
+    Field("city_name", ("name",), "str", default="Unknown"),
+    Field("city_id", ("id",), "str", required=True),
+    Field("country", ("sys", "country"), "str", default="Unknown"),
+    Field("ts_utc", ("dt",), "int", required=True, valid=(1, MAX_TIMESTAMP)),
+    Field("temp_c", ("main", "temp"), "float", required=True, valid=(-100.0, 70.0), temperature=True),
+    Field("feels_like_c", ("main", "feels_like"), "float", default=-273.15, temperature=True),
+    Field("humidity", ("main", "humidity"), "float", required=True, valid=(0.0, 100.0)),
+    Field("pressure", ("main", "pressure"), "float", default=0.0),
+    Field("wind_speed", ("wind", "speed"), "float", default=0.0, valid=(0.0, 150.0)),
+    Field("wind_deg", ("wind", "deg"), "float", default=0.0, valid=(0.0, 360.0)),
+    Field("weather_main", ("weather", 0, "main"), "str", default="Unknown"),
+    Field("weather_desc", ("weather", 0, "description"), "str", default="Unknown"),
+)
+# Column order of INSERT_WEATHER_RAW_SQL; date_str and captured_at_utc are derived.
+ROW_COLUMNS = (
+    "city_name", "city_id", "country", "ts_utc", "date_str", "captured_at_utc",
+    "temp_c", "feels_like_c", "humidity", "pressure",
+    "wind_speed", "wind_deg", "weather_main", "weather_desc",
+)
+
+
+def _step(values, key):
+    """The child at key (a dict key or a list index) of every value, None where there is none."""
+    if isinstance(key, int):
+        return [v[key] if type(v) is list and len(v) > key else None for v in values]
+    return [v.get(key) if type(v) is dict else None for v in values]
+
+
+def extract_columns(responses, fields):
+    """
+    The values of every field along its path in each response, as one list per field (None
+    where a level is missing or malformed).
+    The paths are walked one level at a time over the whole batch, and a level shared by
+    several fields (e.g. "main") is walked once.
+    """
+    levels = {(): responses}
+
+    def column(path):
+        if path not in levels:
+            levels[path] = _step(column(path[:-1]), path[-1])
+        return levels[path]
+
+    return [column(field.path) for field in fields]
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _numeric(values):
+    """float64 array of values, NaN where a value is missing or not a number (inf is kept)."""
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        # a string or an object somewhere: fall back to converting one value at a time
+        return np.array([_to_float(v) for v in values], dtype=np.float64)
+
+
+def _date_strings(ts):
+    """YYYY-MM-DD of every Unix timestamp ("" for 0), formatted once per distinct day."""
+    days, index = np.unique(ts // 86400, return_inverse=True)
+    labels = np.datetime_as_string(days.astype("datetime64[D]"), unit="D").astype(object)
+    dates = labels[index.ravel()]
+    dates[ts == 0] = ""
+    return dates
+
+
+class WeatherBatch:
+    """
+    A batch of responses transformed into typed columns (ROW_COLUMNS as NumPy arrays, object
+    arrays for the text columns).
+    valid is the mask of the rows that passed every check and rejected counts the failures by
+    reason (e.g. "temp_c_missing", "humidity_out_of_range"); a row can fail several checks.
+    missing holds, per field, the mask of the rows where the default was used.
+    kelvin_converted counts the temperature values found in Kelvin and converted to Celsius.
+    """
+
+    def __init__(self, columns, valid, rejected, missing, kelvin_converted=0):
+        self.columns = columns
+        self.valid = valid
+        self.rejected = rejected
+        self.missing = missing
+        self.kelvin_converted = kelvin_converted
+
+    def __len__(self):
+        return len(self.valid)
+
+    @property
+    def valid_count(self):
+        return int(self.valid.sum())
+
+    def rows(self):
+        """Valid rows as tuples in INSERT_WEATHER_RAW_SQL order, ready for executemany / COPY."""
+        return list(zip(*[self.columns[name][self.valid].tolist() for name in ROW_COLUMNS]))
+
+    def summary(self):
+        """One-line description of the batch for the logs."""
+        rejected = ", ".join(f"{reason}={count}" for reason, count in sorted(self.rejected.items()))
+        return (f"rows={len(self)} valid={self.valid_count} kelvin_converted={self.kelvin_converted}"
+                + (f" rejected: {rejected}" if rejected else ""))
+
+
+def transform_batch(responses, captured_at_utc, fields=WEATHER_FIELDS):
+    """
+    Turn a list of current weather responses into a WeatherBatch in one pass over the records.
+    captured_at_utc is the fetch timestamp (YYYYMMDDTHHMMSSZ) of every response, or a sequence
+    with one per response. The values of each of `fields` are extracted along its path, then
+    converted, defaulted and validated column by column with NumPy: the checks produce masks instead of
+    one log line per bad record.
+    """
+    return _transform(extract_columns(responses, fields), len(responses), captured_at_utc, fields)
+
+
+def _transform(raw, n, captured_at_utc, fields):
+    valid = np.ones(n, dtype=bool)
+    rejected, columns, missing_mask = {}, {}, {}
+    kelvin_converted = 0
+
+    def reject(mask, reason):
+        count = int(mask.sum())
+        if count:
+            rejected[reason] = rejected.get(reason, 0) + count
+            valid[mask] = False
+
+    for field, values in zip(fields, raw):
+        if field.kind == "str":
+            column = np.empty(n, dtype=object)
+            column[:] = values
+            missing = np.equal(column, None)
+        else:
+            column = _numeric(values)
+            missing = ~np.isfinite(column)  # inf is as malformed as a missing value
+        missing_mask[field.name] = missing
+        if field.required:
+            reject(missing, f"{field.name}_missing")
+        column[missing] = field.default if field.default is not None else ("" if field.kind == "str" else 0)
+        if field.kind == "str":
+            if not set(map(type, values)) <= {str, type(None)}:
+                # e.g. the numeric city id, stored as its text
+                column[:] = [v if type(v) is str else str(v) for v in column.tolist()]
+            columns[field.name] = column
+            continue
+        if field.temperature:
+            # units check: a value only Kelvin can explain is converted rather than rejected
+            kelvin = ~missing & (column > KELVIN_THRESHOLD)
+            column[kelvin] = np.round(column[kelvin] - KELVIN_OFFSET, 2)
+            kelvin_converted += int(kelvin.sum())
+        if field.valid:
+            low, high = field.valid
+            out = np.zeros(n, dtype=bool)
+            if low is not None:
+                out |= column < low
+            if high is not None:
+                out |= column > high
+            out &= ~missing
+            reject(out, f"{field.name}_out_of_range")
+            if field.kind == "int":
+                column[out] = 0  # the rows are rejected, and the value may not fit in int64
+        columns[field.name] = column.astype(np.int64) if field.kind == "int" else column
+
+    columns["date_str"] = _date_strings(columns["ts_utc"])
+    if isinstance(captured_at_utc, str):
+        columns["captured_at_utc"] = np.full(n, captured_at_utc, dtype=object)
+    else:
+        columns["captured_at_utc"] = np.array(captured_at_utc, dtype=object)
+    return WeatherBatch(columns, valid, rejected, missing_mask, kelvin_converted)
@@ -0,0 +1,143 @@
+import threading
+import time
+
+from src.utils.logger import logging
+from src.utils.metrics import ROWS
+from src.utils.storage import SQLiteBackend
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 5.0
+
+
+class WeatherWriter:
+    """
+    Long-lived, thread-safe writer for weather_raw.
+    It keeps a single storage backend open for the life of the process, creates the schema once,
+    and collects observation rows (tuples in INSERT_WEATHER_RAW_SQL column order) into
+    batches that are written in one transaction (executemany on SQLite, COPY on PostgreSQL).
+    A batch is flushed when it reaches batch_size rows or when flush_interval seconds have
+    passed since the last flush, whichever comes first.
+    Duplicates on (city_id, ts_utc) are ignored by the database and counted.
+    The on_written callback given with rows is called once the batch holding them is committed,
+    and dropped if the batch fails.
+    backend is a StorageBackend; without one the SQLite database at db_path is used, and
+    wal, synchronous, cache_size and mmap_size are passed to apply_pragmas.
+    """
+
+    def __init__(self, db_path: str, batch_size: int = DEFAULT_BATCH_SIZE, flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 wal: bool = False, synchronous: str = None, cache_size: int = None, mmap_size: int = None,
+                 backend=None):
+        self.db_path = db_path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.backend = backend or SQLiteBackend(
+            db_path, wal=wal, synchronous=synchronous, cache_size=cache_size, mmap_size=mmap_size,
+        )
+        self.backend.init_schema()
+
+        self._pending = []
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._started = time.monotonic()
+        self.rows_received = 0
+        self.rows_inserted = 0
+        self.rows_duplicate = 0
+        self.rows_failed = 0
+        self.batches = 0
+        self.flush_seconds = 0.0
+
+        self._timer = None
+        if flush_interval and flush_interval > 0:
+            self._timer = threading.Thread(target=self._flush_periodically, name="weather-writer", daemon=True)
+            self._timer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def add(self, row, on_written=None):
+        """Queue one observation row; flushes immediately if the batch is full."""
+        self.add_many([row], on_written)
+
+    def add_many(self, rows, on_written=None):
+        """Queue several observation rows; flushes immediately if the batch is full."""
+        with self._lock:
+            self._pending.extend(rows)
+            if on_written:
+                self._callbacks.append(on_written)
+            self.rows_received += len(rows)
+            if len(self._pending) >= self.batch_size:
+                self._flush_locked()
+
+    def flush(self):
+        """Write every queued row to the database in one transaction."""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        callbacks, self._callbacks = self._callbacks, []
+        start = time.perf_counter()
+        try:
+            inserted = self.backend.insert_rows(batch)
+        except self.backend.errors as e:
+            self.rows_failed += len(batch)
+            ROWS.labels("error").inc(len(batch))
+            logging.error(f"Database batch insert error ({len(batch)} rows dropped): {e}")
+            return
+        elapsed = time.perf_counter() - start
+        self.rows_inserted += inserted
+        self.rows_duplicate += len(batch) - inserted
+        ROWS.labels("inserted").inc(inserted)
+        ROWS.labels("duplicate").inc(len(batch) - inserted)
+        self.batches += 1
+        self.flush_seconds += elapsed
+        for callback in callbacks:
+            callback()
+        logging.info(
+            f"[BATCH] rows={len(batch)} inserted={inserted} duplicates={len(batch) - inserted} "
+            f"took={elapsed * 1000:.1f}ms"
+        )
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"Periodic flush failed: {e}")
+
+    def stats(self):
+        """
+        Return the writer counters as a dict.
+        rows_per_sec is measured over the time spent inside flushes (database throughput),
+        ingest_rows_per_sec over the wall time since the writer was opened.
+        """
+        with self._lock:
+            uptime = time.monotonic() - self._started
+            return {
+                "rows_received": self.rows_received,
+                "rows_inserted": self.rows_inserted,
+                "rows_duplicate": self.rows_duplicate,
+                "rows_failed": self.rows_failed,
+                "rows_pending": len(self._pending),
+                "batches": self.batches,
+                "flush_seconds": round(self.flush_seconds, 4),
+                "rows_per_sec": round(self.rows_inserted / self.flush_seconds, 1) if self.flush_seconds else 0.0,
+                "ingest_rows_per_sec": round(self.rows_inserted / uptime, 1) if uptime else 0.0,
+            }
+
+    def close(self):
+        """Flush what is left and close the backend. Safe to call twice."""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        if self._timer:
+            self._timer.join()
+        self.flush()
+        self.backend.close()
+        logging.info(f"Weather writer closed: {self.stats()}")
@@ -0,0 +1,290 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from src.utils.logger import logging
+
+WORK_QUEUES = ("sqlite", "postgres")
+DEFAULT_QUEUE_DB = "data/work_queue.db"
+DEFAULT_LEASE_SECONDS = 120.0
+DEFAULT_CLAIM_SIZE = 100
+# A worker that has not claimed work for this long is considered dead and its leases released.
+DEFAULT_STALE_AFTER = 3 * DEFAULT_LEASE_SECONDS
+
+# The statements are shared by both databases: {p} is the parameter marker and {floor}...{end}
+# rounds a non-negative REAL down (SQLite has no FLOOR unless built with the math functions,
+# and a CAST to integer rounds in PostgreSQL).
+_SCHEMA_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS work_items (
+    city TEXT PRIMARY KEY,
+    period DOUBLE PRECISION NOT NULL, -- seconds between two fetches of the city
+    due_at DOUBLE PRECISION NOT NULL, -- UTC epoch seconds of the next fetch
+    lease_owner TEXT,
+    lease_until DOUBLE PRECISION,
+    runs BIGINT NOT NULL DEFAULT 0
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_work_items_due ON work_items (due_at)",
+    """
+    CREATE TABLE IF NOT EXISTS work_workers (
+    worker TEXT PRIMARY KEY,
+    heartbeat_at DOUBLE PRECISION NOT NULL
+    )
+    """,
+]
+_SELECT_CITIES_SQL = "SELECT city, period FROM work_items"
+_INSERT_ITEM_SQL = """
+    INSERT INTO work_items (city, period, due_at) VALUES ({p}, {p}, {p})
+    ON CONFLICT(city) DO UPDATE SET period = excluded.period
+"""
+_DELETE_ITEM_SQL = "DELETE FROM work_items WHERE city = {p}"
+# Claim the most overdue cities nobody holds a valid lease on. One statement, so two workers
+# can never claim the same city: SQLite runs it under the database write lock, PostgreSQL
+# skips the rows another claim has locked.
+_CLAIM_SQL = """
+    UPDATE work_items SET lease_owner = {p}, lease_until = {p}
+    WHERE city IN (
+        SELECT city FROM work_items
+        WHERE due_at <= {p} AND (lease_until IS NULL OR lease_until < {p})
+        ORDER BY due_at
+        LIMIT {p}{lock}
+    )
+    RETURNING city
+"""
+# Move a fetched city to its next slot on its fixed-rate grid after now, skipping missed ones.
+_COMPLETE_SQL = """
+    UPDATE work_items SET
+        lease_owner = NULL, lease_until = NULL, runs = runs + 1,
+        due_at = due_at + period * (1 + {floor}({p} - due_at) / period{end})
+    WHERE city = {p} AND lease_owner = {p}
+"""
+_RETRY_SQL = """
+    UPDATE work_items SET lease_owner = NULL, lease_until = NULL, due_at = {p}
+    WHERE city = {p} AND lease_owner = {p}
+"""
+_RELEASE_SQL = "UPDATE work_items SET lease_owner = NULL, lease_until = NULL WHERE lease_owner = {p}"
+_HEARTBEAT_SQL = """
+    INSERT INTO work_workers (worker, heartbeat_at) VALUES ({p}, {p})
+    ON CONFLICT(worker) DO UPDATE SET heartbeat_at = excluded.heartbeat_at
+"""
+_DELETE_WORKER_SQL = "DELETE FROM work_workers WHERE worker = {p}"
+_SELECT_STALE_WORKERS_SQL = "SELECT worker FROM work_workers WHERE heartbeat_at < {p}"
+_STATS_SQL = """
+    SELECT COUNT(*),
+           COALESCE(SUM(CASE WHEN lease_until >= {p} THEN 1 ELSE 0 END), 0),
+           COALESCE(SUM(CASE WHEN due_at <= {p} THEN 1 ELSE 0 END), 0),
+           MIN(due_at),
+           COALESCE(SUM(runs), 0)
+    FROM work_items
+"""
+
+
+def worker_id(pid: int = None):
+    """Name of a worker in the queue: host:pid, unique across the machines sharing the queue."""
+    return f"{socket.gethostname()}:{pid or os.getpid()}"
+
+
+def spread_due_times(count: int, period: float, now: float):
+    """First due time of `count` new cities, spread evenly over one period from now."""
+    return [now + period * i / count for i in range(count)]
+
+
+class WorkQueue:
+    """
+    The cities to fetch, shared by every worker of a sharded ingestion (see run_sharded).
+    Each city is due on its own fixed-rate grid. A worker claims a batch of due cities under a
+    lease, fetches them and completes them, which moves each city to its next slot. A worker
+    that dies simply stops completing: its leases expire (or are released by release() as
+    soon as the coordinator notices) and the cities are claimed by the others.
+    Subclasses provide _connection() and the SQL dialect; all methods are thread-safe.
+    """
+
+    name = None
+    errors = ()
+    marker = "?"
+    floor = ("CAST(", " AS INTEGER)")
+    lock = ""
+
+    def _sql(self, template):
+        return template.format(p=self.marker, floor=self.floor[0], end=self.floor[1], lock=self.lock)
+
+    @contextmanager
+    def _connection(self):
+        """A connection for one transaction, committed on success."""
+        raise NotImplementedError
+
+    def _execute(self, sql, params=(), many=False, fetch=False):
+        with self._connection() as conn:
+            cur = conn.cursor()
+            try:
+                if many:
+                    cur.executemany(self._sql(sql), params)
+                else:
+                    cur.execute(self._sql(sql), params)
+                return cur.fetchall() if fetch else cur.rowcount
+            finally:
+                cur.close()
+
+    def init_schema(self):
+        for statement in _SCHEMA_SQL:
+            self._execute(statement)
+
+    def sync(self, periods: dict, prune: bool = True, spread: bool = True, clock=time.time):
+        """
+        Make the queue hold the cities of periods, a {city: seconds between two fetches} map.
+        New cities get their first due time spread over their period (all due now without
+        spread); a changed period applies from the next fetch. With prune, cities no longer
+        listed are removed.
+        Returns (cities added, cities removed).
+        """
+        known = dict(self._execute(_SELECT_CITIES_SQL, fetch=True))
+        now, new = clock(), {}
+        for city, period in periods.items():
+            if city not in known:
+                new.setdefault(period, []).append(city)
+        rows = [
+            (city, period, at)
+            for period, cities in new.items()
+            for city, at in zip(cities, spread_due_times(len(cities), period if spread else 0.0, now))
+        ]
+        # on a known city the insert only updates the period
+        rows += [(city, period, 0.0) for city, period in periods.items() if city in known and known[city] != period]
+        if rows:
+            self._execute(_INSERT_ITEM_SQL, rows, many=True)
+        gone = [(city,) for city in known if city not in periods] if prune else []
+        if gone:
+            self._execute(_DELETE_ITEM_SQL, gone, many=True)
+        added = sum(map(len, new.values()))
+        logging.info(f"[QUEUE] cities={len(periods)} added={added} removed={len(gone)}")
+        return added, len(gone)
+
+    def claim(self, worker: str, limit: int = DEFAULT_CLAIM_SIZE, lease: float = DEFAULT_LEASE_SECONDS, clock=time.time):
+        """Lease up to `limit` due cities to worker for `lease` seconds and return them, most overdue first."""
+        now = clock()
+        self._execute(_HEARTBEAT_SQL, (worker, now))
+        return [city for city, in self._execute(_CLAIM_SQL, (worker, now + lease, now, now, limit), fetch=True)]
+
+    def complete(self, worker: str, cities, clock=time.time):
+        """Give back fetched cities, due again at their next slot. Cities whose lease was lost are left alone."""
+        now = clock()
+        self._execute(_COMPLETE_SQL, [(now, city, worker) for city in cities], many=True)
+
+    def retry(self, worker: str, cities, delay: float, clock=time.time):
+        """Give back cities that could not be fetched, due again in `delay` seconds."""
+        at = clock() + delay
+        self._execute(_RETRY_SQL, [(at, city, worker) for city in cities], many=True)
+
+    def release(self, worker: str):
+        """Drop the leases and the heartbeat of a worker that is gone. Returns the leases released."""
+        released = self._execute(_RELEASE_SQL, (worker,))
+        self._execute(_DELETE_WORKER_SQL, (worker,))
+        if released:
+            logging.warning(f"[QUEUE] released {released} leases of worker {worker}")
+        return released
+
+    def reap(self, stale_after: float = DEFAULT_STALE_AFTER, clock=time.time):
+        """Release the workers (on any host) whose last claim is older than stale_after seconds."""
+        stale = [worker for worker, in self._execute(_SELECT_STALE_WORKERS_SQL, (clock() - stale_after,), fetch=True)]
+        for worker in stale:
+            logging.warning(f"[QUEUE] worker {worker} missed its heartbeat")
+            self.release(worker)
+        return stale
+
+    def stats(self, clock=time.time):
+        """Cities in the queue, leased right now and due right now, seconds to the next due one and runs completed."""
+        now = clock()
+        items, leased, due, next_due, runs = self._execute(_STATS_SQL, (now, now), fetch=True)[0]
+        return {
+            "cities": items, "leased": leased, "due": due, "runs": runs,
+            "next_due_in": None if next_due is None else round(max(0.0, next_due - now), 1),
+        }
+
+    def close(self):
+        """Release the connections."""
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+    A work queue in an SQLite file, for worker processes on one host (or on hosts sharing the
+    file over a filesystem with working locks). WAL mode lets the claims of one worker proceed
+    while others read; writers wait up to busy_timeout seconds for the lock.
+    """
+
+    name = "sqlite"
+    errors = (sqlite3.Error,)
+
+    def __init__(self, path: str = DEFAULT_QUEUE_DB, busy_timeout: float = 30.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL;")
+        self.init_schema()
+
+    @contextmanager
+    def _connection(self):
+        # one connection per thread, kept open: a claim is a single short statement
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=self.busy_timeout)
+            conn.execute("PRAGMA synchronous=NORMAL;")
+        with conn:
+            yield conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class PostgresWorkQueue(WorkQueue):
+    """
+    A work queue in PostgreSQL, for workers spread over several hosts. Claims lock their rows
+    with FOR UPDATE SKIP LOCKED, so concurrent workers take different cities without waiting.
+    """
+
+    name = "postgres"
+    marker = "%s"
+    floor = ("FLOOR(", ")")
+    lock = " FOR UPDATE SKIP LOCKED"
+
+    def __init__(self, dsn: str):
+        from src.utils import postgres_backend  # deferred: needs psycopg2
+
+        postgres_backend._require_psycopg2()
+
+        if not dsn:
+            raise ValueError("The PostgreSQL work queue needs a connection string (--pg-dsn or WEATHER_PG_DSN)")
+        self.dsn = dsn
+        self.errors = (postgres_backend.psycopg2.Error,)
+        self._psycopg2 = postgres_backend.psycopg2
+        self._local = threading.local()
+        self.init_schema()
+
+    @contextmanager
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or conn.closed:
+            conn = self._local.conn = self._psycopg2.connect(self.dsn)
+        with conn:  # commits, or rolls back on error
+            yield conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def open_work_queue(kind: str = "sqlite", path: str = DEFAULT_QUEUE_DB, dsn: str = None):
+    """Open the work queue `kind` ("sqlite" at path, or "postgres" at the libpq connection string dsn)."""
+    if kind == "sqlite":
+        return SQLiteWorkQueue(path)
+    if kind == "postgres":
+        return PostgresWorkQueue(dsn)
+    raise ValueError(f"unknown work queue {kind!r}, expected one of {WORK_QUEUES}")
@@ -0,0 +1,35 @@
+import sqlite3
+
+import pytest
+
+from benchmarks.mock_owm import start_mock_server
+
+
+@pytest.fixture
+def stub():
+    """Start the OpenWeatherMap stub server; stub(**MockState options) returns (state, base_url)."""
+    servers = []
+
+    def start(**options):
+        server, base_url = start_mock_server(**options)
+        servers.append(server)
+        return server.RequestHandlerClass.state, base_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "weather.db")
+
+
+def stored_cities(db_path):
+    """City names with at least one weather_raw row."""
+    conn = sqlite3.connect(db_path)
+    try:
+        return {row[0] for row in conn.execute("SELECT DISTINCT city_name FROM weather_raw;")}
+    finally:
+        conn.close()
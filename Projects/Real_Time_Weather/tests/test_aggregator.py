@@ -0,0 +1,108 @@
+import random
+import sqlite3
+
+import pytest
+
+from src.utils.weather_aggregator import _merge_new_rows, aggregate_incremental, aggregate_range, get_high_water_mark
+from src.utils.weather_db import INSERT_WEATHER_RAW_SQL, create_metrics_table, create_weather_table
+
+DAY = 86400
+DAY1 = 1_750_032_000  # 2025-06-16T00:00:00Z
+CITIES = ("Oslo", "Lima", "Pune")
+METRICS_SQL = """
+    SELECT city_name, date_utc, samples, sum_temp, min_temp, max_temp, sum_humidity, avg_temp, avg_humidity
+    FROM weather_metrics ORDER BY 1, 2
+"""
+RECOMPUTED_SQL = """
+    SELECT city_name, DATE(ts_utc, 'unixepoch'), COUNT(*), SUM(temp_c), MIN(temp_c), MAX(temp_c),
+           SUM(humidity), AVG(temp_c), AVG(humidity)
+    FROM weather_raw GROUP BY 1, 2 ORDER BY 1, 2
+"""
+
+
+def row(city, ts, temp, humidity=50.0):
+    return (city, str(CITIES.index(city)), "XX", ts, "", "test", temp, temp, humidity, 1013, 3.0, 180, "Clear", "clear sky")
+
+
+@pytest.fixture
+def conn(db_path):
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    create_weather_table(conn)
+    create_metrics_table(conn)
+    yield conn
+    conn.close()
+
+
+def insert(conn, rows):
+    conn.executemany(INSERT_WEATHER_RAW_SQL, rows)
+
+
+def metrics(conn, city, day):
+    return conn.execute(
+        "SELECT samples, min_temp, max_temp, avg_temp FROM weather_metrics WHERE city_name = ? AND date_utc = ?;",
+        (city, day),
+    ).fetchone()
+
+
+def test_incremental_runs_add_up_to_a_full_recompute(conn):
+    rng = random.Random(7)
+    rows = [row(city, ts, round(rng.uniform(-20, 35), 1), rng.randint(10, 100))
+            for city in CITIES for ts in range(DAY1, DAY1 + 4 * DAY, 1800)]
+    rng.shuffle(rows)  # every batch has late rows for days already merged
+    merged = 0
+    for start in range(0, len(rows), 97):
+        insert(conn, rows[start:start + 97])
+        merged += aggregate_incremental(conn)
+    assert merged == len(rows)
+    assert aggregate_incremental(conn) == 0
+
+    stored = conn.execute(METRICS_SQL).fetchall()
+    expected = conn.execute(RECOMPUTED_SQL).fetchall()
+    assert len(stored) == len(CITIES) * 4
+    for got, want in zip(stored, expected):
+        assert got[:3] == want[:3] and got[4:6] == want[4:6]  # keys, samples, min, max
+        assert got[3] == pytest.approx(want[3]) and got[6:] == pytest.approx(want[6:])
+
+
+def test_late_row_updates_its_day_only(conn):
+    insert(conn, [row("Oslo", DAY1 + 3600, 10.0), row("Oslo", DAY1 + 7200, 20.0), row("Oslo", DAY1 + DAY, 5.0)])
+    assert aggregate_incremental(conn) == 3
+    assert metrics(conn, "Oslo", "2025-06-16") == (2, 10.0, 20.0, 15.0)
+
+    insert(conn, [row("Oslo", DAY1 + 60, -3.0)])  # arrives after its day was aggregated
+    assert aggregate_incremental(conn) == 1
+    assert metrics(conn, "Oslo", "2025-06-16") == (3, -3.0, 20.0, 9.0)
+    assert metrics(conn, "Oslo", "2025-06-17") == (1, 5.0, 5.0, 5.0)
+    assert get_high_water_mark(conn) == (4, DAY1 + 60)
+
+
+def test_first_merge_recomputes_instead_of_adding_to_old_metrics(conn):
+    insert(conn, [row("Oslo", DAY1, 10.0), row("Oslo", DAY1 + 60, 12.0)])
+    # metrics written by an older, non-incremental aggregation of the same rows
+    conn.execute("INSERT INTO weather_metrics VALUES ('Oslo', '2025-06-16', 11.0, 10.0, 12.0, 50.0, 2, 22.0, 100.0);")
+    conn.execute("BEGIN IMMEDIATE;")
+    assert _merge_new_rows(conn) == (2, 2)
+    conn.commit()
+    assert metrics(conn, "Oslo", "2025-06-16") == (2, 10.0, 12.0, 11.0)
+
+    conn.execute("BEGIN IMMEDIATE;")
+    assert _merge_new_rows(conn) == (2, 0)  # nothing above the mark
+    conn.commit()
+
+
+def test_range_recompute_overwrites_only_the_touched_days(conn):
+    insert(conn, [row(city, DAY1 + day * DAY + hour * 3600, 10.0 + hour) for city in CITIES[:2]
+                  for day in range(3) for hour in range(4)])
+    aggregate_incremental(conn)
+    conn.execute("UPDATE weather_metrics SET samples = 999, min_temp = -99;")  # damaged metrics
+    insert(conn, [row("Oslo", DAY1 + 2 * DAY + 600, 50.0)])  # pending, not merged yet
+
+    # any instant of the second day selects the whole day, for every city
+    assert aggregate_range(conn, DAY1 + DAY + 5000, DAY1 + DAY + 6000) == 2
+    for city in CITIES[:2]:
+        assert metrics(conn, city, "2025-06-16")[:2] == (999, -99)
+        assert metrics(conn, city, "2025-06-17") == (4, 10.0, 13.0, 11.5)
+    # the pending row was merged into the untouched day before the recompute
+    assert metrics(conn, "Oslo", "2025-06-18")[:3] == (1000, -99, 50.0)
+    assert metrics(conn, "Lima", "2025-06-18")[:2] == (999, -99)
+    assert get_high_water_mark(conn)[0] == 25
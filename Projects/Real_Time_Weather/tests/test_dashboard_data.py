@@ -0,0 +1,63 @@
+import random
+
+import numpy as np
+
+from src.utils.dashboard_data import CityBuffer, DashboardData
+
+NOW = 1_750_000_000
+
+
+def test_buffer_wraps_around_and_returns_the_newest_samples_in_order():
+    rng = random.Random(5)
+    buf, ts = CityBuffer(capacity=7), []
+    for _ in range(40):
+        n = rng.randint(0, 9)  # chunks smaller and larger than the capacity
+        chunk = np.arange(len(ts), len(ts) + n, dtype=np.int64) * 10
+        buf.extend(chunk, chunk / 10.0, chunk / 100.0)
+        ts += chunk.tolist()
+        kept = ts[-7:]
+        got = buf.since(0)
+        assert got["ts_utc"].tolist() == kept
+        assert got["temp_c"].tolist() == [t / 10.0 for t in kept]
+        assert got["humidity"].tolist() == [t / 100.0 for t in kept]
+        assert buf.last_ts == (kept[-1] if kept else None)
+
+    newest = ts[-7:]
+    assert buf.since(newest[3])["ts_utc"].tolist() == newest[3:]
+    assert buf.since(newest[3] - 1)["ts_utc"].tolist() == newest[3:]
+    assert buf.since(newest[-1] + 1)["ts_utc"].tolist() == []
+
+    buf.since(0)["ts_utc"][:] = 0  # copies: the buffer is not touched
+    assert buf.since(0)["ts_utc"].tolist() == newest
+    buf.clear()
+    assert buf.last_ts is None and buf.since(0)["ts_utc"].tolist() == []
+
+
+class FakeBackend:
+    def __init__(self):
+        self.rows = []
+        self.calls = []
+
+    def city_range(self, city, start_ts):
+        self.calls.append(start_ts)
+        return [row for row in self.rows if row[0] >= start_ts]
+
+
+def test_recent_reads_only_the_rows_newer_than_the_buffer():
+    clock, backend = [NOW], FakeBackend()
+    data = DashboardData(None, window=3600, refresh_interval=30, full_refresh_interval=600,
+                         capacity=16, clock=lambda: clock[0], backend=backend)
+    backend.rows = [(NOW - 600 * i, 10.0 + i, 50.0) for i in range(8, -1, -1)]
+
+    assert data.recent("Oslo")["ts_utc"].tolist() == [NOW - 600 * i for i in range(6, -1, -1)]
+    assert data.recent("Oslo")["temp_c"].tolist() == [16.0, 15.0, 14.0, 13.0, 12.0, 11.0, 10.0]
+    assert backend.calls == [NOW - 3600]  # the second read within refresh_interval is buffered
+
+    backend.rows.append((NOW + 60, 9.0, 55.0))
+    clock[0] = NOW + 60
+    assert data.recent("Oslo")["ts_utc"].tolist()[-2:] == [NOW, NOW + 60]
+    assert backend.calls[-1] == NOW + 1  # only the delta
+
+    clock[0] = NOW + 600  # full rebuild, and the window has moved on
+    assert data.recent("Oslo")["ts_utc"].tolist()[0] == NOW - 3000
+    assert backend.calls[-1] == NOW + 600 - 3600
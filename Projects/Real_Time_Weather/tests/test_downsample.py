@@ -0,0 +1,71 @@
+import math
+
+import numpy as np
+import pytest
+
+from src.utils.downsample import OVERSAMPLE, TIERS, choose_tier, lttb, minmax, plan_buckets, reduce_series
+
+DAY = 86400
+
+
+def walk(size, seed=3):
+    rng = np.random.default_rng(seed)
+    return np.arange(size, dtype=np.float64) * 600, np.cumsum(rng.normal(size=size))
+
+
+@pytest.mark.parametrize("size, points", [(5000, 100), (1001, 1000), (10, 3), (7, 6)])
+def test_lttb_returns_exactly_n_points_with_both_ends(size, points):
+    x, y = walk(size)
+    kept = lttb(x, y, points)
+    assert len(kept) == points
+    assert kept[0] == 0 and kept[-1] == size - 1
+    assert np.all(np.diff(kept) > 0)
+
+
+def test_lttb_keeps_a_spike_and_leaves_short_series_alone():
+    x, y = walk(2000)
+    y[1234] = 1e6
+    assert 1234 in lttb(x, y, 50)
+    assert lttb(x, y, 2000).tolist() == lttb(x, y, 5000).tolist() == list(range(2000))
+    assert lttb(x, y, 2).tolist() == list(range(2000))  # too few points for a triangle
+
+
+def test_minmax_keeps_the_extremes_of_every_bucket():
+    x, y = walk(1000)
+    kept = minmax(x, y, 40)
+    assert len(kept) <= 40 and np.all(np.diff(kept) > 0)
+    for start in range(0, 1000, 50):  # 20 buckets of 50 samples
+        bucket = y[start:start + 50]
+        assert start + int(bucket.argmin()) in kept and start + int(bucket.argmax()) in kept
+    assert minmax(x, y, 1000).tolist() == list(range(1000))
+
+
+def test_choose_tier_picks_the_finest_tier_that_fits():
+    assert choose_tier(0, DAY, 4000)[0] == "raw"
+    assert choose_tier(0, 4000 * 600, 4000)[0] == "raw"  # the bound is inclusive
+    assert choose_tier(0, 4000 * 600 + 1, 4000)[0] == "hourly"
+    assert choose_tier(0, 100 * DAY, 4000)[0] == "hourly"
+    assert choose_tier(0, 365 * DAY, 4000)[0] == "daily"
+    assert choose_tier(0, 50 * 365 * DAY, 4000) == TIERS[-1]  # nothing fits: the coarsest
+    assert choose_tier(5, 5, 1)[0] == "raw"
+
+
+@pytest.mark.parametrize("days", [1, 30, 365, 3650])
+def test_planned_buckets_fit_the_points(days):
+    name, table, bucket = plan_buckets(0, days * DAY, points=500)
+    resolution = dict((tier[0], tier[2]) for tier in TIERS)[name]
+    assert bucket % resolution == 0
+    assert math.ceil(days * DAY / bucket) <= OVERSAMPLE * 500
+
+
+def test_reduce_series_returns_typed_columns():
+    x, y = walk(3000)
+    rows = [(int(t), v, v - 1, v + 1, 50.0, 4) for t, v in zip(x, y)]
+    columns = reduce_series(rows, points=300)
+    assert len(columns["ts_utc"]) == 300
+    assert columns["ts_utc"].dtype == columns["samples"].dtype == np.int64
+    assert columns["ts_utc"][0] == 0 and columns["ts_utc"][-1] == int(x[-1])
+    assert len(reduce_series(rows, points=300, method="minmax")["ts_utc"]) <= 300
+    assert reduce_series([], points=300)["temp_c"].size == 0
+    with pytest.raises(ValueError):
+        reduce_series(rows, method="mean")
@@ -0,0 +1,67 @@
+import random
+import time
+
+import pytest
+
+from main import run_once
+from src.utils.http_client import HostRateLimiter, create_session, get_json, host_of, weather_url
+from src.utils.resilience import CircuitBreaker, FetchFailed, FetchPolicy
+from tests.conftest import stored_cities
+
+CITIES = [f"City{i}" for i in range(40)]
+PARAMS = {"appid": "key", "q": "Oslo", "units": "metric"}
+
+
+def test_pooled_session_reuses_its_connections(stub, db_path, tmp_path):
+    state, base_url = stub()
+    session = create_session(4)
+    for _ in range(2):
+        run_once(CITIES, "key", db_path, str(tmp_path / "raw"), concurrency=4, session=session, base_url=base_url)
+
+    pools = session.get_adapter(base_url).poolmanager.pools
+    assert len(pools) == 1
+    pool = pools[next(iter(pools.keys()))]
+    assert stored_cities(db_path) == set(CITIES)
+    assert state.requests == pool.num_requests == 2 * len(CITIES)
+    # keep-alive: one connection per fetch thread for the two ticks, not one per request
+    assert pool.num_connections <= 4
+    session.close()
+
+
+def test_retry_after_sets_the_retry_delay():
+    policy = FetchPolicy(backoff=0.1, rng=random.Random(0))
+    assert all(2.0 <= policy.delay(attempt, retry_after=2.0) <= 2.1 for attempt in range(5))
+
+
+def test_429_is_retried_without_tripping_the_breaker(stub):
+    state, base_url = stub(rate_429=1.0, retry_after=0)
+    breaker = CircuitBreaker(threshold=1)
+    policy = FetchPolicy(retries=2, backoff=0.01, breaker=breaker)
+    with create_session(1) as session, pytest.raises(FetchFailed):
+        get_json(session, weather_url(base_url), PARAMS, policy=policy)
+    assert state.throttled == state.requests == 3
+    # throttling is not a failure of the host
+    assert breaker.state(host_of(base_url)) == "closed"
+
+
+def test_long_retry_after_pauses_the_host_instead_of_blocking_the_fetch(stub):
+    state, base_url = stub(rate_429=1.0, retry_after=1)
+    limiter = HostRateLimiter(6000)
+    policy = FetchPolicy(retries=3, backoff=0.01, max_backoff=0.5)
+    with create_session(1) as session, pytest.raises(FetchFailed):
+        get_json(session, weather_url(base_url), PARAMS, rate_limiter=limiter, policy=policy)
+    assert state.requests == 1
+
+    start = time.monotonic()
+    limiter.acquire(host_of(base_url))
+    assert time.monotonic() - start >= 0.8
+
+
+def test_throttled_cities_are_fetched_after_their_retries(stub, db_path, tmp_path):
+    state, base_url = stub(rate_429=0.3, retry_after=0, seed=3)
+    policy = FetchPolicy(retries=6, backoff=0.01, rng=random.Random(0))
+    run_once(CITIES[:20], "key", db_path, str(tmp_path / "raw"), concurrency=1, base_url=base_url,
+             rate_limiter=HostRateLimiter(60_000), policy=policy)
+    assert state.throttled > 0
+    assert stored_cities(db_path) == set(CITIES[:20])
+    assert state.requests == 20 + state.throttled
@@ -0,0 +1,56 @@
+import io
+import logging
+from urllib.parse import quote, quote_plus
+
+import pytest
+
+from src.utils.logger import REDACTED, Redactor, configure_logging, shutdown_logging
+
+KEY = "s3cr3t/k+y=1 2"
+
+
+@pytest.fixture
+def restore_root():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield
+    shutdown_logging()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def test_key_is_masked_in_the_file_and_the_stream(tmp_path, restore_root):
+    log_file, stream = tmp_path / "app.log", io.StringIO()
+    configure_logging(level="INFO", log_file=str(log_file), api_key=KEY, stream=stream)
+    logging.info("Request sent to URL: %s", f"https://api.example/weather?q=Oslo&appid={quote(KEY, safe='')}&units=metric")
+    logging.warning("key=%s", KEY)
+    logging.error("escaped %s and %s", quote(KEY, safe=""), quote_plus(KEY))
+    logging.info("other appid=0123abcd&q=Lima")
+    shutdown_logging()
+
+    for text in (log_file.read_text(encoding="utf-8"), stream.getvalue()):
+        assert len(text.splitlines()) == 4
+        assert text.count(REDACTED) == 5
+        for secret in (KEY, quote(KEY, safe=""), quote_plus(KEY), "s3cr3t", "0123abcd"):
+            assert secret not in text
+        assert "q=Oslo&appid=" + REDACTED + "&units=metric" in text
+
+
+def test_redact_value_walks_nested_content():
+    redact = Redactor(KEY)
+    content = {"url": f"/weather?appid={KEY}", "list": [KEY, 3], "n": None}
+    assert redact.redact_value(content) == {"url": "/weather?appid=" + REDACTED, "list": [REDACTED, 3], "n": None}
+
+
+def test_shutdown_drains_the_queue(tmp_path, restore_root):
+    log_file = tmp_path / "app.log"
+    configure_logging(level="INFO", log_file=str(log_file))
+    for i in range(5000):
+        logging.info("record %d", i)
+    shutdown_logging()  # returns once the listener wrote every queued record
+    lines = log_file.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 5000 and lines[-1].endswith("record 4999")
+    shutdown_logging()  # a second call is a no-op
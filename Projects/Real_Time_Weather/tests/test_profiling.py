@@ -0,0 +1,35 @@
+import pytest
+
+from main import run_once
+from src.utils import profiling
+from src.utils.profiling import TickProfiler
+from tests.conftest import stored_cities
+
+CITIES = [f"City{i}" for i in range(12)]
+
+
+@pytest.mark.parametrize("per_thread", [True, False])
+def test_profiled_concurrent_tick_stores_every_city(stub, db_path, tmp_path, monkeypatch, per_thread):
+    if per_thread and not profiling.PER_THREAD_PROFILES:
+        pytest.skip("one profiler per process on this Python")
+    monkeypatch.setattr(profiling, "PER_THREAD_PROFILES", per_thread)
+    _, base_url = stub(latency_ms=5)
+    profiler = TickProfiler(out_dir=str(tmp_path / "profiles"))
+    profiler.arm()
+
+    run_once(CITIES, "key", db_path, str(tmp_path / "raw"), concurrency=8, base_url=base_url, profiler=profiler)
+
+    assert stored_cities(db_path) == set(CITIES)
+    assert profiler.captures == 1
+    assert len(list((tmp_path / "profiles").glob("tick-run_once-*.prof"))) == 1
+
+
+def test_unarmed_profiler_leaves_the_tick_alone(stub, db_path, tmp_path):
+    _, base_url = stub()
+    profiler = TickProfiler(out_dir=str(tmp_path / "profiles"))
+
+    run_once(CITIES, "key", db_path, str(tmp_path / "raw"), concurrency=4, base_url=base_url, profiler=profiler)
+
+    assert stored_cities(db_path) == set(CITIES)
+    assert profiler.captures == 0
+    assert not (tmp_path / "profiles").exists()
@@ -0,0 +1,97 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from benchmarks.mock_owm import fake_weather  # noqa: E402
+from src.utils import raw_archive  # noqa: E402
+from src.utils.raw_archive import RawArchiveWriter, iter_archive_batches, scan_archive  # noqa: E402
+from src.utils.weather_transform import transform_batch  # noqa: E402
+
+DAY1 = datetime(2025, 8, 1, 10, 15, tzinfo=timezone.utc)
+DAY2 = datetime(2025, 8, 2, 9, 0, tzinfo=timezone.utc)
+CITIES = ["Oslo", "Paris", "Lima"]
+
+
+def parts(root):
+    return sorted(str(path.relative_to(root)).split("/")[0] for path in root.rglob("*.parquet"))
+
+
+def test_responses_are_partitioned_by_day_and_written_on_close(tmp_path):
+    root = tmp_path / "archive"
+    writer = RawArchiveWriter(str(root), roll="hourly")
+    for captured in (DAY1, DAY1.replace(hour=11), DAY2):
+        for city in CITIES:
+            writer.append(city, fake_weather(city, captured.timestamp()), captured)
+    # the two older hours rolled to disk when a newer bucket started, the last one is buffered
+    assert parts(root) == ["date=2025-08-01", "date=2025-08-01"]
+    writer.close()
+    assert parts(root) == ["date=2025-08-01", "date=2025-08-01", "date=2025-08-02"]
+    assert writer.files_written == 3 and writer.rows_written == 9
+
+    table = scan_archive(str(root))
+    assert table.num_rows == 9
+    rows = table.to_pylist()
+    assert {row["captured_at_utc"] for row in rows} == {"20250801T101500Z", "20250801T111500Z", "20250802T090000Z"}
+    for row in rows:
+        captured = datetime.strptime(row["captured_at_utc"], "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+        assert json.loads(row["payload"]) == fake_weather(row["city"], captured.timestamp())
+        assert row["date"] == captured.strftime("%Y-%m-%d")
+        assert (row["city_id"], row["dt"]) == (json.loads(row["payload"])["id"], json.loads(row["payload"])["dt"])
+
+
+def test_reading_back_prunes_days_cities_and_columns(tmp_path):
+    root = str(tmp_path / "archive")
+    writer = RawArchiveWriter(root, roll="daily")
+    for captured in (DAY1, DAY2):
+        responses = [fake_weather(city, captured.timestamp()) for city in CITIES]
+        batch = transform_batch(responses, captured.strftime("%Y%m%dT%H%M%SZ"))
+        writer.append_batch(CITIES, responses, batch, captured)
+    writer.close()
+
+    assert scan_archive(root).num_rows == 6
+    day2 = scan_archive(root, start_date="2025-08-02", columns=["city", "dt"])
+    assert day2.column_names == ["city", "dt"]
+    assert sorted(day2.column("city").to_pylist()) == sorted(CITIES)
+    assert set(day2.column("dt").to_pylist()) == {fake_weather("Oslo", DAY2.timestamp())["dt"]}
+    oslo = list(iter_archive_batches(root, end_date="2025-08-01", cities=["Oslo"], columns=["payload"]))
+    assert [json.loads(p)["name"] for batch in oslo for p in batch.column("payload").to_pylist()] == ["Oslo"]
+    assert scan_archive(str(tmp_path / "missing")).num_rows == 0
+
+
+def test_failed_write_keeps_the_responses_and_raises(tmp_path, monkeypatch):
+    root = tmp_path / "archive"
+    writer = RawArchiveWriter(str(root), roll="daily")
+    for city in CITIES:
+        writer.append(city, fake_weather(city, DAY1.timestamp()), DAY1)
+
+    write_table = raw_archive.pq.write_table
+
+    def failing_write(table, path, **kwargs):
+        open(path, "wb").close()  # a partial file, as a full disk would leave
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(raw_archive.pq, "write_table", failing_write)
+    with pytest.raises(OSError):
+        writer.flush()
+    assert parts(root) == [] and writer.files_written == 0
+    # a roll that fails on the append path is logged and the older day stays buffered too
+    writer.append("Rome", fake_weather("Rome", DAY2.timestamp()), DAY2)
+    assert parts(root) == []
+
+    monkeypatch.setattr(raw_archive.pq, "write_table", write_table)
+    writer.close()
+    assert writer.rows_written == 4
+    assert sorted(scan_archive(str(root)).column("city").to_pylist()) == sorted(CITIES + ["Rome"])
+
+
+def test_malformed_ids_are_archived_as_null(tmp_path):
+    root = str(tmp_path / "archive")
+    writer = RawArchiveWriter(root)
+    writer.append("Oslo", {**fake_weather("Oslo", DAY1.timestamp()), "id": "not-a-number", "dt": 2**70}, DAY1)
+    writer.close()
+    row = scan_archive(root).to_pylist()[0]
+    assert row["city_id"] is None and row["dt"] is None
+    assert json.loads(row["payload"])["id"] == "not-a-number"
@@ -0,0 +1,35 @@
+import json
+import logging
+
+from benchmarks.datagen import write_raw_files
+from src.utils.logger import configure_logging, shutdown_logging
+from src.utils.replay import replay
+from tests.conftest import stored_cities
+
+
+def test_replay_with_a_pool_while_logging_runs(db_path, tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    write_raw_files(str(data_dir), 40, 4)
+    with open(data_dir / "raw_Broken_20250101T000000Z.json", "w", encoding="utf-8") as f:
+        json.dump({"name": "Broken", "dt": 1}, f)
+    log_file = tmp_path / "replay.log"
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    configure_logging(level="INFO", log_file=str(log_file))
+    try:
+        result = replay(db_path, str(data_dir), workers=2, chunk_size=8)
+    finally:
+        shutdown_logging()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        for handler in handlers:
+            root.addHandler(handler)
+        root.setLevel(level)
+
+    assert result["sources"] == 41
+    assert result["rejected"] == 1
+    assert result["rows_inserted"] == 40
+    assert stored_cities(db_path) == {f"City{i:05d}" for i in range(4)}
+    log = log_file.read_text(encoding="utf-8")
+    assert "[TRANSFORM]" in log and "Replay finished" in log
@@ -0,0 +1,111 @@
+import random
+import time
+
+import pytest
+
+from main import run_once
+from src.utils.http_client import create_session, get_json, host_of, weather_url
+from src.utils.resilience import CircuitBreaker, FetchFailed, FetchPolicy, RetryQueue
+from src.utils.weather_writer import WeatherWriter
+from tests.conftest import stored_cities
+
+CITIES = [f"City{i}" for i in range(12)]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_after_threshold_and_lets_one_trial_through():
+    clock = FakeClock()
+    breaker = CircuitBreaker(threshold=3, reset_timeout=10, clock=clock)
+    for _ in range(2):
+        breaker.failure("api")
+    assert breaker.state("api") == "closed" and breaker.allow("api")
+    breaker.failure("api")
+    assert breaker.state("api") == "open" and not breaker.allow("api")
+
+    clock.now += 10
+    assert breaker.state("api") == "half-open"
+    assert breaker.allow("api")
+    assert not breaker.allow("api")  # only one trial call at a time
+    breaker.failure("api")
+    assert breaker.state("api") == "open"
+
+    clock.now += 10
+    assert breaker.allow("api")
+    breaker.success("api")
+    assert breaker.state("api") == "closed" and breaker.allow("api")
+
+
+def test_429_on_the_trial_call_keeps_the_breaker_open_for_another_timeout(stub):
+    state, base_url = stub(rate_429=1.0, retry_after=0)
+    clock, host = FakeClock(), host_of(base_url)
+    breaker = CircuitBreaker(threshold=1, reset_timeout=10, clock=clock)
+    breaker.failure(host)
+    clock.now += 10
+    policy = FetchPolicy(retries=0, breaker=breaker)
+    with create_session(1) as session:
+        with pytest.raises(FetchFailed):
+            get_json(session, weather_url(base_url), {"appid": "key", "q": "Oslo"}, policy=policy)
+        assert state.throttled == 1
+        # not stuck half-open with a trial that never ends: open again, then a new trial
+        assert breaker.state(host) == "open" and not breaker.allow(host)
+        clock.now += 10
+        state.rate_429 = 0.0
+        assert get_json(session, weather_url(base_url), {"appid": "key", "q": "Oslo"}, policy=policy)
+    assert breaker.state(host) == "closed"
+
+
+def test_retry_queue_backoff_and_give_up(db_path):
+    clock = FakeClock()
+    writer = WeatherWriter(db_path, flush_interval=0)
+    try:
+        queue = RetryQueue(writer.backend, base_delay=60, max_delay=100, max_attempts=3, clock=clock)
+        queue.push("Oslo", "boom")
+        assert queue.due() == []
+        clock.now += 60
+        assert queue.due() == ["Oslo"]
+        queue.push("Oslo", "boom")
+        clock.now += 100  # 120s capped at max_delay
+        assert queue.due() == ["Oslo"]
+
+        # the queue lives in the writer's database, so a restart picks it up
+        assert "Oslo" in RetryQueue(writer.backend, clock=clock)
+        queue.push("Oslo", "boom")
+        queue.push("Oslo", "boom")
+        assert "Oslo" not in queue
+        assert RetryQueue(writer.backend, clock=clock).size == 0
+    finally:
+        writer.close()
+
+
+def test_outage_opens_breaker_and_queue_drains_once_back(stub, db_path, tmp_path):
+    state, base_url = stub()
+    state.down = True
+    policy = FetchPolicy(retries=2, backoff=0.01, max_backoff=0.05, rng=random.Random(0),
+                         breaker=CircuitBreaker(threshold=3, reset_timeout=0.2))
+    out_dir = str(tmp_path / "raw")
+    writer = WeatherWriter(db_path, flush_interval=0)
+    try:
+        queue = RetryQueue(writer.backend, base_delay=0)
+        run_once(CITIES, "key", db_path, out_dir, concurrency=1, base_url=base_url,
+                 writer=writer, policy=policy, retry_queue=queue)
+        # the open breaker fails the remaining cities fast instead of sending their retries
+        assert state.requests < len(CITIES)
+        assert queue.size == len(CITIES)
+        assert not stored_cities(db_path)
+
+        state.down = False
+        time.sleep(0.3)  # past the breaker reset timeout
+        run_once([], "key", db_path, out_dir, concurrency=1, base_url=base_url,
+                 writer=writer, policy=policy, retry_queue=queue)
+        assert stored_cities(db_path) == set(CITIES)
+        assert queue.size == 0
+        assert RetryQueue(writer.backend).size == 0
+    finally:
+        writer.close()
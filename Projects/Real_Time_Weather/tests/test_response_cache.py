@@ -0,0 +1,61 @@
+import sqlite3
+
+import pytest
+
+from main import run_once
+from src.utils.response_cache import ResponseCache
+from src.utils.storage import SQLiteBackend
+from src.utils.weather_writer import WeatherWriter
+from tests.conftest import stored_cities
+
+CITIES = [f"City{i}" for i in range(25)]
+
+
+class FailingBackend(SQLiteBackend):
+    """An SQLite backend whose first `failures` batch inserts fail."""
+
+    def __init__(self, db_path, failures=1):
+        super().__init__(db_path)
+        self.failures = failures
+
+    def insert_rows(self, rows):
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError("database is locked")
+        return super().insert_rows(rows)
+
+
+def test_payload_is_only_remembered_once_recorded():
+    cache = ResponseCache(path=None, clock=lambda: 1_000)
+    payload = {"id": 1, "dt": 900}
+
+    assert cache.is_new("London", payload)
+    assert cache.is_new("London", payload)
+    assert cache.should_fetch("London")
+
+    cache.record("London", payload)
+    assert not cache.is_new("London", payload)
+    assert not cache.should_fetch("London")
+    assert cache.is_new("London", {"id": 1, "dt": 1_500})
+
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_failed_write_is_retried_on_the_next_fetch(stub, db_path, tmp_path, bulk):
+    _, base_url = stub()
+    cache = ResponseCache(path=str(tmp_path / "cache.json"))
+    writer = WeatherWriter(None, batch_size=10_000, flush_interval=0, backend=FailingBackend(db_path))
+    try:
+        run_once(CITIES, "key", db_path, str(tmp_path / "raw"), concurrency=4, base_url=base_url,
+                 writer=writer, cache=cache, bulk=bulk)
+        assert writer.rows_failed == len(CITIES)
+        assert cache.stats()["unchanged_payloads"] == 0
+
+        run_once(CITIES, "key", db_path, str(tmp_path / "raw"), concurrency=4, base_url=base_url,
+                 writer=writer, cache=cache, bulk=bulk)
+        assert stored_cities(db_path) == set(CITIES)
+
+        run_once(CITIES, "key", db_path, str(tmp_path / "raw"), concurrency=4, base_url=base_url,
+                 writer=writer, cache=cache, bulk=bulk)
+        assert cache.stats()["hits"] == len(CITIES)
+    finally:
+        writer.close()
@@ -0,0 +1,100 @@
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from benchmarks.datagen import write_raw_files  # noqa: E402
+from src.utils import raw_archive  # noqa: E402
+from src.utils.raw_archive import scan_archive  # noqa: E402
+from src.utils.replay import iter_raw_json_files  # noqa: E402
+from src.utils.retention import archive_expired_files, cutoff_ts, prune_database  # noqa: E402
+from src.utils.weather_writer import WeatherWriter  # noqa: E402
+
+DAY = 86400
+FIRST_DAY = 1_750_032_000  # 2025-06-16T00:00:00Z
+NOW = FIRST_DAY + 4 * DAY + 13 * 3600  # early afternoon of the fifth day
+
+
+def hourly_rows(days, cities=("Oslo", "Lima")):
+    return [
+        (city, str(i), "XX", ts, "", "test", 10.0 + i, 9.0, 50, 1013, 3.0, 180, "Clear", "clear sky")
+        for ts in range(FIRST_DAY, FIRST_DAY + days * DAY, 3600)
+        for i, city in enumerate(cities)
+    ]
+
+
+@pytest.fixture
+def conn(db_path):
+    with WeatherWriter(db_path, flush_interval=0) as writer:
+        writer.add_many(hourly_rows(5))
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    yield conn
+    conn.close()
+
+
+def test_cutoffs_fall_on_utc_day_boundaries():
+    assert cutoff_ts(2, NOW) == FIRST_DAY + 2 * DAY
+    assert cutoff_ts(2, FIRST_DAY + 4 * DAY) == FIRST_DAY + 2 * DAY
+    assert cutoff_ts(2, FIRST_DAY + 5 * DAY - 1) == FIRST_DAY + 2 * DAY
+
+
+def test_prune_removes_whole_days_and_keeps_the_metrics(conn):
+    retention = {"raw": 2, "hourly": 3, "daily": None, "metrics": None}
+    expected = prune_database(conn, retention, NOW, batch_size=10, pause=0, dry_run=True)
+    assert conn.execute("SELECT COUNT(*) FROM weather_raw;").fetchone()[0] == 5 * 24 * 2
+
+    stats = prune_database(conn, retention, NOW, batch_size=10, pause=0)
+    assert (stats["raw"], stats["hourly"]) == (expected["raw"], expected["hourly"]) == (2 * 24 * 2, 1 * 24 * 2)
+    assert stats["batches"] > 2  # several short transactions, not one
+    first, count = conn.execute("SELECT MIN(ts_utc), COUNT(*) FROM weather_raw;").fetchone()
+    assert (first, count) == (FIRST_DAY + 2 * DAY, 3 * 24 * 2)
+    assert conn.execute("SELECT MIN(bucket_ts) FROM weather_rollup_hourly;").fetchone()[0] == FIRST_DAY + DAY
+    # the pruned days were merged first: their metrics are complete and kept
+    assert conn.execute("SELECT COUNT(*), MIN(samples) FROM weather_metrics;").fetchone() == (5 * 2, 24)
+    assert conn.execute("SELECT COUNT(*) FROM weather_rollup_daily;").fetchone()[0] == 5 * 2
+
+
+def raw_files(data_dir):
+    return sorted(Path(path).name for path in iter_raw_json_files(str(data_dir)))
+
+
+def test_expired_files_move_to_the_archive(tmp_path):
+    data_dir, archive_dir = tmp_path / "data", tmp_path / "archive"
+    data_dir.mkdir()
+    write_raw_files(str(data_dir), 4 * 24, 1, end_ts=FIRST_DAY + 4 * DAY - 3600, interval=3600)
+    kept = [name for name in raw_files(data_dir) if name.split("_")[-1] >= "20250618"]
+
+    assert archive_expired_files(str(data_dir), str(archive_dir), 2, NOW, dry_run=True)["files"] == 2 * 24
+    totals = archive_expired_files(str(data_dir), str(archive_dir), 2, NOW, chunk_size=30)
+    assert totals == {"files": 2 * 24, "rejected": 0, "failed": 0}
+    assert raw_files(data_dir) == kept
+    archived = scan_archive(str(archive_dir), columns=["captured_at_utc", "date"])
+    assert archived.num_rows == 2 * 24
+    assert sorted(set(archived.column("date").to_pylist())) == ["2025-06-16", "2025-06-17"]
+
+
+def test_failed_archive_write_leaves_the_files_in_place(tmp_path, monkeypatch):
+    data_dir, archive_dir = tmp_path / "data", tmp_path / "archive"
+    data_dir.mkdir()
+    write_raw_files(str(data_dir), 4 * 24, 1, end_ts=FIRST_DAY + 4 * DAY - 3600, interval=3600)
+    before = raw_files(data_dir)
+    write_table, calls = raw_archive.pq.write_table, []
+
+    def write_first_day_only(table, path, **kwargs):
+        calls.append(path)
+        if len(calls) > 1:
+            raise OSError("No space left on device")
+        write_table(table, path, **kwargs)
+
+    monkeypatch.setattr(raw_archive.pq, "write_table", write_first_day_only)
+    totals = archive_expired_files(str(data_dir), str(archive_dir), 2, NOW)
+    # the first day is on disk and its files are gone; the second one failed and the pass stopped
+    assert totals == {"files": 24, "rejected": 0, "failed": 24}
+    assert raw_files(data_dir) == [name for name in before if "20250616T" not in name]
+    assert scan_archive(str(archive_dir)).num_rows == 24
+
+    monkeypatch.setattr(raw_archive.pq, "write_table", write_table)
+    assert archive_expired_files(str(data_dir), str(archive_dir), 2, NOW)["files"] == 24
+    assert scan_archive(str(archive_dir)).num_rows == 2 * 24
@@ -0,0 +1,21 @@
+import pytest
+
+from main import run_once
+from src.utils.weather_writer import WeatherWriter
+from tests.conftest import stored_cities
+
+CITIES = [f"City{i}" for i in range(25)]
+
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_tick_rows_are_flushed_through_a_shared_writer(stub, db_path, tmp_path, bulk):
+    _, base_url = stub()
+    writer = WeatherWriter(db_path, batch_size=10_000, flush_interval=0)
+    try:
+        for _ in range(2):  # the second bulk tick goes through the group endpoint
+            run_once(CITIES, "key", db_path, str(tmp_path / "raw"), concurrency=4, base_url=base_url,
+                     writer=writer, bulk=bulk)
+            assert stored_cities(db_path) == set(CITIES)
+            assert writer.stats()["rows_pending"] == 0
+    finally:
+        writer.close()
@@ -0,0 +1,113 @@
+import random
+import threading
+import time
+
+import pytest
+
+from src.utils.scheduler import TimerHeapScheduler, parse_interval_overrides, spread_offsets
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def settle(job):
+    """Wait for the pool thread to finish the job's run."""
+    deadline = time.monotonic() + 5
+    while job.running and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert not job.running
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def scheduler(clock):
+    scheduler = TimerHeapScheduler(max_workers=2, clock=clock, rng=random.Random(1))
+    yield scheduler
+    scheduler.stop()
+
+
+def test_runs_stay_on_the_fixed_rate_grid(clock, scheduler):
+    started = []
+    job = scheduler.add_job("oslo", lambda: started.append(clock()), interval=10, offset=3)
+    assert scheduler.run_pending() == 3.0
+    clock.now = 1003.0
+    assert scheduler.run_pending() == 10.0
+    settle(job)
+    clock.now = 1016.5  # a late dispatch does not move the next run
+    assert scheduler.run_pending() == 6.5
+    settle(job)
+
+    clock.now = 1045.0  # the process was busy: 1023 runs late, 1033 and 1043 are dropped
+    assert scheduler.run_pending() == 8.0
+    settle(job)
+    assert started == [1003.0, 1016.5, 1045.0]
+    assert (job.runs, job.skipped, job.base) == (3, 2, 1053.0)
+
+
+def test_a_job_still_running_skips_its_tick(clock, scheduler):
+    release, calls = threading.Event(), []
+
+    def slow():
+        calls.append(clock())
+        if len(calls) == 1:
+            release.wait(5)
+        elif len(calls) == 3:
+            raise RuntimeError("boom")  # logged, the job stays scheduled
+
+    job = scheduler.add_job("slow", slow, interval=10)
+    other = scheduler.add_job("other", lambda: None, interval=10, offset=5)
+    for now in (1000.0, 1005.0, 1010.0, 1015.0):
+        clock.now = now
+        scheduler.run_pending()
+        settle(other)
+    assert (job.skipped, other.skipped, other.runs) == (1, 0, 2)  # a slow job holds back no other
+
+    release.set()
+    settle(job)
+    for now in (1020.0, 1030.0, 1040.0):
+        clock.now = now
+        scheduler.run_pending()
+        settle(job)
+    assert calls == [1000.0, 1020.0, 1030.0, 1040.0]
+    assert (job.runs, job.skipped) == (4, 1)
+
+
+def test_jitter_only_delays_a_run_and_stays_within_its_bound(clock, scheduler):
+    job = scheduler.add_job("jittered", lambda: None, interval=10, jitter=2)
+    delays = []
+    for n in range(200):
+        clock.now = 1000.0 + n * 10 + 2  # late enough for any jitter
+        # the next run is due at its grid time plus 0..2s of jitter, i.e. 8..10s from now
+        delays.append(scheduler.run_pending())
+        settle(job)
+    assert job.runs == 200 and job.skipped == 0
+    assert all(8.0 <= delay <= 10.0 for delay in delays)
+    assert max(delays) - min(delays) > 1.5
+
+    clock.now = 1000.0 + 200 * 10 - 0.001  # before the grid time nothing is ever due
+    scheduler.run_pending()
+    assert job.runs == 200
+
+
+def test_offsets_spread_the_jobs_over_the_interval():
+    assert spread_offsets(4, 60) == [0.0, 15.0, 30.0, 45.0]
+    assert spread_offsets(1, 60) == [0.0]
+    assert spread_offsets(0, 60) == []
+
+
+def test_interval_overrides_are_parsed_per_city_and_group():
+    overrides = parse_interval_overrides(["Oslo=5", " Paris , Rome,=0.5", "New York=10", "Oslo=1"])
+    assert overrides == {"Oslo": 60.0, "Paris": 30.0, "Rome": 30.0, "New York": 600.0}
+    assert parse_interval_overrides(None) == {}
+    for spec in ("Oslo", "=5", "Oslo=0", "Oslo=-1", "Oslo=soon"):
+        with pytest.raises(ValueError):
+            parse_interval_overrides([spec])
@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+from src.utils.bulk_fetch import CityIdResolver
+from src.utils.storage import create_backend
+
+DAY = 86400
+DAY1 = 1_750_032_000  # 2025-06-16T00:00:00Z
+DAY2 = DAY1 + DAY
+TABLES = ("weather_raw", "cities", "weather_metrics", "aggregation_state",
+          "weather_rollup_hourly", "weather_rollup_daily", "fetch_retry_queue", "city_lookup")
+
+
+def row(city, ts, temp, humidity=50):
+    city_id = {"Oslo": "3143244", "Lima": "3936456"}[city]
+    return (city, city_id, "XX", ts, "", "test", temp, temp, humidity, 1013, 3.0, 180, "Clear", "clear sky")
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        backend = create_backend("sqlite", db_path=str(tmp_path / "weather.db"))
+    else:
+        pytest.importorskip("psycopg2")
+        # a separate variable from WEATHER_PG_DSN: the tables of this database are dropped
+        dsn = os.getenv("WEATHER_TEST_PG_DSN")
+        if not dsn:
+            pytest.skip("set WEATHER_TEST_PG_DSN to a scratch PostgreSQL database")
+        backend = create_backend("postgres", dsn=dsn)
+        backend._write(f"DROP TABLE IF EXISTS {', '.join(TABLES)}")
+    backend.init_schema()
+    yield backend
+    if request.param == "postgres":
+        backend._write(f"DROP TABLE IF EXISTS {', '.join(TABLES)}")
+    backend.close()
+
+
+def test_inserts_skip_duplicates_and_feed_the_queries(backend):
+    assert backend.insert_rows([row("Oslo", DAY1, 10), row("Oslo", DAY1 + 3600, 14), row("Lima", DAY1, 20)]) == 3
+    assert backend.insert_rows([row("Oslo", DAY1, 99), row("Lima", DAY1, 99), row("Oslo", DAY2, 30)]) == 1
+    assert backend.insert_rows([]) == 0
+
+    assert backend.cities() == ["Lima", "Oslo"]
+    assert [tuple(r) for r in backend.city_range("Oslo", DAY1 + 1)] == [(DAY1 + 3600, 14, 50), (DAY2, 30, 50)]
+    expected = [(DAY1, 12, 10, 14, 50, 2), (DAY2, 30, 30, 30, 50, 1)]
+    for table in ("weather_raw", "weather_rollup_hourly", "weather_rollup_daily"):
+        buckets = backend.series_buckets("Oslo", DAY1, DAY2 + DAY - 1, table, DAY)
+        assert [tuple(r) for r in buckets] == expected, table
+
+
+def test_late_rows_are_merged_into_their_day(backend):
+    backend.insert_rows([row("Oslo", DAY1, 10), row("Oslo", DAY1 + 3600, 14), row("Lima", DAY1, 20)])
+    assert backend.aggregate_incremental() == 3
+    assert backend.aggregate_incremental() == 0
+
+    backend.insert_rows([row("Oslo", DAY1 + 7200, 18, humidity=80), row("Oslo", DAY2, 30)])
+    assert backend.aggregate_incremental() == 2
+    merged = [tuple(r) for r in backend.daily_metrics("Oslo", 7)]
+    assert merged == [("2025-06-17", 30, 30, 30, 50, 1), ("2025-06-16", 14, 10, 18, 60, 3)]
+    assert [tuple(r) for r in backend.daily_metrics("Oslo", 1)] == merged[:1]
+
+    # recomputing the first day from weather_raw finds what the merges built
+    assert backend.aggregate_range(DAY1 + 100, DAY1 + 200) == 2
+    assert [tuple(r) for r in backend.daily_metrics("Oslo", 7)] == merged
+    assert [tuple(r) for r in backend.daily_metrics("Lima", 7)] == [("2025-06-16", 20, 20, 20, 50, 1)]
+
+
+def test_retry_queue_rows_are_upserted_and_deleted(backend):
+    backend.save_retry("Oslo", 1, "HTTP 503", "20250616T000000Z", 100.0)
+    backend.save_retry("Lima", 1, "network error", "20250616T000000Z", 150.0)
+    backend.save_retry("Oslo", 2, "HTTP 503", "20250616T000000Z", 200.0)
+    assert sorted(tuple(r) for r in backend.retry_queue()) == [("Lima", 1, 150.0), ("Oslo", 2, 200.0)]
+
+    backend.delete_retry("Oslo")
+    backend.delete_retry("Paris")
+    assert [tuple(r) for r in backend.retry_queue()] == [("Lima", 1, 150.0)]
+
+
+def test_city_ids_resolved_in_bulk_mode_are_kept_by_the_backend(backend):
+    resolver = CityIdResolver(backend)
+    resolver.remember("Oslo", {"id": 3143244})
+    resolver.remember("Lima", {"id": 3936456})
+    resolver.remember("Nowhere", {"cod": "404"})
+    resolver.forget("Lima")
+
+    # a later tick (or another process) loads what was resolved
+    assert backend.city_lookup() == {"oslo": "3143244"}
+    assert CityIdResolver(backend).resolve([" OSLO", "Lima"]) == ({" OSLO": "3143244"}, ["Lima"])
@@ -0,0 +1,65 @@
+import gc
+import threading
+import warnings
+
+from benchmarks.mock_owm import fake_weather
+from src.utils.weather_transform import transform_batch
+
+CAPTURED = "20250101T000000Z"
+
+
+def test_malformed_levels_are_missing_values():
+    good = fake_weather("London", 1_750_000_000)
+    responses = [
+        good,
+        dict(good, main=[1, 2]),                         # wrong type: required temp/humidity missing
+        dict(good, weather="clear"),                      # wrong type: defaults
+        dict(good, weather=[]),                           # empty list: defaults
+        {k: v for k, v in good.items() if k != "dt"},     # missing required field
+        "not a response",
+    ]
+    batch = transform_batch(responses, CAPTURED)
+
+    assert batch.valid.tolist() == [True, False, True, True, False, False]
+    rows = batch.rows()
+    assert rows[0][0] == "London" and rows[0][3] == good["dt"]
+    assert rows[1][12:] == ("Unknown", "Unknown") == rows[2][12:]
+    assert batch.rejected["temp_c_missing"] == 2
+    assert batch.rejected["ts_utc_missing"] == 2
+
+
+def test_huge_and_infinite_values_are_rejected_without_overflow():
+    good = fake_weather("London", 1_750_000_000)
+    bad_dt = [float("inf"), float("-inf"), 1e20, 1e300, 2**70, 253_402_300_800]
+    responses = [good] + [dict(good, dt=dt) for dt in bad_dt] + [dict(good, main=dict(good["main"], temp=float("inf")))]
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")  # e.g. "invalid value encountered in cast"
+        batch = transform_batch(responses, CAPTURED)
+
+    assert batch.valid.tolist() == [True] + [False] * 7
+    assert batch.rejected == {"ts_utc_missing": 2, "ts_utc_out_of_range": 4, "temp_c_missing": 1}
+    assert batch.columns["ts_utc"].tolist() == [good["dt"]] + [0] * 6 + [good["dt"]]
+    assert batch.rows()[0][3:5] == (good["dt"], "2025-06-15")
+
+
+def test_empty_batch():
+    batch = transform_batch([], CAPTURED)
+    assert len(batch) == 0 and batch.rows() == []
+
+
+def test_concurrent_batches_leave_the_collector_alone():
+    responses = [fake_weather(f"City{i}", 1_750_000_000) for i in range(2000)]
+    results = []
+
+    def work():
+        for _ in range(5):
+            results.append(transform_batch(responses, CAPTURED).valid_count)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [len(responses)] * 20
+    assert gc.isenabled()
@@ -0,0 +1,61 @@
+import threading
+from collections import Counter
+
+from src.utils.resilience import FetchPolicy
+from src.utils.sharding import ShardWorker
+from src.utils.work_queue import SQLiteWorkQueue
+
+CITIES = [f"City{i}" for i in range(300)]
+NOW = 1_754_000_000.0
+
+
+def test_concurrent_workers_never_fetch_a_city_twice(tmp_path):
+    path = str(tmp_path / "queue.db")
+    queue = SQLiteWorkQueue(path)
+    queue.sync({city: 3600 for city in CITIES}, spread=False)
+    fetched, lock = Counter(), threading.Lock()
+
+    def sink(found):
+        with lock:
+            fetched.update(city for city, _ in found)
+
+    def work(n):
+        # one queue (and connection) per worker, like the worker processes
+        worker = ShardWorker(SQLiteWorkQueue(path), lambda city, policy: ({"name": city}, None), sink,
+                             FetchPolicy(retries=0), name=f"worker{n}", claim_size=7, concurrency=2)
+        while worker.step():
+            pass
+        worker.queue.close()
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert set(fetched) == set(CITIES)
+    assert max(fetched.values()) == 1
+    stats = queue.stats()
+    assert stats["runs"] == len(CITIES) and stats["leased"] == 0 and stats["due"] == 0
+    queue.close()
+
+
+def test_a_city_is_claimed_again_only_once_its_lease_is_gone(tmp_path):
+    queue = SQLiteWorkQueue(str(tmp_path / "queue.db"))
+    queue.sync({city: 600 for city in CITIES[:5]}, spread=False, clock=lambda: NOW)
+
+    assert sorted(queue.claim("a", lease=60, clock=lambda: NOW)) == CITIES[:5]
+    assert queue.claim("b", lease=60, clock=lambda: NOW + 30) == []
+    # a's lease expired: b takes the cities over, and a's late completion is ignored
+    assert sorted(queue.claim("b", lease=60, clock=lambda: NOW + 61)) == CITIES[:5]
+    queue.complete("a", CITIES[:5], clock=lambda: NOW + 62)
+    assert queue.stats(clock=lambda: NOW + 62)["runs"] == 0
+    queue.complete("b", CITIES[:5], clock=lambda: NOW + 62)
+    assert queue.stats(clock=lambda: NOW + 62)["runs"] == 5
+    assert queue.claim("c", clock=lambda: NOW + 62) == []
+
+    # a worker found dead gives its leases back right away
+    assert len(queue.claim("c", lease=60, clock=lambda: NOW + 600)) == 5
+    assert queue.release("c") == 5
+    assert len(queue.claim("d", lease=60, clock=lambda: NOW + 601)) == 5
+    queue.close()